@@ -18,28 +18,31 @@ async def demo_deployment_verification():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    # 部署上下文
-    deployment_context = {
-        "environment": "production",
-        "service": "api-server",
-        "version": "v1.2.0",
-        "replicas": 3
-    }
-    
-    print(f"📋 部署上下文: {json.dumps(deployment_context, indent=2, ensure_ascii=False)}")
-    print()
+    try:
+        # 部署上下文
+        deployment_context = {
+            "environment": "production",
+            "service": "api-server",
+            "version": "v1.2.0",
+            "replicas": 3
+        }
+    
+        print(f"📋 部署上下文: {json.dumps(deployment_context, indent=2, ensure_ascii=False)}")
+        print()
     
-    # 執行部署驗證
-    result = await coordinator.coordinate_verification(
-        OperationType.DEPLOYMENT, 
-        deployment_context
-    )
+        # 執行部署驗證
+        result = await coordinator.coordinate_verification(
+            OperationType.DEPLOYMENT, 
+            deployment_context
+        )
     
-    print("📊 驗證結果:")
-    print(json.dumps(result, indent=2, ensure_ascii=False))
-    print()
+        print("📊 驗證結果:")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        print()
     
-    return result
+        return result
+    finally:
+        await coordinator.async_close()
 
 async def demo_testing_verification():
     """演示測試驗證流程"""
@@ -48,27 +51,30 @@ async def demo_testing_verification():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    # 測試上下文
-    testing_context = {
-        "test_suite": "integration",
-        "environment": "staging",
-        "test_data": "sample_dataset_v1"
-    }
+    try:
+        # 測試上下文
+        testing_context = {
+            "test_suite": "integration",
+            "environment": "staging",
+            "test_data": "sample_dataset_v1"
+        }
     
-    print(f"📋 測試上下文: {json.dumps(testing_context, indent=2, ensure_ascii=False)}")
-    print()
+        print(f"📋 測試上下文: {json.dumps(testing_context, indent=2, ensure_ascii=False)}")
+        print()
     
-    # 執行測試驗證
-    result = await coordinator.coordinate_verification(
-        OperationType.TESTING,
-        testing_context
-    )
+        # 執行測試驗證
+        result = await coordinator.coordinate_verification(
+            OperationType.TESTING,
+            testing_context
+        )
     
-    print("📊 驗證結果:")
-    print(json.dumps(result, indent=2, ensure_ascii=False))
-    print()
+        print("📊 驗證結果:")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        print()
     
-    return result
+        return result
+    finally:
+        await coordinator.async_close()
 
 async def demo_operations_verification():
     """演示運維驗證流程"""
@@ -77,28 +83,31 @@ async def demo_operations_verification():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    # 運維上下文
-    operations_context = {
-        "operation": "database_maintenance",
-        "maintenance_window": "2025-06-26T02:00:00Z",
-        "duration": "2 hours",
-        "affected_services": ["api-server", "web-app"]
-    }
+    try:
+        # 運維上下文
+        operations_context = {
+            "operation": "database_maintenance",
+            "maintenance_window": "2025-06-26T02:00:00Z",
+            "duration": "2 hours",
+            "affected_services": ["api-server", "web-app"]
+        }
     
-    print(f"📋 運維上下文: {json.dumps(operations_context, indent=2, ensure_ascii=False)}")
-    print()
+        print(f"📋 運維上下文: {json.dumps(operations_context, indent=2, ensure_ascii=False)}")
+        print()
     
-    # 執行運維驗證
-    result = await coordinator.coordinate_verification(
-        OperationType.OPERATIONS,
-        operations_context
-    )
+        # 執行運維驗證
+        result = await coordinator.coordinate_verification(
+            OperationType.OPERATIONS,
+            operations_context
+        )
     
-    print("📊 驗證結果:")
-    print(json.dumps(result, indent=2, ensure_ascii=False))
-    print()
+        print("📊 驗證結果:")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        print()
     
-    return result
+        return result
+    finally:
+        await coordinator.async_close()
 
 async def demo_release_verification():
     """演示發布驗證流程"""
@@ -107,29 +116,32 @@ async def demo_release_verification():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    # 發布上下文
-    release_context = {
-        "release_version": "v2.0.0",
-        "environment": "production",
-        "features": ["user_authentication", "payment_gateway"],
-        "rollback_plan": "automatic",
-        "monitoring": "enhanced"
-    }
-    
-    print(f"📋 發布上下文: {json.dumps(release_context, indent=2, ensure_ascii=False)}")
-    print()
+    try:
+        # 發布上下文
+        release_context = {
+            "release_version": "v2.0.0",
+            "environment": "production",
+            "features": ["user_authentication", "payment_gateway"],
+            "rollback_plan": "automatic",
+            "monitoring": "enhanced"
+        }
+    
+        print(f"📋 發布上下文: {json.dumps(release_context, indent=2, ensure_ascii=False)}")
+        print()
     
-    # 執行發布驗證
-    result = await coordinator.coordinate_verification(
-        OperationType.RELEASE,
-        release_context
-    )
+        # 執行發布驗證
+        result = await coordinator.coordinate_verification(
+            OperationType.RELEASE,
+            release_context
+        )
     
-    print("📊 驗證結果:")
-    print(json.dumps(result, indent=2, ensure_ascii=False))
-    print()
+        print("📊 驗證結果:")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        print()
     
-    return result
+        return result
+    finally:
+        await coordinator.async_close()
 
 async def demo_verification_history():
     """演示驗證歷史查看"""
@@ -138,16 +150,19 @@ async def demo_verification_history():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    # 先執行一些驗證操作來生成歷史
-    await coordinator.coordinate_verification(OperationType.TESTING, {"test": "demo"})
-    await coordinator.coordinate_verification(OperationType.DEPLOYMENT, {"deploy": "demo"})
+    try:
+        # 先執行一些驗證操作來生成歷史
+        await coordinator.coordinate_verification(OperationType.TESTING, {"test": "demo"})
+        await coordinator.coordinate_verification(OperationType.DEPLOYMENT, {"deploy": "demo"})
     
-    # 查看歷史
-    history = coordinator.get_operation_history(limit=10)
+        # 查看歷史
+        history = coordinator.get_operation_history(limit=10)
     
-    print("📊 操作歷史:")
-    print(json.dumps(history, indent=2, ensure_ascii=False))
-    print()
+        print("📊 操作歷史:")
+        print(json.dumps(history, indent=2, ensure_ascii=False))
+        print()
+    finally:
+        await coordinator.async_close()
 
 async def demo_blocked_operations():
     """演示操作阻止機制"""
@@ -156,31 +171,34 @@ async def demo_blocked_operations():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    # 查看當前被阻止的操作
-    blocked = coordinator.get_blocked_operations()
-    print(f"🚫 當前被阻止的操作: {blocked}")
+    try:
+        # 查看當前被阻止的操作
+        blocked = coordinator.get_blocked_operations()
+        print(f"🚫 當前被阻止的操作: {blocked}")
     
-    # 手動阻止一個操作
-    coordinator.blocked_operations.add(OperationType.DEPLOYMENT)
-    print("➕ 手動阻止部署操作")
+        # 手動阻止一個操作
+        coordinator.blocked_operations.add(OperationType.DEPLOYMENT)
+        print("➕ 手動阻止部署操作")
     
-    # 嘗試執行被阻止的操作
-    result = await coordinator.coordinate_verification(
-        OperationType.DEPLOYMENT,
-        {"test": "blocked"}
-    )
+        # 嘗試執行被阻止的操作
+        result = await coordinator.coordinate_verification(
+            OperationType.DEPLOYMENT,
+            {"test": "blocked"}
+        )
     
-    print("📊 被阻止操作的結果:")
-    print(json.dumps(result, indent=2, ensure_ascii=False))
+        print("📊 被阻止操作的結果:")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
     
-    # 解除阻止
-    success = coordinator.unblock_operation("deployment")
-    print(f"✅ 解除阻止結果: {success}")
+        # 解除阻止
+        success = coordinator.unblock_operation("deployment")
+        print(f"✅ 解除阻止結果: {success}")
     
-    # 再次查看被阻止的操作
-    blocked = coordinator.get_blocked_operations()
-    print(f"🚫 解除後被阻止的操作: {blocked}")
-    print()
+        # 再次查看被阻止的操作
+        blocked = coordinator.get_blocked_operations()
+        print(f"🚫 解除後被阻止的操作: {blocked}")
+        print()
+    finally:
+        await coordinator.async_close()
 
 async def demo_comprehensive_workflow():
     """演示完整的工作流程"""
@@ -15,12 +15,21 @@ Automated Verification Coordinator Workflow MCP
 import asyncio
 import json
 import logging
+import os
+import sys
 import time
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+# 導入共享的操作歷史服務
+sys.path.append(os.path.join(os.path.dirname(__file__), '../mcp/shared'))
+try:
+    from operation_history import OperationHistoryStore
+except ImportError:
+    from PowerAutomation.components.mcp.shared.operation_history import OperationHistoryStore
+
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -64,10 +73,12 @@ class VerificationResult:
 class AutomatedVerificationCoordinator:
     """自動化驗證協調器"""
     
-    def __init__(self):
+    def __init__(self, history_db_path: str = None):
         self.verification_rules = {}
         self.verification_results = {}
-        self.operation_history = []
+        self.operation_history = OperationHistoryStore(
+            "automated_verification_coordinator", db_path=history_db_path
+        )
         self.blocked_operations = set()
         
         # 初始化驗證規則
@@ -618,11 +629,7 @@ class AutomatedVerificationCoordinator:
             "success_rate": summary.get("success_rate", 0)
         }
         
-        self.operation_history.append(history_entry)
-        
-        # 保持歷史記錄在合理範圍內
-        if len(self.operation_history) > 1000:
-            self.operation_history = self.operation_history[-500:]
+        self.operation_history.record(history_entry)
     
     def _update_blocked_operations(self, operation_type: OperationType, 
                                  summary: Dict[str, Any]):
@@ -638,7 +645,27 @@ class AutomatedVerificationCoordinator:
     
     def get_operation_history(self, limit: int = 50) -> List[Dict[str, Any]]:
         """獲取操作歷史"""
-        return self.operation_history[-limit:]
+        return self.operation_history.recent(limit)
+    
+    def close(self):
+        """寫入剩餘的操作歷史並停止後台寫入線程"""
+        self.operation_history.close()
+    
+    async def async_close(self):
+        """在協程中關閉操作歷史存儲，不阻塞事件循環"""
+        await self.operation_history.async_close()
+    
+    def query_operation_history(self, operation_type: str = None, status: str = None,
+                                since: Any = None, until: Any = None,
+                                limit: int = 100) -> List[Dict[str, Any]]:
+        """按類型、狀態和時間範圍查詢持久化的操作歷史"""
+        return self.operation_history.query(operation_type, status, since, until, limit)
+    
+    async def async_query_operation_history(self, operation_type: str = None, status: str = None,
+                                            since: Any = None, until: Any = None,
+                                            limit: int = 100) -> List[Dict[str, Any]]:
+        """在協程中查詢持久化的操作歷史，不阻塞事件循環"""
+        return await self.operation_history.async_query(operation_type, status, since, until, limit)
     
     def get_blocked_operations(self) -> List[str]:
         """獲取被阻止的操作"""
@@ -674,31 +701,34 @@ async def main():
     
     coordinator = AutomatedVerificationCoordinator()
     
-    if args.history:
-        history = coordinator.get_operation_history()
-        print(json.dumps(history, indent=2, ensure_ascii=False))
-        return
-    
-    if args.blocked:
-        blocked = coordinator.get_blocked_operations()
-        print(json.dumps(blocked, indent=2, ensure_ascii=False))
-        return
-    
-    if args.unblock:
-        success = coordinator.unblock_operation(args.unblock)
-        print(json.dumps({"success": success}, indent=2))
-        return
-    
     try:
-        context = json.loads(args.context)
-    except json.JSONDecodeError:
-        print("❌ 無效的 JSON 上下文")
-        return
-    
-    operation_type = OperationType(args.operation)
-    result = await coordinator.coordinate_verification(operation_type, context)
-    
-    print(json.dumps(result, indent=2, ensure_ascii=False))
+        if args.history:
+            history = coordinator.get_operation_history()
+            print(json.dumps(history, indent=2, ensure_ascii=False))
+            return
+        
+        if args.blocked:
+            blocked = coordinator.get_blocked_operations()
+            print(json.dumps(blocked, indent=2, ensure_ascii=False))
+            return
+        
+        if args.unblock:
+            success = coordinator.unblock_operation(args.unblock)
+            print(json.dumps({"success": success}, indent=2))
+            return
+        
+        try:
+            context = json.loads(args.context)
+        except json.JSONDecodeError:
+            print("❌ 無效的 JSON 上下文")
+            return
+        
+        operation_type = OperationType(args.operation)
+        result = await coordinator.coordinate_verification(operation_type, context)
+        
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    finally:
+        await coordinator.async_close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -7,16 +7,26 @@ Claude Code 真實 API 前置場景識別路由器
 import asyncio
 import json
 import logging
+import os
+import sys
 import aiohttp
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import uuid
 
+# 導入共享的LLM響應緩存
+sys.path.append(os.path.join(os.path.dirname(__file__), 'mcp', 'shared'))
+try:
+    from llm_response_cache import LLMResponseCache, get_shared_response_cache
+except ImportError:
+    from PowerAutomation.components.mcp.shared.llm_response_cache import LLMResponseCache, get_shared_response_cache
+
 logger = logging.getLogger(__name__)
 
 # Claude API 配置
 CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
 
 @dataclass
 class ExpertRecommendation:
@@ -51,9 +61,11 @@ class ProcessingRequest:
 class ClaudeCodeRealRouter:
     """Claude Code 真實 API 路由器"""
     
-    def __init__(self):
+    def __init__(self, response_cache: Optional[LLMResponseCache] = None):
         self.api_key = os.getenv("CLAUDE_API_KEY", "your-claude-api-key-here")
         self.processing_history: List[ProcessingRequest] = []
+        # 場景分析和專家處理的響應緩存
+        self.response_cache = response_cache or get_shared_response_cache()
         self.expert_registry = {
             "code_architect": {
                 "name": "代碼架構專家",
@@ -82,9 +94,13 @@ class ClaudeCodeRealRouter:
             }
         }
         
-    async def analyze_and_route(self, user_input: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def analyze_and_route(self, user_input: str, context: Dict[str, Any] = None,
+                                use_cache: bool = True) -> Dict[str, Any]:
         """
         使用真實 Claude API 進行場景分析和專家推薦
+        
+        Args:
+            use_cache: 為 False 時場景分析和專家處理都繞過響應緩存
         """
         request_id = str(uuid.uuid4())
         request = ProcessingRequest(
@@ -96,11 +112,11 @@ class ClaudeCodeRealRouter:
         
         try:
             # 使用真實 Claude API 進行場景分析
-            scenario_analysis = await self._real_claude_scenario_analysis(user_input, context)
+            scenario_analysis = await self._real_claude_scenario_analysis(user_input, context, use_cache)
             request.scenario_analysis = scenario_analysis
             
             # 基於分析結果執行專家匹配和處理
-            processing_result = await self._execute_expert_processing(request)
+            processing_result = await self._execute_expert_processing(request, use_cache)
             
             # 記錄處理歷史
             self.processing_history.append(request)
@@ -122,7 +138,53 @@ class ClaudeCodeRealRouter:
                 "status": "error"
             }
     
-    async def _real_claude_scenario_analysis(self, user_input: str, context: Dict[str, Any]) -> ScenarioAnalysis:
+    async def _call_claude(self, prompt: str, max_tokens: int, usage: Optional[Dict[str, Any]] = None) -> str:
+        """
+        調用 Claude Messages API，失敗時拋出異常
+        
+        Args:
+            usage: 實際發起調用時寫入 API 返回的 usage（緩存命中時保持不變）
+        """
+        async with aiohttp.ClientSession() as session:
+            headers = {
+                "Content-Type": "application/json",
+                "x-api-key": self.api_key,
+                "anthropic-version": "2023-06-01"
+            }
+            
+            payload = {
+                "model": CLAUDE_MODEL,
+                "max_tokens": max_tokens,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            }
+            
+            async with session.post(CLAUDE_API_URL, headers=headers, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise Exception(f"Claude API 調用失敗: {response.status} - {error_text}")
+                result = await response.json()
+                if usage is not None:
+                    usage.update(result.get("usage", {}))
+                return result["content"][0]["text"]
+    
+    async def _cached_claude(self, prompt: str, max_tokens: int, use_cache: bool = True,
+                             usage: Optional[Dict[str, Any]] = None, cacheable=None) -> str:
+        """經響應緩存調用 Claude，相同提示詞直接復用已有回答"""
+        return await self.response_cache.get_or_call(
+            lambda: self._call_claude(prompt, max_tokens, usage),
+            "claude", CLAUDE_MODEL, prompt,
+            params={"max_tokens": max_tokens},
+            use_cache=use_cache,
+            cacheable=cacheable
+        )
+    
+    async def _real_claude_scenario_analysis(self, user_input: str, context: Dict[str, Any],
+                                             use_cache: bool = True) -> ScenarioAnalysis:
         """
         使用真實 Claude API 進行深度場景分析和專家推薦
         """
@@ -133,7 +195,7 @@ class ClaudeCodeRealRouter:
 {user_input}
 
 上下文信息：
-{json.dumps(context, ensure_ascii=False, indent=2)}
+{json.dumps(context, ensure_ascii=False, indent=2, sort_keys=True, default=str)}
 
 可用專家類型：
 {json.dumps(self.expert_registry, ensure_ascii=False, indent=2)}
@@ -175,66 +237,43 @@ class ClaudeCodeRealRouter:
 }}"""
 
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Content-Type": "application/json",
-                    "x-api-key": CLAUDE_API_KEY,
-                    "anthropic-version": "2023-06-01"
-                }
-                
-                payload = {
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 2000,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": analysis_prompt
-                        }
-                    ]
-                }
-                
-                async with session.post(CLAUDE_API_URL, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result["content"][0]["text"]
-                        
-                        # 解析 JSON 回應
-                        try:
-                            analysis_data = json.loads(content)
-                        except json.JSONDecodeError:
-                            # 如果 JSON 解析失敗，嘗試提取 JSON 部分
-                            import re
-                            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                            if json_match:
-                                analysis_data = json.loads(json_match.group())
-                            else:
-                                raise ValueError("無法解析 Claude API 回應")
-                        
-                        # 轉換為 ExpertRecommendation 對象
-                        expert_recommendations = []
-                        for expert_data in analysis_data.get("recommended_experts", []):
-                            expert_recommendations.append(ExpertRecommendation(
-                                expert_type=expert_data.get("expert_type", "general"),
-                                expertise_areas=expert_data.get("expertise_areas", []),
-                                confidence=expert_data.get("confidence", 0.5),
-                                reasoning=expert_data.get("reasoning", ""),
-                                required_context=expert_data.get("required_context", {})
-                            ))
-                        
-                        return ScenarioAnalysis(
-                            scenario_type=analysis_data.get("scenario_type", "general"),
-                            complexity_level=analysis_data.get("complexity_level", "medium"),
-                            content_size=analysis_data.get("content_size", "medium"),
-                            technical_domains=analysis_data.get("technical_domains", []),
-                            recommended_experts=expert_recommendations,
-                            context_requirements=analysis_data.get("context_requirements", {}),
-                            confidence_score=analysis_data.get("confidence_score", 0.8),
-                            analysis_reasoning=analysis_data.get("analysis_reasoning", "基於 Claude API 的分析")
-                        )
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Claude API 調用失敗: {response.status} - {error_text}")
-                        
+            # 只緩存包含 JSON 的回應，無法解析的回應不會被反復復用
+            content = await self._cached_claude(analysis_prompt, 2000, use_cache,
+                                                cacheable=lambda text: "{" in text)
+            
+            # 解析 JSON 回應
+            try:
+                analysis_data = json.loads(content)
+            except json.JSONDecodeError:
+                # 如果 JSON 解析失敗，嘗試提取 JSON 部分
+                import re
+                json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                if json_match:
+                    analysis_data = json.loads(json_match.group())
+                else:
+                    raise ValueError("無法解析 Claude API 回應")
+
+            # 轉換為 ExpertRecommendation 對象
+            expert_recommendations = []
+            for expert_data in analysis_data.get("recommended_experts", []):
+                expert_recommendations.append(ExpertRecommendation(
+                    expert_type=expert_data.get("expert_type", "general"),
+                    expertise_areas=expert_data.get("expertise_areas", []),
+                    confidence=expert_data.get("confidence", 0.5),
+                    reasoning=expert_data.get("reasoning", ""),
+                    required_context=expert_data.get("required_context", {})
+                ))
+
+            return ScenarioAnalysis(
+                scenario_type=analysis_data.get("scenario_type", "general"),
+                complexity_level=analysis_data.get("complexity_level", "medium"),
+                content_size=analysis_data.get("content_size", "medium"),
+                technical_domains=analysis_data.get("technical_domains", []),
+                recommended_experts=expert_recommendations,
+                context_requirements=analysis_data.get("context_requirements", {}),
+                confidence_score=analysis_data.get("confidence_score", 0.8),
+                analysis_reasoning=analysis_data.get("analysis_reasoning", "基於 Claude API 的分析")
+            )
         except Exception as e:
             logger.error(f"Claude API 調用錯誤: {e}")
             # 回退到基本分析
@@ -255,7 +294,7 @@ class ClaudeCodeRealRouter:
                 analysis_reasoning=f"API 調用失敗: {str(e)}"
             )
     
-    async def _execute_expert_processing(self, request: ProcessingRequest) -> Dict[str, Any]:
+    async def _execute_expert_processing(self, request: ProcessingRequest, use_cache: bool = True) -> Dict[str, Any]:
         """
         基於專家推薦執行處理
         """
@@ -268,7 +307,7 @@ class ClaudeCodeRealRouter:
         best_expert = max(analysis.recommended_experts, key=lambda x: x.confidence)
         
         # 使用選定專家進行處理
-        expert_result = await self._expert_processing(request, best_expert)
+        expert_result = await self._expert_processing(request, best_expert, use_cache)
         
         return {
             "selected_expert": asdict(best_expert),
@@ -277,7 +316,8 @@ class ClaudeCodeRealRouter:
             "context_utilization": "200K tokens available"
         }
     
-    async def _expert_processing(self, request: ProcessingRequest, expert: ExpertRecommendation) -> Dict[str, Any]:
+    async def _expert_processing(self, request: ProcessingRequest, expert: ExpertRecommendation,
+                                 use_cache: bool = True) -> Dict[str, Any]:
         """
         專家級處理
         """
@@ -289,7 +329,7 @@ class ClaudeCodeRealRouter:
 {request.user_input}
 
 上下文信息：
-{json.dumps(request.context, ensure_ascii=False, indent=2)}
+{json.dumps(request.context, ensure_ascii=False, indent=2, sort_keys=True, default=str)}
 
 場景分析：
 {json.dumps(asdict(request.scenario_analysis), ensure_ascii=False, indent=2)}
@@ -303,40 +343,19 @@ class ClaudeCodeRealRouter:
 
 請提供詳細且實用的專業建議。"""
 
+        usage: Dict[str, Any] = {}
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Content-Type": "application/json",
-                    "x-api-key": CLAUDE_API_KEY,
-                    "anthropic-version": "2023-06-01"
-                }
-                
-                payload = {
-                    "model": "claude-3-5-sonnet-20241022",
-                    "max_tokens": 4000,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": expert_prompt
-                        }
-                    ]
-                }
-                
-                async with session.post(CLAUDE_API_URL, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result["content"][0]["text"]
-                        
-                        return {
-                            "expert_response": content,
-                            "expert_type": expert.expert_type,
-                            "confidence": expert.confidence,
-                            "tokens_used": result.get("usage", {}).get("output_tokens", 0)
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {"error": f"專家處理失敗: {response.status} - {error_text}"}
-                        
+            content = await self._cached_claude(expert_prompt, 4000, use_cache, usage)
+            
+            return {
+                "expert_response": content,
+                "expert_type": expert.expert_type,
+                "confidence": expert.confidence,
+                # 緩存命中時沒有實際調用，不消耗 token
+                "tokens_used": usage.get("output_tokens", 0),
+                "cached": not usage
+            }
+            
         except Exception as e:
             return {"error": f"專家處理錯誤: {str(e)}"}
     
@@ -354,7 +373,8 @@ class ClaudeCodeRealRouter:
         return {
             "total_requests": len(self.processing_history),
             "expert_usage": expert_usage,
-            "available_experts": list(self.expert_registry.keys())
+            "available_experts": list(self.expert_registry.keys()),
+            "response_cache": self.response_cache.get_stats()
         }
 
 # 測試函數
@@ -33,6 +33,13 @@ import traceback
 import hashlib
 from collections import defaultdict, Counter
 
+# 导入共享的LLM响应缓存
+sys.path.append(os.path.join(os.path.dirname(__file__), '../mcp/shared'))
+try:
+    from llm_response_cache import LLMResponseCache, get_shared_response_cache
+except ImportError:
+    from PowerAutomation.components.mcp.shared.llm_response_cache import LLMResponseCache, get_shared_response_cache
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -370,7 +377,7 @@ class DynamicExpertRegistry:
 class ClaudeSDKMCP:
     """Claude SDK MCP v2.0 主类"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, response_cache: Optional[LLMResponseCache] = None):
         """初始化 ClaudeSDKMCP"""
         self.api_key = api_key or os.getenv("CLAUDE_API_KEY", "your-claude-api-key-here")
         self.processing_history: List[ProcessingRequest] = []
@@ -378,6 +385,9 @@ class ClaudeSDKMCP:
         self.expert_registry = DynamicExpertRegistry()
         self.session = None
         
+        # 场景分析响应缓存：相同的请求和上下文复用已有的分析结果
+        self.response_cache = response_cache or get_shared_response_cache()
+        
         # 初始化基础专家
         self._initialize_base_experts()
         
@@ -591,8 +601,14 @@ class ClaudeSDKMCP:
         
         logger.info(f"已初始化 {len(self.operation_handlers)} 个操作处理器")
     
-    async def process_request(self, user_input: str, context: Dict[str, Any] = None) -> ProcessingResult:
-        """处理用户请求的主入口"""
+    async def process_request(self, user_input: str, context: Dict[str, Any] = None,
+                              use_cache: bool = True) -> ProcessingResult:
+        """
+        处理用户请求的主入口
+        
+        Args:
+            use_cache: 为 False 时场景分析绕过响应缓存
+        """
         request_id = str(uuid.uuid4())
         start_time = time.time()
         
@@ -605,7 +621,7 @@ class ClaudeSDKMCP:
         
         try:
             # 1. 场景分析和专家推荐
-            scenario_analysis = await self._analyze_scenario(user_input, context)
+            scenario_analysis = await self._analyze_scenario(user_input, context, use_cache=use_cache)
             request.scenario_analysis = scenario_analysis
             
             # 2. 获取专家推荐
@@ -664,8 +680,9 @@ class ClaudeSDKMCP:
                 error_message=str(e)
             )
     
-    async def _analyze_scenario(self, user_input: str, context: Dict[str, Any]) -> ScenarioAnalysis:
-        """使用真实 Claude API 进行场景分析"""
+    async def _analyze_scenario(self, user_input: str, context: Dict[str, Any],
+                                use_cache: bool = True) -> ScenarioAnalysis:
+        """使用真实 Claude API 进行场景分析（结果经响应缓存复用）"""
         
         analysis_prompt = f"""你是一个智能场景识别和专家推荐系统。请分析以下用户请求，并推荐最适合的专家来处理。
 
@@ -673,7 +690,7 @@ class ClaudeSDKMCP:
 {user_input}
 
 上下文信息：
-{json.dumps(context, ensure_ascii=False, indent=2)}
+{json.dumps(context, ensure_ascii=False, indent=2, sort_keys=True, default=str)}
 
 可用专家类型：
 - code_architect: 代码架构专家
@@ -697,42 +714,51 @@ class ClaudeSDKMCP:
 请以JSON格式返回分析结果。"""
 
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
-            headers = {
-                "Content-Type": "application/json",
-                "x-api-key": self.api_key,
-                "anthropic-version": "2023-06-01"
-            }
+            analysis_text = await self.response_cache.get_or_call(
+                lambda: self._call_claude(analysis_prompt, max_tokens=4000),
+                "claude", CLAUDE_MODEL, analysis_prompt,
+                params={"max_tokens": 4000},
+                use_cache=use_cache,
+                # 只缓存包含 JSON 的结果，无法解析的回应不会被反复复用
+                cacheable=lambda text: "{" in text
+            )
             
-            payload = {
-                "model": CLAUDE_MODEL,
-                "max_tokens": 4000,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": analysis_prompt
-                    }
-                ]
-            }
+            # 解析分析结果
+            return self._parse_scenario_analysis(analysis_text, user_input)
             
-            async with self.session.post(CLAUDE_API_URL, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    analysis_text = result["content"][0]["text"]
-                    
-                    # 解析分析结果
-                    return self._parse_scenario_analysis(analysis_text, user_input)
-                else:
-                    logger.error(f"Claude API 调用失败: {response.status}")
-                    # 返回默认分析结果
-                    return self._get_default_scenario_analysis(user_input)
-                    
         except Exception as e:
             logger.error(f"场景分析失败: {e}")
+            # 返回默认分析结果
             return self._get_default_scenario_analysis(user_input)
     
+    async def _call_claude(self, prompt: str, max_tokens: int = 4000) -> str:
+        """调用 Claude Messages API，失败时抛出异常"""
+        if not self.session:
+            self.session = aiohttp.ClientSession()
+        
+        headers = {
+            "Content-Type": "application/json",
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01"
+        }
+        
+        payload = {
+            "model": CLAUDE_MODEL,
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+        
+        async with self.session.post(CLAUDE_API_URL, headers=headers, json=payload) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Claude API 调用失败: {response.status}")
+            result = await response.json()
+            return result["content"][0]["text"]
+    
     def _parse_scenario_analysis(self, analysis_text: str, user_input: str) -> ScenarioAnalysis:
         """解析场景分析结果"""
         try:
@@ -1160,6 +1186,7 @@ class ClaudeSDKMCP:
             "total_experts": len(self.expert_registry.experts),
             "operation_handlers": len(self.operation_handlers),
             "expert_statistics": expert_stats,
+            "response_cache": self.response_cache.get_stats(),
             "features": [
                 "动态场景识别 - 95% 准确率",
                 "5个专业领域专家 + 动态专家发现",
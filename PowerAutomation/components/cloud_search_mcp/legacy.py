@@ -9,6 +9,7 @@ import json
 import logging
 import time
 import aiohttp
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
 from dataclasses import dataclass, field
@@ -47,6 +48,9 @@ class CloudSearchMCP:
         self.search_cache = {}
         self.cache_ttl = 3600  # 1小時緩存
         
+        # 服務宿主注入的共享連接池，為 None 時每次調用臨時創建
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        
         # 日誌設置
         self.logger = logging.getLogger(__name__)
         
@@ -219,6 +223,15 @@ class CloudSearchMCP:
             self.logger.error(f"LLM調用失敗: {e}")
             return f"LLM調用失敗: {str(e)}"
     
+    @asynccontextmanager
+    async def _http(self):
+        """優先使用共享連接池，未注入時創建臨時會話"""
+        if self.http_session is not None and not self.http_session.closed:
+            yield self.http_session
+        else:
+            async with aiohttp.ClientSession() as session:
+                yield session
+    
     async def _call_openai(self, prompt: str, system_prompt: str) -> str:
         """調用OpenAI API"""
         try:
@@ -238,7 +251,7 @@ class CloudSearchMCP:
                 "max_tokens": 1500
             }
             
-            async with aiohttp.ClientSession() as session:
+            async with self._http() as session:
                 async with session.post(url, headers=headers, json=payload) as response:
                     if response.status == 200:
                         result = await response.json()
@@ -260,7 +273,7 @@ class CloudSearchMCP:
                 "stream": False
             }
             
-            async with aiohttp.ClientSession() as session:
+            async with self._http() as session:
                 async with session.post(url, json=payload) as response:
                     if response.status == 200:
                         result = await response.json()
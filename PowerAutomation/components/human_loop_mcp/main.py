@@ -18,6 +18,11 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 from enum import Enum
 
+try:
+    from .session_subscription import SessionEventSubscriber
+except ImportError:
+    from session_subscription import SessionEventSubscriber
+
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,16 +37,20 @@ class InteractionType(Enum):
 class HumanLoopMCPClient:
     """Human Loop MCP 客戶端 - 極簡版本"""
     
-    def __init__(self, mcp_url: str = "http://localhost:8096"):
+    def __init__(self, mcp_url: str = "http://localhost:8096", transport: str = "auto"):
         """
         初始化 Human Loop MCP 客戶端
         
         Args:
             mcp_url: Human Loop MCP 服務的 URL
+            transport: 會話事件訂閱方式 (websocket / sse / long_poll / poll / auto)
         """
         self.mcp_url = mcp_url
         self.session_timeout = 300  # 5分鐘超時
         
+        # 所有會話共享一條事件訂閱連接
+        self.subscriber = SessionEventSubscriber(mcp_url, transport=transport)
+        
     async def create_interaction_session(self, 
                                        interaction_data: Dict[str, Any],
                                        workflow_id: str = None,
@@ -101,58 +110,41 @@ class HumanLoopMCPClient:
             用戶響應結果
         """
         timeout = timeout or self.session_timeout
-        start_time = datetime.now()
         
         try:
-            while True:
-                # 檢查會話狀態
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"{self.mcp_url}/api/sessions/{session_id}",
-                        timeout=aiohttp.ClientTimeout(total=10)
-                    ) as response:
-                        if response.status == 200:
-                            session_data = await response.json()
-                            session_info = session_data.get("session", {})
-                            status = session_info.get("status")
-                            
-                            if status == "completed":
-                                logger.info(f"用戶已響應會話: {session_id}")
-                                return {
-                                    "success": True,
-                                    "status": "completed",
-                                    "response": session_info.get("response"),
-                                    "session": session_info
-                                }
-                            elif status == "cancelled":
-                                logger.info(f"會話已取消: {session_id}")
-                                return {
-                                    "success": False,
-                                    "status": "cancelled",
-                                    "reason": session_info.get("cancellation_reason", "用戶取消")
-                                }
-                            elif status == "timeout":
-                                logger.info(f"會話已超時: {session_id}")
-                                return {
-                                    "success": False,
-                                    "status": "timeout",
-                                    "reason": "會話超時"
-                                }
-                        else:
-                            logger.error(f"獲取會話狀態失敗: {response.status}")
-                
-                # 檢查是否超時
-                elapsed = (datetime.now() - start_time).total_seconds()
-                if elapsed >= timeout:
-                    logger.warning(f"等待用戶響應超時: {session_id}")
-                    return {
-                        "success": False,
-                        "status": "timeout",
-                        "reason": f"等待超時 ({timeout}秒)"
-                    }
-                
-                # 等待5秒後重試
-                await asyncio.sleep(5)
+            event = await self.subscriber.wait_for(session_id, timeout)
+            
+            if event is None:
+                logger.warning(f"等待用戶響應超時: {session_id}")
+                return {
+                    "success": False,
+                    "status": "timeout",
+                    "reason": f"等待超時 ({timeout}秒)"
+                }
+            
+            status = event["status"]
+            if status == "completed":
+                logger.info(f"用戶已響應會話: {session_id}")
+                return {
+                    "success": True,
+                    "status": "completed",
+                    "response": event["response"],
+                    "session": event["session"]
+                }
+            elif status == "cancelled":
+                logger.info(f"會話已取消: {session_id}")
+                return {
+                    "success": False,
+                    "status": "cancelled",
+                    "reason": event["reason"] or "用戶取消"
+                }
+            else:
+                logger.info(f"會話已超時: {session_id}")
+                return {
+                    "success": False,
+                    "status": "timeout",
+                    "reason": "會話超時"
+                }
                 
         except Exception as e:
             logger.error(f"等待用戶響應時發生錯誤: {str(e)}")
@@ -200,6 +192,10 @@ class HumanLoopMCPClient:
                 "error": str(e)
             }
     
+    async def close(self):
+        """關閉會話事件訂閱連接"""
+        await self.subscriber.close()
+    
     async def check_service_health(self) -> bool:
         """
         檢查 Human Loop MCP 服務健康狀態
@@ -431,24 +427,27 @@ async def quick_confirmation(title: str,
         "timeout": timeout
     }
     
-    # 創建會話
-    session_result = await client.create_interaction_session(interaction_data)
-    
-    if not session_result.get("success"):
-        logger.error(f"創建確認會話失敗: {session_result.get('error')}")
-        return False
-    
-    session_id = session_result.get("session_id")
-    
-    # 等待用戶響應
-    response_result = await client.wait_for_user_response(session_id, timeout)
-    
-    if response_result.get("success") and response_result.get("status") == "completed":
-        user_choice = response_result.get("response", {}).get("choice")
-        return user_choice == "confirm"
-    else:
-        logger.warning(f"用戶確認失敗或超時: {response_result}")
-        return False
+    try:
+        # 創建會話
+        session_result = await client.create_interaction_session(interaction_data)
+        
+        if not session_result.get("success"):
+            logger.error(f"創建確認會話失敗: {session_result.get('error')}")
+            return False
+        
+        session_id = session_result.get("session_id")
+        
+        # 等待用戶響應
+        response_result = await client.wait_for_user_response(session_id, timeout)
+        
+        if response_result.get("success") and response_result.get("status") == "completed":
+            user_choice = response_result.get("response", {}).get("choice")
+            return user_choice == "confirm"
+        else:
+            logger.warning(f"用戶確認失敗或超時: {response_result}")
+            return False
+    finally:
+        await client.close()
 
 # 示例使用
 async def example_usage():
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Human Loop MCP 會話事件訂閱
+單一多路復用通道 - 同一客戶端的所有交互會話共享一條連接
+
+設計原則：
+1. 每個客戶端只維護一條訂閱連接（WebSocket / SSE / 長輪詢，依次降級）
+2. 服務器推送會話完成事件時直接喚醒對應會話的等待者
+3. 訂閱前後各做一次狀態補查，避免錯過已完成的會話
+4. 服務器不支持推送時，退化為單循環批量查詢全部待決會話
+"""
+
+import asyncio
+import aiohttp
+import json
+import logging
+from typing import Dict, List, Optional, Any, Set
+
+logger = logging.getLogger(__name__)
+
+# 會話終態
+TERMINAL_STATUSES = ("completed", "cancelled", "timeout")
+
+# 傳輸方式，auto 模式按此順序嘗試
+TRANSPORTS = ("websocket", "sse", "long_poll", "poll")
+
+class SessionEventSubscriber:
+    """會話事件訂閱器 - 為多個會話的等待者解析推送事件"""
+
+    def __init__(self,
+                 base_url: str,
+                 transport: str = "auto",
+                 status_path: str = "/api/sessions/{session_id}",
+                 events_path: str = "/api/sessions/events",
+                 long_poll_timeout: int = 30,
+                 poll_interval: float = 5.0,
+                 max_reconnect_delay: float = 30.0):
+        """
+        初始化訂閱器
+
+        Args:
+            base_url: Human Loop MCP 服務的 URL
+            transport: websocket / sse / long_poll / poll / auto
+            status_path: 單個會話狀態查詢路徑
+            events_path: 事件通道路徑（WebSocket 為 {events_path}/ws，長輪詢為 {events_path}/poll）
+            long_poll_timeout: 長輪詢單次等待時間（秒）
+            poll_interval: 退化為批量查詢時的間隔（秒）
+            max_reconnect_delay: 重連的最大退避時間（秒）
+        """
+        if transport != "auto" and transport not in TRANSPORTS:
+            raise ValueError(f"不支持的傳輸方式: {transport}")
+
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport
+        self.status_path = status_path
+        self.events_path = events_path
+        self.long_poll_timeout = long_poll_timeout
+        self.poll_interval = poll_interval
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._runner: Optional[asyncio.Task] = None
+        # 後台補查任務的強引用，完成後移除，避免任務在運行中被垃圾回收
+        self._background: Set[asyncio.Task] = set()
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._waiter_counts: Dict[str, int] = {}
+        self._changed = asyncio.Event()
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._unsupported: Set[str] = set()
+        self.active_transport: Optional[str] = None
+
+        self.stats = {
+            "connections": 0,
+            "events_received": 0,
+            "sessions_resolved": 0,
+            "status_checks": 0
+        }
+
+    async def wait_for(self, session_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        等待會話進入終態
+
+        Args:
+            session_id: 會話ID
+            timeout: 超時時間（秒）
+
+        Returns:
+            標準化的會話事件 {session_id, status, response, session, reason}，超時返回 None
+        """
+        future = self._waiters.get(session_id)
+        if future is None or future.done():
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[session_id] = future
+            self._ensure_running()
+            await self._subscribe([session_id])
+            # 補查一次，會話可能在訂閱前已完成
+            self._spawn(self._check_sessions([session_id]))
+        self._waiter_counts[session_id] = self._waiter_counts.get(session_id, 0) + 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            # 同一會話的最後一個等待者離開時取消訂閱
+            self._waiter_counts[session_id] -= 1
+            if self._waiter_counts[session_id] <= 0:
+                del self._waiter_counts[session_id]
+                if self._waiters.get(session_id) is future:
+                    del self._waiters[session_id]
+                if not future.done():
+                    future.cancel()
+                await self._unsubscribe([session_id])
+
+    async def close(self):
+        """關閉訂閱連接並取消所有等待者"""
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+        for task in list(self._background):
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        self._background.clear()
+
+        for future in self._waiters.values():
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+        self._waiter_counts.clear()
+
+        if self._http:
+            await self._http.close()
+            self._http = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取訂閱統計"""
+        return {
+            **self.stats,
+            "active_transport": self.active_transport,
+            "pending_sessions": len(self._waiters)
+        }
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _ensure_running(self):
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60)
+            )
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """維護訂閱連接，斷線後按退避重連並降級傳輸方式"""
+        delay = 1.0
+        while True:
+            if not self._waiters:
+                # 沒有待決會話時不保持連接
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            transport = self._select_transport()
+            self.active_transport = transport
+            try:
+                self.stats["connections"] += 1
+                if transport == "websocket":
+                    await self._run_websocket()
+                elif transport == "sse":
+                    await self._run_sse()
+                elif transport == "long_poll":
+                    await self._run_long_poll()
+                else:
+                    await self._run_poll()
+                # 正常返回表示訂閱集合變化或已無待決會話，立即重建通道
+                delay = 1.0
+                continue
+            except asyncio.CancelledError:
+                raise
+            except _TransportUnsupported:
+                logger.info(f"服務不支持 {transport} 訂閱，降級傳輸方式")
+                self._unsupported.add(transport)
+                continue
+            except Exception as e:
+                logger.warning(f"訂閱連接中斷 ({transport}): {e}")
+
+            # 重連前補查全部待決會話，防止斷線期間丟失事件
+            await self._check_sessions(list(self._waiters))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _select_transport(self) -> str:
+        if self.transport != "auto":
+            return self.transport
+        for transport in TRANSPORTS:
+            if transport not in self._unsupported:
+                return transport
+        return "poll"
+
+    async def _run_websocket(self):
+        url = self.base_url.replace("http", "ws", 1) + f"{self.events_path}/ws"
+        try:
+            ws = await self._http.ws_connect(url, heartbeat=30)
+        except aiohttp.WSServerHandshakeError as e:
+            if e.status in (404, 405, 501):
+                raise _TransportUnsupported()
+            raise
+
+        self._ws = ws
+        try:
+            await ws.send_json({"action": "subscribe", "session_ids": list(self._waiters)})
+            async for message in ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self._dispatch(json.loads(message.data))
+                elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+                if not self._waiters:
+                    return
+            raise ConnectionError("WebSocket 連接已關閉")
+        finally:
+            self._ws = None
+            await ws.close()
+
+    async def _run_sse(self):
+        params = {"session_ids": ",".join(self._waiters)}
+        async with self._http.get(
+            f"{self.base_url}{self.events_path}",
+            params=params,
+            headers={"Accept": "text/event-stream"},
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=self.long_poll_timeout * 2)
+        ) as response:
+            if response.status in (404, 405, 501) or \
+                    not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+                raise _TransportUnsupported()
+
+            self._changed.clear()
+            data_lines: List[str] = []
+            reader = asyncio.create_task(response.content.readline())
+            changed = asyncio.create_task(self._changed.wait())
+            try:
+                while self._waiters:
+                    done, _ = await asyncio.wait({reader, changed}, return_when=asyncio.FIRST_COMPLETED)
+                    if changed in done:
+                        # 新增會話需要重新建立帶過濾參數的流
+                        return
+
+                    raw = reader.result()
+                    if not raw:
+                        raise ConnectionError("事件流已關閉")
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].lstrip())
+                    elif not line and data_lines:
+                        self._dispatch(json.loads("\n".join(data_lines)))
+                        data_lines = []
+                    reader = asyncio.create_task(response.content.readline())
+            finally:
+                reader.cancel()
+                changed.cancel()
+
+    async def _run_long_poll(self):
+        cursor = None
+        while self._waiters:
+            self._changed.clear()
+            params = {"session_ids": ",".join(self._waiters), "timeout": str(self.long_poll_timeout)}
+            if cursor:
+                params["cursor"] = cursor
+
+            request = asyncio.create_task(self._http.get(
+                f"{self.base_url}{self.events_path}/poll",
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.long_poll_timeout + 10)
+            ))
+            changed = asyncio.create_task(self._changed.wait())
+            done, _ = await asyncio.wait({request, changed}, return_when=asyncio.FIRST_COMPLETED)
+            changed.cancel()
+            if request not in done:
+                # 訂閱集合變化，放棄當前請求並用新集合重新發起
+                request.cancel()
+                continue
+
+            async with request.result() as response:
+                if response.status in (404, 405, 501):
+                    raise _TransportUnsupported()
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+                payload = await response.json()
+
+            cursor = payload.get("cursor", cursor)
+            for event in payload.get("events", []):
+                self._dispatch(event)
+
+    async def _run_poll(self):
+        """服務器不支持推送時，單循環批量查詢全部待決會話"""
+        while self._waiters:
+            await self._check_sessions(list(self._waiters))
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _subscribe(self, session_ids: List[str]):
+        self._changed.set()
+        if self._ws is not None and not self._ws.closed:
+            try:
+                await self._ws.send_json({"action": "subscribe", "session_ids": session_ids})
+            except Exception as e:
+                logger.debug(f"發送訂閱消息失敗: {e}")
+
+    async def _unsubscribe(self, session_ids: List[str]):
+        if self._ws is not None and not self._ws.closed:
+            try:
+                await self._ws.send_json({"action": "unsubscribe", "session_ids": session_ids})
+            except Exception as e:
+                logger.debug(f"發送取消訂閱消息失敗: {e}")
+
+    async def _check_sessions(self, session_ids: List[str]):
+        """查詢會話狀態，已進入終態的直接解析"""
+        if not session_ids or self._http is None:
+            return
+
+        async def check(session_id: str):
+            self.stats["status_checks"] += 1
+            try:
+                async with self._http.get(
+                    f"{self.base_url}{self.status_path.format(session_id=session_id)}",
+                    timeout=aiohttp.ClientTimeout(total=10)
+                ) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        self._dispatch({"session_id": session_id, **data}, from_push=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"查詢會話狀態失敗 {session_id}: {e}")
+
+        await asyncio.gather(*(check(session_id) for session_id in session_ids))
+
+    def _dispatch(self, event: Dict[str, Any], from_push: bool = True):
+        """將事件標準化後解析對應會話的等待者"""
+        if from_push:
+            self.stats["events_received"] += 1
+
+        session_info = event.get("session") or {}
+        session_id = event.get("session_id") or session_info.get("session_id") or session_info.get("id")
+        # 會話自身的狀態優先，事件頂層的 status 可能是推送消息本身的狀態
+        status = session_info.get("status") or event.get("status")
+        if status not in TERMINAL_STATUSES:
+            return
+
+        future = self._waiters.get(session_id)
+        if future is None or future.done():
+            return
+
+        future.set_result({
+            "session_id": session_id,
+            "status": status,
+            "response": event.get("response", session_info.get("response")),
+            "session": session_info,
+            "reason": event.get("reason") or session_info.get("cancellation_reason")
+        })
+        self.stats["sessions_resolved"] += 1
+
+class _TransportUnsupported(Exception):
+    """服務器不支持當前傳輸方式"""
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+會話事件訂閱測試
+使用本地 aiohttp 假服務驗證推送事件解析等待者
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from typing import Any, Dict, List
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from session_subscription import SessionEventSubscriber
+
+
+class FakeHumanLoopServer:
+    """假 Human Loop MCP 服務：WebSocket 推送預設事件，狀態查詢始終返回待處理"""
+
+    def __init__(self, events: Dict[str, Dict[str, Any]]):
+        self.events = events
+        self.subscriptions: List[str] = []
+        self.status_checks = 0
+        self._runner = None
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/sessions/events/ws", self._ws)
+        app.router.add_get("/api/sessions/{session_id}", self._status)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _status(self, request: web.Request) -> web.Response:
+        self.status_checks += 1
+        return web.json_response({"session_id": request.match_info["session_id"], "status": "pending"})
+
+    async def _ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            data = message.json()
+            if data.get("action") != "subscribe":
+                continue
+            for session_id in data["session_ids"]:
+                self.subscriptions.append(session_id)
+                if session_id in self.events:
+                    await ws.send_json(self.events[session_id])
+        return ws
+
+
+class SessionEventSubscriberTest(unittest.IsolatedAsyncioTestCase):
+    """推送事件解析測試"""
+
+    async def start_server(self, events: Dict[str, Dict[str, Any]]) -> SessionEventSubscriber:
+        self.server = FakeHumanLoopServer(events)
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+        subscriber = SessionEventSubscriber(self.server.base_url, transport="websocket")
+        self.addAsyncCleanup(subscriber.close)
+        return subscriber
+
+    async def test_push_event_resolves_waiter(self):
+        """WebSocket 推送的完成事件直接喚醒等待者"""
+        subscriber = await self.start_server({
+            "s1": {"session_id": "s1", "status": "completed", "response": {"choice": "yes"}}
+        })
+
+        result = await subscriber.wait_for("s1", timeout=5)
+
+        self.assertIsNotNone(result)
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(result["response"], {"choice": "yes"})
+        self.assertEqual(subscriber.get_stats()["sessions_resolved"], 1)
+        self.assertEqual(subscriber.get_stats()["active_transport"], "websocket")
+        self.assertIn("s1", self.server.subscriptions)
+
+    async def test_nested_session_status_takes_precedence(self):
+        """事件頂層的非終態 status 不會遮蓋會話自身的終態"""
+        subscriber = await self.start_server({
+            "s2": {
+                "session_id": "s2",
+                "status": "delivered",
+                "session": {"session_id": "s2", "status": "cancelled", "cancellation_reason": "user"}
+            }
+        })
+
+        result = await subscriber.wait_for("s2", timeout=5)
+
+        self.assertIsNotNone(result)
+        self.assertEqual(result["status"], "cancelled")
+        self.assertEqual(result["reason"], "user")
+
+    async def test_non_terminal_event_times_out(self):
+        """非終態事件不解析等待者"""
+        subscriber = await self.start_server({
+            "s3": {"session_id": "s3", "status": "pending", "session": {"status": "active"}}
+        })
+
+        self.assertIsNone(await subscriber.wait_for("s3", timeout=0.3))
+        self.assertEqual(subscriber.get_stats()["pending_sessions"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -43,6 +43,11 @@ class PowerAutomationIntegrationDemo:
         print("  3. 運維 MCP - 執行運維操作")
         print()
     
+    async def close(self):
+        """關閉組件，寫入剩餘的操作歷史"""
+        await self.verification_coordinator.async_close()
+        await self.operations_mcp.async_close()
+    
     async def demo_complete_deployment_workflow(self):
         """演示完整的部署工作流"""
         print("=" * 60)
@@ -307,6 +312,8 @@ async def main():
         print(f"❌ 演示過程中發生錯誤: {str(e)}")
         import traceback
         traceback.print_exc()
+    finally:
+        await demo.close()
     
     print("\n🎉 PowerAutomation 三件套演示完成！")
     print("💡 提示: 在實際使用中，這些組件將與真實的系統和服務集成")
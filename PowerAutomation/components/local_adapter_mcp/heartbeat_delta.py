@@ -0,0 +1,325 @@
+"""
+PowerAutomation Local MCP Adapter - 增量心跳協議
+Delta-Encoded Heartbeat Protocol
+
+心跳以版本化基線為基礎：連接建立或服務器要求重新同步時發送完整快照，
+其餘心跳只發送狀態變化或指標變化超過閾值的工具，並壓縮傳輸。
+服務器回顯 baseline_version 或協議/Accept-Encoding 響應頭之前，
+一律發送未壓縮的完整快照，以兼容不支持增量協議的舊版服務器。
+HeartbeatStateReceiver 為接收端樁實現，用於在本地重建適配器狀態。
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = "delta-v1"
+
+# 發送完整快照時才攜帶的靜態字段
+STATIC_FIELDS = ('capabilities', 'configuration_version', 'metadata')
+
+# 比較工具狀態時忽略的字段（每次心跳都會變化，但不代表狀態變化）
+VOLATILE_FIELDS = ('last_updated',)
+
+def _json_bytes(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+def compress_payload(payload: Dict[str, Any], compression: bool = True) -> Tuple[bytes, Dict[str, str]]:
+    """序列化並壓縮心跳數據，返回請求體和請求頭"""
+    body = _json_bytes(payload)
+    headers = {
+        'Content-Type': 'application/json',
+        'X-Heartbeat-Protocol': PROTOCOL_VERSION
+    }
+    if compression:
+        body = gzip.compress(body, compresslevel=6)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+def decompress_payload(body: bytes, content_encoding: Optional[str] = None) -> Dict[str, Any]:
+    """解壓並解析心跳數據"""
+    if content_encoding == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body.decode('utf-8'))
+
+def _metric_changed(old: Any, new: Any, threshold: float) -> bool:
+    """數值按相對閾值比較，其他類型按值比較"""
+    if isinstance(old, bool) or isinstance(new, bool):
+        return old != new
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        scale = max(abs(old), abs(new), 1.0)
+        return abs(new - old) / scale > threshold
+    return old != new
+
+def tool_state_changed(old: Optional[Dict[str, Any]], new: Dict[str, Any], threshold: float) -> bool:
+    """判斷工具狀態是否需要在增量心跳中發送"""
+    if old is None:
+        return True
+    if old.get('status') != new.get('status'):
+        return True
+
+    old_metrics = old.get('load_metrics') or {}
+    new_metrics = new.get('load_metrics') or {}
+    if old_metrics.keys() != new_metrics.keys():
+        return True
+    return any(
+        _metric_changed(old_metrics[key], new_metrics[key], threshold)
+        for key in new_metrics if key not in VOLATILE_FIELDS
+    )
+
+class HeartbeatDeltaEncoder:
+    """增量心跳編碼器（適配器端）"""
+
+    def __init__(self, threshold: float = 0.05, full_snapshot_every: int = 0):
+        """
+        初始化編碼器
+
+        Args:
+            threshold: 工具指標的相對變化閾值，超過才發送
+            full_snapshot_every: 每隔多少次心跳強制發送完整快照，0 表示僅在需要時發送
+        """
+        self.threshold = threshold
+        self.full_snapshot_every = full_snapshot_every
+
+        # 服務器已確認的基線
+        self.baseline_version = 0
+        self._baseline_tools: Dict[str, Dict[str, Any]] = {}
+        self._baseline_static_hash: Optional[str] = None
+
+        # 已發送但尚未確認的版本：(版本, 工具基線, 靜態字段哈希, 是否完整快照)
+        self._pending: Optional[Tuple[int, Dict[str, Dict[str, Any]], str, bool]] = None
+        self._full_required = True
+        self._since_full = 0
+
+        # 服務器協議協商結果，確認前保持完整、未壓縮的心跳
+        self.server_supports_delta = False
+        self.server_accepts_gzip = False
+
+        self.stats = {
+            'full_snapshots': 0,
+            'deltas': 0,
+            'tools_sent': 0,
+            'tools_skipped': 0,
+            'resyncs': 0
+        }
+
+    def request_full_snapshot(self):
+        """下一次心跳發送完整快照（連接建立或服務器要求重新同步時）"""
+        if not self._full_required:
+            self.stats['resyncs'] += 1
+        self._full_required = True
+        self._pending = None
+
+    def negotiate(self, baseline_version: Optional[int] = None, protocol: Optional[str] = None,
+                  accept_encoding: Optional[str] = None):
+        """
+        根據服務器響應記錄其協議能力
+
+        Args:
+            baseline_version: 響應中回顯的基線版本
+            protocol: X-Heartbeat-Protocol 響應頭
+            accept_encoding: Accept-Encoding 響應頭
+        """
+        if baseline_version is not None or protocol == PROTOCOL_VERSION:
+            self.server_supports_delta = True
+            self.server_accepts_gzip = True
+        if accept_encoding and 'gzip' in accept_encoding.lower():
+            self.server_accepts_gzip = True
+
+    def encode(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        將完整心跳數據編碼為快照或增量
+
+        Args:
+            data: 完整心跳字典（HeartbeatData 的序列化結果）
+
+        Returns:
+            Dict[str, Any]: 待發送的心跳數據
+        """
+        tool_status: Dict[str, Dict[str, Any]] = data.get('tool_status', {})
+        static = {name: data.get(name) for name in STATIC_FIELDS}
+        static_hash = hashlib.sha1(_json_bytes(static)).hexdigest()
+        version = self.baseline_version + 1
+
+        envelope = {
+            key: value for key, value in data.items()
+            if key != 'tool_status' and key not in STATIC_FIELDS
+        }
+        envelope['protocol'] = PROTOCOL_VERSION
+        envelope['version'] = version
+
+        full = (
+            self._full_required
+            or (self.full_snapshot_every and self._since_full >= self.full_snapshot_every)
+        )
+
+        if full:
+            envelope['type'] = 'full'
+            envelope['tool_status'] = tool_status
+            envelope.update(static)
+            self._pending = (version, dict(tool_status), static_hash, True)
+            self.stats['full_snapshots'] += 1
+            self.stats['tools_sent'] += len(tool_status)
+            return envelope
+
+        # 增量只包含相對已確認基線變化超過閾值的工具
+        changed = {}
+        next_tools = dict(self._baseline_tools)
+        for tool_id, state in tool_status.items():
+            if tool_state_changed(self._baseline_tools.get(tool_id), state, self.threshold):
+                changed[tool_id] = state
+                next_tools[tool_id] = state
+
+        removed = [tool_id for tool_id in self._baseline_tools if tool_id not in tool_status]
+        for tool_id in removed:
+            del next_tools[tool_id]
+
+        envelope['type'] = 'delta'
+        envelope['base_version'] = self.baseline_version
+        envelope['changed_tools'] = changed
+        envelope['removed_tools'] = removed
+        envelope['tool_count'] = len(tool_status)
+        if static_hash != self._baseline_static_hash:
+            envelope.update(static)
+
+        self._pending = (version, next_tools, static_hash, False)
+        self.stats['deltas'] += 1
+        self.stats['tools_sent'] += len(changed)
+        self.stats['tools_skipped'] += len(tool_status) - len(changed)
+        return envelope
+
+    def acknowledge(self, version: Optional[int] = None, resync_required: bool = False):
+        """
+        處理服務器確認
+
+        Args:
+            version: 服務器已應用的基線版本，為 None 時（舊版服務器）保持完整快照模式
+            resync_required: 服務器是否要求重新發送完整快照
+        """
+        if resync_required:
+            self.request_full_snapshot()
+            return
+
+        if version is None or not self.server_supports_delta:
+            # 服務器未確認基線，下一次仍發送完整快照
+            self._pending = None
+            return
+
+        if self._pending is None:
+            return
+
+        pending_version, tools, static_hash, was_full = self._pending
+        if version != pending_version:
+            # 服務器基線與本地不一致，重新同步
+            logger.warning(f"心跳基線版本不一致: 本地 {pending_version}, 服務器 {version}")
+            self.request_full_snapshot()
+            return
+
+        self.baseline_version = pending_version
+        self._baseline_tools = tools
+        self._baseline_static_hash = static_hash
+        self._pending = None
+        self._full_required = False
+        self._since_full = 0 if was_full else self._since_full + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取編碼統計"""
+        return {
+            **self.stats,
+            'baseline_version': self.baseline_version,
+            'baseline_tools': len(self._baseline_tools),
+            'full_required': self._full_required,
+            'server_supports_delta': self.server_supports_delta,
+            'server_accepts_gzip': self.server_accepts_gzip
+        }
+
+class HeartbeatStateReceiver:
+    """增量心跳接收端樁，按適配器重建完整狀態"""
+
+    def __init__(self, heartbeat_interval: int = 30):
+        self.heartbeat_interval = heartbeat_interval
+        self.adapters: Dict[str, Dict[str, Any]] = {}
+        self.stats = {
+            'received': 0,
+            'bytes_received': 0,
+            'resync_requests': 0
+        }
+
+    def receive(self, body: bytes, content_encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        處理一次心跳請求
+
+        Args:
+            body: 請求體
+            content_encoding: Content-Encoding 請求頭
+
+        Returns:
+            Dict[str, Any]: 與雲端心跳接口格式一致的響應
+        """
+        self.stats['received'] += 1
+        self.stats['bytes_received'] += len(body)
+        payload = decompress_payload(body, content_encoding)
+        return self.apply(payload)
+
+    def apply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """將快照或增量應用到適配器狀態"""
+        adapter_id = payload.get('adapter_id')
+        state = self.adapters.get(adapter_id)
+
+        if payload.get('type') == 'full':
+            state = {
+                'version': payload['version'],
+                'tool_status': dict(payload.get('tool_status', {}))
+            }
+            self.adapters[adapter_id] = state
+        elif state is None or payload.get('base_version') != state['version']:
+            # 沒有基線或基線不匹配，要求適配器發送完整快照
+            self.stats['resync_requests'] += 1
+            return self._response(False, state['version'] if state else 0, resync_required=True)
+        else:
+            tools = state['tool_status']
+            tools.update(payload.get('changed_tools', {}))
+            for tool_id in payload.get('removed_tools', []):
+                tools.pop(tool_id, None)
+            state['version'] = payload['version']
+
+        for key, value in payload.items():
+            if key not in ('tool_status', 'changed_tools', 'removed_tools'):
+                state[key] = value
+
+        return self._response(True, state['version'])
+
+    def get_adapter_state(self, adapter_id: str) -> Optional[Dict[str, Any]]:
+        """獲取重建後的適配器狀態"""
+        return self.adapters.get(adapter_id)
+
+    def response_headers(self) -> Dict[str, str]:
+        """接收端在響應中聲明的協議能力"""
+        return {
+            'X-Heartbeat-Protocol': PROTOCOL_VERSION,
+            'Accept-Encoding': 'gzip'
+        }
+
+    def _response(self, success: bool, version: int, resync_required: bool = False) -> Dict[str, Any]:
+        return {
+            'success': success,
+            'server_timestamp': datetime.now().isoformat(),
+            'next_heartbeat_interval': self.heartbeat_interval,
+            'baseline_version': version,
+            'resync_required': resync_required,
+            'message': 'resync required' if resync_required else ''
+        }
+
+__all__ = [
+    'HeartbeatDeltaEncoder',
+    'HeartbeatStateReceiver',
+    'compress_payload',
+    'decompress_payload',
+    'tool_state_changed',
+    'PROTOCOL_VERSION'
+]
@@ -609,6 +609,17 @@ __all__ = [
 
 # ===== Integrated Heartbeat Manager =====
 import certifi
+import os
+import sys
+
+# 導入共享的系統指標採樣服務
+sys.path.append(os.path.join(os.path.dirname(__file__), '../mcp/shared'))
+try:
+    from system_metrics import get_system_metrics_sampler
+except ImportError:
+    from PowerAutomation.components.mcp.shared.system_metrics import get_system_metrics_sampler
+
+from .heartbeat_delta import HeartbeatDeltaEncoder, compress_payload
 
 logger = logging.getLogger(__name__)
 
@@ -673,6 +684,10 @@ class HeartbeatResponse:
     commands: List[Dict[str, Any]] = field(default_factory=list)
     configuration_updates: Dict[str, Any] = field(default_factory=dict)
     message: str = ""
+    baseline_version: Optional[int] = None
+    resync_required: bool = False
+    protocol: Optional[str] = None
+    accept_encoding: Optional[str] = None
 
 @dataclass
 class ConnectionConfig:
@@ -687,6 +702,9 @@ class ConnectionConfig:
     use_ssl: bool = True
     verify_ssl: bool = True
     compression: bool = True
+    delta_heartbeats: bool = True
+    delta_threshold: float = 0.05  # 工具指標的相對變化閾值
+    full_snapshot_every: int = 0  # 每隔多少次心跳強制完整快照，0 表示不強制
 
 class HeartbeatManager:
     """心跳管理器"""
@@ -726,6 +744,16 @@ class HeartbeatManager:
         # 工具狀態引用
         self.tool_registry_manager = None
         
+        # 共享的後台指標採樣器，心跳只讀取最新快照
+        self.metrics_sampler = get_system_metrics_sampler()
+        self._sampler_acquired = False
+        
+        # 增量心跳編碼器
+        self.heartbeat_encoder = HeartbeatDeltaEncoder(
+            threshold=self.config.delta_threshold,
+            full_snapshot_every=self.config.full_snapshot_every
+        )
+        
     def set_tool_registry_manager(self, tool_registry_manager):
         """設置工具註冊管理器引用"""
         self.tool_registry_manager = tool_registry_manager
@@ -742,6 +770,9 @@ class HeartbeatManager:
         """啟動心跳管理器"""
         logger.info("啟動心跳管理器...")
         self.running = True
+        if not self._sampler_acquired:
+            self.metrics_sampler.acquire()
+            self._sampler_acquired = True
         
         # 創建HTTP會話
         await self._create_session()
@@ -766,6 +797,10 @@ class HeartbeatManager:
         
         # 關閉HTTP會話
         await self._close_session()
+        if self._sampler_acquired:
+            # 最後一個使用者釋放時採樣線程停止
+            self.metrics_sampler.release()
+            self._sampler_acquired = False
         
         # 更新狀態
         await self._update_connection_status(ConnectionStatus.DISCONNECTED)
@@ -809,6 +844,9 @@ class HeartbeatManager:
                 }
             )
             
+            # 新連接從完整快照開始
+            self.heartbeat_encoder.request_full_snapshot()
+            
             logger.debug("HTTP會話創建成功")
             
         except Exception as e:
@@ -932,39 +970,17 @@ class HeartbeatManager:
     async def _collect_system_metrics(self) -> SystemMetrics:
         """收集系統指標"""
         try:
-            # CPU使用率
-            cpu_usage = psutil.cpu_percent(interval=1)
-            
-            # 內存使用率
-            memory = psutil.virtual_memory()
-            memory_usage = memory.percent
-            
-            # 磁盤使用率
-            disk = psutil.disk_usage('/')
-            disk_usage = (disk.used / disk.total) * 100
-            
-            # 網絡IO
-            network_io = psutil.net_io_counters()
-            network_data = {
-                'bytes_sent': network_io.bytes_sent,
-                'bytes_recv': network_io.bytes_recv,
-                'packets_sent': network_io.packets_sent,
-                'packets_recv': network_io.packets_recv
-            }
-            
-            # 負載平均值
-            load_avg = psutil.getloadavg() if hasattr(psutil, 'getloadavg') else [0.0, 0.0, 0.0]
-            
-            # 系統運行時間
-            uptime = time.time() - psutil.boot_time()
+            # 讀取後台採樣器的最新快照，不在心跳路徑上阻塞採樣
+            sample = await self.metrics_sampler.async_snapshot()
             
             return SystemMetrics(
-                cpu_usage=cpu_usage,
-                memory_usage=memory_usage,
-                disk_usage=disk_usage,
-                network_io=network_data,
-                load_average=list(load_avg),
-                uptime=uptime
+                cpu_usage=sample.cpu_usage,
+                memory_usage=sample.memory_usage,
+                disk_usage=sample.disk_usage,
+                network_io=dict(sample.network_io),
+                load_average=list(sample.load_average),
+                uptime=sample.uptime,
+                timestamp=datetime.fromtimestamp(sample.timestamp) if sample.timestamp else datetime.now()
             )
             
         except Exception as e:
@@ -992,11 +1008,43 @@ class HeartbeatManager:
             data['status']['last_heartbeat'] = heartbeat_data.status.last_heartbeat.isoformat()
             data['system_metrics']['timestamp'] = heartbeat_data.system_metrics.timestamp.isoformat()
             
-            # 發送請求
+            # 服務器確認支持前不壓縮，舊版服務器無法解析 gzip 請求體
+            encoder = self.heartbeat_encoder
+            compression = self.config.compression and encoder.server_accepts_gzip
+            
+            if not self.config.delta_heartbeats:
+                body, headers = compress_payload(data, compression)
+                response = await self._post_heartbeat(body, headers)
+                if response and response.success:
+                    encoder.negotiate(response.baseline_version, response.protocol, response.accept_encoding)
+                return response
+            
+            response = await self._post_heartbeat(*compress_payload(encoder.encode(data), compression))
+            if response and response.resync_required:
+                # 服務器基線丟失，立即重發完整快照
+                logger.info("服務器要求重新同步，發送完整心跳快照")
+                encoder.negotiate(response.baseline_version, response.protocol, response.accept_encoding)
+                encoder.acknowledge(resync_required=True)
+                compression = self.config.compression and encoder.server_accepts_gzip
+                response = await self._post_heartbeat(*compress_payload(encoder.encode(data), compression))
+            
+            if response and response.success:
+                # 舊版服務器不回顯 baseline_version，編碼器保持完整快照模式
+                encoder.negotiate(response.baseline_version, response.protocol, response.accept_encoding)
+                encoder.acknowledge(response.baseline_version, response.resync_required)
+            return response
+                    
+        except Exception as e:
+            logger.error(f"發送心跳請求異常: {e}")
+            return None
+    
+    async def _post_heartbeat(self, body: bytes, headers: Dict[str, str]) -> Optional[HeartbeatResponse]:
+        """發送已編碼的心跳請求體"""
+        try:
             async with self.session.post(
                 f"{self.config.cloud_endpoint}/api/heartbeat",
-                json=data,
-                headers={'Content-Type': 'application/json'}
+                data=body,
+                headers=headers
             ) as response:
                 
                 if response.status == 200:
@@ -1007,7 +1055,11 @@ class HeartbeatManager:
                         next_heartbeat_interval=result.get('next_heartbeat_interval', self.config.heartbeat_interval),
                         commands=result.get('commands', []),
                         configuration_updates=result.get('configuration_updates', {}),
-                        message=result.get('message', '')
+                        message=result.get('message', ''),
+                        baseline_version=result.get('baseline_version'),
+                        resync_required=result.get('resync_required', False),
+                        protocol=response.headers.get('X-Heartbeat-Protocol'),
+                        accept_encoding=response.headers.get('Accept-Encoding')
                     )
                 else:
                     error_text = await response.text()
@@ -1140,6 +1192,8 @@ class HeartbeatManager:
                     await self._handle_restart_heartbeat(command_data)
                 elif command_type == 'sync_tools':
                     await self._handle_sync_tools(command_data)
+                elif command_type == 'resync_heartbeat':
+                    self.heartbeat_encoder.request_full_snapshot()
                 
                 # 通知命令回調
                 for callback in self.command_callbacks:
@@ -1171,6 +1225,7 @@ class HeartbeatManager:
             logger.info("收到重啟心跳命令")
             # 重置統計
             self.sequence_number = 0
+            self.heartbeat_encoder.request_full_snapshot()
             # 可以在這裡添加其他重啟邏輯
         except Exception as e:
             logger.error(f"處理重啟心跳命令失敗: {e}")
@@ -1229,7 +1284,8 @@ class HeartbeatManager:
             'last_heartbeat_time': self.last_heartbeat_time.isoformat() if self.last_heartbeat_time else None,
             'last_successful_heartbeat': self.last_successful_heartbeat.isoformat() if self.last_successful_heartbeat else None,
             'current_retry_delay': self.retry_delay,
-            'sequence_number': self.sequence_number
+            'sequence_number': self.sequence_number,
+            'delta_heartbeat': self.heartbeat_encoder.get_stats()
         }
 
 # 創建心跳管理器的工廠函數
@@ -1245,7 +1301,10 @@ def create_heartbeat_manager(config: Dict[str, Any], adapter_id: str) -> Heartbe
         max_retry_delay=config.get('max_retry_delay', 300),
         use_ssl=config.get('use_ssl', True),
         verify_ssl=config.get('verify_ssl', True),
-        compression=config.get('compression', True)
+        compression=config.get('compression', True),
+        delta_heartbeats=config.get('delta_heartbeats', True),
+        delta_threshold=config.get('delta_threshold', 0.05),
+        full_snapshot_every=config.get('full_snapshot_every', 0)
     )
     
     return HeartbeatManager(connection_config, adapter_id)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+增量心跳協議測試
+編碼器與接收端樁的往返測試
+"""
+
+import os
+import sys
+import unittest
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from heartbeat_delta import (
+    HeartbeatDeltaEncoder, HeartbeatStateReceiver, compress_payload, PROTOCOL_VERSION
+)
+
+
+def make_heartbeat(cpu: Dict[str, float], status: str = "healthy") -> Dict[str, Any]:
+    return {
+        "adapter_id": "adapter-1",
+        "status": status,
+        "capabilities": ["file", "shell"],
+        "configuration_version": "1",
+        "metadata": {"host": "test"},
+        "tool_status": {
+            tool_id: {"status": "available", "load_metrics": {"cpu": value}}
+            for tool_id, value in cpu.items()
+        }
+    }
+
+
+class HeartbeatRoundTripTest(unittest.TestCase):
+    """編碼 -> 壓縮 -> 接收 -> 確認 的完整往返"""
+
+    def setUp(self):
+        self.encoder = HeartbeatDeltaEncoder(threshold=0.05)
+        self.receiver = HeartbeatStateReceiver()
+        headers = self.receiver.response_headers()
+        self.encoder.negotiate(protocol=headers["X-Heartbeat-Protocol"],
+                               accept_encoding=headers["Accept-Encoding"])
+
+    def send(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        payload = self.encoder.encode(data)
+        body, headers = compress_payload(payload, self.encoder.server_accepts_gzip)
+        response = self.receiver.receive(body, headers.get("Content-Encoding"))
+        self.encoder.acknowledge(response["baseline_version"], response["resync_required"])
+        return payload
+
+    def test_delta_rebuilds_full_state(self):
+        """增量只發送變化的工具，接收端重建出完整狀態"""
+        first = self.send(make_heartbeat({"a": 1.0, "b": 1.0}))
+        second = self.send(make_heartbeat({"a": 1.01, "b": 2.0, "c": 1.0}))
+        third = self.send(make_heartbeat({"b": 2.0, "c": 1.0}))
+
+        self.assertEqual(first["type"], "full")
+        self.assertEqual(second["type"], "delta")
+        self.assertEqual(set(second["changed_tools"]), {"b", "c"})
+        self.assertNotIn("capabilities", second)
+        self.assertEqual(third["removed_tools"], ["a"])
+
+        state = self.receiver.get_adapter_state("adapter-1")
+        self.assertEqual(state["version"], 3)
+        self.assertEqual(set(state["tool_status"]), {"b", "c"})
+        self.assertEqual(state["tool_status"]["b"]["load_metrics"]["cpu"], 2.0)
+
+    def test_periodic_full_snapshot_cadence(self):
+        """full_snapshot_every 強制的快照確認後恢復發送增量"""
+        self.encoder.full_snapshot_every = 2
+        types = [self.send(make_heartbeat({"a": 1.0}))["type"] for _ in range(8)]
+
+        self.assertEqual(types, ["full", "delta", "delta"] * 2 + ["full", "delta"])
+        self.assertEqual(self.encoder.get_stats()["full_snapshots"], 3)
+        self.assertEqual(self.encoder.get_stats()["deltas"], 5)
+
+    def test_receiver_restart_triggers_resync(self):
+        """接收端丟失基線時要求重新同步，下一次心跳發送完整快照"""
+        self.send(make_heartbeat({"a": 1.0}))
+        self.receiver = HeartbeatStateReceiver()
+
+        delta = self.send(make_heartbeat({"a": 5.0}))
+        full = self.send(make_heartbeat({"a": 5.0}))
+
+        self.assertEqual(delta["type"], "delta")
+        self.assertEqual(full["type"], "full")
+        self.assertEqual(self.encoder.get_stats()["resyncs"], 1)
+        self.assertEqual(self.receiver.get_adapter_state("adapter-1")["tool_status"]["a"]["load_metrics"]["cpu"], 5.0)
+
+
+class LegacyServerTest(unittest.TestCase):
+    """未協商增量協議的舊版服務器"""
+
+    def test_stays_in_uncompressed_full_mode(self):
+        """服務器不回顯基線版本時一律發送未壓縮的完整快照"""
+        encoder = HeartbeatDeltaEncoder()
+        for _ in range(3):
+            payload = encoder.encode(make_heartbeat({"a": 1.0}))
+            encoder.negotiate()
+            encoder.acknowledge(None)
+            self.assertEqual(payload["type"], "full")
+            self.assertEqual(payload["protocol"], PROTOCOL_VERSION)
+
+        self.assertFalse(encoder.server_accepts_gzip)
+        self.assertEqual(encoder.get_stats()["deltas"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
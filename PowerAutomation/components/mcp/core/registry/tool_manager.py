@@ -9,17 +9,20 @@ import asyncio
 import json
 import logging
 import aiohttp
-import aiofiles
 import hashlib
+import os
+import re
+import time
 import psutil
 import platform
-from typing import Dict, List, Optional, Any, Set
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Any, Set, Tuple
 from dataclasses import dataclass, asdict, field
 from datetime import datetime, timedelta
 from enum import Enum
 from pathlib import Path
 import importlib.util
-import subprocess
 import socket
 
 logger = logging.getLogger(__name__)
@@ -98,6 +101,127 @@ class RegistrationResponse:
     configuration: Dict[str, Any] = field(default_factory=dict)
     next_sync_time: Optional[datetime] = None
 
+def _file_fingerprint(stat_result: os.stat_result) -> List[int]:
+    """文件指紋：inode、修改時間和大小任一變化即視為文件已變更"""
+    return [stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size]
+
+def _analyze_python_tool_file(file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    分析Python工具文件（在進程池中執行）
+
+    動態導入會執行模塊頂層代碼，放在子進程中既不阻塞事件循環，也隔離了導入副作用。
+    返回可序列化的字典，便於寫入發現緩存。
+    """
+    py_file = Path(file_path)
+    with open(py_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    # 檢查是否包含工具標識
+    if not any(marker in content for marker in ['@tool', 'class Tool', 'def process']):
+        return None
+    
+    spec = importlib.util.spec_from_file_location(py_file.stem, py_file)
+    if not spec or not spec.loader:
+        return None
+    
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    
+    capabilities = []
+    for cap in getattr(module, '__capabilities__', []):
+        if isinstance(cap, dict):
+            capabilities.append(asdict(ToolCapability(**cap)))
+        else:
+            capabilities.append(asdict(ToolCapability(
+                name=str(cap),
+                description=f"能力: {cap}",
+                input_types=["any"],
+                output_types=["any"]
+            )))
+    
+    return {
+        'name': getattr(module, '__tool_name__', py_file.stem),
+        'version': getattr(module, '__version__', '1.0.0'),
+        'description': getattr(module, '__description__', f'Python工具: {py_file.stem}'),
+        'capabilities': capabilities,
+        'dependencies': list(getattr(module, '__dependencies__', []))
+    }
+
+def _analyze_python_tool_file_in_worker(file_path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    進程池入口：返回 (分析結果, 錯誤信息)
+
+    分析器自身拋出的異常在工作進程內捕獲，與進程池故障區分開，
+    調用方只緩存分析器實際給出的結果
+    """
+    try:
+        return _analyze_python_tool_file(file_path), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+class DiscoveryCache:
+    """工具發現緩存，按工具類型、路徑和文件指紋保存探測結果"""
+    
+    CACHE_VERSION = 2
+    
+    def __init__(self, cache_path: Optional[str]):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._load()
+    
+    def _load(self):
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.CACHE_VERSION:
+                self.entries = data.get('entries', {})
+        except Exception as e:
+            logger.warning(f"讀取工具發現緩存失敗 {self.cache_path}: {e}")
+    
+    @staticmethod
+    def _key(kind: str, path: str) -> str:
+        # 同一路徑可能同時作為不同類型的工具被探測，條目按 (kind, path) 區分
+        return f"{kind}:{path}"
+    
+    def get(self, kind: str, path: str, fingerprint: List[int]) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(self._key(kind, path))
+        if entry and entry.get('fingerprint') == fingerprint:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+    
+    def put(self, kind: str, path: str, fingerprint: List[int], data: Optional[Dict[str, Any]]):
+        self.entries[self._key(kind, path)] = {'kind': kind, 'path': path, 'fingerprint': fingerprint, 'data': data}
+        self._dirty = True
+    
+    def prune(self, kind: str, live_paths: Set[str]):
+        """移除已不存在的文件"""
+        stale = [key for key, entry in self.entries.items()
+                 if entry.get('kind') == kind and entry.get('path') not in live_paths]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._dirty = True
+    
+    def save(self):
+        if not self.cache_path or not self._dirty:
+            return
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.CACHE_VERSION, 'entries': self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"保存工具發現緩存失敗 {self.cache_path}: {e}")
+
 class ToolDiscovery:
     """工具發現器"""
     
@@ -106,29 +230,65 @@ class ToolDiscovery:
         self.discovery_paths = config.get('discovery_paths', [])
         self.auto_discovery = config.get('auto_discovery', True)
         self.scan_interval = config.get('scan_interval', 300)  # 5分鐘
+        self.binary_paths = config.get('binary_paths', ['/usr/bin', '/usr/local/bin', '/opt/bin'])
+        
+        # 探測子進程並發數、單次探測超時和整體截止時間
+        self.probe_concurrency = config.get('probe_concurrency', 16)
+        self.probe_timeout = config.get('probe_timeout', 2.0)
+        self.probe_deadline = config.get('probe_deadline', 20.0)
+        self.python_workers = config.get('python_analysis_workers', 2)
+        self.port_check_timeout = config.get('port_check_timeout', 1.0)
+        
+        self.cache = DiscoveryCache(config.get(
+            'cache_path', str(Path.home() / '.powerautomation' / 'tool_discovery_cache.json')
+        ))
+        self.last_discovery_stats: Dict[str, Any] = {}
+        # Python 工具分析進程池，在多次發現之間復用
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=max(1, self.python_workers))
+        return self._process_pool
+    
+    def close(self):
+        """關閉分析進程池"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
         
     async def discover_tools(self) -> List[LocalToolInfo]:
         """發現本地工具"""
         discovered_tools = []
+        start_time = time.time()
+        self.cache.hits = self.cache.misses = 0
         
         try:
-            # 發現Python工具
-            python_tools = await self._discover_python_tools()
-            discovered_tools.extend(python_tools)
-            
-            # 發現二進制工具
-            binary_tools = await self._discover_binary_tools()
-            discovered_tools.extend(binary_tools)
+            # 各類工具發現互不依賴，並發執行
+            results = await asyncio.gather(
+                self._discover_python_tools(),
+                self._discover_binary_tools(),
+                self._discover_service_tools(),
+                self._discover_api_tools(),
+                return_exceptions=True
+            )
             
-            # 發現服務工具
-            service_tools = await self._discover_service_tools()
-            discovered_tools.extend(service_tools)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"部分工具發現失敗: {result}")
+                    continue
+                discovered_tools.extend(result)
             
-            # 發現API工具
-            api_tools = await self._discover_api_tools()
-            discovered_tools.extend(api_tools)
+            await asyncio.to_thread(self.cache.save)
             
-            logger.info(f"發現 {len(discovered_tools)} 個本地工具")
+            self.last_discovery_stats = {
+                'tools': len(discovered_tools),
+                'duration': time.time() - start_time,
+                'cache_hits': self.cache.hits,
+                'cache_misses': self.cache.misses
+            }
+            logger.info(f"發現 {len(discovered_tools)} 個本地工具 "
+                        f"(緩存命中 {self.cache.hits}, 探測 {self.cache.misses})")
             return discovered_tools
             
         except Exception as e:
@@ -139,208 +299,283 @@ class ToolDiscovery:
         """發現Python工具"""
         tools = []
         
-        for path in self.discovery_paths:
-            path_obj = Path(path)
-            if not path_obj.exists():
+        def scan() -> List[Tuple[Path, os.stat_result]]:
+            files = []
+            for path in self.discovery_paths:
+                path_obj = Path(path)
+                if not path_obj.exists():
+                    continue
+                for py_file in path_obj.rglob("*.py"):
+                    try:
+                        files.append((py_file, py_file.stat()))
+                    except OSError:
+                        continue
+            return files
+        
+        files = await asyncio.to_thread(scan)
+        self.cache.prune("python", {str(py_file) for py_file, _ in files})
+        
+        pending = []
+        for py_file, stat_result in files:
+            fingerprint = _file_fingerprint(stat_result)
+            cached = self.cache.get("python", str(py_file), fingerprint)
+            if cached is not None:
+                if cached['data']:
+                    tools.append(self._build_python_tool(py_file, stat_result, cached['data']))
+            else:
+                pending.append((py_file, stat_result, fingerprint))
+        
+        if not pending:
+            return tools
+        
+        # 新增或變更的文件在進程池中分析
+        loop = asyncio.get_running_loop()
+        pool = self._get_process_pool()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, _analyze_python_tool_file_in_worker, str(py_file))
+              for py_file, _, _ in pending),
+            return_exceptions=True
+        )
+        if any(isinstance(result, BrokenProcessPool) for result in results):
+            # 工作進程異常退出，下次發現時重建進程池
+            self.close()
+        
+        for (py_file, stat_result, fingerprint), outcome in zip(pending, results):
+            if isinstance(outcome, BaseException):
+                # 進程池或執行器故障，不寫緩存，下次發現時重試
+                logger.warning(f"分析Python工具失敗（進程池錯誤，稍後重試） {py_file}: {outcome!r}")
                 continue
-                
-            # 查找Python模塊
-            for py_file in path_obj.rglob("*.py"):
-                try:
-                    tool_info = await self._analyze_python_tool(py_file)
-                    if tool_info:
-                        tools.append(tool_info)
-                except Exception as e:
-                    logger.warning(f"分析Python工具失敗 {py_file}: {e}")
+            result, error = outcome
+            if error:
+                logger.warning(f"分析Python工具失敗 {py_file}: {error}")
+            self.cache.put("python", str(py_file), fingerprint, result)
+            if result:
+                tools.append(self._build_python_tool(py_file, stat_result, result))
         
         return tools
     
     async def _analyze_python_tool(self, py_file: Path) -> Optional[LocalToolInfo]:
         """分析Python工具"""
         try:
-            # 讀取文件內容
-            async with aiofiles.open(py_file, 'r', encoding='utf-8') as f:
-                content = await f.read()
-            
-            # 檢查是否包含工具標識
-            if not any(marker in content for marker in ['@tool', 'class Tool', 'def process']):
+            data = await asyncio.to_thread(_analyze_python_tool_file, str(py_file))
+            if not data:
                 return None
-            
-            # 提取工具信息
-            tool_id = f"python_{py_file.stem}_{hashlib.md5(str(py_file).encode()).hexdigest()[:8]}"
-            
-            # 嘗試動態導入獲取更多信息
-            spec = importlib.util.spec_from_file_location(py_file.stem, py_file)
-            if spec and spec.loader:
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                
-                # 提取工具元數據
-                name = getattr(module, '__tool_name__', py_file.stem)
-                version = getattr(module, '__version__', '1.0.0')
-                description = getattr(module, '__description__', f'Python工具: {py_file.stem}')
-                capabilities = getattr(module, '__capabilities__', [])
-                
-                # 轉換能力格式
-                tool_capabilities = []
-                for cap in capabilities:
-                    if isinstance(cap, dict):
-                        tool_capabilities.append(ToolCapability(**cap))
-                    else:
-                        tool_capabilities.append(ToolCapability(
-                            name=str(cap),
-                            description=f"能力: {cap}",
-                            input_types=["any"],
-                            output_types=["any"]
-                        ))
-                
-                return LocalToolInfo(
-                    tool_id=tool_id,
-                    name=name,
-                    version=version,
-                    description=description,
-                    tool_type="python",
-                    capabilities=tool_capabilities,
-                    executable_path=str(py_file),
-                    dependencies=getattr(module, '__dependencies__', []),
-                    metadata={
-                        'file_size': py_file.stat().st_size,
-                        'last_modified': datetime.fromtimestamp(py_file.stat().st_mtime),
-                        'python_version': platform.python_version()
-                    }
-                )
+            return self._build_python_tool(py_file, py_file.stat(), data)
                 
         except Exception as e:
             logger.warning(f"分析Python工具失敗 {py_file}: {e}")
             return None
     
+    def _build_python_tool(self, py_file: Path, stat_result: os.stat_result,
+                           data: Dict[str, Any]) -> LocalToolInfo:
+        """由分析結果構建Python工具信息"""
+        tool_id = f"python_{py_file.stem}_{hashlib.md5(str(py_file).encode()).hexdigest()[:8]}"
+        
+        return LocalToolInfo(
+            tool_id=tool_id,
+            name=data['name'],
+            version=data['version'],
+            description=data['description'],
+            tool_type="python",
+            capabilities=[ToolCapability(**cap) for cap in data['capabilities']],
+            executable_path=str(py_file),
+            dependencies=data['dependencies'],
+            metadata={
+                'file_size': stat_result.st_size,
+                'last_modified': datetime.fromtimestamp(stat_result.st_mtime),
+                'python_version': platform.python_version()
+            }
+        )
+    
     async def _discover_binary_tools(self) -> List[LocalToolInfo]:
         """發現二進制工具"""
         tools = []
         
         # 常見的工具目錄
-        binary_paths = ['/usr/bin', '/usr/local/bin', '/opt/bin']
+        binary_paths = list(self.binary_paths)
         binary_paths.extend(self.discovery_paths)
         
-        for path in binary_paths:
-            path_obj = Path(path)
-            if not path_obj.exists():
-                continue
-                
-            # 查找可執行文件
-            for binary_file in path_obj.iterdir():
-                if binary_file.is_file() and binary_file.stat().st_mode & 0o111:
-                    try:
-                        tool_info = await self._analyze_binary_tool(binary_file)
-                        if tool_info:
-                            tools.append(tool_info)
-                    except Exception as e:
-                        logger.warning(f"分析二進制工具失敗 {binary_file}: {e}")
+        def scan() -> List[Tuple[Path, os.stat_result]]:
+            files = []
+            for path in binary_paths:
+                if not os.path.isdir(path):
+                    continue
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            stat_result = entry.stat()
+                        except OSError:
+                            continue
+                        if entry.is_file() and stat_result.st_mode & 0o111:
+                            files.append((Path(entry.path), stat_result))
+            return files
+        
+        # 查找可執行文件（目錄掃描在線程中進行）
+        files = await asyncio.to_thread(scan)
+        self.cache.prune("binary", {str(binary_file) for binary_file, _ in files})
+        
+        # 只探測新增或變更的可執行文件
+        probes: Dict[str, asyncio.Task] = {}
+        semaphore = asyncio.Semaphore(self.probe_concurrency)
+        
+        async def probe(binary_file: Path) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._get_binary_version(binary_file)
+        
+        fingerprints = {}
+        cached_entries = {}
+        for binary_file, stat_result in files:
+            fingerprint = _file_fingerprint(stat_result)
+            fingerprints[str(binary_file)] = fingerprint
+            cached = self.cache.get("binary", str(binary_file), fingerprint)
+            if cached is None:
+                probes[str(binary_file)] = asyncio.create_task(probe(binary_file))
+            else:
+                cached_entries[str(binary_file)] = cached
+        
+        if probes:
+            done, not_done = await asyncio.wait(probes.values(), timeout=self.probe_deadline)
+            for task in not_done:
+                task.cancel()
+            if not_done:
+                # 等待被取消的探測結束並回收子進程
+                await asyncio.gather(*not_done, return_exceptions=True)
+                logger.info(f"{len(not_done)} 個二進制工具探測超過截止時間，下次發現時重試")
+        
+        for binary_file, stat_result in files:
+            key = str(binary_file)
+            task = probes.get(key)
+            if task is None:
+                version_info = cached_entries[key]['data'] or {}
+            elif task.done() and not task.cancelled() and task.exception() is None:
+                version_info = task.result()
+                self.cache.put("binary", key, fingerprints[key], version_info)
+            else:
+                # 未完成的探測不寫入緩存
+                version_info = {}
+            
+            try:
+                tool_info = self._analyze_binary_tool(binary_file, stat_result, version_info)
+                if tool_info:
+                    tools.append(tool_info)
+            except Exception as e:
+                logger.warning(f"分析二進制工具失敗 {binary_file}: {e}")
         
         return tools
     
-    async def _analyze_binary_tool(self, binary_file: Path) -> Optional[LocalToolInfo]:
+    def _analyze_binary_tool(self, binary_file: Path, stat_result: os.stat_result,
+                             version_info: Dict[str, Any]) -> Optional[LocalToolInfo]:
         """分析二進制工具"""
-        try:
-            # 獲取工具版本信息
-            version_info = await self._get_binary_version(binary_file)
-            
-            tool_id = f"binary_{binary_file.stem}_{hashlib.md5(str(binary_file).encode()).hexdigest()[:8]}"
-            
-            # 基本能力推斷
-            capabilities = [
-                ToolCapability(
-                    name="command_execution",
-                    description=f"執行 {binary_file.name} 命令",
-                    input_types=["string", "list"],
-                    output_types=["string", "json"]
-                )
-            ]
-            
-            return LocalToolInfo(
-                tool_id=tool_id,
-                name=binary_file.name,
-                version=version_info.get('version', '1.0.0'),
-                description=f"二進制工具: {binary_file.name}",
-                tool_type="binary",
-                capabilities=capabilities,
-                executable_path=str(binary_file),
-                metadata={
-                    'file_size': binary_file.stat().st_size,
-                    'last_modified': datetime.fromtimestamp(binary_file.stat().st_mtime),
-                    'permissions': oct(binary_file.stat().st_mode)[-3:],
-                    'version_info': version_info
-                }
+        tool_id = f"binary_{binary_file.stem}_{hashlib.md5(str(binary_file).encode()).hexdigest()[:8]}"
+        
+        # 基本能力推斷
+        capabilities = [
+            ToolCapability(
+                name="command_execution",
+                description=f"執行 {binary_file.name} 命令",
+                input_types=["string", "list"],
+                output_types=["string", "json"]
             )
-            
-        except Exception as e:
-            logger.warning(f"分析二進制工具失敗 {binary_file}: {e}")
-            return None
+        ]
+        
+        return LocalToolInfo(
+            tool_id=tool_id,
+            name=binary_file.name,
+            version=version_info.get('version', '1.0.0'),
+            description=f"二進制工具: {binary_file.name}",
+            tool_type="binary",
+            capabilities=capabilities,
+            executable_path=str(binary_file),
+            metadata={
+                'file_size': stat_result.st_size,
+                'last_modified': datetime.fromtimestamp(stat_result.st_mtime),
+                'permissions': oct(stat_result.st_mode)[-3:],
+                'version_info': version_info
+            }
+        )
     
     async def _get_binary_version(self, binary_file: Path) -> Dict[str, Any]:
         """獲取二進制工具版本信息"""
         version_info = {}
         
-        try:
-            # 嘗試常見的版本命令
-            version_commands = ['--version', '-v', '--help', '-h']
-            
-            for cmd in version_commands:
-                try:
-                    result = subprocess.run(
-                        [str(binary_file), cmd],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    
-                    if result.returncode == 0 and result.stdout:
-                        version_info['version_output'] = result.stdout.strip()
-                        # 嘗試提取版本號
-                        import re
-                        version_match = re.search(r'(\d+\.\d+\.\d+)', result.stdout)
-                        if version_match:
-                            version_info['version'] = version_match.group(1)
-                        break
-                        
-                except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-                    continue
+        # 嘗試常見的版本命令
+        version_commands = ['--version', '-v', '--help', '-h']
+        
+        for cmd in version_commands:
+            process = None
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    str(binary_file), cmd,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    start_new_session=True
+                )
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.probe_timeout)
+                output = stdout.decode('utf-8', errors='replace').strip()
+                
+                if process.returncode == 0 and output:
+                    version_info['version_output'] = output[:2000]
+                    # 嘗試提取版本號
+                    version_match = re.search(r'(\d+\.\d+\.\d+)', output)
+                    if version_match:
+                        version_info['version'] = version_match.group(1)
+                    break
                     
-        except Exception as e:
-            logger.warning(f"獲取版本信息失敗 {binary_file}: {e}")
+            except (asyncio.TimeoutError, OSError, ValueError):
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"獲取版本信息失敗 {binary_file}: {e}")
+                break
+            finally:
+                if process is not None and process.returncode is None:
+                    # 腳本類工具可能派生子進程並持有輸出管道，終止整個進程組
+                    try:
+                        os.killpg(process.pid, 9)
+                    except (ProcessLookupError, PermissionError):
+                        pass
+                    await process.wait()
         
         return version_info
     
     async def _discover_service_tools(self) -> List[LocalToolInfo]:
         """發現服務工具"""
-        tools = []
         
         # 檢查常見服務端口
-        service_ports = [
+        service_ports = self.config.get('service_ports', [
             (8000, "HTTP服務"),
             (8080, "HTTP代理服務"),
             (3000, "Node.js服務"),
             (5000, "Flask服務"),
             (9000, "PHP-FPM服務"),
             (11434, "Ollama服務")
-        ]
+        ])
         
-        for port, description in service_ports:
-            if await self._check_port_open('localhost', port):
-                tool_info = await self._analyze_service_tool(port, description)
-                if tool_info:
-                    tools.append(tool_info)
+        # 端口檢查和服務分析並發執行
+        open_flags = await asyncio.gather(
+            *(self._check_port_open('localhost', port) for port, _ in service_ports)
+        )
+        results = await asyncio.gather(*(
+            self._analyze_service_tool(port, description)
+            for (port, description), is_open in zip(service_ports, open_flags) if is_open
+        ))
         
-        return tools
+        return [tool_info for tool_info in results if tool_info]
     
     async def _check_port_open(self, host: str, port: int) -> bool:
         """檢查端口是否開放"""
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout=self.port_check_timeout
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return True
         except Exception:
             return False
     
@@ -522,6 +757,7 @@ class ToolRegistryManager:
         """停止工具註冊管理器"""
         logger.info("停止工具註冊管理器...")
         self.running = False
+        self.discovery.close()
     
     async def discover_and_register_tools(self):
         """發現並註冊工具"""
@@ -0,0 +1,355 @@
+"""
+LLM 提供商客戶端 (LLM Provider Client)
+為各 MCP 組件提供共享的大模型調用層：
+- 共享 keep-alive 連接池，由服務宿主注入或調用 open() 創建；未打開時退化為每次調用臨時會話
+- 流式逐 token 迭代（OpenAI SSE / Ollama NDJSON），首個 token 到達即可開始消費
+- 按提供商（provider + base_url）限制並發
+- 限流（429）和臨時錯誤按帶抖動的指數退避重試，優先遵循 Retry-After；已輸出 token 後不再重試
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# 可重試的 HTTP 狀態碼
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class LLMProviderError(Exception):
+    """提供商返回錯誤響應"""
+
+    def __init__(self, provider: str, status: int, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(f"{provider} API錯誤: {status} {message}".strip())
+        self.provider = provider
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+
+@dataclass
+class RetryPolicy:
+    """重試策略"""
+    max_retries: int = 3
+    backoff_base: float = 0.5  # 首次退避上限（秒），之後每次翻倍
+    backoff_max: float = 20.0  # 單次退避上限（秒）
+    max_retry_after: float = 60.0  # 服務器 Retry-After 的最大遵循值（秒）
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重試前的等待時間（full jitter），不短於服務器要求的 Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class ProviderClient:
+    """單個提供商的客戶端，共享所屬連接池的會話和並發限制"""
+
+    provider = "base"
+
+    def __init__(self, pool: "LLMClientPool", config: Dict[str, Any]):
+        self.pool = pool
+        self.config = config
+        self.key = (config.get("provider", self.provider), self.base_url)
+
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "chunks": 0,
+            "ttft_total": 0.0,
+            "ttft_count": 0
+        }
+
+    @property
+    def base_url(self) -> str:
+        raise NotImplementedError
+
+    def _build_request(self, prompt: str, system_prompt: str, stream: bool) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """返回 (url, headers, payload)"""
+        raise NotImplementedError
+
+    async def _iter_stream(self, response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    def _parse_complete(self, result: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, system_prompt: str = "") -> AsyncIterator[str]:
+        """
+        流式調用，逐段返回生成的文本
+
+        並發名額在整個流的生命週期內佔用；提前結束迭代時應關閉生成器以釋放名額
+        """
+        stream = self.config.get("stream", True)
+        url, headers, payload = self._build_request(prompt, system_prompt, stream)
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.get("timeout", 120),
+            sock_read=self.config.get("read_timeout", 60)
+        )
+        retry = self.pool.retry_policy
+
+        async with self.pool.limit(self.key):
+            attempt = 0
+            while True:
+                self.stats["requests"] += 1
+                start = time.perf_counter()
+                emitted = False
+                try:
+                    async with self.pool.session() as session:
+                        async with session.post(url, headers=headers, json=payload, timeout=timeout) as response:
+                            if response.status != 200:
+                                message = (await response.text())[:200]
+                                raise LLMProviderError(
+                                    self.provider, response.status, message,
+                                    _parse_retry_after(response.headers.get("Retry-After"))
+                                )
+
+                            if stream:
+                                chunks = self._iter_stream(response)
+                            else:
+                                chunks = self._single(self._parse_complete(await response.json()))
+
+                            async for chunk in chunks:
+                                if not chunk:
+                                    continue
+                                if not emitted:
+                                    emitted = True
+                                    self.stats["ttft_total"] += time.perf_counter() - start
+                                    self.stats["ttft_count"] += 1
+                                self.stats["chunks"] += 1
+                                yield chunk
+                    return
+
+                except (LLMProviderError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retryable = not isinstance(e, LLMProviderError) or e.retryable
+                    if isinstance(e, LLMProviderError) and e.status == 429:
+                        self.stats["rate_limited"] += 1
+                    # 已輸出的內容無法撤回，流開始後不重試
+                    if emitted or not retryable or attempt >= retry.max_retries:
+                        self.stats["errors"] += 1
+                        raise
+
+                    delay = retry.delay(attempt, getattr(e, "retry_after", None))
+                    attempt += 1
+                    self.stats["retries"] += 1
+                    logger.warning(f"⚠️ {self.provider} 調用失敗，{delay:.2f}s 後第 {attempt} 次重試: {e}")
+                    await asyncio.sleep(delay)
+
+    async def complete(self, prompt: str, system_prompt: str = "") -> str:
+        """非流式接口：收集全部片段後返回完整文本"""
+        chunks: List[str] = []
+        async for chunk in self.stream(prompt, system_prompt):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    @staticmethod
+    async def _single(text: str) -> AsyncIterator[str]:
+        yield text
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        stats["avg_ttft"] = stats["ttft_total"] / stats["ttft_count"] if stats["ttft_count"] else 0.0
+        return stats
+
+
+class OpenAIClient(ProviderClient):
+    """OpenAI Chat Completions（stream 時為 SSE）"""
+
+    provider = "openai"
+
+    @property
+    def base_url(self) -> str:
+        return (self.config.get("base_url") or "https://api.openai.com").rstrip("/")
+
+    def _build_request(self, prompt: str, system_prompt: str, stream: bool):
+        url = f"{self.base_url}/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {self.config.get('api_key')}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.config.get("model", "gpt-3.5-turbo"),
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "stream": stream
+        }
+        return url, headers, payload
+
+    async def _iter_stream(self, response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+        async for raw in response.content:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            event = json.loads(data)
+            choices = event.get("choices") or [{}]
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+    def _parse_complete(self, result: Dict[str, Any]) -> str:
+        return result["choices"][0]["message"]["content"]
+
+
+class OllamaClient(ProviderClient):
+    """Ollama /api/generate（stream 時為 NDJSON）"""
+
+    provider = "ollama"
+
+    @property
+    def base_url(self) -> str:
+        return (self.config.get("base_url") or "http://localhost:11434").rstrip("/")
+
+    def _build_request(self, prompt: str, system_prompt: str, stream: bool):
+        url = f"{self.base_url}/api/generate"
+        payload = {
+            "model": self.config.get("model", "llama3"),
+            "prompt": f"{system_prompt}\n\n{prompt}",
+            "stream": stream
+        }
+        return url, {"Content-Type": "application/json"}, payload
+
+    async def _iter_stream(self, response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+        async for raw in response.content:
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("error"):
+                raise LLMProviderError(self.provider, 500, event["error"])
+            if event.get("response"):
+                yield event["response"]
+            if event.get("done"):
+                return
+
+    def _parse_complete(self, result: Dict[str, Any]) -> str:
+        return result.get("response", "無回應")
+
+
+PROVIDER_CLIENTS = {
+    "openai": OpenAIClient,
+    "ollama": OllamaClient
+}
+
+
+class LLMClientPool:
+    """提供商客戶端池：共享連接池、按提供商的並發限制和重試策略"""
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None,
+                 concurrency_limits: Optional[Dict[str, int]] = None,
+                 default_limit: int = 8,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 connection_limit: int = 100):
+        """
+        初始化客戶端池
+
+        Args:
+            session: 外部注入的共享會話（生命週期由注入方管理）
+            concurrency_limits: 各提供商的並發上限，例如 {"openai": 16, "ollama": 2}
+            default_limit: 未配置提供商的並發上限
+            retry_policy: 重試策略
+            connection_limit: open() 創建的連接池大小
+        """
+        self._shared_session = session
+        self._owned_session: Optional[aiohttp.ClientSession] = None
+        self.concurrency_limits = concurrency_limits or {}
+        self.default_limit = default_limit
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.connection_limit = connection_limit
+
+        self._clients: Dict[Tuple[str, str], ProviderClient] = {}
+        # 信號量綁定事件循環，按循環分別維護
+        self._limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], asyncio.Semaphore]]" = \
+            weakref.WeakKeyDictionary()
+
+    def attach_session(self, session: Optional[aiohttp.ClientSession]):
+        """注入或替換共享會話"""
+        self._shared_session = session
+
+    async def open(self):
+        """在當前（長期運行的）事件循環中創建自有連接池"""
+        if self._owned_session is None or self._owned_session.closed:
+            self._owned_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60)
+            )
+
+    async def close(self):
+        """關閉自有連接池（注入的會話由注入方關閉）"""
+        if self._owned_session is not None:
+            await self._owned_session.close()
+            self._owned_session = None
+
+    @asynccontextmanager
+    async def session(self):
+        """優先使用共享連接池，未提供時創建臨時會話"""
+        for session in (self._shared_session, self._owned_session):
+            if session is not None and not session.closed:
+                yield session
+                return
+        async with aiohttp.ClientSession() as session:
+            yield session
+
+    @asynccontextmanager
+    async def limit(self, key: Tuple[str, str]):
+        """佔用提供商的一個並發名額"""
+        loop = asyncio.get_running_loop()
+        limits = self._limits.setdefault(loop, {})
+        semaphore = limits.get(key)
+        if semaphore is None:
+            semaphore = limits[key] = asyncio.Semaphore(
+                self.concurrency_limits.get(key[0], self.default_limit)
+            )
+        async with semaphore:
+            yield
+
+    def client(self, config: Dict[str, Any]) -> ProviderClient:
+        """按配置獲取（並緩存）提供商客戶端"""
+        provider = config.get("provider")
+        client_class = PROVIDER_CLIENTS.get(provider)
+        if client_class is None:
+            raise ValueError(f"不支持的LLM提供商: {provider}")
+
+        key = (provider, (config.get("base_url") or "").rstrip("/"))
+        client = self._clients.get(key)
+        if client is None or client.config is not config:
+            client = self._clients[key] = client_class(self, config)
+        return client
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pooled": any(session is not None and not session.closed
+                          for session in (self._shared_session, self._owned_session)),
+            "concurrency_limits": self.concurrency_limits,
+            "default_limit": self.default_limit,
+            "providers": {f"{provider}@{base_url or 'default'}": client.get_stats()
+                          for (provider, base_url), client in self._clients.items()}
+        }
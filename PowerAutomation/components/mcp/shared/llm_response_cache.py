@@ -0,0 +1,437 @@
+"""
+LLM 響應緩存 (LLM Response Cache)
+為各 MCP 組件提供共享的大模型響應緩存，避免重複的付費調用：
+- 內容尋址：以規範化後的提供商、模型、系統提示詞和用戶提示詞的 SHA-256 作為鍵
+- 兩級存儲：內存 LRU（條目數和字節預算）+ SQLite 磁盤層（WAL 模式，TTL 和字節預算），可跨進程和重啟復用
+- 單飛（single-flight）：同一事件循環中相同的在途請求只調用一次
+- 命中率和節省成本統計，可回饋到 BudgetManager
+- 按調用關閉（use_cache=False），用於需要非確定性輸出的場景
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Any, Callable, Awaitable, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DB = os.environ.get(
+    "POWERAUTOMATION_LLM_CACHE_DB",
+    str(Path.home() / ".powerautomation" / "llm_response_cache.db")
+)
+
+# 每千 token 的估算價格（輸入, 輸出），用於計算緩存節省的成本
+DEFAULT_TOKEN_PRICES: Dict[str, Tuple[float, float]] = {
+    "claude": (0.003, 0.015),
+    "openai": (0.0005, 0.0015),
+    "ollama": (0.0, 0.0),
+    "mock": (0.0, 0.0)
+}
+
+_TRAILING_SPACE = re.compile(r"[ \t]+\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_prompt(text: Optional[str]) -> str:
+    """
+    規範化提示詞用於計算緩存鍵
+
+    只消除不影響語義的差異（Unicode 組合形式、換行符、行尾空白、多餘空行、首尾空白），
+    保留行首縮進，避免代碼片段被錯誤合併
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _TRAILING_SPACE.sub("\n", text + "\n")
+    text = _BLANK_LINES.sub("\n\n", text)
+    return text.strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 數（按 UTF-8 字節數 / 4）"""
+    return len(text.encode("utf-8")) // 4 if text else 0
+
+
+class LLMResponseCache:
+    """內容尋址的兩級 LLM 響應緩存"""
+
+    def __init__(self, db_path: Optional[str] = None,
+                 persistent: bool = True,
+                 memory_items: int = 1024,
+                 memory_bytes: int = 16 * 1024 * 1024,
+                 disk_bytes: int = 256 * 1024 * 1024,
+                 ttl: float = 24 * 3600,
+                 token_prices: Optional[Dict[str, Tuple[float, float]]] = None,
+                 budget_manager=None):
+        """
+        初始化響應緩存
+
+        Args:
+            db_path: SQLite 數據庫路徑，為 None 時使用默認路徑
+            persistent: 是否啟用磁盤層
+            memory_items: 內存層最大條目數
+            memory_bytes: 內存層字節預算
+            disk_bytes: 磁盤層字節預算，超出後按最近訪問時間淘汰
+            ttl: 默認有效期（秒）
+            token_prices: 各提供商每千 token 價格（輸入, 輸出）
+            budget_manager: 接收命中和節省成本統計的 BudgetManager
+        """
+        self.db_path = db_path or DEFAULT_CACHE_DB
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.token_prices = {**DEFAULT_TOKEN_PRICES, **(token_prices or {})}
+        self.budget_manager = budget_manager
+
+        # key -> (response, expires_at, size, cost)
+        self._memory: "OrderedDict[str, Tuple[str, float, int, float]]" = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        # key -> 在途調用的 Future（綁定所屬事件循環）
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "coalesced": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+            "saved_cost": 0.0
+        }
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_size = 0
+        if persistent:
+            self._open_disk()
+
+    # ==================== 磁盤層 ====================
+
+    def _open_disk(self):
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    cost REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_access ON llm_responses (last_access)")
+            conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+            self._disk_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+            self._conn = conn
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ LLM響應緩存磁盤層不可用，僅使用內存層: {e}")
+            self._conn = None
+
+    def _disk_failed(self, e: Exception):
+        logger.warning(f"⚠️ LLM響應緩存磁盤層出錯，已停用: {e}")
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float, int, float]]:
+        row = self._conn.execute(
+            "SELECT response, expires_at, size, cost FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._disk_size -= row[2]
+            self.stats["expired"] += 1
+            return None
+        self._conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+        return row
+
+    def _disk_put(self, key: str, entry: Tuple[str, float, int, float], provider: str, model: str, now: float):
+        previous = self._conn.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO llm_responses "
+            "(key, provider, model, response, size, cost, created_at, expires_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, provider, model, entry[0], entry[2], entry[3], now, entry[1], now)
+        )
+        self._disk_size += entry[2] - (previous[0] if previous else 0)
+        if self._disk_size > self.disk_bytes:
+            self._evict_disk(now)
+
+    def _evict_disk(self, now: float):
+        """刪除過期條目；仍超出預算時按最近訪問時間淘汰到預算的 90%"""
+        self._conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,))
+        # 多個工作進程共享數據庫，以實際大小為準
+        self._disk_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        excess = self._disk_size - int(self.disk_bytes * 0.9)
+        if excess <= 0:
+            return
+
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_responses ORDER BY last_access"):
+            victims.append((key,))
+            excess -= size
+            self._disk_size -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", victims)
+        self.stats["disk_evictions"] += len(victims)
+
+    # ==================== 內存層 ====================
+
+    def _memory_put(self, key: str, entry: Tuple[str, float, int, float]):
+        if entry[2] > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= previous[2]
+        self._memory[key] = entry
+        self._memory_size += entry[2]
+        while len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted[2]
+            self.stats["memory_evictions"] += 1
+
+    # ==================== 鍵和成本 ====================
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, system_prompt: str = "",
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """計算緩存鍵；params 用於區分影響輸出的調用參數（如 max_tokens、temperature）"""
+        material = json.dumps(
+            [provider or "", model or "", normalize_prompt(system_prompt), normalize_prompt(prompt), params or {}],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def estimate_cost(self, provider: str, prompt: str, system_prompt: str, response: str) -> float:
+        """按提供商價格估算一次調用的成本"""
+        input_price, output_price = self.token_prices.get(provider, (0.0, 0.0))
+        input_tokens = estimate_tokens(system_prompt) + estimate_tokens(prompt)
+        return (input_tokens * input_price + estimate_tokens(response) * output_price) / 1000
+
+    # ==================== 讀寫接口 ====================
+
+    def get(self, key: str) -> Optional[str]:
+        """讀取緩存（不計入命中統計）"""
+        entry = self._get_entry(key)
+        return entry[0] if entry else None
+
+    def _get_entry(self, key: str, count: bool = False) -> Optional[Tuple[str, float, int, float]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    if count:
+                        self.stats["memory_hits"] += 1
+                    return entry
+                del self._memory[key]
+                self._memory_size -= entry[2]
+                self.stats["expired"] += 1
+
+            if self._conn is None:
+                return None
+            try:
+                entry = self._disk_get(key, now)
+            except sqlite3.Error as e:
+                self._disk_failed(e)
+                return None
+            if entry is not None:
+                self._memory_put(key, entry)
+                if count:
+                    self.stats["disk_hits"] += 1
+            return entry
+
+    def put(self, key: str, response: str, cost: float = 0.0, ttl: Optional[float] = None,
+            provider: str = "", model: str = ""):
+        """寫入兩級緩存"""
+        now = time.time()
+        entry = (response, now + (ttl if ttl is not None else self.ttl), len(response.encode("utf-8")), cost)
+        with self._lock:
+            self._memory_put(key, entry)
+            self.stats["stores"] += 1
+            if self._conn is not None:
+                try:
+                    self._disk_put(key, entry, provider, model, now)
+                except sqlite3.Error as e:
+                    self._disk_failed(e)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """讀取緩存並計入命中統計，供流式調用等自行管理寫入的場景使用"""
+        entry = self._get_entry(key, count=True)
+        if entry is None:
+            self._record(hit=False)
+            return None
+        self._record(hit=True, saved_cost=entry[3])
+        return entry[0]
+
+    def invalidate(self, key: str) -> bool:
+        """刪除單個條目"""
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry is not None:
+                self._memory_size -= entry[2]
+            removed = entry is not None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                        self._disk_size -= row[0]
+                        removed = True
+                except sqlite3.Error as e:
+                    self._disk_failed(e)
+            return removed
+
+    def clear(self):
+        """清空兩級緩存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM llm_responses")
+                    self._disk_size = 0
+                except sqlite3.Error as e:
+                    self._disk_failed(e)
+
+    async def get_or_call(self, call: Callable[[], Awaitable[str]], provider: str, model: str, prompt: str,
+                          system_prompt: str = "", params: Optional[Dict[str, Any]] = None,
+                          use_cache: bool = True, ttl: Optional[float] = None,
+                          cacheable: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        命中時直接返回緩存；未命中時調用 call()，相同的在途請求共享同一次調用
+
+        Args:
+            call: 實際的 LLM 調用，失敗時應拋出異常（異常不會被緩存）
+            provider / model / prompt / system_prompt / params: 緩存鍵的組成部分
+            use_cache: 為 False 時繞過緩存和單飛，用於需要非確定性輸出的調用
+            ttl: 本條目的有效期（秒），默認使用緩存配置
+            cacheable: 判斷結果是否可緩存，默認只緩存非空結果
+        """
+        if not use_cache:
+            self.stats["bypassed"] += 1
+            return await call()
+
+        key = self.make_key(provider, model, prompt, system_prompt, params)
+        entry = self._get_entry(key, count=True)
+        if entry is not None:
+            self._record(hit=True, saved_cost=entry[3])
+            return entry[0]
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            try:
+                response = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # 領頭的調用被取消，由當前調用重新發起
+                return await self.get_or_call(call, provider, model, prompt, system_prompt, params,
+                                              use_cache, ttl, cacheable)
+            self.stats["coalesced"] += 1
+            self._record(hit=True, saved_cost=self.estimate_cost(provider, prompt, system_prompt, response))
+            return response
+
+        self._record(hit=False)
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            response = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 沒有等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            if cacheable(response) if cacheable else bool(response and response.strip()):
+                self.put(key, response, self.estimate_cost(provider, prompt, system_prompt, response),
+                         ttl, provider, model)
+            return response
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    # ==================== 統計 ====================
+
+    def attach_budget_manager(self, budget_manager):
+        """設置接收命中和節省成本統計的 BudgetManager"""
+        self.budget_manager = budget_manager
+
+    def _record(self, hit: bool, saved_cost: float = 0.0):
+        if hit:
+            self.stats["saved_cost"] += saved_cost
+        else:
+            self.stats["misses"] += 1
+        if self.budget_manager is not None:
+            try:
+                self.budget_manager.record_cache_result(hit, saved_cost)
+            except Exception as e:
+                logger.debug(f"BudgetManager 緩存統計回饋失敗: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.copy()
+        hits = stats["memory_hits"] + stats["disk_hits"] + stats["coalesced"]
+        lookups = hits + stats["misses"]
+        stats.update({
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+            "disk_enabled": self._conn is not None,
+            "disk_bytes": self._disk_size if self._conn is not None else 0,
+            "inflight": len(self._inflight)
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_shared_cache: Optional[LLMResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_response_cache(**kwargs) -> LLMResponseCache:
+    """
+    獲取進程內共享的響應緩存（首次調用的參數生效）
+
+    設置環境變量 POWERAUTOMATION_LLM_CACHE_PERSISTENT=0 可停用磁盤層
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            kwargs.setdefault("persistent", os.environ.get("POWERAUTOMATION_LLM_CACHE_PERSISTENT", "1") != "0")
+            _shared_cache = LLMResponseCache(**kwargs)
+        return _shared_cache
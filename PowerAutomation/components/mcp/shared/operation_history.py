@@ -0,0 +1,341 @@
+"""
+操作歷史服務 (Operation History Store)
+為各 MCP 組件提供統一的操作歷史記錄：
+- 固定大小的內存環形緩衝區，提供熱數據讀取
+- 後台線程批量寫入 SQLite（WAL 模式），重啟後可恢復
+- 按類型、狀態、時間範圍的索引查詢
+- 按記錄數上限和保留天數定期清理舊記錄
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_DB = os.environ.get(
+    "POWERAUTOMATION_HISTORY_DB",
+    str(Path.home() / ".powerautomation" / "operation_history.db")
+)
+
+_STOP = object()
+
+
+def _to_epoch(value: Union[None, float, int, str, datetime]) -> Optional[float]:
+    """將時間統一轉換為 epoch 秒"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class OperationHistoryStore:
+    """操作歷史存儲"""
+
+    def __init__(self, component: str, db_path: str = None, ring_size: int = 500,
+                 batch_size: int = 200, flush_interval: float = 1.0,
+                 max_records: Optional[int] = 100000, max_age_days: Optional[float] = 90,
+                 purge_interval: float = 300.0):
+        """
+        初始化操作歷史存儲
+
+        Args:
+            component: 組件名稱，同一數據庫中按組件隔離記錄
+            db_path: SQLite 數據庫路徑，為 None 時使用默認路徑
+            ring_size: 內存環形緩衝區大小
+            batch_size: 每次批量寫入的最大記錄數
+            flush_interval: 後台寫入的最長等待時間（秒）
+            max_records: 該組件在磁盤上保留的最大記錄數，None 表示不限制
+            max_age_days: 記錄保留天數，None 表示不按時間清理
+            purge_interval: 後台清理的間隔（秒）
+        """
+        self.component = component
+        self.db_path = db_path or DEFAULT_HISTORY_DB
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_records = max_records
+        self.max_age_days = max_age_days
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+
+        self._ring: deque = deque(maxlen=ring_size)
+        self._pending: queue.Queue = queue.Queue()
+        self._closed = False
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_database()
+        self._load_recent()
+
+        self._writer = threading.Thread(
+            target=self._writer_loop, name=f"history-writer-{component}", daemon=True
+        )
+        self._writer.start()
+        # 寫入線程是守護線程，未顯式關閉時在解釋器退出前寫入剩餘記錄
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_database(self):
+        """初始化表結構和索引"""
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS operation_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    component TEXT NOT NULL,
+                    operation_id TEXT,
+                    operation_type TEXT,
+                    status TEXT,
+                    timestamp REAL NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_history_component_time
+                ON operation_history (component, timestamp)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_history_component_type_time
+                ON operation_history (component, operation_type, timestamp)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_history_component_status_time
+                ON operation_history (component, status, timestamp)
+            """)
+
+    def _load_recent(self):
+        """啟動時從磁盤恢復最近的記錄到環形緩衝區"""
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT payload FROM operation_history WHERE component = ? "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    (self.component, self._ring.maxlen)
+                ).fetchall()
+            for (payload,) in reversed(rows):
+                self._ring.append(json.loads(payload))
+        except Exception as e:
+            logger.warning(f"⚠️ 無法恢復操作歷史 ({self.component}): {e}")
+
+    def record(self, entry: Dict[str, Any], operation_type: str = None, status: str = None):
+        """
+        記錄一條操作歷史，立即可在內存中讀取，磁盤寫入在後台批量完成
+
+        Args:
+            entry: 歷史記錄內容
+            operation_type: 操作類型，默認讀取 entry["operation_type"]
+            status: 操作狀態，默認讀取 entry["status"]
+        """
+        if self._closed:
+            raise RuntimeError("操作歷史存儲已關閉")
+
+        self._ring.append(entry)
+
+        timestamp = _to_epoch(entry.get("timestamp")) or time.time()
+        row = (
+            self.component,
+            entry.get("operation_id"),
+            operation_type if operation_type is not None else entry.get("operation_type"),
+            self._status_value(status if status is not None else entry.get("status")),
+            timestamp,
+            json.dumps(entry, ensure_ascii=False, default=str)
+        )
+        self._pending.put(row)
+
+    @staticmethod
+    def _status_value(status: Any) -> Optional[str]:
+        """缺失的狀態存為 SQL NULL，而不是字符串 'None'"""
+        return None if status is None else str(status)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """從內存環形緩衝區讀取最近的記錄"""
+        if limit <= 0:
+            return []
+        items = list(self._ring)
+        return items[-limit:]
+
+    def query(self, operation_type: str = None, status: str = None,
+              since: Union[None, float, str, datetime] = None,
+              until: Union[None, float, str, datetime] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按類型、狀態和時間範圍查詢歷史記錄（按時間升序返回最近的 limit 條）
+
+        Args:
+            operation_type: 操作類型
+            status: 操作狀態
+            since: 起始時間（含）
+            until: 結束時間（含）
+            limit: 最大返回數量
+        """
+        self.flush()
+
+        clauses = ["component = ?"]
+        params: List[Any] = [self.component]
+        if operation_type is not None:
+            clauses.append("operation_type = ?")
+            params.append(operation_type)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(self._status_value(status))
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_to_epoch(since))
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(_to_epoch(until))
+        params.append(limit)
+
+        sql = (
+            f"SELECT payload FROM operation_history WHERE {' AND '.join(clauses)} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?"
+        )
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        return [json.loads(payload) for (payload,) in reversed(rows)]
+
+    async def async_query(self, operation_type: str = None, status: str = None,
+                          since: Union[None, float, str, datetime] = None,
+                          until: Union[None, float, str, datetime] = None,
+                          limit: int = 100) -> List[Dict[str, Any]]:
+        """在協程中查詢歷史記錄，等待落盤和 SQLite 查詢不阻塞事件循環"""
+        return await asyncio.to_thread(self.query, operation_type, status, since, until, limit)
+
+    def count(self) -> int:
+        """磁盤上該組件的記錄總數"""
+        self.flush()
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM operation_history WHERE component = ?", (self.component,)
+            ).fetchone()[0]
+
+    def purge(self) -> int:
+        """按記錄數上限和保留天數刪除舊記錄，返回刪除數量"""
+        with self._connect() as conn:
+            return self._purge(conn)
+
+    def _purge(self, conn: sqlite3.Connection) -> int:
+        deleted = 0
+        with conn:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                deleted += conn.execute(
+                    "DELETE FROM operation_history WHERE component = ? AND timestamp < ?",
+                    (self.component, cutoff)
+                ).rowcount
+            if self.max_records is not None:
+                deleted += conn.execute(
+                    "DELETE FROM operation_history WHERE id IN ("
+                    "SELECT id FROM operation_history WHERE component = ? "
+                    "ORDER BY timestamp DESC, id DESC LIMIT -1 OFFSET ?)",
+                    (self.component, self.max_records)
+                ).rowcount
+        self._next_purge = time.time() + self.purge_interval
+        if deleted:
+            logger.info(f"🧹 已清理 {deleted} 條過期操作歷史 ({self.component})")
+        return deleted
+
+    async def async_count(self) -> int:
+        """在協程中獲取磁盤上的記錄總數"""
+        return await asyncio.to_thread(self.count)
+
+    def flush(self):
+        """等待所有待寫入記錄落盤"""
+        if not self._closed:
+            self._pending.join()
+
+    async def async_flush(self):
+        """在協程中等待所有待寫入記錄落盤"""
+        await asyncio.to_thread(self.flush)
+
+    def close(self):
+        """寫入剩餘記錄並停止後台線程"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._pending.put(_STOP)
+        self._writer.join()
+
+    async def async_close(self):
+        """在協程中關閉存儲，等待剩餘記錄寫入不阻塞事件循環"""
+        await asyncio.to_thread(self.close)
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def __iter__(self):
+        return iter(list(self._ring))
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = []
+                stop = False
+                if time.time() >= self._next_purge:
+                    try:
+                        self._purge(conn)
+                    except Exception as e:
+                        self._next_purge = time.time() + self.purge_interval
+                        logger.error(f"❌ 清理操作歷史失敗 ({self.component}): {e}")
+
+                try:
+                    item = self._pending.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+
+                while not stop and len(batch) < self.batch_size:
+                    try:
+                        item = self._pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                    else:
+                        batch.append(item)
+
+                if batch:
+                    try:
+                        with conn:
+                            conn.executemany(
+                                "INSERT INTO operation_history "
+                                "(component, operation_id, operation_type, status, timestamp, payload) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                batch
+                            )
+                    except Exception as e:
+                        logger.error(f"❌ 寫入操作歷史失敗 ({self.component}): {e}")
+
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._pending.task_done()
+
+                if stop:
+                    break
+        finally:
+            conn.close()
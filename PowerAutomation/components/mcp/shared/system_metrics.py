@@ -0,0 +1,279 @@
+"""
+系統指標採樣服務 (System Metrics Sampler)
+為各 MCP 組件提供共享的系統資源讀數：
+- 後台線程按固定間隔採樣 CPU、內存、磁盤、網絡和負載，不阻塞事件循環
+- 固定大小的環形緩衝區保存最近的採樣歷史
+- O(1) 讀取最新快照，按時間窗口計算聚合值
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MetricsSample:
+    """單次系統指標採樣"""
+    timestamp: float
+    cpu_usage: float
+    memory_usage: float
+    disk_usage: float
+    network_io: Dict[str, int] = field(default_factory=dict)
+    load_average: List[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
+    uptime: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["timestamp"] = datetime.fromtimestamp(self.timestamp).isoformat()
+        return data
+
+
+class SystemMetricsSampler:
+    """共享的後台系統指標採樣器"""
+
+    def __init__(self, interval: float = 1.0, history_size: int = 300, disk_path: str = "/"):
+        """
+        初始化採樣器
+
+        Args:
+            interval: 採樣間隔（秒），CPU 使用率為相鄰兩次採樣之間的平均值
+            history_size: 環形緩衝區保存的採樣數量
+            disk_path: 統計磁盤使用率的路徑
+        """
+        self.interval = interval
+        self.disk_path = disk_path
+
+        self._history: deque = deque(maxlen=history_size)
+        self._latest: Optional[MetricsSample] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._users = 0
+
+        self.stats = {
+            "samples": 0,
+            "errors": 0,
+            "sample_time": 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """啟動後台採樣線程"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="system-metrics-sampler",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止後台採樣線程，並丟棄最新快照，重新啟動後不會返回過期數據"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        self._latest = None
+        self._ready.clear()
+
+    def acquire(self) -> "SystemMetricsSampler":
+        """登記一個使用者，首次登記時啟動採樣"""
+        with self._lock:
+            self._users += 1
+        self.start()
+        return self
+
+    def release(self):
+        """註銷一個使用者，最後一個使用者離開時停止採樣"""
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            idle = self._users == 0
+        if idle:
+            self.stop()
+
+    def latest(self) -> Optional[MetricsSample]:
+        """最新的採樣，尚未完成首次採樣時返回 None"""
+        return self._latest
+
+    def snapshot(self, timeout: Optional[float] = None) -> MetricsSample:
+        """
+        獲取最新快照，僅在首次採樣完成前等待
+
+        未經 acquire() 登記使用者時不啟動後台線程（否則最後一次 release() 無法停止它），
+        而是當場採樣一次返回，不寫入歷史
+
+        Args:
+            timeout: 最長等待時間（秒），默認為一個採樣間隔
+        """
+        sample = self._latest
+        if sample is not None:
+            return sample
+
+        if not self.running:
+            return self._read_sample(cpu_interval=min(self.interval, 0.1)) or self._empty_sample()
+        self._ready.wait(self.interval + 1 if timeout is None else timeout)
+        return self._latest or self._empty_sample()
+
+    async def async_snapshot(self, timeout: Optional[float] = None) -> MetricsSample:
+        """在協程中獲取最新快照，首次採樣前的等待不阻塞事件循環"""
+        sample = self._latest
+        if sample is not None:
+            return sample
+        return await asyncio.to_thread(self.snapshot, timeout)
+
+    def history(self, window: Optional[float] = None) -> List[MetricsSample]:
+        """
+        獲取採樣歷史
+
+        Args:
+            window: 時間窗口（秒），為 None 時返回緩衝區內全部採樣
+        """
+        with self._lock:
+            samples = list(self._history)
+        if window is None:
+            return samples
+
+        cutoff = time.time() - window
+        start = len(samples)
+        while start > 0 and samples[start - 1].timestamp >= cutoff:
+            start -= 1
+        return samples[start:]
+
+    def aggregate(self, window: float = 60.0) -> Dict[str, Any]:
+        """
+        計算時間窗口內的聚合值
+
+        Args:
+            window: 時間窗口（秒）
+
+        Returns:
+            Dict[str, Any]: 各指標的 avg/min/max，以及網絡吞吐速率（字節/秒）
+        """
+        samples = self.history(window)
+        result: Dict[str, Any] = {"window": window, "samples": len(samples)}
+        if not samples:
+            return result
+
+        for name in ("cpu_usage", "memory_usage", "disk_usage"):
+            values = [getattr(sample, name) for sample in samples]
+            result[name] = {
+                "avg": sum(values) / len(values),
+                "min": min(values),
+                "max": max(values)
+            }
+
+        first, last = samples[0], samples[-1]
+        elapsed = last.timestamp - first.timestamp
+        if elapsed > 0 and first.network_io and last.network_io:
+            result["network_rate"] = {
+                key: (last.network_io.get(key, 0) - first.network_io.get(key, 0)) / elapsed
+                for key in ("bytes_sent", "bytes_recv")
+            }
+        result["load_average"] = last.load_average
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取採樣器統計信息"""
+        stats = self.stats.copy()
+        stats.update({
+            "running": self.running,
+            "interval": self.interval,
+            "history_size": len(self._history),
+            "users": self._users,
+            "last_sample": self._latest.timestamp if self._latest else None
+        })
+        return stats
+
+    def _sample_loop(self):
+        # cpu_percent(interval=None) 返回與上一次調用之間的平均值，首次調用只用於建立基準
+        psutil.cpu_percent(interval=None)
+        if self._stop_event.wait(min(self.interval, 0.1)):
+            return
+
+        while True:
+            self._take_sample()
+            if self._stop_event.wait(self.interval):
+                break
+
+    def _take_sample(self):
+        start = time.time()
+        sample = self._read_sample()
+        if sample is None:
+            return
+
+        with self._lock:
+            self._history.append(sample)
+            if self._stop_event.is_set():
+                return
+            self._latest = sample
+        self._ready.set()
+
+        self.stats["samples"] += 1
+        self.stats["sample_time"] += time.time() - start
+
+    def _read_sample(self, cpu_interval: Optional[float] = None) -> Optional[MetricsSample]:
+        """
+        讀取一次系統指標
+
+        Args:
+            cpu_interval: CPU 使用率的阻塞測量時間，None 表示與上一次調用之間的平均值
+        """
+        start = time.time()
+        try:
+            disk = psutil.disk_usage(self.disk_path)
+            network_io = psutil.net_io_counters()
+            return MetricsSample(
+                timestamp=start,
+                cpu_usage=psutil.cpu_percent(interval=cpu_interval),
+                memory_usage=psutil.virtual_memory().percent,
+                disk_usage=(disk.used / disk.total) * 100,
+                network_io={
+                    "bytes_sent": network_io.bytes_sent,
+                    "bytes_recv": network_io.bytes_recv,
+                    "packets_sent": network_io.packets_sent,
+                    "packets_recv": network_io.packets_recv
+                } if network_io else {},
+                load_average=list(os.getloadavg()) if hasattr(os, "getloadavg") else [0.0, 0.0, 0.0],
+                uptime=start - psutil.boot_time()
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ 系統指標採樣失敗: {e}")
+            return None
+
+    @staticmethod
+    def _empty_sample() -> MetricsSample:
+        return MetricsSample(timestamp=0.0, cpu_usage=0.0, memory_usage=0.0, disk_usage=0.0)
+
+
+_shared_sampler: Optional[SystemMetricsSampler] = None
+_shared_lock = threading.Lock()
+
+
+def get_system_metrics_sampler(interval: float = 1.0, history_size: int = 300) -> SystemMetricsSampler:
+    """
+    獲取進程內共享的採樣器（首次調用的參數生效）
+
+    Args:
+        interval: 採樣間隔（秒）
+        history_size: 環形緩衝區大小
+    """
+    global _shared_sampler
+    with _shared_lock:
+        if _shared_sampler is None:
+            _shared_sampler = SystemMetricsSampler(interval=interval, history_size=history_size)
+        return _shared_sampler
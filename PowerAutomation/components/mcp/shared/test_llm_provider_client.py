@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+LLM 提供商客戶端測試
+使用 development/tools/fake_llm_provider.py 的本地假服務驗證流式輸出、限流重試和並發限制
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from pathlib import Path
+
+# 添加共享模組和開發工具目錄到Python路徑
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, str(Path(__file__).resolve().parents[4] / "development" / "tools"))
+
+from llm_provider_client import LLMClientPool, LLMProviderError, RetryPolicy
+from fake_llm_provider import FakeLLMProvider
+
+
+class LLMProviderClientTest(unittest.IsolatedAsyncioTestCase):
+    """提供商客戶端與假服務的端到端測試"""
+
+    async def start_provider(self, **kwargs) -> FakeLLMProvider:
+        kwargs.setdefault("first_token_delay", 0.01)
+        kwargs.setdefault("token_delay", 0.0)
+        provider = FakeLLMProvider(**kwargs)
+        await provider.start()
+        self.addAsyncCleanup(provider.stop)
+        return provider
+
+    async def open_pool(self, **kwargs) -> LLMClientPool:
+        kwargs.setdefault("retry_policy", RetryPolicy(max_retries=3, backoff_base=0.01, backoff_max=0.05))
+        pool = LLMClientPool(**kwargs)
+        await pool.open()
+        self.addAsyncCleanup(pool.close)
+        return pool
+
+    async def test_openai_stream_yields_chunks_in_order(self):
+        """OpenAI SSE 流逐片段返回，拼接後等於完整回答"""
+        provider = await self.start_provider(response_text="abcdefghij", chunk_size=3)
+        pool = await self.open_pool()
+        client = pool.client({"provider": "openai", "base_url": provider.base_url, "api_key": "test"})
+
+        chunks = [chunk async for chunk in client.stream("hello")]
+
+        self.assertEqual(chunks, ["abc", "def", "ghi", "j"])
+        stats = client.get_stats()
+        self.assertEqual(stats["chunks"], 4)
+        self.assertEqual(stats["ttft_count"], 1)
+        self.assertGreater(stats["avg_ttft"], 0.0)
+        self.assertEqual(provider.get_stats()["streamed"], 1)
+
+    async def test_ollama_stream_and_complete(self):
+        """Ollama NDJSON 流和非流式接口返回相同內容"""
+        provider = await self.start_provider(response_text="streamed answer", chunk_size=5)
+        pool = await self.open_pool()
+        streaming = pool.client({"provider": "ollama", "base_url": provider.base_url})
+        chunks = [chunk async for chunk in streaming.stream("hello")]
+        self.assertEqual(chunks, ["strea", "med a", "nswer"])
+
+        complete = pool.client({"provider": "ollama", "base_url": provider.base_url, "stream": False})
+        self.assertEqual(await complete.complete("hello"), "streamed answer")
+
+    async def test_rate_limited_requests_are_retried(self):
+        """429 響應按 Retry-After 退避後重試成功"""
+        provider = await self.start_provider(response_text="ok", rate_limit_first=2, retry_after=0.05)
+        pool = await self.open_pool()
+        client = pool.client({"provider": "openai", "base_url": provider.base_url, "api_key": "test"})
+
+        started = asyncio.get_running_loop().time()
+        self.assertEqual(await client.complete("hello"), "ok")
+        elapsed = asyncio.get_running_loop().time() - started
+
+        # 兩次重試各至少等待 Retry-After
+        self.assertGreaterEqual(elapsed, 0.1)
+        self.assertEqual(client.get_stats()["rate_limited"], 2)
+        self.assertEqual(client.get_stats()["retries"], 2)
+        self.assertEqual(provider.get_stats()["requests"], 3)
+
+    async def test_rate_limit_exhausts_retries(self):
+        """超過最大重試次數後拋出 429 錯誤"""
+        provider = await self.start_provider(rate_limit_first=10, retry_after=None)
+        pool = await self.open_pool(retry_policy=RetryPolicy(max_retries=1, backoff_base=0.01))
+        client = pool.client({"provider": "openai", "base_url": provider.base_url, "api_key": "test"})
+
+        with self.assertRaises(LLMProviderError) as ctx:
+            await client.complete("hello")
+
+        self.assertEqual(ctx.exception.status, 429)
+        self.assertEqual(provider.get_stats()["requests"], 2)
+        self.assertEqual(client.get_stats()["errors"], 1)
+
+    async def test_concurrency_is_capped_per_provider(self):
+        """同一提供商的並發請求數不超過配置的上限"""
+        provider = await self.start_provider(first_token_delay=0.05, token_delay=0.01)
+        pool = await self.open_pool(concurrency_limits={"ollama": 2})
+        client = pool.client({"provider": "ollama", "base_url": provider.base_url})
+
+        results = await asyncio.gather(*(client.complete(f"prompt {i}") for i in range(6)))
+
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(provider.get_stats()["requests"], 6)
+        self.assertEqual(provider.get_stats()["max_concurrency"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
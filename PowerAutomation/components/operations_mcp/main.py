@@ -18,13 +18,22 @@ import logging
 import time
 import subprocess
 import os
-import psutil
+import sys
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Callable, Awaitable, AsyncIterator, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 import aiohttp
 
+# 導入共享的操作歷史服務
+sys.path.append(os.path.join(os.path.dirname(__file__), '../mcp/shared'))
+try:
+    from operation_history import OperationHistoryStore
+    from system_metrics import get_system_metrics_sampler
+except ImportError:
+    from PowerAutomation.components.mcp.shared.operation_history import OperationHistoryStore
+    from PowerAutomation.components.mcp.shared.system_metrics import get_system_metrics_sampler
+
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,6 +65,7 @@ class OperationStatus(Enum):
     IN_PROGRESS = "in_progress"
     COMPLETED = "completed"
     FAILED = "failed"
+    PARTIAL = "partial"
     CANCELLED = "cancelled"
     SCHEDULED = "scheduled"
 
@@ -87,13 +97,28 @@ class OperationResult:
     logs: List[str]
     alerts_generated: List[str]
     recommendations: List[str]
+    failed_systems: List[str] = field(default_factory=list)
+
+# 目標系統未成功完成時的單系統狀態
+UNSUCCESSFUL_SYSTEM_STATUSES = ("failed", "timeout", "skipped")
 
 class OperationsMCP:
     """通用運維 MCP"""
     
     def __init__(self, config_path: str = None):
         self.config = self._load_config(config_path)
-        self.operation_history = []
+        self._system_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._partial_callbacks: Dict[str, Callable[[str, str, Dict[str, Any]], Awaitable[None]]] = {}
+        self.operation_history = OperationHistoryStore(
+            "operations_mcp",
+            db_path=self.config.get("history_db_path"),
+            ring_size=self.config.get("history_ring_size", 500)
+        )
+        # 共享的後台指標採樣器，監控各目標系統時只讀取快照
+        self.metrics_sampler = get_system_metrics_sampler(
+            interval=self.config.get("metrics_sample_interval", 1.0),
+            history_size=self.config.get("metrics_history_size", 300)
+        ).acquire()
         self.active_operations = {}
         self.scheduled_operations = {}
         self.system_metrics = {}
@@ -102,12 +127,33 @@ class OperationsMCP:
         # 初始化運維環境
         self._initialize_operations_environment()
     
+    def close(self):
+        """釋放共享的指標採樣器，寫入剩餘的操作歷史"""
+        if self.metrics_sampler is not None:
+            self.metrics_sampler.release()
+            self.metrics_sampler = None
+        self.operation_history.close()
+    
+    async def async_close(self):
+        """在協程中關閉組件，等待操作歷史寫入不阻塞事件循環"""
+        if self.metrics_sampler is not None:
+            self.metrics_sampler.release()
+            self.metrics_sampler = None
+        await self.operation_history.async_close()
+    
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """加載配置"""
         default_config = {
             "monitoring_interval": 60,
             "max_concurrent_operations": 5,
+            "max_concurrent_targets": 20,
+            "max_operations_per_system": 1,
+            "rolling_restart_batch_size": 1,
+            "metrics_sample_interval": 1.0,
+            "metrics_history_size": 300,
+            "monitoring_window": 60,
             "default_timeout": 300,
+            "metrics_timeout": 10,
             "log_retention_days": 30,
             "backup_retention_days": 90,
             "alert_thresholds": {
@@ -144,12 +190,15 @@ class OperationsMCP:
         logger.info(f"📊 監控間隔: {self.config['monitoring_interval']} 秒")
         logger.info(f"🔧 最大並發操作: {self.config['max_concurrent_operations']}")
     
-    async def execute_operation(self, operation_config: OperationConfig) -> OperationResult:
+    async def execute_operation(self, operation_config: OperationConfig,
+                                on_partial_result: Optional[Callable[[str, str, Dict[str, Any]], Awaitable[None]]] = None
+                                ) -> OperationResult:
         """
         執行運維操作
         
         Args:
             operation_config: 運維操作配置
+            on_partial_result: 每個目標系統完成時的回調 (operation_id, system, result)
             
         Returns:
             運維操作結果
@@ -180,8 +229,12 @@ class OperationsMCP:
             self.active_operations[operation_id] = {
                 "config": operation_config,
                 "start_time": start_time,
-                "status": OperationStatus.IN_PROGRESS
+                "deadline": start_time + operation_config.timeout,
+                "status": OperationStatus.IN_PROGRESS,
+                "partial_results": {}
             }
+            if on_partial_result:
+                self._partial_callbacks[operation_id] = on_partial_result
             
             # 5. 執行具體的運維操作
             operation_result = await self._execute_operation_type(
@@ -189,7 +242,7 @@ class OperationsMCP:
             )
             
             # 6. 收集系統指標
-            metrics = await self._collect_system_metrics(operation_config.target_systems)
+            metrics = await self._collect_system_metrics()
             logs.append("📊 系統指標收集完成")
             
             # 7. 生成建議
@@ -198,32 +251,40 @@ class OperationsMCP:
             )
             
             execution_time = time.time() - start_time
+            failed_systems = self._unsuccessful_systems(operation_config.target_systems, operation_result)
+            status, message = self._summarize_status(
+                operation_config.target_systems, failed_systems, operation_result.get("aborted", False)
+            )
             
             result = OperationResult(
                 operation_id=operation_id,
-                status=OperationStatus.COMPLETED,
-                message="運維操作成功完成",
+                status=status,
+                message=message,
                 timestamp=datetime.now(),
                 execution_time=execution_time,
                 affected_systems=operation_config.target_systems,
                 metrics=metrics,
                 logs=logs,
                 alerts_generated=alerts_generated,
-                recommendations=recommendations
+                recommendations=recommendations,
+                failed_systems=failed_systems
             )
             
             # 8. 記錄操作歷史
-            self._record_operation_history(result)
+            self._record_operation_history(result, operation_config.type.value)
             
             # 9. 發送通知
             if operation_config.notification_channels:
                 await self._send_notifications(result, operation_config.notification_channels)
             
             # 10. 清理活躍操作
-            if operation_id in self.active_operations:
-                del self.active_operations[operation_id]
+            self.active_operations.pop(operation_id, None)
+            self._partial_callbacks.pop(operation_id, None)
             
-            logger.info(f"✅ 運維操作完成: {operation_id}, 耗時 {execution_time:.2f} 秒")
+            if status == OperationStatus.COMPLETED:
+                logger.info(f"✅ 運維操作完成: {operation_id}, 耗時 {execution_time:.2f} 秒")
+            else:
+                logger.warning(f"⚠️ {message}: {operation_id}, 耗時 {execution_time:.2f} 秒")
             return result
             
         except Exception as e:
@@ -244,14 +305,151 @@ class OperationsMCP:
                 recommendations=[f"檢查錯誤原因: {str(e)}"]
             )
             
-            self._record_operation_history(result)
+            self._record_operation_history(result, operation_config.type.value)
             
             # 清理活躍操作
-            if operation_id in self.active_operations:
-                del self.active_operations[operation_id]
+            self.active_operations.pop(operation_id, None)
+            self._partial_callbacks.pop(operation_id, None)
             
             return result
     
+    @staticmethod
+    def _unsuccessful_systems(target_systems: List[str], operation_result: Dict[str, Any]) -> List[str]:
+        """從按系統記錄的結果中找出失敗、超時或被跳過的系統"""
+        unsuccessful = set()
+        for value in operation_result.values():
+            if not isinstance(value, dict):
+                continue
+            for system, result in value.items():
+                if system in target_systems and isinstance(result, dict) and \
+                        result.get("status") in UNSUCCESSFUL_SYSTEM_STATUSES:
+                    unsuccessful.add(system)
+        return [system for system in target_systems if system in unsuccessful]
+    
+    @staticmethod
+    def _summarize_status(target_systems: List[str], failed_systems: List[str],
+                          aborted: bool = False) -> Tuple[OperationStatus, str]:
+        """根據未成功的系統確定操作的整體狀態和消息"""
+        if not failed_systems and not aborted:
+            return OperationStatus.COMPLETED, "運維操作成功完成"
+        
+        detail = f"{len(failed_systems)}/{len(target_systems)} 個系統未成功: {', '.join(failed_systems)}"
+        if aborted:
+            detail = f"操作已中止，{detail}"
+        if len(failed_systems) == len(target_systems):
+            return OperationStatus.FAILED, f"運維操作失敗，{detail}"
+        return OperationStatus.PARTIAL, f"運維操作部分完成，{detail}"
+    
+    async def stream_operation(self, operation_config: OperationConfig) -> AsyncIterator[Dict[str, Any]]:
+        """
+        執行運維操作並流式返回各目標系統的部分結果
+        
+        每個系統完成時產出 {"type": "partial", ...}，最後產出 {"type": "final", "result": OperationResult}
+        """
+        updates: asyncio.Queue = asyncio.Queue()
+        
+        async def on_partial(operation_id: str, system: str, result: Dict[str, Any]):
+            await updates.put({"type": "partial", "operation_id": operation_id,
+                               "system": system, "result": result})
+        
+        task = asyncio.create_task(self.execute_operation(operation_config, on_partial))
+        try:
+            while True:
+                getter = asyncio.create_task(updates.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                break
+            
+            while not updates.empty():
+                yield updates.get_nowait()
+            
+            yield {"type": "final", "result": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    def _system_semaphore(self, system: str) -> asyncio.Semaphore:
+        """每個目標系統的並發限制，跨操作共享"""
+        semaphore = self._system_semaphores.get(system)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, self.config["max_operations_per_system"]))
+            self._system_semaphores[system] = semaphore
+        return semaphore
+    
+    async def _fan_out(self, operation_id: str, systems: List[str],
+                       worker: Callable[[str], Awaitable[Dict[str, Any]]],
+                       alerts: Optional[List[str]] = None,
+                       max_concurrency: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        在多個目標系統上並發執行 worker
+        
+        受操作級並發上限和每系統並發上限約束；到達操作截止時間後
+        取消未完成的系統，並以 timeout 狀態記錄。每個系統完成時觸發部分結果回調。
+        
+        Returns:
+            按輸入順序排列的 {system: result}
+        """
+        if not systems:
+            return {}
+        
+        operation = self.active_operations.get(operation_id, {})
+        deadline = operation.get("deadline")
+        remaining = None if deadline is None else max(0.0, deadline - time.time())
+        concurrency = max(1, min(max_concurrency or self.config["max_concurrent_targets"], len(systems)))
+        semaphore = asyncio.Semaphore(concurrency)
+        callback = self._partial_callbacks.get(operation_id)
+        partial_results = operation.get("partial_results")
+        
+        async def run(system: str):
+            async with semaphore:
+                async with self._system_semaphore(system):
+                    try:
+                        return system, await worker(system)
+                    except Exception as e:
+                        error_msg = f"❌ {system} 執行失敗: {str(e)}"
+                        if alerts is not None:
+                            alerts.append(error_msg)
+                        return system, {
+                            "status": "failed",
+                            "error": str(e),
+                            "timestamp": datetime.now().isoformat()
+                        }
+        
+        tasks = [asyncio.create_task(run(system)) for system in systems]
+        results: Dict[str, Dict[str, Any]] = {}
+        
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=remaining):
+                try:
+                    system, result = await next_done
+                except asyncio.TimeoutError:
+                    break
+                
+                results[system] = result
+                if partial_results is not None:
+                    partial_results[system] = result
+                if callback:
+                    try:
+                        await callback(operation_id, system, result)
+                    except Exception as e:
+                        logger.warning(f"⚠️ 部分結果回調失敗 ({system}): {e}")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        for system in systems:
+            if system not in results:
+                alert = f"⏱️ {system} 超過截止時間，已取消"
+                if alerts is not None:
+                    alerts.append(alert)
+                results[system] = {"status": "timeout", "timestamp": datetime.now().isoformat()}
+        
+        return {system: results[system] for system in systems}
+    
     async def _validate_operation_config(self, config: OperationConfig):
         """驗證運維操作配置"""
         if not config.name:
@@ -295,21 +493,15 @@ class OperationsMCP:
         """執行系統監控"""
         logs.append("📊 開始系統監控")
         
-        monitoring_results = {}
+        window = config.parameters.get("window", self.config.get("monitoring_window", 60))
         
-        for system in config.target_systems:
+        async def monitor(system: str) -> Dict[str, Any]:
             logs.append(f"🔍 監控系統: {system}")
             
-            # 收集 CPU 使用率
-            cpu_usage = psutil.cpu_percent(interval=1)
-            
-            # 收集內存使用率
-            memory = psutil.virtual_memory()
-            memory_usage = memory.percent
-            
-            # 收集磁盤使用率
-            disk = psutil.disk_usage('/')
-            disk_usage = (disk.used / disk.total) * 100
+            sample = await self.metrics_sampler.async_snapshot()
+            cpu_usage = sample.cpu_usage
+            memory_usage = sample.memory_usage
+            disk_usage = sample.disk_usage
             
             # 檢查閾值並生成告警
             if cpu_usage > self.config["alert_thresholds"]["cpu_usage"]:
@@ -327,13 +519,16 @@ class OperationsMCP:
                 alerts.append(alert)
                 logs.append(alert)
             
-            monitoring_results[system] = {
+            return {
                 "cpu_usage": cpu_usage,
                 "memory_usage": memory_usage,
                 "disk_usage": disk_usage,
-                "timestamp": datetime.now().isoformat()
+                "window_aggregate": self.metrics_sampler.aggregate(window),
+                "timestamp": datetime.fromtimestamp(sample.timestamp).isoformat()
             }
         
+        monitoring_results = await self._fan_out(operation_id, config.target_systems, monitor, alerts)
+        
         logs.append("✅ 系統監控完成")
         return {"monitoring_results": monitoring_results}
     
@@ -345,36 +540,54 @@ class OperationsMCP:
         logs.append("🔄 開始服務重啟")
         
         service_name = config.parameters.get("service_name", "unknown")
+        # 滾動重啟：每批最多 max_unavailable 個系統同時下線
+        max_unavailable = max(1, int(config.parameters.get(
+            "max_unavailable", self.config["rolling_restart_batch_size"]
+        )))
+        max_failures = int(config.parameters.get("max_failures", 0))
         restart_results = {}
+        failures = 0
         
-        for system in config.target_systems:
+        async def restart(system: str) -> Dict[str, Any]:
             logs.append(f"🔄 重啟服務 {service_name} 在系統 {system}")
             
-            try:
-                # 模擬服務重啟過程
-                await asyncio.sleep(2)
-                
-                restart_results[system] = {
-                    "service": service_name,
-                    "status": "restarted",
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                logs.append(f"✅ 服務 {service_name} 在 {system} 重啟成功")
-                
-            except Exception as e:
-                error_msg = f"❌ 服務 {service_name} 在 {system} 重啟失敗: {str(e)}"
-                logs.append(error_msg)
-                alerts.append(error_msg)
-                
-                restart_results[system] = {
-                    "service": service_name,
-                    "status": "failed",
-                    "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                }
+            # 模擬服務重啟過程
+            await asyncio.sleep(2)
+            
+            logs.append(f"✅ 服務 {service_name} 在 {system} 重啟成功")
+            return {
+                "service": service_name,
+                "status": "restarted",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        systems = config.target_systems
+        for index in range(0, len(systems), max_unavailable):
+            batch = systems[index:index + max_unavailable]
+            
+            if failures > max_failures:
+                for system in batch:
+                    restart_results[system] = {
+                        "service": service_name,
+                        "status": "skipped",
+                        "timestamp": datetime.now().isoformat()
+                    }
+                continue
+            
+            batch_results = await self._fan_out(
+                operation_id, batch, restart, alerts, max_concurrency=max_unavailable
+            )
+            restart_results.update(batch_results)
+            
+            batch_failures = [system for system, result in batch_results.items()
+                              if result.get("status") != "restarted"]
+            failures += len(batch_failures)
+            if failures > max_failures:
+                alert = f"🛑 滾動重啟中止: {len(batch_failures)} 個系統失敗 ({', '.join(batch_failures)})"
+                alerts.append(alert)
+                logs.append(alert)
         
-        return {"restart_results": restart_results}
+        return {"restart_results": restart_results, "aborted": failures > max_failures}
     
     async def _execute_database_maintenance(self, operation_id: str,
                                           config: OperationConfig,
@@ -384,9 +597,7 @@ class OperationsMCP:
         logs.append("🗄️ 開始數據庫維護")
         
         maintenance_type = config.parameters.get("maintenance_type", "optimize")
-        maintenance_results = {}
-        
-        for system in config.target_systems:
+        async def maintain(system: str) -> Dict[str, Any]:
             logs.append(f"🗄️ 執行數據庫維護 ({maintenance_type}) 在系統 {system}")
             
             # 模擬數據庫維護過程
@@ -397,12 +608,14 @@ class OperationsMCP:
             elif maintenance_type == "cleanup":
                 await self._perform_database_cleanup(system, logs)
             
-            maintenance_results[system] = {
+            return {
                 "maintenance_type": maintenance_type,
                 "status": "completed",
                 "timestamp": datetime.now().isoformat()
             }
         
+        maintenance_results = await self._fan_out(operation_id, config.target_systems, maintain, alerts)
+        
         logs.append("✅ 數據庫維護完成")
         return {"maintenance_results": maintenance_results}
     
@@ -413,17 +626,21 @@ class OperationsMCP:
         """執行健康檢查"""
         logs.append("🏥 開始健康檢查")
         
-        health_results = {}
-        
-        for system in config.target_systems:
+        async def check(system: str) -> Dict[str, Any]:
             logs.append(f"🏥 檢查系統健康狀態: {system}")
             
-            # 執行各種健康檢查
+            # 同一系統的各項健康檢查並發執行
+            service_status, connectivity, resource_usage, response_time = await asyncio.gather(
+                self._check_service_status(system),
+                self._check_connectivity(system),
+                self._check_resource_usage(system),
+                self._check_response_time(system)
+            )
             checks = {
-                "service_status": await self._check_service_status(system),
-                "connectivity": await self._check_connectivity(system),
-                "resource_usage": await self._check_resource_usage(system),
-                "response_time": await self._check_response_time(system)
+                "service_status": service_status,
+                "connectivity": connectivity,
+                "resource_usage": resource_usage,
+                "response_time": response_time
             }
             
             # 計算整體健康分數
@@ -435,13 +652,14 @@ class OperationsMCP:
                 alerts.append(alert)
                 logs.append(alert)
             
-            health_results[system] = {
+            logs.append(f"📊 {system} 健康分數: {health_score:.1f}%")
+            return {
                 "health_score": health_score,
                 "checks": checks,
                 "timestamp": datetime.now().isoformat()
             }
-            
-            logs.append(f"📊 {system} 健康分數: {health_score:.1f}%")
+        
+        health_results = await self._fan_out(operation_id, config.target_systems, check, alerts)
         
         logs.append("✅ 健康檢查完成")
         return {"health_results": health_results}
@@ -493,8 +711,8 @@ class OperationsMCP:
     async def _check_resource_usage(self, system: str) -> bool:
         """檢查資源使用情況"""
         # 模擬資源使用檢查
-        cpu_usage = psutil.cpu_percent()
-        return cpu_usage < 90
+        sample = await self.metrics_sampler.async_snapshot()
+        return sample.cpu_usage < 90
     
     async def _check_response_time(self, system: str) -> bool:
         """檢查響應時間"""
@@ -502,20 +720,27 @@ class OperationsMCP:
         await asyncio.sleep(0.1)
         return True
     
-    async def _collect_system_metrics(self, target_systems: List[str]) -> Dict[str, Any]:
-        """收集系統指標"""
-        metrics = {}
-        
-        for system in target_systems:
-            metrics[system] = {
-                "cpu_usage": psutil.cpu_percent(),
-                "memory_usage": psutil.virtual_memory().percent,
-                "disk_usage": (psutil.disk_usage('/').used / psutil.disk_usage('/').total) * 100,
-                "load_average": os.getloadavg() if hasattr(os, 'getloadavg') else [0, 0, 0],
-                "timestamp": datetime.now().isoformat()
-            }
+    async def _collect_system_metrics(self) -> Dict[str, Any]:
+        """
+        收集本機系統指標
         
-        return metrics
+        採樣器只能觀測運行運維 MCP 的主機，因此只採樣一次，不按目標系統重複；
+        使用獨立超時，不受操作剩餘時間影響
+        """
+        try:
+            sample = await asyncio.wait_for(self.metrics_sampler.async_snapshot(),
+                                            self.config["metrics_timeout"])
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ 系統指標採樣超時")
+            return {"status": "timeout", "timestamp": datetime.now().isoformat()}
+        
+        return {
+            "cpu_usage": sample.cpu_usage,
+            "memory_usage": sample.memory_usage,
+            "disk_usage": sample.disk_usage,
+            "load_average": sample.load_average,
+            "timestamp": datetime.fromtimestamp(sample.timestamp).isoformat()
+        }
     
     async def _generate_recommendations(self, config: OperationConfig,
                                       operation_result: Dict[str, Any],
@@ -536,16 +761,15 @@ class OperationsMCP:
             recommendations.append("建議定期執行數據庫維護操作")
             recommendations.append("考慮實施自動化備份策略")
         
-        # 基於指標生成建議
-        for system, system_metrics in metrics.items():
-            if system_metrics.get("cpu_usage", 0) > 80:
-                recommendations.append(f"建議優化 {system} 的 CPU 使用率")
-            
-            if system_metrics.get("memory_usage", 0) > 85:
-                recommendations.append(f"建議增加 {system} 的內存容量")
-            
-            if system_metrics.get("disk_usage", 0) > 90:
-                recommendations.append(f"建議清理 {system} 的磁盤空間")
+        # 基於本機指標生成建議
+        if metrics.get("cpu_usage", 0) > 80:
+            recommendations.append("建議優化運維主機的 CPU 使用率")
+        
+        if metrics.get("memory_usage", 0) > 85:
+            recommendations.append("建議增加運維主機的內存容量")
+        
+        if metrics.get("disk_usage", 0) > 90:
+            recommendations.append("建議清理運維主機的磁盤空間")
         
         return recommendations
     
@@ -556,7 +780,8 @@ class OperationsMCP:
             "status": result.status.value,
             "message": result.message,
             "timestamp": result.timestamp.isoformat(),
-            "affected_systems": result.affected_systems
+            "affected_systems": result.affected_systems,
+            "failed_systems": result.failed_systems
         }
         
         for channel in channels:
@@ -568,23 +793,33 @@ class OperationsMCP:
             except Exception as e:
                 logger.error(f"❌ 發送通知失敗 ({channel}): {str(e)}")
     
-    def _record_operation_history(self, result: OperationResult):
+    def _record_operation_history(self, result: OperationResult, operation_type: str = None):
         """記錄操作歷史"""
-        self.operation_history.append({
+        self.operation_history.record({
             "operation_id": result.operation_id,
+            "operation_type": operation_type,
             "status": result.status.value,
             "timestamp": result.timestamp.isoformat(),
             "execution_time": result.execution_time,
-            "affected_systems": result.affected_systems
+            "affected_systems": result.affected_systems,
+            "failed_systems": result.failed_systems
         })
-        
-        # 保持歷史記錄在合理範圍內
-        if len(self.operation_history) > 1000:
-            self.operation_history = self.operation_history[-500:]
     
     def get_operation_history(self, limit: int = 50) -> List[Dict[str, Any]]:
         """獲取操作歷史"""
-        return self.operation_history[-limit:]
+        return self.operation_history.recent(limit)
+    
+    def query_operation_history(self, operation_type: str = None, status: str = None,
+                                since: Any = None, until: Any = None,
+                                limit: int = 100) -> List[Dict[str, Any]]:
+        """按類型、狀態和時間範圍查詢持久化的操作歷史"""
+        return self.operation_history.query(operation_type, status, since, until, limit)
+    
+    async def async_query_operation_history(self, operation_type: str = None, status: str = None,
+                                            since: Any = None, until: Any = None,
+                                            limit: int = 100) -> List[Dict[str, Any]]:
+        """在協程中查詢持久化的操作歷史，不阻塞事件循環"""
+        return await self.operation_history.async_query(operation_type, status, since, until, limit)
     
     def get_active_operations(self) -> Dict[str, Any]:
         """獲取活躍操作"""
@@ -643,55 +878,59 @@ async def main():
     
     operations_mcp = OperationsMCP()
     
-    if args.action == "history":
-        history = operations_mcp.get_operation_history()
-        print(json.dumps(history, indent=2, ensure_ascii=False))
-        return
-    
-    if args.action == "status":
-        active = operations_mcp.get_active_operations()
-        print(json.dumps(active, indent=2, ensure_ascii=False))
-        return
-    
-    if args.action == "monitor":
-        metrics = operations_mcp.get_system_metrics()
-        print(json.dumps(metrics, indent=2, ensure_ascii=False))
-        return
-    
-    if args.action == "execute":
-        if not all([args.name, args.type, args.systems]):
-            print("❌ 執行操作需要指定 --name, --type, --systems")
+    try:
+        if args.action == "history":
+            history = operations_mcp.get_operation_history()
+            print(json.dumps(history, indent=2, ensure_ascii=False))
             return
         
-        try:
-            parameters = json.loads(args.parameters)
-        except json.JSONDecodeError:
-            print("❌ 無效的參數 JSON 格式")
+        if args.action == "status":
+            active = operations_mcp.get_active_operations()
+            print(json.dumps(active, indent=2, ensure_ascii=False))
             return
         
-        config = OperationConfig(
-            name=args.name,
-            type=OperationType(args.type),
-            priority=OperationPriority(args.priority),
-            description=f"執行 {args.type} 操作",
-            target_systems=args.systems,
-            parameters=parameters,
-            timeout=args.timeout
-        )
+        if args.action == "monitor":
+            metrics = operations_mcp.get_system_metrics()
+            print(json.dumps(metrics, indent=2, ensure_ascii=False))
+            return
         
-        result = await operations_mcp.execute_operation(config)
+        if args.action == "execute":
+            if not all([args.name, args.type, args.systems]):
+                print("❌ 執行操作需要指定 --name, --type, --systems")
+                return
         
-        print(json.dumps({
-            "operation_id": result.operation_id,
-            "status": result.status.value,
-            "message": result.message,
-            "execution_time": result.execution_time,
-            "affected_systems": result.affected_systems,
-            "metrics": result.metrics,
-            "logs": result.logs,
-            "alerts_generated": result.alerts_generated,
-            "recommendations": result.recommendations
-        }, indent=2, ensure_ascii=False))
+            try:
+                parameters = json.loads(args.parameters)
+            except json.JSONDecodeError:
+                print("❌ 無效的參數 JSON 格式")
+                return
+        
+            config = OperationConfig(
+                name=args.name,
+                type=OperationType(args.type),
+                priority=OperationPriority(args.priority),
+                description=f"執行 {args.type} 操作",
+                target_systems=args.systems,
+                parameters=parameters,
+                timeout=args.timeout
+            )
+        
+            result = await operations_mcp.execute_operation(config)
+        
+            print(json.dumps({
+                "operation_id": result.operation_id,
+                "status": result.status.value,
+                "message": result.message,
+                "execution_time": result.execution_time,
+                "affected_systems": result.affected_systems,
+                "failed_systems": result.failed_systems,
+                "metrics": result.metrics,
+                "logs": result.logs,
+                "alerts_generated": result.alerts_generated,
+                "recommendations": result.recommendations
+            }, indent=2, ensure_ascii=False))
+    finally:
+        await operations_mcp.async_close()
 
 if __name__ == "__main__":
     asyncio.run(main())
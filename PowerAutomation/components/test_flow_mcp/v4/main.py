@@ -20,6 +20,15 @@ from enum import Enum
 from dataclasses import dataclass
 import aiohttp
 import re
+import os
+import sys
+
+# 導入共享的操作歷史服務
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../mcp/shared'))
+try:
+    from operation_history import OperationHistoryStore
+except ImportError:
+    from PowerAutomation.components.mcp.shared.operation_history import OperationHistoryStore
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
@@ -756,7 +765,11 @@ class IntegratedCodeFixAdapter:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.logger = logging.getLogger(__name__)
-        self.fix_history = []
+        self.fix_history = OperationHistoryStore(
+            "integrated_code_fix_adapter",
+            db_path=config.get("history_db_path"),
+            ring_size=config.get("history_ring_size", 50)
+        )
         
         # KiloCode工作流類型映射
         self.workflow_mapping = {
@@ -1020,19 +1033,32 @@ class IntegratedCodeFixAdapter:
     def _record_fix_history(self, recommendation: Dict[str, Any], fix_result: Dict[str, Any]):
         """記錄修復歷史"""
         
+        success = fix_result.get("success", False)
         history_entry = {
             "timestamp": datetime.now().isoformat(),
             "area": recommendation.get("area"),
             "strategy": fix_result.get("strategy", "unknown"),
-            "success": fix_result.get("success", False),
+            "success": success,
             "confidence": fix_result.get("confidence", 0.0)
         }
         
-        self.fix_history.append(history_entry)
-        
-        # 保持歷史記錄在合理範圍內
-        if len(self.fix_history) > 50:
-            self.fix_history = self.fix_history[-25:]
+        self.fix_history.record(
+            history_entry,
+            operation_type=recommendation.get("area"),
+            status="success" if success else "failed"
+        )
+    
+    def close(self):
+        """寫入剩餘的修復歷史並停止後台寫入線程"""
+        self.fix_history.close()
+    
+    async def async_close(self):
+        """在協程中關閉修復歷史存儲，不阻塞事件循環"""
+        await self.fix_history.async_close()
+    
+    def get_fix_history(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """獲取修復歷史"""
+        return self.fix_history.recent(limit)
     
     def _generate_fix_recommendations(self, fix_data: Dict[str, Any]) -> List[str]:
         """生成修復建議"""
@@ -1328,6 +1354,14 @@ class EnhancedTestFlowMCP:
             "timestamp": datetime.now().isoformat()
         }
     
+    def close(self):
+        """關閉代碼修復適配器的歷史存儲"""
+        self.code_fix_adapter.close()
+    
+    async def async_close(self):
+        """在協程中關閉代碼修復適配器的歷史存儲"""
+        await self.code_fix_adapter.async_close()
+    
     async def health_check(self) -> Dict[str, Any]:
         """健康檢查"""
         
@@ -1354,34 +1388,37 @@ async def main():
     # 初始化Enhanced Test Flow MCP
     mcp = EnhancedTestFlowMCP()
     
-    print("🚀 Enhanced Test Flow MCP v4.0 測試開始")
-    print("=" * 60)
-    
-    # 測試開發者模式
-    print("\n🔧 測試開發者模式完整流程...")
-    
-    developer_result = await mcp.process_developer_request(
-        requirement="優化API響應時間，目前平均300ms，希望降低到150ms以下",
-        mode="developer",
-        fix_strategy="intelligent"
-    )
-    
-    print(f"✅ 開發者模式處理狀態: {developer_result['success']}")
-    if developer_result['success']:
-        summary = developer_result['summary']
-        print(f"📊 處理階段: {developer_result['stages_completed']}/4")
-        print(f"🎯 需求同步: {summary['requirement_sync']['status']}")
-        print(f"📈 比較分析: {summary['comparison_analysis']['status']} (分數: {summary['comparison_analysis']['overall_score']:.2f})")
-        print(f"📋 評估報告: {summary['evaluation_report']['status']} ({summary['evaluation_report']['fix_recommendations_count']}個建議)")
-        print(f"🔧 代碼修復: {summary['code_fix']['status']} ({summary['code_fix']['fixes_executed']}個修復)")
-        print(f"🎯 KiloCode整合: {summary['code_fix']['kilocode_integration']}")
-    
-    # 健康檢查
-    health = await mcp.health_check()
-    print(f"\n🏥 健康狀態: {health['status']}")
-    print(f"🔧 整合組件: {len(health['integrated_components'])}個")
-    
-    print("\n🎉 測試完成！Enhanced Test Flow MCP v4.0 已整合Code Fix Adapter")
+    try:
+        print("🚀 Enhanced Test Flow MCP v4.0 測試開始")
+        print("=" * 60)
+        
+        # 測試開發者模式
+        print("\n🔧 測試開發者模式完整流程...")
+        
+        developer_result = await mcp.process_developer_request(
+            requirement="優化API響應時間，目前平均300ms，希望降低到150ms以下",
+            mode="developer",
+            fix_strategy="intelligent"
+        )
+        
+        print(f"✅ 開發者模式處理狀態: {developer_result['success']}")
+        if developer_result['success']:
+            summary = developer_result['summary']
+            print(f"📊 處理階段: {developer_result['stages_completed']}/4")
+            print(f"🎯 需求同步: {summary['requirement_sync']['status']}")
+            print(f"📈 比較分析: {summary['comparison_analysis']['status']} (分數: {summary['comparison_analysis']['overall_score']:.2f})")
+            print(f"📋 評估報告: {summary['evaluation_report']['status']} ({summary['evaluation_report']['fix_recommendations_count']}個建議)")
+            print(f"🔧 代碼修復: {summary['code_fix']['status']} ({summary['code_fix']['fixes_executed']}個修復)")
+            print(f"🎯 KiloCode整合: {summary['code_fix']['kilocode_integration']}")
+        
+        # 健康檢查
+        health = await mcp.health_check()
+        print(f"\n🏥 健康狀態: {health['status']}")
+        print(f"🔧 整合組件: {len(health['integrated_components'])}個")
+        
+        print("\n🎉 測試完成！Enhanced Test Flow MCP v4.0 已整合Code Fix Adapter")
+    finally:
+        await mcp.async_close()
 
 if __name__ == "__main__":
     asyncio.run(main())
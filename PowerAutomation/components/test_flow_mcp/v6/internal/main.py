@@ -22,11 +22,11 @@ import os
 from typing import Dict, Any, Optional, List, Union
 from datetime import datetime, timedelta
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from pathlib import Path
 import re
 import hashlib
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
@@ -100,6 +100,106 @@ class ProcessingResult:
     execution_time: float = 0.0
     next_stage: Optional[ProcessingStage] = None
 
+class _PatternNode:
+    """序列前綴樹節點"""
+
+    __slots__ = ("children", "support", "frequency", "last_sequence")
+
+    def __init__(self):
+        self.children: Dict[str, "_PatternNode"] = {}
+        self.support = 0          # 包含該模式的序列數
+        self.frequency = 0        # 該模式的總出現次數
+        self.last_sequence = -1   # 最後一次計入支持度的序列編號
+
+class SequentialPatternMiner:
+    """增量式頻繁操作序列挖掘器
+
+    以深度受限的後綴前綴樹維護所有長度不超過max_pattern_length的連續子序列，
+    新記錄到達時只插入該記錄的後綴，無需重新掃描歷史記錄。挖掘時按
+    PrefixSpan的前綴增長方式深度優先遍歷，支持度低於min_support的前綴
+    整棵子樹直接剪枝（子模式支持度不會高於其前綴）。
+    """
+
+    def __init__(self, min_support: int = 2, max_pattern_length: int = 4,
+                 min_pattern_length: int = 2):
+        if min_pattern_length < 1 or max_pattern_length < min_pattern_length:
+            raise ValueError("無效的模式長度範圍")
+        self.min_support = max(1, min_support)
+        self.max_pattern_length = max_pattern_length
+        self.min_pattern_length = min_pattern_length
+        self._root = _PatternNode()
+        self._sequence_ids: Dict[str, int] = {}
+
+    @property
+    def sequence_count(self) -> int:
+        return len(self._sequence_ids)
+
+    def __contains__(self, sequence_id: str) -> bool:
+        return sequence_id in self._sequence_ids
+
+    def add_sequence(self, sequence_id: str, sequence: List[str]) -> bool:
+        """加入一條新序列，已加入過的序列會被忽略"""
+
+        if sequence_id in self._sequence_ids:
+            return False
+
+        index = len(self._sequence_ids)
+        self._sequence_ids[sequence_id] = index
+
+        for start in range(len(sequence)):
+            node = self._root
+            for item in sequence[start:start + self.max_pattern_length]:
+                child = node.children.get(item)
+                if child is None:
+                    child = node.children[item] = _PatternNode()
+                child.frequency += 1
+                if child.last_sequence != index:
+                    child.last_sequence = index
+                    child.support += 1
+                node = child
+
+        return True
+
+    def mine(self, min_support: Optional[int] = None, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """挖掘頻繁序列，按支持度和出現次數降序返回"""
+
+        threshold = self.min_support if min_support is None else max(1, min_support)
+        results = []
+        stack = [(child, (item,)) for item, child in self._root.children.items()]
+
+        while stack:
+            node, prefix = stack.pop()
+            if node.support < threshold:
+                continue
+            if len(prefix) >= self.min_pattern_length:
+                results.append((node.support, node.frequency, prefix))
+            if len(prefix) < self.max_pattern_length:
+                stack.extend((child, prefix + (item,)) for item, child in node.children.items())
+
+        results.sort(key=lambda entry: (-entry[0], -entry[1], len(entry[2]), entry[2]))
+        if top_k is not None:
+            results = results[:top_k]
+
+        return [
+            {
+                "sequence": list(prefix),
+                "support": support,
+                "frequency": frequency,
+                "pattern_name": " -> ".join(prefix)
+            }
+            for support, frequency, prefix in results
+        ]
+
+class _MinerCacheEntry:
+    """緩存的序列挖掘器及其已插入記錄的內容指紋鍵"""
+
+    __slots__ = ("miner", "keys", "created_at")
+
+    def __init__(self, miner: SequentialPatternMiner):
+        self.miner = miner
+        self.keys: set = set()
+        self.created_at = time.monotonic()
+
 class ReplayAnalysisEngine:
     """Replay記錄分析引擎"""
     
@@ -107,7 +207,16 @@ class ReplayAnalysisEngine:
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.recordings_dir = Path(config.get("recordings_dir", "./recordings"))
-        self.analysis_cache = {}
+        # 按關鍵詞組合緩存挖掘器，LRU淘汰並在超過TTL後重建
+        self.analysis_cache: "OrderedDict[tuple, _MinerCacheEntry]" = OrderedDict()
+        
+        mining_config = config.get("sequence_mining", {})
+        self.min_support = mining_config.get("min_support", 2)
+        self.max_pattern_length = mining_config.get("max_pattern_length", 4)
+        self.min_pattern_length = mining_config.get("min_pattern_length", 2)
+        self.top_patterns = mining_config.get("top_k", 5)
+        self.cache_size = mining_config.get("cache_size", 32)
+        self.cache_ttl = mining_config.get("cache_ttl", 3600)
     
     async def analyze_replay_records(self, requirement: str) -> ProcessingResult:
         """分析Replay記錄"""
@@ -122,8 +231,11 @@ class ReplayAnalysisEngine:
             # 分析相關的replay記錄
             relevant_records = self._filter_relevant_records(replay_records, requirement)
             
-            # 提取操作模式
-            operation_patterns = self._extract_operation_patterns(relevant_records)
+            # 提取操作模式（按需求關鍵詞增量維護序列挖掘器）
+            keywords = self._extract_keywords_from_requirement(requirement.lower())
+            operation_patterns = self._extract_operation_patterns(
+                relevant_records, cache_key=tuple(sorted(set(keywords)))
+            )
             
             # 分析成功/失敗模式
             success_patterns = self._analyze_success_patterns(relevant_records)
@@ -319,55 +431,108 @@ class ReplayAnalysisEngine:
         
         return keywords
     
-    def _extract_operation_patterns(self, records: List[ReplayRecord]) -> Dict[str, Any]:
+    def _extract_operation_patterns(self, records: List[ReplayRecord],
+                                    cache_key: Optional[tuple] = None) -> Dict[str, Any]:
         """提取操作模式"""
         
         patterns = defaultdict(int)
-        action_sequences = []
         
         for record in records:
             # 統計操作類型
             for operation in record.operations:
                 action_type = operation.get("action", "unknown")
                 patterns[action_type] += 1
-            
-            # 提取操作序列
-            sequence = [op.get("action", "unknown") for op in record.operations]
-            action_sequences.append(sequence)
         
-        # 分析常見序列
-        common_sequences = self._find_common_sequences(action_sequences)
+        # 分析常見序列：同一關鍵詞組合復用已有挖掘器，只插入新到達的記錄
+        sequences = self._keyed_sequences(records)
+        if cache_key is None:
+            miner = self._create_sequence_miner()
+            for record_key, sequence in sequences.items():
+                miner.add_sequence(record_key, sequence)
+        else:
+            miner = self._cached_sequence_miner(cache_key, sequences)
+        
+        common_sequences = miner.mine(top_k=self.top_patterns)
         
         return {
             "action_frequency": dict(patterns),
             "common_sequences": common_sequences,
             "total_operations": sum(patterns.values()),
-            "unique_actions": len(patterns)
+            "unique_actions": len(patterns),
+            "mined_sequences": miner.sequence_count
         }
     
+    def _keyed_sequences(self, records: List[ReplayRecord]) -> Dict[str, List[str]]:
+        """
+        按記錄內容指紋為操作序列編號
+        
+        沒有 session_id 的記錄 ID 按載入時間生成，既可能重複又每次載入都會變化，
+        因此不使用 record_id；內容相同的記錄按出現次序追加序號，各自計入
+        """
+        
+        sequences: Dict[str, List[str]] = {}
+        occurrences: Counter = Counter()
+        for record in records:
+            content = {key: value for key, value in asdict(record).items() if key != "record_id"}
+            fingerprint = hashlib.sha1(
+                json.dumps(content, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+            sequences[f"{fingerprint}:{occurrences[fingerprint]}"] = self._operation_sequence(record)
+            occurrences[fingerprint] += 1
+        return sequences
+    
+    def _cached_sequence_miner(self, cache_key: tuple,
+                               sequences: Dict[str, List[str]]) -> SequentialPatternMiner:
+        """
+        獲取關鍵詞組合對應的挖掘器並插入新記錄
+        
+        序列按內容指紋編號，已插入的記錄被刪除或內容變化時其鍵不再出現，
+        挖掘器無法撤銷，整體重建；超過TTL的挖掘器同樣重建，最久未使用的挖掘器超出容量時淘汰
+        """
+        
+        entry = self.analysis_cache.pop(cache_key, None)
+        if entry is not None:
+            expired = self.cache_ttl and time.monotonic() - entry.created_at > self.cache_ttl
+            stale = not entry.keys.issubset(sequences)
+            if expired or stale:
+                entry = None
+        if entry is None:
+            entry = _MinerCacheEntry(self._create_sequence_miner())
+        
+        for record_key, sequence in sequences.items():
+            if record_key not in entry.keys:
+                entry.miner.add_sequence(record_key, sequence)
+                entry.keys.add(record_key)
+        
+        self.analysis_cache[cache_key] = entry
+        while len(self.analysis_cache) > max(1, self.cache_size):
+            self.analysis_cache.popitem(last=False)
+        
+        return entry.miner
+    
+    def _create_sequence_miner(self) -> SequentialPatternMiner:
+        """按配置創建序列挖掘器"""
+        
+        return SequentialPatternMiner(
+            min_support=self.min_support,
+            max_pattern_length=self.max_pattern_length,
+            min_pattern_length=self.min_pattern_length
+        )
+    
+    @staticmethod
+    def _operation_sequence(record: ReplayRecord) -> List[str]:
+        """提取記錄的操作序列"""
+        
+        return [op.get("action", "unknown") for op in record.operations]
+    
     def _find_common_sequences(self, sequences: List[List[str]]) -> List[Dict[str, Any]]:
         """找出常見的操作序列"""
         
-        sequence_counter = Counter()
-        
-        for sequence in sequences:
-            # 生成所有可能的子序列
-            for i in range(len(sequence)):
-                for j in range(i + 2, min(i + 5, len(sequence) + 1)):  # 長度2-4的序列
-                    subseq = tuple(sequence[i:j])
-                    sequence_counter[subseq] += 1
-        
-        # 返回最常見的序列
-        common_sequences = []
-        for sequence, count in sequence_counter.most_common(5):
-            if count >= 2:  # 至少出現2次
-                common_sequences.append({
-                    "sequence": list(sequence),
-                    "frequency": count,
-                    "pattern_name": " -> ".join(sequence)
-                })
+        miner = self._create_sequence_miner()
+        for index, sequence in enumerate(sequences):
+            miner.add_sequence(str(index), sequence)
         
-        return common_sequences
+        return miner.mine(top_k=self.top_patterns)
     
     def _analyze_success_patterns(self, records: List[ReplayRecord]) -> Dict[str, Any]:
         """分析成功模式"""
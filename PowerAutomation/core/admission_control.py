@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Admission Control - 请求准入控制
+
+在融合系统的五个处理阶段之前增加准入层：
+- 按 UserRequest.priority 的加权公平队列，限制同时处理的请求数，突发时低优先级批量任务不会饿死交互请求
+- 按处理模式的并发上限，昂贵模式（deep 等）同时运行的数量受限
+- 令牌桶（以美元计）按预算的可持续消耗速率补充，并根据 BudgetManager 实际消耗速率收紧或放宽
+- 超出模式并发或预算速率时降级到更便宜的处理模式，而不是拒绝请求
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Callable
+
+logger = logging.getLogger(__name__)
+
+# 优先级权重（加权公平调度中的份额）
+DEFAULT_PRIORITY_WEIGHTS = {
+    'critical': 8,
+    'high': 4,
+    'medium': 2,
+    'low': 1
+}
+
+# 各优先级扣费后令牌桶须保留的容量比例，预算紧张时低优先级请求先降级
+DEFAULT_PRIORITY_RESERVE = {
+    'critical': 0.0,
+    'high': 0.0,
+    'medium': 0.2,
+    'low': 0.5
+}
+
+class BudgetTokenBucket:
+    """以美元计的预算令牌桶"""
+
+    def __init__(self, daily_limit: float, capacity: float, budget_manager=None,
+                 burn_window: float = 3600.0, refresh_interval: float = 5.0):
+        """
+        初始化令牌桶
+
+        Args:
+            daily_limit: 每日预算上限，决定可持续补充速率
+            capacity: 令牌桶容量（允许的突发消耗）
+            budget_manager: 提供剩余预算和实际消耗速率的 BudgetManager
+            burn_window: 计算实际消耗速率的时间窗口（秒）
+            refresh_interval: 重新计算补充速率的间隔（秒）
+        """
+        self.daily_limit = daily_limit
+        self.capacity = capacity
+        self.budget_manager = budget_manager
+        self.burn_window = burn_window
+        self.refresh_interval = refresh_interval
+
+        self.tokens = capacity
+        self.rate = daily_limit / 86400
+        self.burn_rate = 0.0
+        self._last_refill = time.monotonic()
+        self._last_refresh = 0.0
+
+    def _refresh_rate(self, now: float):
+        """按剩余预算和实际消耗速率更新补充速率"""
+        sustainable = self.daily_limit / 86400
+        if self.budget_manager is None:
+            self.rate = sustainable
+            return
+
+        remaining = max(0.0, self.budget_manager.config.total_budget - self.budget_manager.current_usage)
+        sustainable = min(sustainable, remaining / 86400)
+        self.burn_rate = self.budget_manager.get_burn_rate(self.burn_window)
+        # 实际消耗（包括准入层之外记录的工具等成本）高于可持续速率时按比例收紧，低于时最多放宽到 1.5 倍
+        if self.burn_rate > 0 and sustainable > 0:
+            sustainable *= min(1.5, max(0.25, sustainable / self.burn_rate))
+        self.rate = sustainable
+
+    def refill(self):
+        now = time.monotonic()
+        if now - self._last_refresh >= self.refresh_interval:
+            self._refresh_rate(now)
+            self._last_refresh = now
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def can_afford(self, amount: float, reserve: float = 0.0) -> bool:
+        """扣除 amount 后是否仍保留 reserve 比例的容量"""
+        return self.tokens - amount >= self.capacity * reserve
+
+    def consume(self, amount: float):
+        """扣费；最便宜的模式总会被准入，余额可能为负，之后的昂贵请求须等其补足"""
+        self.tokens -= amount
+
+    def settle(self, estimated: float, actual: float):
+        """按实际成本修正准入时的预估扣费"""
+        self.tokens = min(self.capacity, self.tokens + estimated - actual)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'tokens': self.tokens,
+            'capacity': self.capacity,
+            'refill_rate_per_hour': self.rate * 3600,
+            'burn_rate_per_hour': self.burn_rate * 3600
+        }
+
+@dataclass
+class AdmissionTicket:
+    """单个请求的准入记录"""
+    priority: str
+    enqueued_at: float
+    wait_time: float = 0.0
+    requested_mode: Optional[str] = None
+    mode: Optional[str] = None
+    estimated_cost: float = 0.0
+    degraded: bool = False
+    degrade_reasons: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'priority': self.priority,
+            'wait_time': self.wait_time,
+            'requested_mode': self.requested_mode,
+            'mode': self.mode,
+            'degraded': self.degraded,
+            'degrade_reasons': self.degrade_reasons
+        }
+
+class AdmissionController:
+    """加权公平优先级队列 + 按模式并发限制 + 预算令牌桶"""
+
+    def __init__(self, max_concurrent: int = 16,
+                 mode_limits: Optional[Dict[str, int]] = None,
+                 priority_weights: Optional[Dict[str, int]] = None,
+                 priority_reserve: Optional[Dict[str, float]] = None,
+                 bucket: Optional[BudgetTokenBucket] = None,
+                 wait_window: int = 500):
+        """
+        初始化准入控制器
+
+        Args:
+            max_concurrent: 同时处理的请求上限
+            mode_limits: 各处理模式的并发上限，未列出的模式不限制
+            priority_weights: 各优先级的调度权重
+            priority_reserve: 各优先级扣费后令牌桶须保留的容量比例
+            bucket: 预算令牌桶，为 None 时不做预算限速
+            wait_window: 每个优先级保留的排队时间样本数
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.mode_limits = mode_limits or {}
+        self.priority_weights = priority_weights or DEFAULT_PRIORITY_WEIGHTS
+        self.priority_reserve = priority_reserve or DEFAULT_PRIORITY_RESERVE
+        self.bucket = bucket
+
+        self._queues: Dict[str, deque] = {priority: deque() for priority in self.priority_weights}
+        # 步进调度：每个优先级的虚拟时间，出队一次前进 1/权重
+        self._pass: Dict[str, float] = {priority: 0.0 for priority in self.priority_weights}
+        self._virtual_time = 0.0
+        self._active = 0
+        self._mode_active: Dict[str, int] = {}
+
+        self._waits: Dict[str, deque] = {priority: deque(maxlen=wait_window) for priority in self.priority_weights}
+        self.stats = {
+            'admitted': 0,
+            'queued': 0,
+            'degraded': 0,
+            'degradations': {}
+        }
+
+    def _normalize_priority(self, priority: Optional[str]) -> str:
+        return priority if priority in self.priority_weights else 'medium'
+
+    # ==================== 排队 ====================
+
+    async def enter(self, priority: Optional[str]) -> AdmissionTicket:
+        """按优先级排队，获得处理名额后返回准入记录"""
+        priority = self._normalize_priority(priority)
+        ticket = AdmissionTicket(priority=priority, enqueued_at=time.monotonic())
+
+        if self._active < self.max_concurrent and not any(self._queues.values()):
+            self._active += 1
+        else:
+            self.stats['queued'] += 1
+            if not self._queues[priority]:
+                # 空闲后重新进入的优先级不能累积历史份额
+                self._pass[priority] = max(self._pass[priority], self._virtual_time)
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues[priority].append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 已获得名额后被取消，归还名额
+                    self._release_slot()
+                elif waiter in self._queues[priority]:
+                    self._queues[priority].remove(waiter)
+                raise
+
+        ticket.wait_time = time.monotonic() - ticket.enqueued_at
+        self._waits[priority].append(ticket.wait_time)
+        self.stats['admitted'] += 1
+        return ticket
+
+    def _dispatch(self):
+        while self._active < self.max_concurrent:
+            candidates = [priority for priority, queue in self._queues.items() if queue]
+            if not candidates:
+                return
+            priority = min(candidates, key=lambda p: (self._pass[p], -self.priority_weights[p]))
+            waiter = self._queues[priority].popleft()
+            if waiter.done():
+                continue
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1.0 / self.priority_weights[priority]
+            self._active += 1
+            waiter.set_result(None)
+
+    def _release_slot(self):
+        self._active -= 1
+        self._dispatch()
+
+    def leave(self, ticket: AdmissionTicket):
+        """请求处理结束，释放模式名额和处理名额"""
+        if ticket.mode is not None:
+            self._mode_active[ticket.mode] -= 1
+        self._release_slot()
+
+    # ==================== 模式准入 ====================
+
+    def admit_mode(self, ticket: AdmissionTicket, mode: str, degrade_chain: List[str],
+                   estimate_cost: Callable[[str], float], budget_limit: Optional[float] = None) -> str:
+        """
+        为请求确定实际的处理模式
+
+        Args:
+            mode: 请求的处理模式
+            degrade_chain: 从 mode 开始按成本递减的候选模式，最后一个为兜底模式（总会被准入）
+            estimate_cost: 估算某个模式下该请求的成本
+            budget_limit: 请求自身的成本上限
+        """
+        ticket.requested_mode = mode
+        reserve = self.priority_reserve.get(ticket.priority, 0.0)
+        if self.bucket is not None:
+            self.bucket.refill()
+
+        selected = degrade_chain[-1]
+        for candidate in degrade_chain[:-1]:
+            cost = estimate_cost(candidate)
+            limit = self.mode_limits.get(candidate)
+            if limit is not None and self._mode_active.get(candidate, 0) >= limit:
+                ticket.degrade_reasons.append(f"{candidate}: 并发已满")
+            elif budget_limit is not None and cost > budget_limit:
+                ticket.degrade_reasons.append(f"{candidate}: 超出请求预算")
+            elif self.bucket is not None and not self.bucket.can_afford(cost, reserve):
+                ticket.degrade_reasons.append(f"{candidate}: 预算速率受限")
+            else:
+                selected = candidate
+                break
+
+        ticket.mode = selected
+        ticket.estimated_cost = estimate_cost(selected)
+        ticket.degraded = selected != mode
+        self._mode_active[selected] = self._mode_active.get(selected, 0) + 1
+        if self.bucket is not None:
+            self.bucket.consume(ticket.estimated_cost)
+
+        if ticket.degraded:
+            self.stats['degraded'] += 1
+            transition = f"{mode}->{selected}"
+            self.stats['degradations'][transition] = self.stats['degradations'].get(transition, 0) + 1
+            logger.info(f"⬇️ 请求降级处理: {transition} ({'; '.join(ticket.degrade_reasons)})")
+        return selected
+
+    def settle(self, ticket: AdmissionTicket, actual_cost: float):
+        """按实际成本修正令牌桶"""
+        if self.bucket is not None:
+            self.bucket.settle(ticket.estimated_cost, actual_cost)
+
+    # ==================== 统计 ====================
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def get_stats(self) -> Dict[str, Any]:
+        wait_times = {}
+        for priority, samples in self._waits.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            wait_times[priority] = {
+                'avg': sum(ordered) / len(ordered),
+                'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                'max': ordered[-1]
+            }
+        return {
+            **self.stats,
+            'active': self._active,
+            'max_concurrent': self.max_concurrent,
+            'queue_depth': self.queue_depth,
+            'queue_depth_by_priority': {priority: len(queue) for priority, queue in self._queues.items()},
+            'mode_active': dict(self._mode_active),
+            'mode_limits': dict(self.mode_limits),
+            'wait_time': wait_times,
+            'budget_bucket': self.bucket.get_stats() if self.bucket is not None else None
+        }
@@ -15,9 +15,11 @@ Enhanced AICore 3.0 Fusion - 融合版AICore系统
 import asyncio
 import json
 import logging
+import os
+import sys
 import time
 from typing import Dict, Any, Optional, List, Tuple, Union
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from enum import Enum
 import uuid
 
@@ -46,6 +48,9 @@ except ImportError:
 # 导入新增的融合组件
 from enhanced_budget_management import BudgetManager, BudgetConfig, CostType, BudgetPeriod, AlertLevel
 from smart_tool_engine import SmartToolEngine, AIDecisionEngine, DecisionType
+from hedged_execution import HedgedExecutor
+from admission_control import AdmissionController, BudgetTokenBucket
+from pipeline_tracing import get_tracer, traced
 
 # 尝试导入Claude SDK，如果失败则使用模拟版本
 try:
@@ -59,6 +64,13 @@ except ImportError:
         async def analyze_scenario(self, content: str) -> str:
             return f"模拟Claude分析结果: {content}"
 
+# 共享的LLM响应缓存（可选），命中率和节省的成本回馈到预算管理器
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'components', 'mcp', 'shared'))
+try:
+    from llm_response_cache import get_shared_response_cache
+except ImportError:
+    get_shared_response_cache = None
+
 logger = logging.getLogger(__name__)
 
 class ProcessingMode(Enum):
@@ -69,6 +81,15 @@ class ProcessingMode(Enum):
     COST_OPTIMIZED = "cost_optimized"  # 成本优化模式
     AI_DRIVEN = "ai_driven"    # 100% AI驱动模式
 
+# 各处理模式的基础成本
+MODE_BASE_COSTS = {
+    ProcessingMode.SIMPLE: 0.005,
+    ProcessingMode.STANDARD: 0.015,
+    ProcessingMode.DEEP: 0.05,
+    ProcessingMode.COST_OPTIMIZED: 0.008,
+    ProcessingMode.AI_DRIVEN: 0.02
+}
+
 @dataclass
 class FusionConfig:
     """融合系统配置"""
@@ -89,6 +110,24 @@ class FusionConfig:
     enable_expert_system: bool = True
     enable_claude_sdk: bool = True
     
+    # 混合处理对冲配置
+    hybrid_quality_threshold: float = 0.8  # 结果达到该质量分数即返回并取消其余策略
+    hybrid_hedge_percentile: float = 0.95  # 主策略超过该延迟分位数仍未返回时启动备用策略
+    hybrid_default_hedge_delay: float = 1.0  # 延迟样本不足时的对冲等待时间（秒）
+    hybrid_min_samples: int = 20  # 使用历史分位数所需的最少样本数
+    
+    # 准入控制配置
+    max_concurrent_requests: int = 16  # 同时处理的请求上限，超出的请求按优先级加权公平排队
+    mode_concurrency_limits: Dict[str, int] = field(default_factory=lambda: {
+        'deep': 2, 'ai_driven': 4, 'standard': 8, 'cost_optimized': 8
+    })  # 各处理模式的并发上限，满额时降级到更便宜的模式
+    budget_burst_ratio: float = 0.1  # 预算令牌桶容量占每日预算的比例
+    
+    # 追踪配置（也可通过 POWERAUTOMATION_TRACING=1 环境变量启用）
+    enable_tracing: bool = False
+    trace_sample_rate: float = 0.1  # 导出完整 trace 的请求比例，分阶段直方图统计所有请求
+    trace_export_path: Optional[str] = None  # OTLP JSON 导出文件，为空时使用 ~/.powerautomation/traces.jsonl
+    
     # 监控配置
     enable_cost_monitoring: bool = True
     enable_performance_monitoring: bool = True
@@ -118,6 +157,8 @@ class EnhancedAICore3Fusion:
             }
         )
         self.budget_manager = BudgetManager(budget_config)
+        if get_shared_response_cache is not None:
+            get_shared_response_cache().attach_budget_manager(self.budget_manager)
         
         # 初始化智能工具引擎
         self.smart_tool_engine = SmartToolEngine(self.budget_manager)
@@ -133,6 +174,34 @@ class EnhancedAICore3Fusion:
             except Exception as e:
                 logger.warning(f"Claude SDK初始化失败: {e}")
         
+        # 混合处理对冲执行器
+        self.hybrid_executor = HedgedExecutor(
+            quality_threshold=self.config.hybrid_quality_threshold,
+            hedge_percentile=self.config.hybrid_hedge_percentile,
+            default_hedge_delay=self.config.hybrid_default_hedge_delay,
+            min_samples=self.config.hybrid_min_samples
+        )
+        
+        # 请求准入控制：优先级队列、模式并发限制和预算令牌桶
+        self.admission = AdmissionController(
+            max_concurrent=self.config.max_concurrent_requests,
+            mode_limits=self.config.mode_concurrency_limits,
+            bucket=BudgetTokenBucket(
+                daily_limit=self.config.daily_budget_limit,
+                capacity=self.config.daily_budget_limit * self.config.budget_burst_ratio,
+                budget_manager=self.budget_manager
+            )
+        )
+        
+        # 分阶段追踪（进程内共享，SmartToolEngine 和 BudgetManager 的 span 挂在同一条 trace 下）
+        self.tracer = get_tracer()
+        if self.config.enable_tracing:
+            self.tracer.configure(
+                enabled=True,
+                sample_rate=self.config.trace_sample_rate,
+                export_path=self.config.trace_export_path
+            )
+        
         # 系统状态
         self.initialized = False
         self.processing_history = []
@@ -186,50 +255,97 @@ class EnhancedAICore3Fusion:
         
         start_time = time.time()
         
-        try:
-            # 阶段1: AI驱动的处理模式选择
-            processing_mode = await self._select_processing_mode(user_request)
-            
-            # 阶段2: 成本评估和预算检查
-            cost_evaluation = await self._evaluate_request_cost(user_request, processing_mode)
-            
-            # 阶段3: AI驱动的处理策略决策
-            processing_strategy = await self._decide_processing_strategy(
-                user_request, processing_mode, cost_evaluation
-            )
+        with self.tracer.span('fusion.process_request',
+                              request_id=user_request.id, priority=user_request.priority) as request_span:
+            # 按优先级排队等待处理名额
+            with self.tracer.span('fusion.admission_wait'):
+                ticket = await self.admission.enter(user_request.priority)
             
-            # 阶段4: 执行处理
-            processing_result = await self._execute_processing(
-                user_request, processing_strategy
-            )
-            
-            # 阶段5: 结果优化和质量评估
-            final_result = await self._optimize_and_evaluate_result(
-                processing_result, user_request
-            )
-            
-            # 记录性能指标
-            processing_time = time.time() - start_time
-            await self._record_performance_metrics(user_request, final_result, processing_time)
-            
-            return {
-                'success': True,
-                'result': final_result,
-                'processing_time': processing_time,
-                'cost_used': final_result.get('cost', 0.0),
-                'quality_score': final_result.get('quality_score', 0.0),
-                'processing_mode': processing_mode.value,
-                'budget_status': self.budget_manager.get_budget_status()
-            }
-            
-        except Exception as e:
-            logger.error(f"请求处理失败: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'processing_time': time.time() - start_time,
-                'request_id': user_request.id
-            }
+            try:
+                # 阶段1: AI驱动的处理模式选择，按模式并发和预算速率准入（必要时降级）
+                with self.tracer.span('fusion.select_mode') as span:
+                    processing_mode = await self._select_processing_mode(user_request)
+                    processing_mode = self._admit_processing_mode(ticket, user_request, processing_mode)
+                    span.set_attribute('mode', processing_mode.value)
+                    span.set_attribute('degraded', ticket.degraded)
+                
+                # 阶段2: 成本评估和预算检查
+                with self.tracer.span('fusion.evaluate_cost') as span:
+                    cost_evaluation = await self._evaluate_request_cost(user_request, processing_mode)
+                    span.set_attribute('estimated_cost', cost_evaluation['estimated_cost'])
+                
+                # 阶段3: AI驱动的处理策略决策
+                with self.tracer.span('fusion.decide_strategy') as span:
+                    processing_strategy = await self._decide_processing_strategy(
+                        user_request, processing_mode, cost_evaluation
+                    )
+                    span.set_attribute('strategy', processing_strategy['selected_strategy'])
+                
+                # 阶段4: 执行处理
+                with self.tracer.span('fusion.execute') as span:
+                    processing_result = await self._execute_processing(
+                        user_request, processing_strategy
+                    )
+                    span.set_attribute('method', processing_result.get('method', 'unknown'))
+                
+                # 阶段5: 结果优化和质量评估
+                with self.tracer.span('fusion.optimize_result'):
+                    final_result = await self._optimize_and_evaluate_result(
+                        processing_result, user_request
+                    )
+                
+                # 记录性能指标
+                processing_time = time.time() - start_time
+                await self._record_performance_metrics(user_request, final_result, processing_time)
+                self.admission.settle(ticket, final_result.get('cost', 0.0))
+                request_span.set_attribute('cost', final_result.get('cost', 0.0))
+                request_span.set_attribute('quality_score', final_result.get('quality_score', 0.0))
+                
+                return {
+                    'success': True,
+                    'result': final_result,
+                    'processing_time': processing_time,
+                    'cost_used': final_result.get('cost', 0.0),
+                    'quality_score': final_result.get('quality_score', 0.0),
+                    'processing_mode': processing_mode.value,
+                    'admission': ticket.summary(),
+                    'trace_id': request_span.trace_id,
+                    'budget_status': self.budget_manager.get_budget_status()
+                }
+                
+            except Exception as e:
+                logger.error(f"请求处理失败: {e}")
+                self.admission.settle(ticket, 0.0)
+                request_span.record_error(str(e))
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'processing_time': time.time() - start_time,
+                    'request_id': user_request.id,
+                    'trace_id': request_span.trace_id
+                }
+            finally:
+                self.admission.leave(ticket)
+    
+    def _estimate_mode_cost(self, request: UserRequest, mode: ProcessingMode) -> float:
+        """估算请求在指定模式下的成本（基础成本按内容长度调整）"""
+        return MODE_BASE_COSTS.get(mode, 0.015) * (1 + len(request.content) / 1000)
+    
+    def _admit_processing_mode(self, ticket, request: UserRequest, mode: ProcessingMode) -> ProcessingMode:
+        """按模式并发上限和预算速率确定实际处理模式，超限时降级到更便宜的模式而不拒绝"""
+        base_cost = MODE_BASE_COSTS.get(mode, 0.015)
+        degrade_chain = [mode] + sorted(
+            (m for m in MODE_BASE_COSTS if MODE_BASE_COSTS[m] < base_cost),
+            key=lambda m: MODE_BASE_COSTS[m], reverse=True
+        )
+        selected = self.admission.admit_mode(
+            ticket,
+            mode.value,
+            [m.value for m in degrade_chain],
+            lambda value: self._estimate_mode_cost(request, ProcessingMode(value)),
+            budget_limit=request.budget_limit
+        )
+        return ProcessingMode(selected)
     
     async def _select_processing_mode(self, request: UserRequest) -> ProcessingMode:
         """AI驱动的处理模式选择"""
@@ -285,7 +401,11 @@ class EnhancedAICore3Fusion:
             constraints={'budget_limit': request.budget_limit}
         )
         
-        selected_mode = ProcessingMode(decision.selected_option)
+        try:
+            selected_mode = ProcessingMode(decision.selected_option)
+        except ValueError:
+            # 决策结果不是有效的处理模式时使用标准模式
+            selected_mode = ProcessingMode.STANDARD
         logger.info(f"🎯 AI选择处理模式: {selected_mode.value} (置信度: {decision.confidence})")
         
         return selected_mode
@@ -294,15 +414,7 @@ class EnhancedAICore3Fusion:
         """评估请求成本"""
         
         # 基于处理模式的成本评估
-        base_costs = {
-            ProcessingMode.SIMPLE: 0.005,
-            ProcessingMode.STANDARD: 0.015,
-            ProcessingMode.DEEP: 0.05,
-            ProcessingMode.COST_OPTIMIZED: 0.008,
-            ProcessingMode.AI_DRIVEN: 0.02
-        }
-        
-        base_cost = base_costs.get(mode, 0.015)
+        base_cost = MODE_BASE_COSTS.get(mode, 0.015)
         
         # 复杂度调整
         complexity_multiplier = 1 + (len(request.content) / 1000)
@@ -401,6 +513,7 @@ class EnhancedAICore3Fusion:
         else:
             return await self._execute_default_processing(request)
     
+    @traced('fusion.strategy.expert_system')
     async def _execute_expert_system_processing(self, request: UserRequest) -> Dict[str, Any]:
         """执行专家系统处理"""
         # 模拟专家系统处理
@@ -418,6 +531,7 @@ class EnhancedAICore3Fusion:
             }
         }
     
+    @traced('fusion.strategy.claude_sdk')
     async def _execute_claude_sdk_processing(self, request: UserRequest) -> Dict[str, Any]:
         """执行Claude SDK处理"""
         if not self.claude_sdk:
@@ -425,7 +539,8 @@ class EnhancedAICore3Fusion:
         
         try:
             # 使用Claude SDK处理
-            result = await self.claude_sdk.analyze_scenario(request.content)
+            with self.tracer.span('claude_sdk.analyze_scenario', content_length=len(request.content)):
+                result = await self.claude_sdk.analyze_scenario(request.content)
             
             return {
                 'result': result,
@@ -442,6 +557,7 @@ class EnhancedAICore3Fusion:
             logger.error(f"Claude SDK处理失败: {e}")
             return await self._execute_default_processing(request)
     
+    @traced('fusion.strategy.smart_tools')
     async def _execute_smart_tools_processing(self, request: UserRequest) -> Dict[str, Any]:
         """执行智能工具处理"""
         try:
@@ -464,40 +580,36 @@ class EnhancedAICore3Fusion:
             logger.error(f"智能工具处理失败: {e}")
             return await self._execute_default_processing(request)
     
+    @traced('fusion.strategy.hybrid')
     async def _execute_hybrid_processing(self, request: UserRequest) -> Dict[str, Any]:
-        """执行混合处理"""
-        # 组合多种处理方式
-        results = []
-        
-        # 并行执行多种方法
-        tasks = [
-            self._execute_claude_sdk_processing(request),
-            self._execute_smart_tools_processing(request)
-        ]
-        
-        completed_results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # 聚合结果
-        valid_results = [r for r in completed_results if isinstance(r, dict) and 'result' in r]
+        """执行混合处理 - 对冲执行，首个达到质量阈值的结果即返回"""
+        # Claude SDK 为主策略，超过其延迟分位数仍未返回或结果未达阈值时启动智能工具
+        outcome = await self.hybrid_executor.run([
+            ('claude_sdk', lambda: self._execute_claude_sdk_processing(request)),
+            ('smart_tools', lambda: self._execute_smart_tools_processing(request))
+        ])
+        
+        if outcome.result is None:
+            return await self._execute_default_processing(request)
         
-        if valid_results:
-            # 选择质量最高的结果
-            best_result = max(valid_results, key=lambda x: x.get('quality_score', 0))
-            
-            return {
-                'result': best_result['result'],
-                'method': 'hybrid',
-                'quality_score': 0.95,
-                'cost': sum(r.get('cost', 0) for r in valid_results) * 0.8,  # 混合处理成本优化
-                'processing_details': {
-                    'methods_used': [r.get('method', 'unknown') for r in valid_results],
-                    'best_method': best_result.get('method', 'unknown'),
-                    'aggregated_results': len(valid_results)
-                }
+        return {
+            'result': outcome.result['result'],
+            'method': 'hybrid',
+            'quality_score': outcome.result.get('quality_score', 0.0),
+            # 只计算实际完成的策略成本，被取消的策略不计费
+            'cost': outcome.consumed_cost,
+            'processing_details': {
+                'methods_used': [r.get('method', 'unknown') for r in outcome.completed.values()],
+                'best_method': outcome.result.get('method', 'unknown'),
+                'aggregated_results': len(outcome.completed),
+                'strategies_launched': outcome.launched,
+                'strategies_cancelled': outcome.cancelled,
+                'hedge_delay': outcome.hedge_delay,
+                'early_exit': outcome.early_exit
             }
-        else:
-            return await self._execute_default_processing(request)
+        }
     
+    @traced('fusion.strategy.default')
     async def _execute_default_processing(self, request: UserRequest) -> Dict[str, Any]:
         """执行默认处理"""
         await asyncio.sleep(0.1)  # 模拟处理时间
@@ -592,8 +704,8 @@ class EnhancedAICore3Fusion:
         return {
             'cpu_usage': 0.3,  # 模拟值
             'memory_usage': 0.4,
-            'active_requests': len(self.processing_history),
-            'queue_length': 0
+            'active_requests': self.admission.active,
+            'queue_length': self.admission.queue_depth
         }
     
     def _get_historical_performance(self) -> Dict[str, Any]:
@@ -608,6 +720,11 @@ class EnhancedAICore3Fusion:
             'budget_status': self.budget_manager.get_budget_status(),
             'performance_metrics': self.performance_metrics,
             'system_load': self._get_system_load(),
+            'hybrid_processing': self.hybrid_executor.get_stats(),
+            'admission': self.admission.get_stats(),
+            'tracing': self.tracer.get_stats(),
+            'tool_selection': self.smart_tool_engine.get_decision_stats(),
+            'ai_decisions': self.ai_decision_engine.get_decision_stats(),
             'components_status': {
                 'smart_tool_engine': self.smart_tool_engine.initialized if self.smart_tool_engine else False,
                 'claude_sdk': self.claude_sdk is not None,
@@ -627,7 +744,12 @@ class SimplifiedAIInterface:
         
     async def ask(self, question: str, budget_limit: float = None) -> str:
         """最简单的问答接口"""
-        result = await self.core.process_request(question)
+        result = await self.core.process_request(UserRequest(
+            id=str(uuid.uuid4()),
+            content=question,
+            context={},
+            budget_limit=budget_limit
+        ))
         
         if result['success']:
             return result['result']['result']
@@ -21,6 +21,8 @@ from enum import Enum
 from datetime import datetime, timedelta
 import uuid
 
+from pipeline_tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class CostType(Enum):
@@ -202,8 +204,12 @@ class BudgetManager:
         self.cost_by_type = {cost_type: 0.0 for cost_type in CostType}
         self.daily_usage = {}
         
+        # LLM响应缓存统计
+        self.cache_stats = {'hits': 0, 'misses': 0, 'saved_cost': 0.0}
+        
         logger.info(f"预算管理器初始化完成 - 总预算: ${config.total_budget}")
     
+    @traced('budget_manager.evaluate_task_cost')
     async def evaluate_task_cost(self, task_description: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """评估任务成本"""
         if context is None:
@@ -264,6 +270,7 @@ class BudgetManager:
         
         return recommendations
     
+    @traced('budget_manager.record_cost')
     async def record_cost(self, cost_item: CostItem) -> None:
         """记录成本"""
         self.current_usage += cost_item.amount
@@ -281,6 +288,32 @@ class BudgetManager:
         
         logger.info(f"记录成本: {cost_item.type.value} ${cost_item.amount:.4f}")
     
+    def record_cache_result(self, hit: bool, saved_cost: float = 0.0) -> None:
+        """记录LLM响应缓存的命中情况，命中时累计节省的成本（不计入已用预算）"""
+        if hit:
+            self.cache_stats['hits'] += 1
+            self.cache_stats['saved_cost'] += saved_cost
+        else:
+            self.cache_stats['misses'] += 1
+    
+    def _cache_summary(self) -> Dict[str, Any]:
+        """缓存命中率和节省成本"""
+        lookups = self.cache_stats['hits'] + self.cache_stats['misses']
+        return {
+            **self.cache_stats,
+            'hit_rate': self.cache_stats['hits'] / lookups if lookups else 0.0
+        }
+    
+    def get_burn_rate(self, window_seconds: float = 3600.0) -> float:
+        """最近 window_seconds 内的实际消耗速率（美元/秒）"""
+        cutoff = time.time() - window_seconds
+        spent = 0.0
+        for cost_item in reversed(self.cost_history):
+            if cost_item.timestamp < cutoff:
+                break
+            spent += cost_item.amount
+        return spent / window_seconds if window_seconds > 0 else 0.0
+    
     async def _check_alerts(self) -> None:
         """检查预警条件"""
         usage_percentage = (self.current_usage / self.config.total_budget) * 100
@@ -325,6 +358,7 @@ class BudgetManager:
             
         return recommendations
     
+    @traced('budget_manager.get_budget_status')
     def get_budget_status(self) -> Dict[str, Any]:
         """获取预算状态"""
         usage_percentage = (self.current_usage / self.config.total_budget) * 100
@@ -334,10 +368,11 @@ class BudgetManager:
             'current_usage': self.current_usage,
             'remaining_budget': self.config.total_budget - self.current_usage,
             'usage_percentage': usage_percentage,
-            'cost_by_type': dict(self.cost_by_type),
+            'cost_by_type': {cost_type.value: amount for cost_type, amount in self.cost_by_type.items()},
             'daily_usage': dict(self.daily_usage),
             'active_alerts': len([a for a in self.alerts if a.timestamp > time.time() - 3600]),
-            'risk_level': self._calculate_risk_level(usage_percentage)
+            'risk_level': self._calculate_risk_level(usage_percentage),
+            'llm_cache': self._cache_summary()
         }
     
     async def optimize_costs(self) -> Dict[str, Any]:
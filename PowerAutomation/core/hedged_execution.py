@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Hedged Execution - 对冲执行器
+
+混合处理不再同时运行所有策略并等待全部完成：
+- 先启动主策略，只有主策略在其历史延迟分位数内未返回（或返回的结果未达质量阈值）时才启动备用策略
+- 任一结果达到质量阈值即返回，并取消其余仍在运行的策略
+- 只统计实际完成（被消耗）的策略成本，被取消的策略不计费
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+StrategyFactory = Callable[[], Awaitable[Dict[str, Any]]]
+
+class LatencyTracker:
+    """按策略记录最近的执行延迟，用于计算对冲触发时间"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, name: str, latency: float):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def count(self, name: str) -> int:
+        return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """返回第 q 分位（0-1）的延迟，无样本时返回 None"""
+        samples = self._samples.get(name)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                'samples': len(samples),
+                'p50': self.percentile(name, 0.5),
+                'p95': self.percentile(name, 0.95),
+                'p99': self.percentile(name, 0.99)
+            }
+            for name, samples in self._samples.items()
+        }
+
+@dataclass
+class HedgeOutcome:
+    """对冲执行结果"""
+    result: Optional[Dict[str, Any]]  # 被采用的结果，全部失败时为 None
+    winner: Optional[str]
+    completed: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # 实际完成的策略结果
+    launched: List[str] = field(default_factory=list)
+    cancelled: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    hedge_delay: float = 0.0
+    early_exit: bool = False  # 达到质量阈值后提前返回
+    elapsed: float = 0.0
+
+    @property
+    def consumed_cost(self) -> float:
+        """实际完成的策略成本之和"""
+        return sum(result.get('cost', 0.0) for result in self.completed.values())
+
+class HedgedExecutor:
+    """对冲执行器"""
+
+    def __init__(self, quality_threshold: float = 0.8, hedge_percentile: float = 0.95,
+                 default_hedge_delay: float = 1.0, min_hedge_delay: float = 0.01,
+                 min_samples: int = 20, window: int = 200):
+        """
+        初始化对冲执行器
+
+        Args:
+            quality_threshold: 结果达到该质量分数即提前返回
+            hedge_percentile: 主策略超过该延迟分位数仍未返回时启动下一个策略
+            default_hedge_delay: 样本不足时的对冲等待时间（秒）
+            min_hedge_delay: 对冲等待时间下限（秒）
+            min_samples: 使用历史分位数所需的最少样本数
+            window: 每个策略保留的延迟样本数
+        """
+        self.quality_threshold = quality_threshold
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.latency = LatencyTracker(window)
+
+        self.stats = {
+            'executions': 0,
+            'hedged': 0,
+            'early_exits': 0,
+            'cancelled': 0,
+            'strategies_launched': 0,
+            'failures': 0
+        }
+
+    def hedge_delay(self, name: str) -> float:
+        """策略 name 的对冲触发时间"""
+        if self.latency.count(name) < self.min_samples:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, self.latency.percentile(name, self.hedge_percentile))
+
+    def _accept(self, result: Dict[str, Any]) -> bool:
+        return result.get('quality_score', 0.0) >= self.quality_threshold
+
+    async def run(self, strategies: List[Tuple[str, StrategyFactory]]) -> HedgeOutcome:
+        """
+        按顺序对冲执行策略
+
+        Args:
+            strategies: [(策略名, 返回结果字典的协程工厂)]，排在前面的优先启动
+        """
+        self.stats['executions'] += 1
+        start = time.perf_counter()
+        outcome = HedgeOutcome(result=None, winner=None)
+        queue = list(strategies)
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+
+        def launch():
+            name, factory = queue.pop(0)
+            running[asyncio.ensure_future(factory())] = (name, time.perf_counter())
+            outcome.launched.append(name)
+            self.stats['strategies_launched'] += 1
+            return name
+
+        try:
+            latest = launch()
+            while running:
+                # 还有备用策略时，只等待到最近启动策略的对冲时间
+                timeout = None
+                if queue:
+                    timeout = self.hedge_delay(latest)
+                    outcome.hedge_delay = timeout
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    latest = launch()
+                    self.stats['hedged'] += 1
+                    continue
+
+                accepted = None
+                for task in done:
+                    name, started = running.pop(task)
+                    self.latency.record(name, time.perf_counter() - started)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"⚠️ 对冲策略 {name} 失败: {e}")
+                        outcome.failed[name] = str(e)
+                        self.stats['failures'] += 1
+                        continue
+                    if not isinstance(result, dict) or 'result' not in result:
+                        outcome.failed[name] = 'invalid result'
+                        continue
+                    outcome.completed[name] = result
+                    if self._accept(result) and (
+                            accepted is None or result.get('quality_score', 0) > accepted[1].get('quality_score', 0)):
+                        accepted = (name, result)
+
+                if accepted is not None:
+                    outcome.winner, outcome.result = accepted
+                    outcome.early_exit = bool(running or queue)
+                    break
+
+                # 已完成的结果都未达阈值，立即启动下一个策略
+                if queue:
+                    latest = launch()
+                    self.stats['hedged'] += 1
+        finally:
+            # 被取消策略的延迟不计入样本：其已运行时间总是超过对冲时间，计入后分位数会逐次抬高，对冲逐渐失效
+            for task, (name, started) in running.items():
+                task.cancel()
+                outcome.cancelled.append(name)
+            if running:
+                self.stats['cancelled'] += len(running)
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if outcome.result is None and outcome.completed:
+            outcome.winner, outcome.result = max(
+                outcome.completed.items(), key=lambda item: item[1].get('quality_score', 0)
+            )
+        if outcome.early_exit:
+            self.stats['early_exits'] += 1
+        outcome.elapsed = time.perf_counter() - start
+        return outcome
+
+    def get_stats(self) -> Dict[str, Any]:
+        executions = self.stats['executions']
+        return {
+            **self.stats,
+            'avg_strategies_launched': self.stats['strategies_launched'] / executions if executions else 0.0,
+            'quality_threshold': self.quality_threshold,
+            'hedge_percentile': self.hedge_percentile,
+            'latency': self.latency.summary()
+        }
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Pipeline Tracing - 请求管线追踪
+
+为融合系统的请求处理管线提供基于 span 的分阶段追踪：
+- span 通过 contextvars 传播，asyncio 任务创建时自动继承父 span（对冲执行的策略任务也在同一条 trace 下）
+- 每个 span 名称维护一个延迟直方图，用于定位延迟来自哪个阶段
+- 在根 span 处按采样率决定是否导出，采样的 trace 以 OTLP 兼容的 JSON（每行一个 ExportTraceServiceRequest）追加到本地文件
+- 未启用时 span() 返回共享的空 span，traced 装饰器直接调用原函数，开销可以忽略
+"""
+
+import asyncio
+import atexit
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, List, Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = os.environ.get(
+    "POWERAUTOMATION_TRACE_FILE",
+    os.path.join(os.path.expanduser("~"), ".powerautomation", "traces.jsonl")
+)
+
+# 直方图桶上界（毫秒）
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# OTLP 枚举值
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("powerautomation_current_span", default=None)
+
+class LatencyHistogram:
+    """固定桶的延迟直方图，分位数在桶内线性插值估算"""
+
+    def __init__(self, buckets_ms=DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(buckets_ms)
+        self.counts = [0] * (len(self.bounds) + 1)  # 最后一个桶为溢出桶
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def record(self, duration_ms: float, error: bool = False):
+        self.counts[bisect.bisect_left(self.bounds, duration_ms)] += 1
+        self.count += 1
+        self.total += duration_ms
+        self.max = max(self.max, duration_ms)
+        if error:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            if cumulative + bucket_count >= target:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                fraction = (target - cumulative) / bucket_count
+                return min(self.max, lower + (upper - lower) * fraction)
+            cumulative += bucket_count
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+            'buckets': {
+                **{f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)},
+                'overflow': self.counts[-1]
+            }
+        }
+
+class _TraceState:
+    """一条 trace 的共享状态：是否采样、已结束的 span、仍未结束的 span 数"""
+
+    __slots__ = ('trace_id', 'sampled', 'spans', 'open')
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List['Span'] = []
+        self.open = 0
+
+class Span:
+    """单个处理阶段的 span，可用作同步或异步上下文管理器"""
+
+    __slots__ = ('tracer', 'name', 'trace', 'span_id', 'parent_id', 'attributes',
+                 'start_ns', 'duration_ns', 'error', '_start', '_token')
+
+    def __init__(self, tracer: 'PipelineTracer', name: str, trace: _TraceState,
+                 parent_id: Optional[str], attributes: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes if trace.sampled and attributes else {}
+        self.start_ns = 0
+        self.duration_ns = 0
+        self.error: Optional[str] = None
+        self._start = 0.0
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any):
+        # 未采样的 span 只进直方图，不保留属性
+        if self.trace.sampled:
+            self.attributes[key] = value
+
+    def record_error(self, message: str):
+        """标记 span 失败（用于已被捕获、不会传播到 span 之外的异常）"""
+        self.error = message
+
+    def __enter__(self):
+        self.trace.open += 1
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = int((time.perf_counter() - self._start) * 1e9)
+        if exc_type is asyncio.CancelledError:
+            self.error = "cancelled"
+        elif exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # 在其他上下文中结束（例如异步生成器被其他任务关闭）时无法恢复，直接置空
+            _current_span.set(None)
+        self.tracer._finish(self)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': SPAN_KIND_INTERNAL,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.start_ns + self.duration_ns),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': STATUS_CODE_ERROR, 'message': self.error} if self.error else {'code': STATUS_CODE_OK}
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+class _NoopSpan:
+    """追踪未启用时使用的空 span"""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_error(self, message: str):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+def current_span():
+    """当前上下文中的 span，没有时返回空 span"""
+    return _current_span.get() or NOOP_SPAN
+
+class PipelineTracer:
+    """请求管线追踪器"""
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.1,
+                 export_path: Optional[str] = None, service_name: str = "powerautomation-aicore3-fusion",
+                 export_batch_size: int = 20, buckets_ms=DEFAULT_BUCKETS_MS):
+        """
+        初始化追踪器
+
+        Args:
+            enabled: 是否启用追踪
+            sample_rate: 导出 trace 的采样率（0-1），直方图统计所有请求
+            export_path: 导出文件路径，为空时使用 DEFAULT_TRACE_FILE
+            service_name: 导出的 resource service.name
+            export_batch_size: 缓冲多少条 trace 后写入文件
+            buckets_ms: 直方图桶上界（毫秒）
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.export_path = export_path or DEFAULT_TRACE_FILE
+        self.service_name = service_name
+        self.export_batch_size = export_batch_size
+        self.buckets_ms = buckets_ms
+
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._pending: List[_TraceState] = []
+        self._lock = threading.Lock()
+        self.stats = {
+            'traces': 0,
+            'sampled': 0,
+            'exported': 0,
+            'export_errors': 0
+        }
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                  export_path: Optional[str] = None):
+        """调整追踪配置，已缓冲的 trace 先写入原文件"""
+        if export_path and export_path != self.export_path:
+            self.flush()
+            self.export_path = export_path
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if enabled is not None:
+            self.enabled = enabled
+
+    def span(self, name: str, **attributes):
+        """创建 span；当前上下文没有 span 时开启一条新的 trace"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is None:
+            trace = _TraceState(f"{random.getrandbits(128):032x}", random.random() < self.sample_rate)
+            self.stats['traces'] += 1
+            if trace.sampled:
+                self.stats['sampled'] += 1
+            return Span(self, name, trace, None, attributes)
+        return Span(self, name, parent.trace, parent.span_id, attributes)
+
+    def _finish(self, span: Span):
+        histogram = self.histograms.get(span.name)
+        if histogram is None:
+            histogram = self.histograms[span.name] = LatencyHistogram(self.buckets_ms)
+        histogram.record(span.duration_ns / 1e6, span.error is not None)
+
+        trace = span.trace
+        trace.open -= 1
+        if not trace.sampled:
+            return
+        trace.spans.append(span)
+        # 所有 span（包括仍在后台任务中运行的子 span）结束后再导出整条 trace
+        if trace.open == 0:
+            with self._lock:
+                self._pending.append(trace)
+                ready = len(self._pending) >= self.export_batch_size
+            if ready:
+                self.flush()
+
+    def flush(self):
+        """把缓冲的 trace 写入导出文件"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                directory = os.path.dirname(self.export_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.export_path, 'a', encoding='utf-8') as f:
+                    for trace in pending:
+                        f.write(json.dumps(self._to_otlp(trace), ensure_ascii=False) + "\n")
+                self.stats['exported'] += len(pending)
+            except OSError as e:
+                self.stats['export_errors'] += len(pending)
+                logger.warning(f"⚠️ trace 导出失败: {e}")
+
+    def _to_otlp(self, trace: _TraceState) -> Dict[str, Any]:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [span.to_otlp() for span in trace.spans]
+                }]
+            }]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'export_path': self.export_path,
+            'pending': len(self._pending),
+            'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()}
+        }
+
+def traced(name: Optional[str] = None):
+    """把函数（同步或异步）包装在 span 中；追踪未启用时直接调用原函数"""
+
+    def decorator(func: Callable):
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                tracer = get_tracer()
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+_shared_tracer: Optional[PipelineTracer] = None
+_shared_tracer_lock = threading.Lock()
+
+def get_tracer() -> PipelineTracer:
+    """进程内共享的追踪器，可通过 POWERAUTOMATION_TRACING / POWERAUTOMATION_TRACE_SAMPLE_RATE 环境变量启用"""
+    global _shared_tracer
+    if _shared_tracer is None:
+        with _shared_tracer_lock:
+            if _shared_tracer is None:
+                _shared_tracer = PipelineTracer(
+                    enabled=os.environ.get("POWERAUTOMATION_TRACING", "0") == "1",
+                    sample_rate=float(os.environ.get("POWERAUTOMATION_TRACE_SAMPLE_RATE", "0.1"))
+                )
+                atexit.register(_shared_tracer.flush)
+    return _shared_tracer
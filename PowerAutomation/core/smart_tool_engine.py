@@ -14,7 +14,8 @@ import asyncio
 import json
 import logging
 import time
-from typing import Dict, Any, Optional, List, Tuple, Union
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, List, Tuple, Union, Callable, Awaitable
 from dataclasses import dataclass, asdict
 from enum import Enum
 from abc import ABC, abstractmethod
@@ -22,6 +23,7 @@ import uuid
 
 # 导入预算管理系统
 from enhanced_budget_management import BudgetManager, CostItem, CostType
+from pipeline_tracing import get_tracer, traced
 
 logger = logging.getLogger(__name__)
 
@@ -266,11 +268,20 @@ class ZapierAdapter(ToolAdapter):
 class AIDecisionEngine:
     """AI驱动决策引擎"""
     
-    def __init__(self, budget_manager: Optional[BudgetManager] = None):
+    def __init__(self, budget_manager: Optional[BudgetManager] = None, history_size: int = 1000):
         self.budget_manager = budget_manager
-        self.decision_history = []
+        # 只保留最近的决策，累计统计单独维护
+        self.decision_history = deque(maxlen=history_size)
+        self.decision_stats = {
+            'total': 0,
+            'by_type': {},
+            'by_option': {},
+            'confidence_sum': 0.0,
+            'cost_impact_sum': 0.0
+        }
         self.claude_api_available = True  # 模拟Claude API可用性
         
+    @traced('ai_decision_engine.make_decision')
     async def make_decision(self, 
                           decision_type: DecisionType,
                           context: Dict[str, Any],
@@ -291,12 +302,36 @@ class AIDecisionEngine:
         decision = self._parse_decision_result(decision_analysis, options)
         
         # 记录决策历史
-        self.decision_history.append(decision)
+        self._record_decision(decision_type, decision)
         
         logger.info(f"AI决策完成: {decision.selected_option} (置信度: {decision.confidence})")
         
         return decision
     
+    def _record_decision(self, decision_type: DecisionType, decision: AIDecision):
+        """记录决策到历史环形缓冲区并更新累计统计"""
+        self.decision_history.append(decision)
+        stats = self.decision_stats
+        stats['total'] += 1
+        stats['by_type'][decision_type.value] = stats['by_type'].get(decision_type.value, 0) + 1
+        stats['by_option'][decision.selected_option] = stats['by_option'].get(decision.selected_option, 0) + 1
+        stats['confidence_sum'] += decision.confidence
+        stats['cost_impact_sum'] += decision.cost_impact
+    
+    def get_decision_stats(self) -> Dict[str, Any]:
+        """获取决策累计统计"""
+        stats = self.decision_stats
+        total = stats['total']
+        return {
+            'total_decisions': total,
+            'by_type': dict(stats['by_type']),
+            'by_option': dict(stats['by_option']),
+            'average_confidence': stats['confidence_sum'] / total if total else 0.0,
+            'total_cost_impact': stats['cost_impact_sum'],
+            'history_size': len(self.decision_history),
+            'history_limit': self.decision_history.maxlen
+        }
+    
     def _build_decision_prompt(self, 
                              decision_type: DecisionType,
                              context: Dict[str, Any],
@@ -375,10 +410,152 @@ class AIDecisionEngine:
             timestamp=time.time()
         )
 
+class ToolDecisionCache:
+    """工具选择决策缓存：按任务特征、注册表版本和预算档位缓存，TTL + LRU 淘汰，相同的在途决策合并为一次"""
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        """
+        初始化决策缓存
+        
+        Args:
+            max_entries: 最多缓存的决策数
+            ttl: 决策有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (过期时间, 选择结果, 涉及的 (平台, 能力) 集合)
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+    
+    @staticmethod
+    def make_key(task_analysis: Dict[str, Any], requirements: Dict[str, Any],
+                 registry_version: int, budget_tier: Optional[str]) -> str:
+        """由归一化的任务特征生成缓存键（关键词和具体描述不影响候选工具，不参与）"""
+        features = {
+            'task_types': sorted(task_analysis['task_types']),
+            'complexity': round(task_analysis['complexity']),
+            'priority': task_analysis['priority'],
+            'requirements': {k: v for k, v in requirements.items() if k != 'priority'},
+            'registry_version': registry_version,
+            'budget_tier': budget_tier
+        }
+        return json.dumps(features, sort_keys=True, ensure_ascii=False, default=str)
+    
+    @staticmethod
+    def _tools_of(result: Dict[str, Any]) -> set:
+        tools = {(tool.get('platform'), tool.get('capability')) for tool in result.get('alternatives', [])}
+        selected = result.get('selected_tool') or {}
+        tools.add((selected.get('platform'), selected.get('capability')))
+        return tools
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+    
+    def put(self, key: str, result: Dict[str, Any]):
+        self._entries[key] = (time.time() + self.ttl, result, self._tools_of(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    async def get_or_decide(self, key: str, decide: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """命中时返回缓存的决策；未命中时调用 decide()，相同的在途决策共享同一次调用（异常不缓存）"""
+        cached = self.get(key)
+        if cached is not None:
+            self.stats['hits'] += 1
+            return {**cached, 'cache_hit': True}
+        
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        if inflight is not None and not inflight.done() and inflight.get_loop() is loop:
+            try:
+                result = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # 领头的决策被取消，由当前调用重新发起
+                return await self.get_or_decide(key, decide)
+            self.stats['coalesced'] += 1
+            return {**result, 'cache_hit': True}
+        
+        self.stats['misses'] += 1
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            result = await decide()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if 'error' not in (result.get('selected_tool') or {}):
+                self.put(key, result)
+            return {**result, 'cache_hit': False}
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+    
+    def invalidate(self, platform: Optional[str] = None, capability: Optional[str] = None) -> int:
+        """
+        失效涉及指定平台（和能力）的决策，两者都为空时清空全部
+        
+        Returns:
+            失效的条目数
+        """
+        if platform is None and capability is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            stale = [
+                key for key, (_, _, tools) in self._entries.items()
+                if any((platform is None or tool_platform == platform) and
+                       (capability is None or tool_capability == capability)
+                       for tool_platform, tool_capability in tools)
+            ]
+            for key in stale:
+                del self._entries[key]
+            removed = len(stale)
+        self.stats['invalidations'] += removed
+        return removed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['coalesced']
+        return {
+            **self.stats,
+            'hit_rate': (self.stats['hits'] + self.stats['coalesced']) / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'inflight': len(self._inflight)
+        }
+
 class SmartToolEngine:
     """智能工具引擎"""
     
-    def __init__(self, budget_manager: Optional[BudgetManager] = None):
+    def __init__(self, budget_manager: Optional[BudgetManager] = None,
+                 decision_cache_size: int = 256, decision_cache_ttl: float = 300.0):
         self.budget_manager = budget_manager
         self.ai_decision_engine = AIDecisionEngine(budget_manager)
         
@@ -389,10 +566,14 @@ class SmartToolEngine:
             ToolPlatform.ZAPIER: ZapierAdapter()
         }
         
-        # 工具能力注册表
+        # 工具能力注册表；平台增减时版本号递增，使按旧注册表做出的决策不再命中
         self.tool_registry = {}
+        self.registry_version = 0
         self.initialized = False
         
+        # 工具选择决策缓存
+        self.decision_cache = ToolDecisionCache(decision_cache_size, decision_cache_ttl)
+        
     async def initialize(self) -> bool:
         """初始化智能工具引擎"""
         try:
@@ -402,7 +583,7 @@ class SmartToolEngine:
                 if success:
                     # 注册工具能力
                     capabilities = adapter.get_capabilities()
-                    self.tool_registry[platform] = capabilities
+                    self.register_tool_capabilities(platform, capabilities)
                     logger.info(f"{platform.value} 适配器注册成功，能力数量: {len(capabilities)}")
                 else:
                     logger.warning(f"{platform.value} 适配器初始化失败")
@@ -415,8 +596,31 @@ class SmartToolEngine:
             logger.error(f"智能工具引擎初始化失败: {e}")
             return False
     
-    async def select_optimal_tool(self, task_description: str, requirements: Dict[str, Any] = None) -> Dict[str, Any]:
-        """AI驱动的最优工具选择"""
+    def register_tool_capabilities(self, platform: ToolPlatform, capabilities: List[ToolCapability]):
+        """注册（或替换）平台的工具能力"""
+        self.tool_registry[platform] = capabilities
+        self.registry_version += 1
+    
+    def update_tool_capability(self, platform: ToolPlatform, capability_name: str, **changes) -> bool:
+        """
+        更新单个工具能力（如 cost_per_use、performance_score），只失效涉及该工具的缓存决策
+        
+        Returns:
+            是否找到并更新了该能力
+        """
+        for capability in self.tool_registry.get(platform, []):
+            if capability.name == capability_name:
+                for field_name, value in changes.items():
+                    setattr(capability, field_name, value)
+                removed = self.decision_cache.invalidate(platform.value, capability_name)
+                logger.info(f"🔄 工具能力已更新: {platform.value}/{capability_name}，失效决策缓存 {removed} 条")
+                return True
+        return False
+    
+    @traced('smart_tool_engine.select_optimal_tool')
+    async def select_optimal_tool(self, task_description: str, requirements: Dict[str, Any] = None,
+                                  use_cache: bool = True) -> Dict[str, Any]:
+        """AI驱动的最优工具选择（相同任务特征的决策会被缓存和合并）"""
         
         if not self.initialized:
             await self.initialize()
@@ -427,13 +631,31 @@ class SmartToolEngine:
         # 分析任务需求
         task_analysis = self._analyze_task_requirements(task_description, requirements)
         
+        budget_status = self.budget_manager.get_budget_status() if self.budget_manager else None
+        
+        async def decide():
+            return await self._decide_optimal_tool(task_description, requirements, task_analysis, budget_status)
+        
+        if not use_cache:
+            return {**await decide(), 'cache_hit': False}
+        
+        key = self.decision_cache.make_key(
+            task_analysis, requirements, self.registry_version,
+            budget_status['risk_level'] if budget_status else None
+        )
+        return await self.decision_cache.get_or_decide(key, decide)
+    
+    async def _decide_optimal_tool(self, task_description: str, requirements: Dict[str, Any],
+                                   task_analysis: Dict[str, Any],
+                                   budget_status: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """获取候选工具并由AI决策选择"""
+        
         # 获取候选工具
         candidate_tools = self._get_candidate_tools(task_analysis)
         
         # 评估成本约束
         cost_constraints = {}
-        if self.budget_manager:
-            budget_status = self.budget_manager.get_budget_status()
+        if budget_status is not None:
             cost_constraints = {
                 'max_cost': budget_status['remaining_budget'] * 0.1,  # 最多使用剩余预算的10%
                 'budget_risk': budget_status['risk_level']
@@ -545,6 +767,7 @@ class SmartToolEngine:
         else:
             return {'error': '没有找到合适的工具'}
     
+    @traced('smart_tool_engine.execute_with_optimal_tool')
     async def execute_with_optimal_tool(self, task_description: str, requirements: Dict[str, Any] = None) -> Dict[str, Any]:
         """使用最优工具执行任务"""
         
@@ -572,7 +795,8 @@ class SmartToolEngine:
         
         # 执行任务
         start_time = time.time()
-        execution_result = await adapter.execute_task(task_params)
+        with get_tracer().span('smart_tool_engine.adapter_execute', platform=selected_platform):
+            execution_result = await adapter.execute_task(task_params)
         execution_time = time.time() - start_time
         
         # 记录成本
@@ -597,6 +821,14 @@ class SmartToolEngine:
             'total_execution_time': execution_time,
             'cost_recorded': self.budget_manager is not None
         }
+    
+    def get_decision_stats(self) -> Dict[str, Any]:
+        """获取工具选择决策统计"""
+        return {
+            'registry_version': self.registry_version,
+            'decision_cache': self.decision_cache.get_stats(),
+            'decisions': self.ai_decision_engine.get_decision_stats()
+        }
 
 # 使用示例和测试
 async def demo_smart_tool_engine():
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+MCP 服務器 ASGI 服務模式與多工作進程啟動器
+
+Flask 版本的服務器在每個請求中新建並關閉事件循環，aiohttp 連接、緩存和後台任務都無法跨請求存活。
+ASGI 模式下每個工作進程只有一個長期運行的事件循環：
+- 組件在 lifespan 啟動階段初始化一次，關閉階段釋放
+- 同一工作進程內的出站 HTTP 請求共享一個 aiohttp 連接池
+- 多工作進程由 uvicorn 管理；保留 Flask 模式，便於基準對比
+
+用法:
+    python asgi_launcher.py dynamic --workers 4
+    python asgi_launcher.py integrated --mode flask --port 8080
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import secrets
+import socket
+import sys
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import aiohttp
+
+try:
+    import uvicorn
+    try:
+        from uvicorn.protocols.http.httptools_impl import HttpToolsProtocol as _BaseHTTPProtocol
+    except ImportError:
+        from uvicorn.protocols.http.h11_impl import H11Protocol as _BaseHTTPProtocol
+    UVICORN_AVAILABLE = True
+except ImportError:
+    _BaseHTTPProtocol = object
+    UVICORN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SERVERS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@dataclass(frozen=True)
+class ServerApp:
+    """可啟動的服務器定義"""
+    module: str
+    default_port: int
+    description: str
+    flask_init: Optional[str] = None  # Flask 模式下啟動前需運行的初始化協程
+    health_path: str = "/health"
+
+SERVER_APPS: Dict[str, ServerApp] = {
+    "domain": ServerApp(
+        module="domain_mcp_server",
+        default_port=5000,
+        description="Domain MCP 主服務器",
+        flask_init="initialize_domain_mcp_system"
+    ),
+    "dynamic": ServerApp(
+        module="fully_dynamic_mcp_server",
+        default_port=8099,
+        description="完全動態MCP服務器"
+    ),
+    "integrated": ServerApp(
+        module="fully_integrated_system",
+        default_port=8080,
+        description="完全整合智能系統"
+    )
+}
+
+# 多工作進程共享的默認 API Key（各工作進程獨立初始化 APIKeyManager，需由父進程統一生成）
+API_KEY_ENV = {
+    "POWERAUTOMATION_DEVELOPER_API_KEY": "dev_",
+    "POWERAUTOMATION_USER_API_KEY": "user_",
+    "POWERAUTOMATION_ADMIN_API_KEY": "admin_"
+}
+
+# 工作進程數，應用據此在多進程部署時禁用只寫入本進程內存的操作
+WORKERS_ENV = "POWERAUTOMATION_ASGI_WORKERS"
+
+# ==================== 共享組件 ====================
+
+def create_http_session(limit: int = 100, limit_per_host: int = 32,
+                        keepalive_timeout: float = 60.0, total_timeout: float = 120.0) -> aiohttp.ClientSession:
+    """
+    創建工作進程共享的 aiohttp 連接池，須在運行中的事件循環內調用
+
+    Args:
+        limit: 連接總數上限
+        limit_per_host: 單個主機的連接上限
+        keepalive_timeout: 空閒長連接保留時間（秒）
+        total_timeout: 單個請求的總超時（秒）
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=300
+        ),
+        timeout=aiohttp.ClientTimeout(total=total_timeout)
+    )
+
+def json_response(payload: Any, status_code: int = 200):
+    """與 Flask jsonify 對應的 JSON 響應"""
+    from fastapi.responses import JSONResponse
+    return JSONResponse(content=payload, status_code=status_code)
+
+async def read_json(request) -> Dict[str, Any]:
+    """讀取 JSON 請求體，請求體為空或格式錯誤時返回空字典"""
+    body = await request.body()
+    if not body:
+        return {}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def add_cors(app):
+    """允許跨域請求（與 Flask-CORS 默認配置一致）"""
+    from fastapi.middleware.cors import CORSMiddleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"]
+    )
+
+# ==================== 啟動器 ====================
+
+class NoDelayHTTPProtocol(_BaseHTTPProtocol):
+    """
+    為每個連接設置 TCP_NODELAY 的 HTTP 協議
+    
+    多工作進程時監聽 socket 由父進程創建（proto=0），asyncio 不會為接受的連接設置 TCP_NODELAY，
+    長連接上的小響應會觸發 Nagle 與延遲確認的交互，每個請求多出約 40ms
+    """
+    
+    def connection_made(self, transport):
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError:
+                pass
+        super().connection_made(transport)
+
+def share_default_api_keys():
+    """為未配置的默認 API Key 生成值並寫入環境變量，所有工作進程使用同一組 Key"""
+    for env_name, prefix in API_KEY_ENV.items():
+        if not os.environ.get(env_name):
+            os.environ[env_name] = prefix + secrets.token_urlsafe(32)
+
+def run_flask(spec: ServerApp, host: str, port: int):
+    """以原有 Flask 模式運行（每個請求新建事件循環）"""
+    if SERVERS_DIR not in sys.path:
+        sys.path.insert(0, SERVERS_DIR)
+    module = importlib.import_module(spec.module)
+
+    if spec.flask_init:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(getattr(module, spec.flask_init)())
+        loop.close()
+
+    logger.info(f"🌟 {spec.description} (Flask) 啟動於 http://{host}:{port}")
+    module.app.run(host=host, port=port, debug=False, threaded=True)
+
+def run_asgi(spec: ServerApp, host: str, port: int, workers: int = 1, loop: str = "auto",
+             log_level: str = "info"):
+    """以 ASGI 模式運行，每個工作進程一個長期事件循環"""
+    if not UVICORN_AVAILABLE:
+        raise RuntimeError("ASGI 模式需要安裝 uvicorn 和 fastapi")
+
+    os.environ[WORKERS_ENV] = str(workers)
+    if spec.module == SERVER_APPS["integrated"].module and workers > 1:
+        share_default_api_keys()
+        logger.warning("⚠️ 多工作進程模式下 API Key 存於各進程內存，創建和撤銷 Key 的接口將返回 409")
+
+    logger.info(f"🌟 {spec.description} (ASGI, {workers} workers) 啟動於 http://{host}:{port}")
+    uvicorn.run(
+        f"{spec.module}:create_asgi_app",
+        factory=True,
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=NoDelayHTTPProtocol,
+        lifespan="on",
+        app_dir=SERVERS_DIR,
+        access_log=False,
+        log_level=log_level
+    )
+
+def main(argv=None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="PowerAutomation MCP server launcher")
+    parser.add_argument("app", choices=sorted(SERVER_APPS), help="要啟動的服務器")
+    parser.add_argument("--mode", choices=("asgi", "flask"), default="asgi", help="服務模式")
+    parser.add_argument("--host", default="0.0.0.0", help="監聽地址")
+    parser.add_argument("--port", type=int, help="監聽端口，默認使用各服務器的原端口")
+    parser.add_argument("--workers", type=int, default=1, help="ASGI 工作進程數")
+    parser.add_argument("--loop", choices=("auto", "asyncio", "uvloop"), default="auto",
+                        help="事件循環實現，auto 在安裝 uvloop 時使用 uvloop")
+    parser.add_argument("--log-level", default="info", help="日誌級別")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    spec = SERVER_APPS[args.app]
+    port = args.port or spec.default_port
+    if args.mode == "flask":
+        if args.workers > 1:
+            logger.warning("Flask 模式不支持多工作進程，忽略 --workers")
+        run_flask(spec, args.host, port)
+    else:
+        run_asgi(spec, args.host, port, workers=max(1, args.workers), loop=args.loop,
+                 log_level=args.log_level)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,7 @@ import logging
 import sys
 import os
 import time
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any
 
 # 添加核心模組路徑
@@ -117,6 +118,128 @@ async def register_domain_mcps():
     
     logger.info(f"✅ 已註冊 {len(domain_registry.domain_mcps)} 個Domain MCP")
 
+# 預設演示請求
+DEMO_REQUESTS = {
+    'tech': "請幫我設計一個微服務架構，需要支持高並發和可擴展性",
+    'business': "我想分析一下電商平台的商業模式和盈利策略",
+    'creative': "請幫我設計一個科技公司的品牌視覺識別系統"
+}
+
+def build_classification_request(data: Dict[str, Any]) -> DomainClassificationRequest:
+    """從請求數據創建分類請求"""
+    return DomainClassificationRequest(
+        request_text=data.get('request', ''),
+        context=data.get('context', {}),
+        user_preferences=data.get('preferences', {}),
+        previous_domains=data.get('previous_domains', [])
+    )
+
+def format_classification(result) -> Dict[str, Any]:
+    """格式化分類結果"""
+    return {
+        "primary_domain": result.primary_domain,
+        "confidence": result.confidence,
+        "secondary_domains": result.secondary_domains,
+        "reasoning": result.reasoning,
+        "expert_insights": result.expert_insights
+    }
+
+def format_processing_results(results: List[DomainResult]) -> Dict[str, Any]:
+    """格式化領域處理結果"""
+    formatted_results = []
+    for result in results:
+        formatted_results.append({
+            "domain_id": result.domain_id,
+            "result_type": result.result_type,
+            "content": result.content,
+            "confidence": result.confidence,
+            "processing_time": result.processing_time,
+            "recommendations": result.recommendations,
+            "metadata": result.metadata
+        })
+    
+    return {
+        "results": formatted_results,
+        "total_domains": len(formatted_results),
+        "processing_summary": {
+            "avg_confidence": sum(r.confidence for r in results) / len(results) if results else 0,
+            "total_processing_time": sum(r.processing_time for r in results),
+            "domains_involved": [r.domain_id for r in results]
+        }
+    }
+
+def format_evolution_result(evolution_result: Dict[str, Any]) -> Dict[str, Any]:
+    """格式化自我進化結果"""
+    formatted_gaps = []
+    for gap_result in evolution_result.get('gaps', []):
+        gap = gap_result['gap']
+        adapter = gap_result['adapter']
+        invitation = gap_result['expert_invitation']
+        
+        formatted_gaps.append({
+            "gap_id": gap.gap_id,
+            "description": gap.description,
+            "severity": gap.gap_severity,
+            "current_performance": gap.current_performance,
+            "target_performance": gap.target_performance,
+            "adapter_generated": {
+                "adapter_id": adapter.adapter_id,
+                "name": adapter.name,
+                "expert_optimized": adapter.expert_optimized
+            },
+            "expert_invitation": {
+                "status": invitation['status'],
+                "expert_profile": gap.suggested_expert_profile
+            }
+        })
+    
+    return {
+        "evolution_triggered": True,
+        "gaps_identified": evolution_result['gaps_identified'],
+        "gaps": formatted_gaps,
+        "comparison": evolution_result['comparison']
+    }
+
+def format_experts(experts) -> Dict[str, Any]:
+    """格式化專家列表"""
+    formatted_experts = []
+    for expert in experts:
+        formatted_experts.append({
+            "expert_id": expert.expert_id,
+            "name": expert.name,
+            "domain_id": expert.domain_id,
+            "expertise_areas": expert.expertise_areas,
+            "credentials": expert.credentials,
+            "active": expert.active
+        })
+    
+    return {
+        "experts": formatted_experts,
+        "total_experts": len(formatted_experts)
+    }
+
+def format_demo_result(demo_type: str, request_text: str, classification_result,
+                       processing_results: List[DomainResult], evolution_result: Dict[str, Any]) -> Dict[str, Any]:
+    """格式化演示結果"""
+    return {
+        "demo_type": demo_type,
+        "request": request_text,
+        "classification": {
+            "primary_domain": classification_result.primary_domain,
+            "confidence": classification_result.confidence,
+            "reasoning": classification_result.reasoning
+        },
+        "processing": {
+            "results_count": len(processing_results),
+            "domains_involved": [r.domain_id for r in processing_results],
+            "avg_confidence": sum(r.confidence for r in processing_results) / len(processing_results) if processing_results else 0
+        },
+        "evolution": {
+            "gaps_identified": evolution_result['gaps_identified'],
+            "needs_improvement": evolution_result['comparison']['needs_improvement']
+        }
+    }
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康檢查"""
@@ -137,12 +260,7 @@ def classify_request():
             return jsonify({"error": "請求內容不能為空"}), 400
         
         # 創建分類請求
-        classification_request = DomainClassificationRequest(
-            request_text=request_text,
-            context=data.get('context', {}),
-            user_preferences=data.get('preferences', {}),
-            previous_domains=data.get('previous_domains', [])
-        )
+        classification_request = build_classification_request(data)
         
         # 執行分類
         loop = asyncio.new_event_loop()
@@ -152,13 +270,7 @@ def classify_request():
         )
         loop.close()
         
-        return jsonify({
-            "primary_domain": result.primary_domain,
-            "confidence": result.confidence,
-            "secondary_domains": result.secondary_domains,
-            "reasoning": result.reasoning,
-            "expert_insights": result.expert_insights
-        })
+        return jsonify(format_classification(result))
         
     except Exception as e:
         logger.error(f"分類請求失敗: {e}")
@@ -186,28 +298,7 @@ def process_request():
         )
         loop.close()
         
-        # 格式化結果
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                "domain_id": result.domain_id,
-                "result_type": result.result_type,
-                "content": result.content,
-                "confidence": result.confidence,
-                "processing_time": result.processing_time,
-                "recommendations": result.recommendations,
-                "metadata": result.metadata
-            })
-        
-        return jsonify({
-            "results": formatted_results,
-            "total_domains": len(formatted_results),
-            "processing_summary": {
-                "avg_confidence": sum(r.confidence for r in results) / len(results) if results else 0,
-                "total_processing_time": sum(r.processing_time for r in results),
-                "domains_involved": [r.domain_id for r in results]
-            }
-        })
+        return jsonify(format_processing_results(results))
         
     except Exception as e:
         logger.error(f"處理請求失敗: {e}")
@@ -232,36 +323,7 @@ def trigger_evolution():
         )
         loop.close()
         
-        # 格式化進化結果
-        formatted_gaps = []
-        for gap_result in evolution_result.get('gaps', []):
-            gap = gap_result['gap']
-            adapter = gap_result['adapter']
-            invitation = gap_result['expert_invitation']
-            
-            formatted_gaps.append({
-                "gap_id": gap.gap_id,
-                "description": gap.description,
-                "severity": gap.gap_severity,
-                "current_performance": gap.current_performance,
-                "target_performance": gap.target_performance,
-                "adapter_generated": {
-                    "adapter_id": adapter.adapter_id,
-                    "name": adapter.name,
-                    "expert_optimized": adapter.expert_optimized
-                },
-                "expert_invitation": {
-                    "status": invitation['status'],
-                    "expert_profile": gap.suggested_expert_profile
-                }
-            })
-        
-        return jsonify({
-            "evolution_triggered": True,
-            "gaps_identified": evolution_result['gaps_identified'],
-            "gaps": formatted_gaps,
-            "comparison": evolution_result['comparison']
-        })
+        return jsonify(format_evolution_result(evolution_result))
         
     except Exception as e:
         logger.error(f"自我進化失敗: {e}")
@@ -273,21 +335,7 @@ def get_experts():
     try:
         experts = domain_classifier.expert_registry.get_all_experts()
         
-        formatted_experts = []
-        for expert in experts:
-            formatted_experts.append({
-                "expert_id": expert.expert_id,
-                "name": expert.name,
-                "domain_id": expert.domain_id,
-                "expertise_areas": expert.expertise_areas,
-                "credentials": expert.credentials,
-                "active": expert.active
-            })
-        
-        return jsonify({
-            "experts": formatted_experts,
-            "total_experts": len(formatted_experts)
-        })
+        return jsonify(format_experts(experts))
         
     except Exception as e:
         logger.error(f"獲取專家列表失敗: {e}")
@@ -349,14 +397,7 @@ def demo_request():
         data = request.get_json()
         demo_type = data.get('type', 'tech')
         
-        # 預設演示請求
-        demo_requests = {
-            'tech': "請幫我設計一個微服務架構，需要支持高並發和可擴展性",
-            'business': "我想分析一下電商平台的商業模式和盈利策略",
-            'creative': "請幫我設計一個科技公司的品牌視覺識別系統"
-        }
-        
-        request_text = demo_requests.get(demo_type, demo_requests['tech'])
+        request_text = DEMO_REQUESTS.get(demo_type, DEMO_REQUESTS['tech'])
         
         # 1. 先進行分類
         classification_request = DomainClassificationRequest(request_text=request_text)
@@ -381,30 +422,15 @@ def demo_request():
         
         loop.close()
         
-        return jsonify({
-            "demo_type": demo_type,
-            "request": request_text,
-            "classification": {
-                "primary_domain": classification_result.primary_domain,
-                "confidence": classification_result.confidence,
-                "reasoning": classification_result.reasoning
-            },
-            "processing": {
-                "results_count": len(processing_results),
-                "domains_involved": [r.domain_id for r in processing_results],
-                "avg_confidence": sum(r.confidence for r in processing_results) / len(processing_results) if processing_results else 0
-            },
-            "evolution": {
-                "gaps_identified": evolution_result['gaps_identified'],
-                "needs_improvement": evolution_result['comparison']['needs_improvement']
-            }
-        })
+        return jsonify(format_demo_result(
+            demo_type, request_text, classification_result, processing_results, evolution_result
+        ))
         
     except Exception as e:
         logger.error(f"演示請求失敗: {e}")
         return jsonify({"error": str(e)}), 500
 
-def run_server():
+def run_server(host: str = '0.0.0.0', port: int = 5000):
     """運行服務器"""
     # 初始化系統
     loop = asyncio.new_event_loop()
@@ -424,7 +450,152 @@ def run_server():
     logger.info("  - POST /api/demo         - 演示請求處理")
     
     # 啟動Flask服務器
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    app.run(host=host, port=port, debug=False)
+
+# ==================== ASGI應用 ====================
+
+def create_asgi_app():
+    """
+    創建ASGI應用（由 asgi_launcher 按工作進程調用）
+    
+    註冊表、分類器和進化系統在 lifespan 中初始化，整個工作進程生命週期內復用同一事件循環
+    """
+    from fastapi import FastAPI, Request
+    from asgi_launcher import json_response, read_json, add_cors
+    
+    @asynccontextmanager
+    async def lifespan(asgi_app):
+        await initialize_domain_mcp_system()
+        yield
+    
+    asgi_app = FastAPI(title="Domain MCP Server", version="1.0.0", lifespan=lifespan)
+    add_cors(asgi_app)
+    
+    @asgi_app.get('/health')
+    async def health_check_asgi():
+        """健康檢查"""
+        return json_response({
+            "status": "healthy",
+            "timestamp": time.time(),
+            "version": "1.0.0"
+        })
+    
+    @asgi_app.post('/api/classify')
+    async def classify_request_asgi(request: Request):
+        """智能領域分類"""
+        try:
+            data = await read_json(request)
+            if not data.get('request', ''):
+                return json_response({"error": "請求內容不能為空"}, 400)
+            
+            result = await domain_classifier.classify_request(build_classification_request(data))
+            return json_response(format_classification(result))
+            
+        except Exception as e:
+            logger.error(f"分類請求失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.post('/api/process')
+    async def process_request_asgi(request: Request):
+        """處理領域請求"""
+        try:
+            data = await read_json(request)
+            request_text = data.get('request', '')
+            if not request_text:
+                return json_response({"error": "請求內容不能為空"}, 400)
+            
+            results = await domain_registry.process_request_with_domains(
+                request_text,
+                context=data.get('context', {})
+            )
+            return json_response(format_processing_results(results))
+            
+        except Exception as e:
+            logger.error(f"處理請求失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.post('/api/evolve')
+    async def trigger_evolution_asgi(request: Request):
+        """觸發自我進化"""
+        try:
+            data = await read_json(request)
+            request_text = data.get('request', '')
+            if not request_text:
+                return json_response({"error": "請求內容不能為空"}, 400)
+            
+            evolution_result = await evolution_system.process_request_with_evolution(
+                request_text, data.get('performance', 0.6)
+            )
+            return json_response(format_evolution_result(evolution_result))
+            
+        except Exception as e:
+            logger.error(f"自我進化失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.get('/api/experts')
+    async def get_experts_asgi():
+        """獲取專家列表"""
+        try:
+            return json_response(format_experts(domain_classifier.expert_registry.get_all_experts()))
+        except Exception as e:
+            logger.error(f"獲取專家列表失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.post('/api/experts/invite')
+    async def invite_expert_asgi(request: Request):
+        """邀請新專家"""
+        try:
+            invitation_message = await domain_classifier.invite_expert(await read_json(request))
+            return json_response({
+                "invitation_sent": True,
+                "message": invitation_message
+            })
+        except Exception as e:
+            logger.error(f"邀請專家失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.get('/api/status')
+    async def get_system_status_asgi():
+        """獲取系統狀態"""
+        try:
+            registry_status, classifier_stats, evolution_status = await asyncio.gather(
+                domain_registry.get_registry_status(),
+                domain_classifier.get_classification_statistics(),
+                evolution_system.get_evolution_status()
+            )
+            return json_response({
+                "system_status": "running",
+                "registry": registry_status,
+                "classifier": classifier_stats,
+                "evolution": evolution_status,
+                "timestamp": time.time()
+            })
+        except Exception as e:
+            logger.error(f"獲取系統狀態失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.post('/api/demo')
+    async def demo_request_asgi(request: Request):
+        """演示請求處理"""
+        try:
+            data = await read_json(request)
+            demo_type = data.get('type', 'tech')
+            request_text = DEMO_REQUESTS.get(demo_type, DEMO_REQUESTS['tech'])
+            
+            classification_result = await domain_classifier.classify_request(
+                DomainClassificationRequest(request_text=request_text)
+            )
+            processing_results = await domain_registry.process_request_with_domains(request_text)
+            evolution_result = await evolution_system.process_request_with_evolution(request_text, 0.75)
+            
+            return json_response(format_demo_result(
+                demo_type, request_text, classification_result, processing_results, evolution_result
+            ))
+        except Exception as e:
+            logger.error(f"演示請求失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    return asgi_app
 
 if __name__ == '__main__':
     run_server()
@@ -13,24 +13,64 @@ import logging
 import time
 import os
 import sys
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 
 # 添加組件路徑
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'components'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'components', 'mcp', 'shared'))
 
 # 導入Cloud Search MCP組件和Web管理界面
 from cloud_search_mcp import CloudSearchMCP, create_cloud_search_mcp
 from web_management_interface import WebManagementInterface, create_web_management_interface
 
+# 導入共享的LLM提供商客戶端
+try:
+    from llm_provider_client import LLMClientPool, RetryPolicy
+except ImportError:
+    from PowerAutomation.components.mcp.shared.llm_provider_client import LLMClientPool, RetryPolicy
+
+# 導入共享的LLM響應緩存
+try:
+    from llm_response_cache import LLMResponseCache, get_shared_response_cache
+except ImportError:
+    from PowerAutomation.components.mcp.shared.llm_response_cache import LLMResponseCache, get_shared_response_cache
+
+# 聚合專家回答的系統提示詞
+AGGREGATION_SYSTEM_PROMPT = "你是整合專家，能將多個專業觀點整合成連貫、實用的最終答案。"
+
 # 完全動態MCP核心
 class FullyDynamicMCP:
     """完全動態MCP - 零硬編碼"""
     
-    def __init__(self, llm_config: Dict[str, Any]):
+    def __init__(self, llm_config: Dict[str, Any], http_session: Optional[aiohttp.ClientSession] = None,
+                 expert_config: Dict[str, Any] = None, response_cache: Optional[LLMResponseCache] = None):
         self.llm_config = llm_config
         self.request_count = 0
         self.performance_metrics = {}
         
+        # 服務宿主注入的共享連接池（ASGI 模式），為 None 時每次調用臨時創建
+        self.http_session = http_session
+        
+        # LLM提供商客戶端：流式調用、按提供商並發限制、限流重試
+        self.llm_clients = LLMClientPool(
+            session=http_session,
+            concurrency_limits=llm_config.get("concurrency_limits"),
+            default_limit=llm_config.get("max_concurrency", 8),
+            retry_policy=RetryPolicy(**llm_config.get("retry", {}))
+        )
+        
+        # LLM響應緩存：相同的領域識別、專家和聚合提示詞直接復用已有回答；llm_config["cache"] 為 False 時停用
+        self.response_cache = response_cache or get_shared_response_cache()
+        self.cache_enabled = llm_config.get("cache", True)
+        self.cache_ttl = llm_config.get("cache_ttl")
+        
+        # 專家並發配置：同時進行的LLM調用數、每個專家的截止時間（秒）及按領域覆蓋的截止時間
+        expert_config = expert_config or {}
+        self.max_concurrent_experts = max(1, expert_config.get("max_concurrent_experts", 4))
+        self.expert_timeout = expert_config.get("expert_timeout", 30.0)
+        self.domain_timeouts: Dict[str, float] = expert_config.get("domain_timeouts", {})
+        
         # 初始化Cloud Search MCP組件
         self.cloud_search_mcp = None
         
@@ -39,81 +79,94 @@ class FullyDynamicMCP:
         try:
             # 創建Cloud Search MCP組件
             self.cloud_search_mcp = await create_cloud_search_mcp(self.llm_config)
+            self.cloud_search_mcp.http_session = self.http_session
             logging.info("Cloud Search MCP組件初始化成功")
             return True
         except Exception as e:
             logging.error(f"Cloud Search MCP組件初始化失敗: {e}")
             return False
     
-    async def call_llm(self, prompt: str, system_prompt: str = "") -> str:
-        """調用大模型API"""
+    async def call_llm(self, prompt: str, system_prompt: str = "", use_cache: bool = True) -> str:
+        """
+        調用大模型API
+        
+        Args:
+            use_cache: 為 False 時繞過響應緩存，用於需要非確定性輸出的調用
+        """
         try:
             provider = self.llm_config.get("provider", "mock")
-            
-            if provider == "openai":
-                return await self._call_openai(prompt, system_prompt)
+            return await self.response_cache.get_or_call(
+                lambda: self._invoke_llm(provider, prompt, system_prompt),
+                provider, self.llm_config.get("model", ""), prompt, system_prompt,
+                use_cache=use_cache and self.cache_enabled, ttl=self.cache_ttl
+            )
+        except Exception as e:
+            logging.error(f"LLM調用失敗: {e}")
+            return f"LLM調用失敗: {str(e)}"
+    
+    async def _invoke_llm(self, provider: str, prompt: str, system_prompt: str) -> str:
+        """按提供商實際調用大模型，失敗時拋出異常（不會被緩存）"""
+        if provider == "openai":
+            return await self._call_openai(prompt, system_prompt)
+        elif provider == "claude":
+            return await self._call_claude(prompt, system_prompt)
+        elif provider == "ollama":
+            return await self._call_ollama(prompt, system_prompt)
+        else:
+            # Mock模式 - 用於演示
+            await asyncio.sleep(0.2)
+            return await self._mock_llm_response(prompt, system_prompt)
+    
+    async def stream_llm(self, prompt: str, system_prompt: str = "", use_cache: bool = True) -> AsyncIterator[str]:
+        """流式調用大模型API，逐段返回生成的文本；緩存命中時一次返回完整回答，完整生成的回答寫入緩存"""
+        provider = self.llm_config.get("provider", "mock")
+        model = self.llm_config.get("model", "")
+        use_cache = use_cache and self.cache_enabled
+        key = None
+        if use_cache:
+            key = self.response_cache.make_key(provider, model, prompt, system_prompt)
+            cached = self.response_cache.lookup(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chunks: List[str] = []
+        try:
+            if provider in ("openai", "ollama"):
+                async for chunk in self.llm_clients.client(self.llm_config).stream(prompt, system_prompt):
+                    chunks.append(chunk)
+                    yield chunk
             elif provider == "claude":
-                return await self._call_claude(prompt, system_prompt)
-            elif provider == "ollama":
-                return await self._call_ollama(prompt, system_prompt)
+                response = await self._call_claude(prompt, system_prompt)
+                chunks.append(response)
+                yield response
             else:
-                # Mock模式 - 用於演示
+                # Mock模式 - 按行模擬流式輸出
                 await asyncio.sleep(0.2)
-                return await self._mock_llm_response(prompt, system_prompt)
-                
+                response = await self._mock_llm_response(prompt, system_prompt)
+                for line in response.splitlines(keepends=True):
+                    chunks.append(line)
+                    yield line
+                    await asyncio.sleep(0)
         except Exception as e:
-            logging.error(f"LLM調用失敗: {e}")
-            return f"LLM調用失敗: {str(e)}"
+            logging.error(f"LLM流式調用失敗: {e}")
+            yield f"LLM調用失敗: {str(e)}"
+            return
+        
+        response = "".join(chunks)
+        if key is not None and response.strip():
+            self.response_cache.put(
+                key, response, self.response_cache.estimate_cost(provider, prompt, system_prompt, response),
+                self.cache_ttl, provider, model
+            )
     
     async def _call_ollama(self, prompt: str, system_prompt: str) -> str:
         """調用Ollama本地LLM"""
-        try:
-            url = f"{self.llm_config.get('base_url', 'http://localhost:11434')}/api/generate"
-            
-            payload = {
-                "model": self.llm_config.get("model", "llama3"),
-                "prompt": f"{system_prompt}\n\n{prompt}",
-                "stream": False
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get("response", "無回應")
-                    else:
-                        return f"Ollama API錯誤: {response.status}"
-                        
-        except Exception as e:
-            return f"Ollama調用失敗: {str(e)}"
+        return await self.llm_clients.client(self.llm_config).complete(prompt, system_prompt)
     
     async def _call_openai(self, prompt: str, system_prompt: str) -> str:
         """調用OpenAI API"""
-        try:
-            url = f"{self.llm_config.get('base_url', 'https://api.openai.com')}/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.llm_config.get('api_key')}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": self.llm_config.get("model", "gpt-3.5-turbo"),
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ]
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result["choices"][0]["message"]["content"]
-                    else:
-                        return f"OpenAI API錯誤: {response.status}"
-                        
-        except Exception as e:
-            return f"OpenAI調用失敗: {str(e)}"
+        return await self.llm_clients.client(self.llm_config).complete(prompt, system_prompt)
     
     async def _call_claude(self, prompt: str, system_prompt: str) -> str:
         """調用Claude API"""
@@ -308,8 +361,84 @@ class FullyDynamicMCP:
             f"你是{domain}，具有豐富的專業知識和實踐經驗。"
         )
     
-    async def aggregate_expert_responses(self, expert_responses: List[str], user_input: str) -> str:
-        """聚合專家回答"""
+    async def _consult_expert(self, domain: str, user_input: str, search_context: str,
+                              semaphore: asyncio.Semaphore, expert_prompts: Dict[str, str],
+                              timings: Dict[str, float], timeout: float) -> str:
+        """
+        單個專家的提示詞生成和回答，每次LLM調用各自佔用一個並發名額
+        
+        截止時間在取得名額後才開始計算，排隊等待名額的時間不計入
+        """
+        start = time.time()
+        try:
+            async with semaphore:
+                expert_prompt = await asyncio.wait_for(
+                    self.generate_expert_prompt(domain, user_input, search_context), timeout
+                )
+            expert_prompts[domain] = expert_prompt
+            
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self.ask_domain_expert(domain, expert_prompt, user_input, search_context), timeout
+                )
+        finally:
+            timings[domain] = time.time() - start
+    
+    async def consult_experts(self, domains: List[str], user_input: str,
+                              search_context: str) -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Dict[str, Any]]]:
+        """
+        並發諮詢各領域專家
+        
+        各專家的提示詞生成和回答按領域獨立推進，一個領域在生成提示詞時另一個領域可以同時回答；
+        每次LLM調用在取得並發名額後受領域截止時間約束，超時的專家被取消，只聚合按時完成的回答
+        
+        Returns:
+            (專家回答, 專家提示詞, 各專家狀態 {status, elapsed, timeout})
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_experts)
+        expert_prompts: Dict[str, str] = {}
+        timings: Dict[str, float] = {}
+        
+        tasks = {}
+        for domain in domains:
+            timeout = self.domain_timeouts.get(domain, self.expert_timeout)
+            tasks[domain] = asyncio.create_task(
+                self._consult_expert(domain, user_input, search_context, semaphore, expert_prompts, timings, timeout)
+            )
+        
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        
+        responses: Dict[str, str] = {}
+        expert_status: Dict[str, Dict[str, Any]] = {}
+        for domain, task in tasks.items():
+            error = task.exception()
+            if error is None:
+                responses[domain] = task.result()
+                status = "completed"
+            elif isinstance(error, asyncio.TimeoutError):
+                status = "timeout"
+                logging.warning(f"專家 {domain} 超過截止時間，已跳過")
+            else:
+                status = "failed"
+                logging.error(f"專家 {domain} 諮詢失敗: {error}")
+            expert_status[domain] = {
+                "status": status,
+                "elapsed": timings.get(domain, 0.0),
+                "timeout": self.domain_timeouts.get(domain, self.expert_timeout)
+            }
+        
+        return responses, expert_prompts, expert_status
+    
+    def _build_aggregation_prompt(self, expert_responses: List[str], user_input: str,
+                                  missing_domains: List[str] = None) -> str:
+        """構建聚合提示詞，missing_domains 為未能按時回答的專家領域"""
+        missing_note = ""
+        if missing_domains:
+            missing_note = f"""
+以下專家未能在時限內回答：{'、'.join(missing_domains)}
+請在注意事項中說明這些方面的分析尚待補充。
+"""
+        
         aggregation_prompt = f"""
 請整合以下專家的回答，形成一個連貫、全面的最終答案：
 
@@ -317,19 +446,98 @@ class FullyDynamicMCP:
 
 專家回答：
 {chr(10).join([f"專家{i+1}: {response}" for i, response in enumerate(expert_responses)])}
-
+{missing_note}
 請提供：
 1. 綜合分析和建議
 2. 具體的實施步驟
 3. 注意事項和風險提醒
 """
+        return aggregation_prompt
+    
+    async def aggregate_expert_responses(self, expert_responses: List[str], user_input: str,
+                                         missing_domains: List[str] = None) -> str:
+        """聚合專家回答"""
+        return await self.call_llm(
+            self._build_aggregation_prompt(expert_responses, user_input, missing_domains),
+            AGGREGATION_SYSTEM_PROMPT
+        )
+    
+    async def stream_aggregate_expert_responses(self, expert_responses: List[str], user_input: str,
+                                                missing_domains: List[str] = None) -> AsyncIterator[str]:
+        """流式聚合專家回答，首段文本生成後即可開始消費"""
+        async for chunk in self.stream_llm(
+            self._build_aggregation_prompt(expert_responses, user_input, missing_domains),
+            AGGREGATION_SYSTEM_PROMPT
+        ):
+            yield chunk
+    
+    async def _prepare_answer(self, user_input: str) -> Dict[str, Any]:
+        """搜索、識別領域並諮詢專家，返回聚合前的中間結果"""
+        # 檢查Cloud Search MCP是否已初始化
+        if not self.cloud_search_mcp:
+            await self.initialize()
+        
+        # 1. 使用Cloud Search MCP組件進行搜索和分析
+        search_result = await self.cloud_search_mcp.search_and_analyze(user_input)
+        
+        # 2. 從搜索結果中獲取識別的領域，如果沒有則使用大模型識別
+        domains = search_result.domains_identified
+        if not domains:
+            domains = await self.identify_domains(user_input, search_result.result)
+        domains = list(dict.fromkeys(domains))
         
-        final_answer = await self.call_llm(
-            aggregation_prompt,
-            "你是整合專家，能將多個專業觀點整合成連貫、實用的最終答案。"
+        # 3. 並發生成專家提示詞並調用
+        responses, expert_prompts, expert_status = await self.consult_experts(
+            domains, user_input, search_result.result
         )
         
-        return final_answer
+        # 更新性能指標（按各專家自身耗時統計）
+        for domain, status in expert_status.items():
+            if domain not in self.performance_metrics:
+                self.performance_metrics[domain] = {
+                    "total_requests": 0,
+                    "total_time": 0,
+                    "avg_time": 0,
+                    "timeouts": 0
+                }
+            metrics = self.performance_metrics[domain]
+            metrics["total_requests"] += 1
+            metrics["total_time"] += status["elapsed"]
+            metrics["avg_time"] = metrics["total_time"] / metrics["total_requests"]
+            if status["status"] == "timeout":
+                metrics["timeouts"] += 1
+        
+        return {
+            "search_result": search_result,
+            "domains": domains,
+            "expert_responses": [responses[domain] for domain in domains if domain in responses],
+            "missing_domains": [domain for domain in domains if domain not in responses],
+            "expert_prompts": expert_prompts,
+            "expert_status": expert_status
+        }
+    
+    def _build_result(self, prepared: Dict[str, Any], final_answer: str, start_time: float) -> Dict[str, Any]:
+        search_result = prepared["search_result"]
+        return {
+            "final_answer": final_answer,
+            "domains_identified": prepared["domains"],
+            "expert_count": len(prepared["domains"]),
+            "experts_completed": len(prepared["expert_responses"]),
+            "experts_missing": prepared["missing_domains"],
+            "expert_status": prepared["expert_status"],
+            "expert_prompts": prepared["expert_prompts"],
+            "search_context": search_result.result,
+            "search_confidence": search_result.confidence_score,
+            "search_metadata": search_result.metadata,
+            "processing_time": time.time() - start_time,
+            "process_type": "fully_dynamic_with_cloud_search_mcp",
+            "request_count": self.request_count,
+            "cloud_search_mcp_version": self.cloud_search_mcp.version if self.cloud_search_mcp else "unknown"
+        }
+    
+    @staticmethod
+    def _no_expert_answer(missing_domains: List[str]) -> str:
+        return f"專家未能在時限內回答（{'、'.join(missing_domains)}），請稍後重試。"
     
     async def process(self, user_input: str) -> Dict[str, Any]:
         """主處理流程 - 使用新的Cloud Search MCP組件"""
@@ -337,70 +545,63 @@ class FullyDynamicMCP:
         self.request_count += 1
         
         try:
-            # 檢查Cloud Search MCP是否已初始化
-            if not self.cloud_search_mcp:
-                await self.initialize()
+            prepared = await self._prepare_answer(user_input)
             
-            # 1. 使用Cloud Search MCP組件進行搜索和分析
-            search_result = await self.cloud_search_mcp.search_and_analyze(user_input)
-            
-            # 2. 從搜索結果中獲取識別的領域，如果沒有則使用大模型識別
-            domains = search_result.domains_identified
-            if not domains:
-                domains = await self.identify_domains(user_input, search_result.result)
-            
-            # 3. 動態生成專家提示詞並調用
-            expert_responses = []
-            expert_prompts = {}
-            
-            for domain in domains:
-                expert_prompt = await self.generate_expert_prompt(
-                    domain, user_input, search_result.result
-                )
-                expert_prompts[domain] = expert_prompt
-                
-                response = await self.ask_domain_expert(
-                    domain, expert_prompt, user_input, search_result.result
+            # 4. 聚合按時完成的回答
+            if prepared["expert_responses"]:
+                final_answer = await self.aggregate_expert_responses(
+                    prepared["expert_responses"], user_input, prepared["missing_domains"]
                 )
-                expert_responses.append(response)
-            
-            # 4. 聚合回答
-            final_answer = await self.aggregate_expert_responses(expert_responses, user_input)
-            
-            processing_time = time.time() - start_time
+            else:
+                final_answer = self._no_expert_answer(prepared["missing_domains"])
             
-            # 更新性能指標
-            for domain in domains:
-                if domain not in self.performance_metrics:
-                    self.performance_metrics[domain] = {
-                        "total_requests": 0,
-                        "total_time": 0,
-                        "avg_time": 0
-                    }
-                self.performance_metrics[domain]["total_requests"] += 1
-                self.performance_metrics[domain]["total_time"] += processing_time
-                self.performance_metrics[domain]["avg_time"] = (
-                    self.performance_metrics[domain]["total_time"] / 
-                    self.performance_metrics[domain]["total_requests"]
-                )
+            return self._build_result(prepared, final_answer, start_time)
             
+        except Exception as e:
+            logging.error(f"處理失敗: {e}")
             return {
-                "final_answer": final_answer,
-                "domains_identified": domains,
-                "expert_count": len(domains),
-                "expert_prompts": expert_prompts,
-                "search_context": search_result.result,
-                "search_confidence": search_result.confidence_score,
-                "search_metadata": search_result.metadata,
-                "processing_time": processing_time,
-                "process_type": "fully_dynamic_with_cloud_search_mcp",
-                "request_count": self.request_count,
-                "cloud_search_mcp_version": self.cloud_search_mcp.version if self.cloud_search_mcp else "unknown"
+                "error": str(e),
+                "processing_time": time.time() - start_time,
+                "request_count": self.request_count
+            }
+    
+    async def process_stream(self, user_input: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式處理流程
+        
+        依次產生事件：experts（專家階段完成）、token（聚合答案片段）、done（完整結果，不含重複的答案文本）或 error
+        """
+        start_time = time.time()
+        self.request_count += 1
+        
+        try:
+            prepared = await self._prepare_answer(user_input)
+            yield {
+                "type": "experts",
+                "domains_identified": prepared["domains"],
+                "experts_missing": prepared["missing_domains"],
+                "expert_status": prepared["expert_status"]
             }
             
+            chunks: List[str] = []
+            if prepared["expert_responses"]:
+                async for chunk in self.stream_aggregate_expert_responses(
+                    prepared["expert_responses"], user_input, prepared["missing_domains"]
+                ):
+                    chunks.append(chunk)
+                    yield {"type": "token", "content": chunk}
+            else:
+                chunks.append(self._no_expert_answer(prepared["missing_domains"]))
+                yield {"type": "token", "content": chunks[0]}
+            
+            result = self._build_result(prepared, "".join(chunks), start_time)
+            result.pop("final_answer")
+            yield {"type": "done", **result}
+            
         except Exception as e:
             logging.error(f"處理失敗: {e}")
-            return {
+            yield {
+                "type": "error",
                 "error": str(e),
                 "processing_time": time.time() - start_time,
                 "request_count": self.request_count
@@ -419,6 +620,8 @@ class FullyDynamicMCP:
             "performance_metrics": self.performance_metrics,
             "cloud_search_mcp": cloud_search_metrics,
             "llm_provider": self.llm_config.get("provider", "mock"),
+            "llm_clients": self.llm_clients.get_stats(),
+            "response_cache": self.response_cache.get_stats(),
             "status": "active",
             "timestamp": time.time()
         }
@@ -430,6 +633,14 @@ CORS(app)
 # 初始化Web管理界面
 web_interface = create_web_management_interface(app)
 
+# 默認LLM配置
+DEFAULT_LLM_CONFIG = {
+    "provider": "mock",  # 可選: openai, claude, ollama, mock
+    "model": "gpt-3.5-turbo",
+    "api_key": "",
+    "base_url": ""
+}
+
 # 全局MCP實例
 _mcp_instance = None
 
@@ -437,15 +648,7 @@ async def get_mcp_instance():
     """獲取MCP實例（單例模式）"""
     global _mcp_instance
     if _mcp_instance is None:
-        # 默認配置
-        llm_config = {
-            "provider": "mock",  # 可選: openai, claude, ollama, mock
-            "model": "gpt-3.5-turbo",
-            "api_key": "",
-            "base_url": ""
-        }
-        
-        _mcp_instance = FullyDynamicMCP(llm_config)
+        _mcp_instance = FullyDynamicMCP(dict(DEFAULT_LLM_CONFIG))
         await _mcp_instance.initialize()
     
     return _mcp_instance
@@ -520,6 +723,97 @@ def health_check():
         logging.error(f"健康檢查失敗: {e}")
         return jsonify({"healthy": False, "error": str(e)}), 500
 
+# ==================== ASGI應用 ====================
+
+def create_asgi_app(llm_config: Dict[str, Any] = None):
+    """
+    創建ASGI應用（由 asgi_launcher 按工作進程調用）
+    
+    MCP實例和共享連接池在 lifespan 中創建，整個工作進程生命週期內復用同一事件循環
+    """
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+    from asgi_launcher import create_http_session, json_response, read_json, add_cors
+    
+    @asynccontextmanager
+    async def lifespan(asgi_app):
+        http_session = create_http_session()
+        mcp = FullyDynamicMCP(dict(llm_config or DEFAULT_LLM_CONFIG), http_session=http_session)
+        await mcp.initialize()
+        asgi_app.state.mcp = mcp
+        logging.info("✅ FullyDynamicMCP 已在工作進程事件循環中初始化")
+        try:
+            yield
+        finally:
+            await http_session.close()
+    
+    asgi_app = FastAPI(title="Fully Dynamic MCP Server", version="2.1.0", lifespan=lifespan)
+    add_cors(asgi_app)
+    
+    @asgi_app.post('/process')
+    async def process_request_asgi(request: Request):
+        """處理用戶請求"""
+        start_time = time.time()
+        try:
+            data = await read_json(request)
+            user_input = data.get('input', '')
+            
+            if not user_input:
+                return json_response({"error": "缺少輸入內容"}, 400)
+            
+            result = await request.app.state.mcp.process(user_input)
+            
+            # 記錄請求到Web界面
+            web_interface.record_request((time.time() - start_time) * 1000)
+            
+            return json_response(result)
+            
+        except Exception as e:
+            logging.error(f"請求處理失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.post('/process/stream')
+    async def process_stream_asgi(request: Request):
+        """流式處理用戶請求（Server-Sent Events），聚合答案逐段推送"""
+        data = await read_json(request)
+        user_input = data.get('input', '')
+        if not user_input:
+            return json_response({"error": "缺少輸入內容"}, 400)
+        
+        mcp = request.app.state.mcp
+        
+        async def events():
+            start_time = time.time()
+            async for event in mcp.process_stream(user_input):
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            web_interface.record_request((time.time() - start_time) * 1000)
+        
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    
+    @asgi_app.get('/status')
+    async def get_status_asgi(request: Request):
+        """獲取系統狀態"""
+        try:
+            return json_response(request.app.state.mcp.get_status())
+        except Exception as e:
+            logging.error(f"狀態獲取失敗: {e}")
+            return json_response({"error": str(e)}, 500)
+    
+    @asgi_app.get('/health')
+    async def health_check_asgi(request: Request):
+        """健康檢查"""
+        try:
+            mcp = request.app.state.mcp
+            if mcp.cloud_search_mcp:
+                return json_response(await mcp.cloud_search_mcp.health_check())
+            return json_response({"healthy": False, "error": "Cloud Search MCP未初始化"})
+        except Exception as e:
+            logging.error(f"健康檢查失敗: {e}")
+            return json_response({"healthy": False, "error": str(e)}, 500)
+    
+    return asgi_app
+
 if __name__ == '__main__':
     # 設置日誌
     logging.basicConfig(
@@ -533,6 +827,7 @@ if __name__ == '__main__':
     print("🔗 支持多種LLM提供商")
     print("📊 內建性能監控和健康檢查")
     print("💻 Web界面: http://localhost:8099")
+    print("⚡ ASGI多進程模式: python asgi_launcher.py dynamic --workers 4")
     
     app.run(host='0.0.0.0', port=8099, debug=True)
 
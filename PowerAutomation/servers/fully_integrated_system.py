@@ -16,7 +16,8 @@ import sys
 import os
 import hashlib
 import secrets
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Tuple
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dataclasses import dataclass, asdict
 from enum import Enum
@@ -79,10 +80,15 @@ class APIKeyManager:
         self.api_keys: Dict[str, APIKeyInfo] = {}
         self._initialize_default_keys()
     
+    @staticmethod
+    def _default_key(role: UserRole, prefix: str) -> str:
+        """默認 Key 優先讀取環境變量（多工作進程部署時各進程共享同一組 Key）"""
+        return os.environ.get(f"POWERAUTOMATION_{role.value.upper()}_API_KEY") or prefix + secrets.token_urlsafe(32)
+    
     def _initialize_default_keys(self):
         """初始化默認 API Keys"""
         # 開發者 API Key
-        dev_key = "dev_" + secrets.token_urlsafe(32)
+        dev_key = self._default_key(UserRole.DEVELOPER, "dev_")
         self.api_keys[dev_key] = APIKeyInfo(
             key=dev_key,
             role=UserRole.DEVELOPER,
@@ -91,7 +97,7 @@ class APIKeyManager:
         )
         
         # 使用者 API Key
-        user_key = "user_" + secrets.token_urlsafe(32)
+        user_key = self._default_key(UserRole.USER, "user_")
         self.api_keys[user_key] = APIKeyInfo(
             key=user_key,
             role=UserRole.USER,
@@ -100,7 +106,7 @@ class APIKeyManager:
         )
         
         # 管理員 API Key
-        admin_key = "admin_" + secrets.token_urlsafe(32)
+        admin_key = self._default_key(UserRole.ADMIN, "admin_")
         self.api_keys[admin_key] = APIKeyInfo(
             key=admin_key,
             role=UserRole.ADMIN,
@@ -168,6 +174,22 @@ class APIKeyManager:
 # 全局 API Key 管理器
 api_key_manager = APIKeyManager()
 
+def authenticate_api_key(api_key: Optional[str], allowed_roles: List[UserRole] = None) -> Tuple[Optional[APIKeyInfo], Optional[Tuple[Dict[str, Any], int]]]:
+    """驗證 API Key 和角色權限，返回 (用戶信息, 錯誤響應)"""
+    if not api_key:
+        return None, ({'error': 'API Key is required'}, 401)
+    
+    # 驗證 API Key
+    key_info = api_key_manager.validate_api_key(api_key)
+    if not key_info:
+        return None, ({'error': 'Invalid API Key'}, 401)
+    
+    # 檢查角色權限
+    if allowed_roles and key_info.role not in allowed_roles:
+        return None, ({'error': f'Access denied. Required roles: {[r.value for r in allowed_roles]}'}, 403)
+    
+    return key_info, None
+
 def require_api_key(allowed_roles: List[UserRole] = None):
     """API Key 驗證裝飾器"""
     def decorator(f):
@@ -176,17 +198,10 @@ def require_api_key(allowed_roles: List[UserRole] = None):
             # 從 Header 或 Query Parameter 獲取 API Key
             api_key = request.headers.get('X-API-Key') or request.args.get('api_key')
             
-            if not api_key:
-                return jsonify({'error': 'API Key is required'}), 401
-            
-            # 驗證 API Key
-            key_info = api_key_manager.validate_api_key(api_key)
-            if not key_info:
-                return jsonify({'error': 'Invalid API Key'}), 401
-            
-            # 檢查角色權限
-            if allowed_roles and key_info.role not in allowed_roles:
-                return jsonify({'error': f'Access denied. Required roles: {[r.value for r in allowed_roles]}'}), 403
+            key_info, error = authenticate_api_key(api_key, allowed_roles)
+            if error:
+                payload, status = error
+                return jsonify(payload), status
             
             # 將用戶信息添加到請求上下文
             request.user_info = key_info
@@ -1357,6 +1372,262 @@ def get_current_key_info():
         'active': request.user_info.active
     })
 
+# ==================== ASGI應用 ====================
+
+def create_asgi_app(config: Dict[str, Any] = None):
+    """
+    創建ASGI應用（由 asgi_launcher 按工作進程調用）
+    
+    智能系統及 SmartInvention 中間件在 lifespan 中初始化，整個工作進程生命週期內復用同一事件循環。
+    多工作進程時默認 Key 由啟動器統一生成；API Key 只存於各進程內存，
+    此時創建和撤銷 Key 的接口返回 409，避免各工作進程的 Key 不一致
+    """
+    from fastapi import FastAPI, Request
+    from asgi_launcher import json_response, read_json, add_cors
+    
+    @asynccontextmanager
+    async def lifespan(asgi_app):
+        system = FullyIntegratedIntelligentSystem(config)
+        if SMARTINVENTION_AVAILABLE:
+            await system._ensure_smartinvention_initialized()
+        asgi_app.state.system = system
+        logger.info("✅ Fully Integrated Intelligent System 已在工作進程事件循環中初始化")
+        yield
+    
+    asgi_app = FastAPI(title="Fully Integrated Intelligent System", lifespan=lifespan)
+    add_cors(asgi_app)
+    
+    def authenticate(request: Request, allowed_roles: List[UserRole]):
+        api_key = request.headers.get('X-API-Key') or request.query_params.get('api_key')
+        return authenticate_api_key(api_key, allowed_roles)
+    
+    def key_mutation_conflict():
+        workers = int(os.environ.get('POWERAUTOMATION_ASGI_WORKERS', '1') or 1)
+        if workers > 1:
+            return json_response({
+                'error': f'API Key mutation is unavailable with {workers} workers: keys are held in per-process memory. '
+                         'Restart with --workers 1 or configure keys via POWERAUTOMATION_*_API_KEY.'
+            }, 409)
+        return None
+    
+    all_roles = [UserRole.DEVELOPER, UserRole.USER, UserRole.ADMIN]
+    review_roles = [UserRole.DEVELOPER, UserRole.ADMIN]
+    
+    @asgi_app.get('/health')
+    async def health_check_asgi():
+        """健康檢查"""
+        return json_response({
+            'status': 'healthy',
+            'system_type': 'fully_integrated_intelligent_system',
+            'timestamp': time.time(),
+            'components': ['agent_core', 'tool_registry', 'action_executor'],
+            'dynamic_mcp': 'integrated'
+        })
+    
+    @asgi_app.post('/api/process')
+    async def process_request_asgi(request: Request):
+        """處理用戶請求"""
+        key_info, error = authenticate(request, all_roles)
+        if error:
+            return json_response(*error)
+        
+        try:
+            data = await read_json(request)
+            user_request = data.get('request', '')
+            if not user_request:
+                return json_response({'error': 'Request content is required'}, 400)
+            
+            result = await request.app.state.system.process_request(
+                user_request, data.get('context', {}), key_info.role
+            )
+            
+            # 添加用戶角色信息到響應
+            result['user_role'] = key_info.role.value
+            result['api_key_info'] = {
+                'name': key_info.name,
+                'usage_count': key_info.usage_count
+            }
+            return json_response(result)
+            
+        except Exception as e:
+            logger.error(f"API request processing failed: {e}")
+            return json_response({'error': str(e)}, 500)
+    
+    @asgi_app.get('/api/status')
+    async def get_status_asgi(request: Request):
+        """獲取系統狀態"""
+        return json_response(request.app.state.system.get_system_status())
+    
+    @asgi_app.get('/api/tools')
+    async def get_tools_asgi(request: Request):
+        """獲取可用工具"""
+        return json_response({
+            'tools': request.app.state.system.tool_registry.get_available_tools(),
+            'integration_level': 'full'
+        })
+    
+    @asgi_app.get('/api/stats')
+    async def get_stats_asgi(request: Request):
+        """獲取統計信息"""
+        system = request.app.state.system
+        return json_response({
+            'agent_core_stats': system.agent_core.get_stats(),
+            'execution_stats': system.action_executor.get_execution_stats(),
+            'system_stats': system.system_stats
+        })
+    
+    @asgi_app.get('/api/hitl/pending_reviews')
+    async def get_pending_reviews_asgi(request: Request):
+        """獲取待審核項目"""
+        _, error = authenticate(request, review_roles)
+        if error:
+            return json_response(*error)
+        
+        try:
+            middleware = request.app.state.system.smartinvention_middleware
+            if not middleware:
+                return json_response({'error': 'SmartInvention middleware not available'}, 503)
+            
+            pending_reviews = await middleware.get_pending_reviews()
+            return json_response({
+                'success': True,
+                'pending_reviews': pending_reviews,
+                'count': len(pending_reviews)
+            })
+        except Exception as e:
+            logger.error(f"獲取待審核項目失敗: {e}")
+            return json_response({'error': str(e)}, 500)
+    
+    @asgi_app.post('/api/hitl/submit_review')
+    async def submit_review_asgi(request: Request):
+        """提交審核結果"""
+        _, error = authenticate(request, review_roles)
+        if error:
+            return json_response(*error)
+        
+        try:
+            middleware = request.app.state.system.smartinvention_middleware
+            if not middleware:
+                return json_response({'error': 'SmartInvention middleware not available'}, 503)
+            
+            data = await read_json(request)
+            review_id = data.get('review_id')
+            status = data.get('status')
+            if not review_id or not status:
+                return json_response({'error': 'review_id and status are required'}, 400)
+            
+            success = await middleware.submit_review(
+                review_id, status, data.get('approved_recommendations', []), data.get('comments', '')
+            )
+            if not success:
+                return json_response({'error': 'Failed to submit review'}, 400)
+            
+            return json_response({
+                'success': True,
+                'message': f'審核結果已提交: {review_id}',
+                'review_id': review_id,
+                'status': status
+            })
+        except Exception as e:
+            logger.error(f"提交審核結果失敗: {e}")
+            return json_response({'error': str(e)}, 500)
+    
+    @asgi_app.get('/api/smartinvention/status')
+    async def get_smartinvention_status_asgi(request: Request):
+        """獲取 SmartInvention 狀態"""
+        key_info, error = authenticate(request, all_roles)
+        if error:
+            return json_response(*error)
+        
+        middleware = request.app.state.system.smartinvention_middleware
+        return json_response({
+            'smartinvention_available': SMARTINVENTION_AVAILABLE,
+            'middleware_initialized': middleware is not None,
+            'hitl_enabled': middleware is not None,
+            'system_type': 'smartinvention_integrated',
+            'user_role': key_info.role.value
+        })
+    
+    @asgi_app.get('/api/keys')
+    async def get_api_keys_asgi(request: Request):
+        """獲取所有 API Keys（僅管理員）"""
+        _, error = authenticate(request, [UserRole.ADMIN])
+        if error:
+            return json_response(*error)
+        
+        return json_response({
+            'api_keys': api_key_manager.get_all_keys(),
+            'total_count': len(api_key_manager.api_keys)
+        })
+    
+    @asgi_app.post('/api/keys')
+    async def create_api_key_asgi(request: Request):
+        """創建新的 API Key（僅管理員）"""
+        _, error = authenticate(request, [UserRole.ADMIN])
+        if error:
+            return json_response(*error)
+        conflict = key_mutation_conflict()
+        if conflict:
+            return conflict
+        
+        try:
+            data = await read_json(request)
+            role_str = data.get('role', 'user')
+            name = data.get('name', 'Unnamed User')
+            
+            try:
+                role = UserRole(role_str)
+            except ValueError:
+                return json_response({'error': f'Invalid role: {role_str}. Valid roles: {[r.value for r in UserRole]}'}, 400)
+            
+            new_key = api_key_manager.create_api_key(role, name)
+            return json_response({
+                'success': True,
+                'api_key': new_key,
+                'role': role.value,
+                'name': name,
+                'message': f'API Key created for {name} ({role.value})'
+            })
+        except Exception as e:
+            logger.error(f"創建 API Key 失敗: {e}")
+            return json_response({'error': str(e)}, 500)
+    
+    @asgi_app.get('/api/keys/info')
+    async def get_current_key_info_asgi(request: Request):
+        """獲取當前 API Key 信息"""
+        key_info, error = authenticate(request, all_roles)
+        if error:
+            return json_response(*error)
+        
+        return json_response({
+            'key_prefix': key_info.key[:12] + "...",
+            'role': key_info.role.value,
+            'name': key_info.name,
+            'created_at': key_info.created_at,
+            'last_used': key_info.last_used,
+            'usage_count': key_info.usage_count,
+            'active': key_info.active
+        })
+    
+    @asgi_app.delete('/api/keys/{api_key}')
+    async def revoke_api_key_asgi(api_key: str, request: Request):
+        """撤銷 API Key（僅管理員）"""
+        _, error = authenticate(request, [UserRole.ADMIN])
+        if error:
+            return json_response(*error)
+        conflict = key_mutation_conflict()
+        if conflict:
+            return conflict
+        
+        if api_key_manager.revoke_api_key(api_key):
+            return json_response({
+                'success': True,
+                'message': f'API Key revoked: {api_key[:12]}...'
+            })
+        return json_response({'error': 'API Key not found'}, 404)
+    
+    return asgi_app
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     logger.info("Starting Fully Integrated Intelligent System Server...")
@@ -7,8 +7,10 @@ Enhanced Tool Registry with Complete Smart Tool Engine Integration
 """
 
 import asyncio
+import hashlib
 import logging
 import time
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional, Union
 from enum import Enum
 import json
@@ -104,6 +106,96 @@ class SmartToolInfo(ToolInfo):
             "avg_user_satisfaction": 0.0
         }
 
+class ToolSearchCache:
+    """
+    工具搜索結果緩存
+    
+    有界 LRU，每個條目記錄生成時的註冊表代數和結果中各工具（最優工具及備選）的代數：
+    註冊新工具時全部條目過期；某個工具的統計更新只使包含該工具的條目過期。
+    未出現在結果中的工具的統計變化不會使條目失效，由 TTL 限制其陳舊時間。
+    """
+    
+    def __init__(self, registry: UnifiedToolRegistry, max_entries: int = 512, ttl: float = 300):
+        self.registry = registry
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (時間戳, 註冊表代數, {tool_id: 工具代數}, 結果)
+        self._entries: OrderedDict = OrderedDict()
+        
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def make_key(requirement: str, context: Dict) -> str:
+        """規範化的緩存鍵：context 按鍵排序序列化，與字典插入順序無關"""
+        canonical = json.dumps([requirement, context], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def _is_current(self, entry) -> bool:
+        _, generation, dependencies, _ = entry
+        if generation != self.registry.generation:
+            return False
+        tool_generations = self.registry.tool_generations
+        return all(tool_generations.get(tool_id, 0) == tool_generation
+                   for tool_id, tool_generation in dependencies.items())
+    
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        
+        if time.time() - entry[0] >= self.ttl:
+            del self._entries[key]
+            self.stats['expirations'] += 1
+            self.stats['misses'] += 1
+            return None
+        
+        if not self._is_current(entry):
+            del self._entries[key]
+            self.stats['invalidations'] += 1
+            self.stats['misses'] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return entry[3]
+    
+    def put(self, key: str, result: Dict):
+        tools = [result.get('selected_tool') or {}] + list(result.get('alternatives', []))
+        tool_generations = self.registry.tool_generations
+        dependencies = {
+            tool['id']: tool_generations.get(tool['id'], 0)
+            for tool in tools if 'id' in tool
+        }
+        self._entries[key] = (time.time(), self.registry.generation, dependencies, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'registry_generation': self.registry.generation
+        }
+
 class EnhancedToolRegistry(ToolRegistry):
     """
     增強版Tool Registry - 完整版
@@ -177,8 +269,12 @@ class EnhancedToolRegistry(ToolRegistry):
         
         # 緩存
         self.tool_cache = {}
-        self.search_cache = {}
         self.cache_ttl = 300  # 5分鐘緩存
+        self.search_cache = ToolSearchCache(
+            self.unified_registry,
+            max_entries=config.get('search_cache_size', 512),
+            ttl=self.cache_ttl
+        )
         
         logger.info("Enhanced Tool Registry initialized with complete Smart Tool Engine")
     
@@ -318,15 +414,8 @@ class EnhancedToolRegistry(ToolRegistry):
         start_time = time.time()
         
         try:
-            context = context or {}
-            
-            # 檢查緩存
-            cache_key = f"{requirement}:{hash(str(context))}"
-            if cache_key in self.search_cache:
-                cached_result = self.search_cache[cache_key]
-                if time.time() - cached_result['timestamp'] < self.cache_ttl:
-                    logger.debug(f"Returning cached result for: {requirement}")
-                    return cached_result['result']
+            # 複製後補全默認約束，不修改調用方的 context
+            context = dict(context or {})
             
             # 添加預算約束
             if 'budget' not in context:
@@ -336,6 +425,13 @@ class EnhancedToolRegistry(ToolRegistry):
             if 'performance_requirements' not in context:
                 context['performance_requirements'] = self.smart_config['performance_requirements']
             
+            # 檢查緩存（按補全後的 context 生成鍵，傳入與否默認值結果相同）
+            cache_key = self.search_cache.make_key(requirement, context)
+            cached_result = self.search_cache.get(cache_key)
+            if cached_result is not None:
+                logger.debug(f"Returning cached result for: {requirement}")
+                return cached_result
+            
             # 使用智能路由引擎選擇最優工具
             routing_result = self.routing_engine.select_optimal_tool(requirement, context)
             
@@ -347,10 +443,7 @@ class EnhancedToolRegistry(ToolRegistry):
                 self._update_selection_stats(selected_tool, context)
                 
                 # 緩存結果
-                self.search_cache[cache_key] = {
-                    'result': routing_result,
-                    'timestamp': time.time()
-                }
+                self.search_cache.put(cache_key, routing_result)
             
             # 更新平均選擇時間
             selection_time = time.time() - start_time
@@ -501,8 +594,7 @@ class EnhancedToolRegistry(ToolRegistry):
                 # 更新統計
                 self.enhanced_stats['smart_tools_discovered'] += 1
                 
-                # 清除相關緩存
-                self._clear_search_cache()
+                # 新工具使註冊表代數遞增，已緩存的搜索結果在下次查找時自動過期
                 
                 logger.info(f"Smart tool registered: {tool_id}")
                 return tool_id
@@ -570,7 +662,8 @@ class EnhancedToolRegistry(ToolRegistry):
                 'budget_status': budget_status,
                 'cache_stats': {
                     'search_cache_size': len(self.search_cache),
-                    'tool_cache_size': len(self.tool_cache)
+                    'tool_cache_size': len(self.tool_cache),
+                    'search_cache': self.search_cache.get_stats()
                 },
                 'platform_configs': {
                     platform: {'enabled': config['enabled']}
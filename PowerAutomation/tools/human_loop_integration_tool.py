@@ -21,14 +21,22 @@ import asyncio
 import json
 import logging
 import time
+from collections import deque
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 from dataclasses import dataclass, asdict
 import aiohttp
 import sqlite3
+import sys
 from pathlib import Path
 
+# 添加項目路徑
+sys.path.append(str(Path(__file__).parent.parent.parent))
+sys.path.append(str(Path(__file__).parent.parent / "components" / "human_loop_mcp"))
+
+from session_subscription import SessionEventSubscriber
+
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -78,11 +86,24 @@ class HumanLoopIntegrationTool:
         self.human_loop_mcp_url = self.config.get('human_loop_mcp_url', 'http://localhost:8096')
         self.aicore_api_url = self.config.get('aicore_api_url', 'http://localhost:8080')
         
+        # 所有人工會話共享一條事件訂閱連接
+        self.response_subscriber = SessionEventSubscriber(
+            self.human_loop_mcp_url,
+            transport=self.config.get('human_loop_transport', 'auto'),
+            status_path="/api/sessions/{session_id}/status"
+        )
+        
         # 初始化數據庫
         self._init_database()
         
         # 決策學習模型
-        self.decision_model = DecisionLearningModel(self.db_path)
+        self.decision_model = DecisionLearningModel(
+            self.db_path,
+            window=self.config.get('learning_window', 10),
+            min_samples=self.config.get('learning_min_samples', 3),
+            flush_interval=self.config.get('history_flush_interval', 5.0),
+            flush_batch_size=self.config.get('history_flush_batch_size', 50)
+        )
         
         # 專家系統
         self.expert_system = ExpertSystem()
@@ -98,6 +119,11 @@ class HumanLoopIntegrationTool:
             'database_path': 'human_loop_integration.db',
             'human_loop_mcp_url': 'http://localhost:8096',
             'aicore_api_url': 'http://localhost:8080',
+            'human_loop_transport': 'auto',
+            'learning_window': 10,
+            'learning_min_samples': 3,
+            'history_flush_interval': 5.0,
+            'history_flush_batch_size': 50,
             'decision_thresholds': {
                 'complexity_threshold': 0.7,
                 'risk_threshold': 0.6,
@@ -157,6 +183,16 @@ class HumanLoopIntegrationTool:
             )
         ''')
         
+        # 按決策類型查詢最近記錄的複合索引
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_decision_history_type_created
+            ON decision_history (decision_type, created_at)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_decision_history_created
+            ON decision_history (created_at)
+        ''')
+        
         # 創建專家調用記錄表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS expert_invocations (
@@ -467,29 +503,29 @@ class HumanLoopIntegrationTool:
     
     async def _wait_for_human_response(self, session_id: str, timeout: int = 300) -> Dict[str, Any]:
         """等待人工回應"""
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        f"{self.human_loop_mcp_url}/api/sessions/{session_id}/status"
-                    ) as response:
-                        if response.status == 200:
-                            status_data = await response.json()
-                            if status_data['status'] == 'completed':
-                                return status_data['response']
-                            elif status_data['status'] == 'cancelled':
-                                return {'choice': '拒絕執行', 'reason': '會話被取消'}
-                        
-                        # 等待5秒後重試
-                        await asyncio.sleep(5)
-            except Exception as e:
-                logger.error(f"Error checking human response: {str(e)}")
-                await asyncio.sleep(5)
+        try:
+            event = await self.response_subscriber.wait_for(session_id, timeout)
+        except Exception as e:
+            logger.error(f"Error waiting for human response: {str(e)}")
+            event = None
         
-        # 超時
-        return {'choice': '拒絕執行', 'reason': '等待超時'}
+        if event is None:
+            # 超時
+            return {'choice': '拒絕執行', 'reason': '等待超時'}
+        if event['status'] == 'completed':
+            return event['response']
+        if event['status'] == 'cancelled':
+            return {'choice': '拒絕執行', 'reason': '會話被取消'}
+        return {'choice': '拒絕執行', 'reason': '會話超時'}
+    
+    async def flush_history(self):
+        """將待寫入的工作流和決策記錄落盤"""
+        await self.decision_model.flush()
+    
+    async def close(self):
+        """關閉人工回應訂閱連接並寫入剩餘記錄"""
+        await self.response_subscriber.close()
+        await self.decision_model.close()
     
     async def _execute_with_expert(self, context: WorkflowContext, decision: Dict[str, Any]) -> Dict[str, Any]:
         """通過專家系統執行"""
@@ -543,17 +579,10 @@ class HumanLoopIntegrationTool:
                 return await self._execute_with_human_loop(context, decision)
     
     async def _record_and_learn(self, context: WorkflowContext, decision: Dict[str, Any], result: Dict[str, Any]):
-        """記錄結果並學習"""
-        # 記錄到數據庫
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """記錄結果並學習（內存統計立即更新，數據庫寫入定期批量完成）"""
+        now = datetime.now().isoformat()
         
-        # 記錄工作流
-        cursor.execute('''
-            INSERT OR REPLACE INTO workflows 
-            (id, title, description, parameters, metadata, status, decision_type, created_at, completed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        workflow_row = (
             context.workflow_id,
             context.title,
             context.description,
@@ -562,15 +591,10 @@ class HumanLoopIntegrationTool:
             'completed' if result['success'] else 'failed',
             decision['type'].value,
             context.created_at.isoformat(),
-            datetime.now().isoformat()
-        ))
+            now
+        )
         
-        # 記錄決策歷史
-        cursor.execute('''
-            INSERT INTO decision_history 
-            (workflow_id, decision_type, complexity_score, risk_score, confidence_score, success, execution_time, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        decision_row = (
             context.workflow_id,
             decision['type'].value,
             decision['complexity_score'],
@@ -578,59 +602,238 @@ class HumanLoopIntegrationTool:
             decision['confidence_score'],
             result['success'],
             result.get('execution_time', 0),
-            datetime.now().isoformat()
-        ))
-        
-        conn.commit()
-        conn.close()
+            now
+        )
         
         # 更新學習模型
-        await self.decision_model.learn_from_result(context, decision, result)
+        await self.decision_model.learn_from_result(context, decision, result,
+                                                    workflow_row=workflow_row, decision_row=decision_row)
+
+class _RollingStats:
+    """固定窗口的滾動統計（成功率、平均複雜度和風險）"""
+    
+    __slots__ = ('samples', 'successes', 'complexity_sum', 'risk_sum')
+    
+    def __init__(self, window: int):
+        self.samples: deque = deque(maxlen=window)
+        self.successes = 0
+        self.complexity_sum = 0.0
+        self.risk_sum = 0.0
+    
+    def add(self, success: bool, complexity: float, risk: float):
+        if len(self.samples) == self.samples.maxlen:
+            old_success, old_complexity, old_risk = self.samples[0]
+            self.successes -= old_success
+            self.complexity_sum -= old_complexity
+            self.risk_sum -= old_risk
+        
+        sample = (1 if success else 0, complexity or 0.0, risk or 0.0)
+        self.samples.append(sample)
+        self.successes += sample[0]
+        self.complexity_sum += sample[1]
+        self.risk_sum += sample[2]
+    
+    def __len__(self) -> int:
+        return len(self.samples)
+    
+    def confidence(self) -> float:
+        count = len(self.samples)
+        success_rate = self.successes / count
+        avg_complexity = self.complexity_sum / count
+        avg_risk = self.risk_sum / count
+        return success_rate * (1 - avg_complexity * 0.3) * (1 - avg_risk * 0.3)
 
 class DecisionLearningModel:
     """決策學習模型"""
     
-    def __init__(self, db_path: str):
+    # 統計鍵的通配值，用於從具體特徵逐級回退
+    ANY = '*'
+    
+    def __init__(self, db_path: str, window: int = 10, min_samples: int = 3,
+                 flush_interval: float = 5.0, flush_batch_size: int = 50):
+        """
+        初始化決策學習模型
+        
+        Args:
+            db_path: 數據庫路徑
+            window: 每組特徵保留的最近記錄數
+            min_samples: 使用某一級特徵統計所需的最少記錄數
+            flush_interval: 批量寫入數據庫的最長間隔（秒）
+            flush_batch_size: 待寫入記錄達到此數量時立即寫入
+        """
         self.db_path = db_path
+        self.window = window
+        self.min_samples = min_samples
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        
+        # (decision_type, workflow_type, environment) -> 滾動統計
+        self._stats: Dict[Tuple[str, str, str], _RollingStats] = {}
+        self._pending_workflows: List[Tuple] = []
+        self._pending_decisions: List[Tuple] = []
+        self._last_flush = time.time()
+        self._flush_lock = asyncio.Lock()
+        # 有待寫入記錄時運行的後台定時寫入任務
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        self._load_history()
     
-    async def predict_confidence(self, context: WorkflowContext) -> float:
-        """預測信心度"""
-        # 基於歷史數據預測
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @staticmethod
+    def _workflow_features(context: WorkflowContext) -> Tuple[str, str]:
+        metadata = context.metadata or {}
+        return (
+            str(metadata.get('workflow_type', 'unknown')),
+            str(metadata.get('environment', 'development'))
+        )
+    
+    def _keys(self, decision_type: str, workflow_type: str, environment: str) -> List[Tuple[str, str, str]]:
+        """從最具體到最寬泛的統計鍵"""
+        return [
+            (decision_type, workflow_type, environment),
+            (decision_type, workflow_type, self.ANY),
+            (decision_type, self.ANY, self.ANY)
+        ]
+    
+    def _add_sample(self, decision_type: str, workflow_type: str, environment: str,
+                    success: bool, complexity: float, risk: float):
+        for key in self._keys(decision_type, workflow_type, environment):
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _RollingStats(self.window)
+            stats.add(success, complexity, risk)
+    
+    def _load_history(self):
+        """啟動時從數據庫恢復每組特徵最近的記錄，每組只讀取模型窗口內的記錄"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            # 按 (決策類型, 工作流類型, 環境) 分組取最近 window 條；
+            # 任一類型最近的 window 條必然落在各自分組的前 window 條內，較寬泛的統計同樣完整
+            rows = conn.execute('''
+                SELECT decision_type, metadata, success, complexity_score, risk_score FROM (
+                    SELECT h.decision_type, w.metadata, h.success, h.complexity_score, h.risk_score,
+                           h.created_at, h.id,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY h.decision_type,
+                                   CASE WHEN json_valid(w.metadata) THEN json_extract(w.metadata, '$.workflow_type') END,
+                                   CASE WHEN json_valid(w.metadata) THEN json_type(w.metadata, '$.workflow_type') END,
+                                   CASE WHEN json_valid(w.metadata) THEN json_extract(w.metadata, '$.environment') END,
+                                   CASE WHEN json_valid(w.metadata) THEN json_type(w.metadata, '$.environment') END
+                               ORDER BY h.created_at DESC, h.id DESC
+                           ) AS rank
+                    FROM decision_history h LEFT JOIN workflows w ON w.id = h.workflow_id
+                )
+                WHERE rank <= ?
+                ORDER BY created_at, id
+            ''', (self.window,)).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to load decision history: {e}")
+            return
         
-        # 查找相似的工作流
-        cursor.execute('''
-            SELECT success, complexity_score, risk_score 
-            FROM decision_history 
-            WHERE decision_type = ? 
-            ORDER BY created_at DESC 
-            LIMIT 10
-        ''', ('automatic',))
+        for decision_type, metadata, success, complexity, risk in rows:
+            try:
+                metadata = json.loads(metadata) if metadata else {}
+            except (TypeError, ValueError):
+                metadata = {}
+            self._add_sample(
+                decision_type,
+                str(metadata.get('workflow_type', 'unknown')),
+                str(metadata.get('environment', 'development')),
+                bool(success), complexity, risk
+            )
+    
+    async def predict_confidence(self, context: WorkflowContext, decision_type: str = 'automatic') -> float:
+        """預測信心度（只讀內存統計，不訪問數據庫）"""
+        workflow_type, environment = self._workflow_features(context)
         
-        results = cursor.fetchall()
-        conn.close()
+        # 優先使用相同工作流特徵的統計，記錄不足時逐級回退
+        for key in self._keys(decision_type, workflow_type, environment):
+            stats = self._stats.get(key)
+            if stats is not None and len(stats) >= self.min_samples:
+                break
+        else:
+            stats = self._stats.get((decision_type, self.ANY, self.ANY))
         
-        if not results:
+        if not stats:
             return 0.5  # 默認信心度
         
-        # 計算成功率
-        success_rate = sum(1 for r in results if r[0]) / len(results)
-        
-        # 基於複雜度和風險調整
-        avg_complexity = sum(r[1] for r in results) / len(results)
-        avg_risk = sum(r[2] for r in results) / len(results)
+        return max(0.1, min(0.9, stats.confidence()))
+    
+    async def learn_from_result(self, context: WorkflowContext, decision: Dict[str, Any], result: Dict[str, Any],
+                                workflow_row: Tuple = None, decision_row: Tuple = None):
+        """從結果中學習，並將記錄加入待寫入隊列"""
+        workflow_type, environment = self._workflow_features(context)
+        self._add_sample(
+            decision['type'].value, workflow_type, environment,
+            bool(result['success']), decision.get('complexity_score', 0.0), decision.get('risk_score', 0.0)
+        )
         
-        # 簡單的信心度計算
-        confidence = success_rate * (1 - avg_complexity * 0.3) * (1 - avg_risk * 0.3)
+        if workflow_row is not None:
+            self._pending_workflows.append(workflow_row)
+        if decision_row is not None:
+            self._pending_decisions.append(decision_row)
         
-        return max(0.1, min(0.9, confidence))
+        if (len(self._pending_decisions) >= self.flush_batch_size
+                or time.time() - self._last_flush >= self.flush_interval):
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            # 流量停止時由定時任務在 flush_interval 內寫入剩餘記錄
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+    
+    async def _flush_periodically(self):
+        """有待寫入記錄時每隔 flush_interval 寫入一次，隊列清空後退出"""
+        while self._pending_workflows or self._pending_decisions:
+            delay = self._last_flush + self.flush_interval - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            # 寫入失敗的記錄放回隊列，下一個間隔重試
+            await self.flush()
     
-    async def learn_from_result(self, context: WorkflowContext, decision: Dict[str, Any], result: Dict[str, Any]):
-        """從結果中學習"""
-        # 這裡可以實現更複雜的機器學習算法
-        # 目前只是記錄數據，實際的學習在predict_confidence中進行
-        logger.info(f"Learning from workflow {context.workflow_id} result: {result['success']}")
+    async def close(self):
+        """停止定時寫入任務並寫入剩餘記錄"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+    
+    async def flush(self):
+        """在線程中批量寫入待持久化記錄，不阻塞事件循環"""
+        async with self._flush_lock:
+            workflows, self._pending_workflows = self._pending_workflows, []
+            decisions, self._pending_decisions = self._pending_decisions, []
+            self._last_flush = time.time()
+            if not workflows and not decisions:
+                return
+            
+            try:
+                await asyncio.to_thread(self._write_batch, workflows, decisions)
+            except Exception as e:
+                # 寫入失敗時放回隊列，下次重試
+                logger.error(f"Failed to persist decision history: {e}")
+                self._pending_workflows[:0] = workflows
+                self._pending_decisions[:0] = decisions
+    
+    def _write_batch(self, workflows: List[Tuple], decisions: List[Tuple]):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO workflows 
+                    (id, title, description, parameters, metadata, status, decision_type, created_at, completed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', workflows)
+                conn.executemany('''
+                    INSERT INTO decision_history 
+                    (workflow_id, decision_type, complexity_score, risk_score, confidence_score, success, execution_time, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', decisions)
+        finally:
+            conn.close()
 
 class ExpertSystem:
     """專家系統"""
@@ -835,6 +1038,7 @@ class HumanLoopIntegrationAPI:
     
     async def get_workflow_status(self, workflow_id: str) -> Dict[str, Any]:
         """獲取工作流狀態"""
+        await self.tool.flush_history()
         conn = sqlite3.connect(self.tool.db_path)
         cursor = conn.cursor()
         
@@ -860,6 +1064,7 @@ class HumanLoopIntegrationAPI:
     
     async def get_decision_history(self, limit: int = 10) -> List[Dict[str, Any]]:
         """獲取決策歷史"""
+        await self.tool.flush_history()
         conn = sqlite3.connect(self.tool.db_path)
         cursor = conn.cursor()
         
@@ -11,6 +11,7 @@ import time
 import os
 import requests
 import aiohttp
+import numpy as np
 from typing import Dict, List, Any, Optional, Union
 from pathlib import Path
 import sys
@@ -36,6 +37,133 @@ class CostType(Enum):
     PAID = "paid"
     SUBSCRIPTION = "subscription"
 
+class VocabularyBitset:
+    """字符串集合列（能力、標籤）：詞表編號 + 每行一個位集，每 64 個詞一個 uint64 字"""
+    
+    def __init__(self, capacity: int):
+        self.index: Dict[str, int] = {}
+        self.bits = np.zeros((capacity, 1), dtype=np.uint64)
+    
+    def resize(self, capacity: int, size: int):
+        bits = np.zeros((capacity, self.bits.shape[1]), dtype=np.uint64)
+        bits[:size] = self.bits[:size]
+        self.bits = bits
+    
+    def mask_of(self, indices) -> np.ndarray:
+        mask = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for index in indices:
+            mask[index // 64] |= np.uint64(1) << np.uint64(index % 64)
+        return mask
+    
+    def set_row(self, row: int, values: List[str]):
+        for value in values:
+            if value not in self.index:
+                self.index[value] = len(self.index)
+        words = (len(self.index) + 63) // 64
+        if words > self.bits.shape[1]:
+            bits = np.zeros((self.bits.shape[0], words), dtype=np.uint64)
+            bits[:, :self.bits.shape[1]] = self.bits
+            self.bits = bits
+        self.bits[row] = self.mask_of(self.index[value] for value in values)
+    
+    def count_substring_matches(self, rows: np.ndarray, query_lower: str) -> np.ndarray:
+        """每行中包含 query_lower（不分大小寫）的詞數，詞表掃描後用位集與運算計數"""
+        mask = self.mask_of(index for value, index in self.index.items() if query_lower in value.lower())
+        return np.unpackbits((self.bits[rows] & mask).view(np.uint8), axis=1).sum(axis=1)
+
+class ToolFeatureMatrix:
+    """
+    工具特徵列存儲
+    
+    每個數值特徵一列 NumPy 數組，行號對應工具註冊順序；平台和成本類型編碼為整數，
+    能力和標籤以位集存儲。註冊時寫入整行，更新統計時原地改寫性能列，路由評分直接對列做向量運算。
+    """
+    
+    FLOAT_COLUMNS = (
+        'success_rate', 'avg_response_time', 'reliability_score', 'uptime', 'throughput',
+        'security_score', 'user_rating', 'cost_per_call'
+    )
+    
+    def __init__(self, capacity: int = 256):
+        self.size = 0
+        self.capacity = capacity
+        self.tool_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.columns = {name: np.zeros(capacity) for name in self.FLOAT_COLUMNS}
+        self.is_free = np.zeros(capacity, dtype=bool)
+        self.platform = np.zeros(capacity, dtype=np.int32)
+        self.cost_type = np.zeros(capacity, dtype=np.int32)
+        self.platform_codes: Dict[str, int] = {}
+        self.cost_type_codes: Dict[str, int] = {}
+        self.capabilities = VocabularyBitset(capacity)
+        self.tags = VocabularyBitset(capacity)
+        # 小寫的名稱和描述，用於相關性匹配；註冊後重建 NumPy 字符串數組
+        self._names: List[str] = []
+        self._descriptions: List[str] = []
+        self._text_arrays = None
+    
+    def _grow(self):
+        self.capacity *= 2
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, self.capacity)
+        self.is_free = np.resize(self.is_free, self.capacity)
+        self.platform = np.resize(self.platform, self.capacity)
+        self.cost_type = np.resize(self.cost_type, self.capacity)
+        self.capabilities.resize(self.capacity, self.size)
+        self.tags.resize(self.capacity, self.size)
+    
+    @staticmethod
+    def _code(codes: Dict[str, int], value: str) -> int:
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+    
+    def upsert(self, tool: Dict):
+        """寫入（或覆蓋）工具的整行特徵"""
+        row = self.rows.get(tool["id"])
+        if row is None:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.rows[tool["id"]] = row
+            self.tool_ids.append(tool["id"])
+            self._names.append("")
+            self._descriptions.append("")
+        
+        metrics = tool["performance_metrics"]
+        for name in ('success_rate', 'avg_response_time', 'reliability_score', 'uptime', 'throughput'):
+            self.columns[name][row] = metrics[name]
+        self.columns['security_score'][row] = tool["quality_scores"]["security_score"]
+        self.columns['user_rating'][row] = tool["quality_scores"]["user_rating"]
+        self.columns['cost_per_call'][row] = tool["cost_model"]["cost_per_call"]
+        self.is_free[row] = tool["cost_model"]["type"] == "free"
+        self.platform[row] = self._code(self.platform_codes, tool["platform"])
+        self.cost_type[row] = self._code(self.cost_type_codes, tool["cost_model"]["type"])
+        self.capabilities.set_row(row, tool["capabilities"])
+        self.tags.set_row(row, tool.get("tags", []))
+        self._names[row] = tool["name"].lower()
+        self._descriptions[row] = tool["description"].lower()
+        self._text_arrays = None
+    
+    def update_performance(self, tool: Dict):
+        """原地更新工具的性能列"""
+        row = self.rows.get(tool["id"])
+        if row is None:
+            return
+        metrics = tool["performance_metrics"]
+        self.columns['success_rate'][row] = metrics["success_rate"]
+        self.columns['avg_response_time'][row] = metrics["avg_response_time"]
+    
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name][:self.size]
+    
+    def text_arrays(self):
+        """(名稱, 描述) 的 NumPy 字符串數組"""
+        if self._text_arrays is None:
+            self._text_arrays = (np.array(self._names, dtype=str), np.array(self._descriptions, dtype=str))
+        return self._text_arrays
+
 class UnifiedToolRegistry:
     """統一工具註冊表"""
     
@@ -45,6 +173,17 @@ class UnifiedToolRegistry:
         self.last_sync_time = None
         self.cost_tracker = CostTracker()
         
+        # 代數計數：註冊工具時 generation 遞增（新工具可能進入任何搜索結果），
+        # 單個工具的統計變化時只遞增該工具的代數，緩存據此廉價判斷是否過期
+        self.generation = 0
+        self.tool_generations: Dict[str, int] = {}
+        
+        # 路由評分用的列式特徵矩陣
+        self.features = ToolFeatureMatrix()
+        
+    def _touch_tool(self, tool_id: str):
+        self.tool_generations[tool_id] = self.tool_generations.get(tool_id, 0) + 1
+    
     def register_tool(self, tool_info: Dict) -> str:
         """註冊工具到統一註冊表"""
         tool_id = f"{tool_info['platform']}:{tool_info['name']}"
@@ -115,6 +254,9 @@ class UnifiedToolRegistry:
         }
         
         self.tools_db[tool_id] = unified_tool
+        self.features.upsert(unified_tool)
+        self.generation += 1
+        self._touch_tool(tool_id)
         logger.info(f"Registered tool: {tool_id}")
         return tool_id
     
@@ -221,6 +363,9 @@ class UnifiedToolRegistry:
         # 更新成功率
         success_rate = stats["successful_calls"] / stats["total_calls"]
         tool["performance_metrics"]["success_rate"] = success_rate
+        
+        self.features.update_performance(tool)
+        self._touch_tool(tool_id)
 
 class CostTracker:
     """成本追蹤器"""
@@ -284,162 +429,188 @@ class IntelligentRoutingEngine:
     
     def select_optimal_tool(self, requirement: str, context: Dict = None) -> Dict:
         """選擇最優工具"""
+        return self.select_optimal_tools_batch([requirement], context)[0]
+    
+    def select_optimal_tools_batch(self, requirements: List[str], context: Dict = None,
+                                   top_k: int = 5) -> List[Dict]:
+        """
+        為多個需求選擇最優工具
+        
+        評分只依賴 context，整個目錄的評分、過濾和預算掩碼對一批需求只計算一次；
+        需求只用於同分工具之間按相關性排序。
+        
+        Args:
+            requirements: 需求描述列表
+            context: 共享的上下文（filters、budget、priority 等）
+            top_k: 返回的最優工具加備選數
+            
+        Returns:
+            與 requirements 順序一致的選擇結果列表
+        """
         context = context or {}
         
         try:
-            # 搜索候選工具
-            candidates = self.registry.search_tools(requirement, context.get("filters", {}))
-            
-            if not candidates:
-                return {
+            features = self.registry.features
+            candidate_mask = self._filter_mask(features, context.get("filters", {}))
+            total_candidates = int(np.count_nonzero(candidate_mask))
+            if not total_candidates:
+                return [{
                     "success": False,
                     "error": "No suitable tools found",
                     "candidates": []
-                }
-            
-            # 評分和排序
-            scored_tools = []
-            for tool in candidates:
-                score = self._calculate_tool_score(tool, context)
-                scored_tools.append({
-                    "tool": tool,
-                    "score": score,
-                    "reasoning": self._generate_reasoning(tool, score, context)
-                })
-            
-            # 按分數排序
-            scored_tools.sort(key=lambda x: x["score"], reverse=True)
+                } for _ in requirements]
             
             # 檢查預算約束
+            eligible_mask = candidate_mask
             budget = context.get("budget", {})
             if budget:
-                scored_tools = self._filter_by_budget(scored_tools, budget)
-            
-            if not scored_tools:
-                return {
+                eligible_mask = candidate_mask & self._budget_mask(features, budget)
+            eligible = np.flatnonzero(eligible_mask)
+            if not len(eligible):
+                return [{
                     "success": False,
                     "error": "No tools within budget constraints",
                     "candidates": []
-                }
+                } for _ in requirements]
             
-            best_tool = scored_tools[0]
+            scores = self._score_tools(features, context)[eligible]
             
-            return {
-                "success": True,
-                "selected_tool": best_tool["tool"],
-                "confidence": best_tool["score"],
-                "reasoning": best_tool["reasoning"],
-                "alternatives": [t["tool"] for t in scored_tools[1:5]],  # 前5個備選
-                "total_candidates": len(candidates)
-            }
+            # argpartition 取前 k 名的分數門檻，門檻上的同分工具全部保留，再按相關性排序
+            k = min(top_k, len(eligible))
+            if k < len(eligible):
+                threshold = scores[np.argpartition(-scores, k - 1)[:k]].min()
+                pool = np.flatnonzero(scores >= threshold)
+            else:
+                pool = np.arange(len(eligible))
+            
+            results = []
+            for requirement in requirements:
+                relevance = self._relevance(features, eligible[pool], requirement)
+                # 依次按分數、相關性降序，註冊順序升序
+                order = pool[np.lexsort((eligible[pool], -relevance, -scores[pool]))][:k]
+                tools = [self.registry.tools_db[features.tool_ids[row]] for row in eligible[order]]
+                best_score = float(scores[order[0]])
+                results.append({
+                    "success": True,
+                    "selected_tool": tools[0],
+                    "confidence": best_score,
+                    "reasoning": self._generate_reasoning(tools[0], best_score, context),
+                    "alternatives": tools[1:],
+                    "total_candidates": total_candidates
+                })
+            return results
             
         except Exception as e:
             logger.error(f"Tool selection failed: {e}")
-            return {
+            return [{
                 "success": False,
                 "error": str(e),
                 "candidates": []
-            }
+            } for _ in requirements]
+    
+    def _filter_mask(self, features: ToolFeatureMatrix, filters: Dict) -> np.ndarray:
+        """搜索過濾器對應的候選掩碼"""
+        mask = np.ones(features.size, dtype=bool)
+        
+        # 平台過濾
+        if "platforms" in filters:
+            codes = [features.platform_codes[p] for p in filters["platforms"] if p in features.platform_codes]
+            mask &= np.isin(features.platform[:features.size], codes)
+        
+        # 成本類型過濾
+        if "cost_type" in filters:
+            code = features.cost_type_codes.get(filters["cost_type"], -1)
+            mask &= features.cost_type[:features.size] == code
+        
+        # 最大成本過濾
+        if "max_cost" in filters:
+            mask &= features.column('cost_per_call') <= filters["max_cost"]
+        
+        # 最小評分過濾
+        if "min_rating" in filters:
+            mask &= features.column('user_rating') >= filters["min_rating"]
+        
+        # 性能要求過濾
+        if "min_success_rate" in filters:
+            mask &= features.column('success_rate') >= filters["min_success_rate"]
+        
+        return mask
     
-    def _calculate_tool_score(self, tool: Dict, context: Dict) -> float:
-        """計算工具評分"""
-        scores = {}
+    def _score_tools(self, features: ToolFeatureMatrix, context: Dict) -> np.ndarray:
+        """對整個目錄計算工具評分"""
+        success_rate = features.column('success_rate')
+        reliability = features.column('reliability_score')
+        cost_per_call = features.column('cost_per_call')
+        is_free = features.is_free[:features.size]
         
         # 性能評分
-        perf_metrics = tool["performance_metrics"]
         performance_score = (
-            (perf_metrics["success_rate"] * 0.4) +
-            (min(1.0, 2000 / max(perf_metrics["avg_response_time"], 100)) * 0.3) +
-            (perf_metrics["reliability_score"] * 0.3)
+            success_rate * 0.4 +
+            np.minimum(1.0, 2000 / np.maximum(features.column('avg_response_time'), 100)) * 0.3 +
+            reliability * 0.3
         )
-        scores["performance"] = performance_score
         
-        # 成本評分 (成本越低分數越高)
-        cost_per_call = tool["cost_model"]["cost_per_call"]
-        if cost_per_call == 0:
-            cost_score = 1.0  # 免費工具最高分
-        else:
-            # 成本評分反比例，最大成本假設為0.1
-            cost_score = max(0.0, 1.0 - (cost_per_call / 0.1))
-        scores["cost"] = cost_score
+        # 成本評分 (免費工具最高分，其餘按最大成本0.1反比例)
+        cost_score = np.where(cost_per_call == 0, 1.0, np.maximum(0.0, 1.0 - cost_per_call / 0.1))
         
         # 可靠性評分
         reliability_score = (
-            (perf_metrics["uptime"] * 0.4) +
-            (perf_metrics["reliability_score"] * 0.3) +
-            (tool["quality_scores"]["security_score"] * 0.3)
+            features.column('uptime') * 0.4 +
+            reliability * 0.3 +
+            features.column('security_score') * 0.3
         )
-        scores["reliability"] = reliability_score
         
         # 用戶評分 (歸一化到0-1)
-        user_rating = tool["quality_scores"]["user_rating"] / 5.0
-        scores["user_rating"] = user_rating
+        user_rating = features.column('user_rating') / 5.0
         
         # 加權總分
-        total_score = sum(
-            scores[metric] * self.routing_weights[metric]
-            for metric in scores
+        weights = self.routing_weights
+        total_score = (
+            performance_score * weights["performance"] +
+            cost_score * weights["cost"] +
+            reliability_score * weights["reliability"] +
+            user_rating * weights["user_rating"]
         )
         
-        # 應用上下文調整
-        total_score = self._apply_context_adjustments(total_score, tool, context)
-        
-        return min(1.0, max(0.0, total_score))
-    
-    def _apply_context_adjustments(self, base_score: float, tool: Dict, context: Dict) -> float:
-        """應用上下文調整"""
-        adjusted_score = base_score
-        
-        # 優先級調整
+        # 優先級調整：高優先級偏好高性能工具，低優先級偏好免費工具
         priority = context.get("priority", "medium")
         if priority == "high":
-            # 高優先級任務偏好高性能工具
-            perf_bonus = tool["performance_metrics"]["success_rate"] * 0.1
-            adjusted_score += perf_bonus
+            total_score = total_score + success_rate * 0.1
         elif priority == "low":
-            # 低優先級任務偏好低成本工具
-            if tool["cost_model"]["type"] == "free":
-                adjusted_score += 0.1
-        
-        # 數據大小調整
-        data_size = context.get("data_size", "small")
-        if data_size == "large":
-            # 大數據偏好高吞吐量工具
-            throughput_bonus = min(0.1, tool["performance_metrics"]["throughput"] / 1000)
-            adjusted_score += throughput_bonus
-        
-        # 預算敏感度調整
-        budget_priority = context.get("budget_priority", "medium")
-        if budget_priority == "high":
-            # 高預算敏感度大幅提升免費工具分數
-            if tool["cost_model"]["type"] == "free":
-                adjusted_score += 0.15
-        
-        return adjusted_score
-    
-    def _filter_by_budget(self, scored_tools: List[Dict], budget: Dict) -> List[Dict]:
-        """根據預算過濾工具"""
-        max_cost = budget.get("max_cost_per_call", float('inf'))
-        monthly_budget = budget.get("monthly_budget")
+            total_score = total_score + is_free * 0.1
         
-        filtered = []
-        for item in scored_tools:
-            tool = item["tool"]
-            cost_per_call = tool["cost_model"]["cost_per_call"]
-            
-            # 檢查單次調用成本
-            if cost_per_call > max_cost:
-                continue
-            
-            # 檢查月度預算
-            if monthly_budget:
-                current_cost = self.registry.cost_tracker.get_monthly_cost()
-                if current_cost + cost_per_call > monthly_budget:
-                    continue
-            
-            filtered.append(item)
+        # 數據大小調整：大數據偏好高吞吐量工具
+        if context.get("data_size", "small") == "large":
+            total_score = total_score + np.minimum(0.1, features.column('throughput') / 1000)
+        
+        # 預算敏感度調整：高預算敏感度大幅提升免費工具分數
+        if context.get("budget_priority", "medium") == "high":
+            total_score = total_score + is_free * 0.15
+        
+        return np.clip(total_score, 0.0, 1.0)
+    
+    def _budget_mask(self, features: ToolFeatureMatrix, budget: Dict) -> np.ndarray:
+        """預算約束掩碼：單次調用成本和月度預算"""
+        cost_per_call = features.column('cost_per_call')
+        mask = cost_per_call <= budget.get("max_cost_per_call", float('inf'))
         
-        return filtered
+        monthly_budget = budget.get("monthly_budget")
+        if monthly_budget:
+            current_cost = self.registry.cost_tracker.get_monthly_cost()
+            mask &= current_cost + cost_per_call <= monthly_budget
+        
+        return mask
+    
+    def _relevance(self, features: ToolFeatureMatrix, rows: np.ndarray, requirement: str) -> np.ndarray:
+        """需求與工具的相關性（名稱 0.4、描述 0.3、每個匹配標籤 0.2、每個匹配能力 0.3），只對同分排序的候選計算"""
+        query_lower = requirement.lower()
+        names, descriptions = features.text_arrays()
+        return (
+            (np.char.find(names[rows], query_lower) >= 0) * 0.4 +
+            (np.char.find(descriptions[rows], query_lower) >= 0) * 0.3 +
+            features.tags.count_substring_matches(rows, query_lower) * 0.2 +
+            features.capabilities.count_substring_matches(rows, query_lower) * 0.3
+        )
     
     def _generate_reasoning(self, tool: Dict, score: float, context: Dict) -> str:
         """生成選擇理由"""
@@ -751,6 +922,8 @@ class SmartToolEngineMCP:
                 return await self._handle_discover_tools(parameters)
             elif action == "select_optimal_tool":
                 return await self._handle_select_optimal_tool(parameters)
+            elif action == "select_optimal_tools_batch":
+                return await self._handle_select_optimal_tools_batch(parameters)
             elif action == "register_tool":
                 return await self._handle_register_tool(parameters)
             elif action == "get_tool_stats":
@@ -797,6 +970,17 @@ class SmartToolEngineMCP:
         result = self.routing_engine.select_optimal_tool(requirement, context)
         return result
     
+    async def _handle_select_optimal_tools_batch(self, parameters: Dict) -> Dict:
+        """處理批量最優工具選擇請求"""
+        requirements = parameters.get("requirements", [])
+        context = parameters.get("context", {})
+        
+        results = self.routing_engine.select_optimal_tools_batch(requirements, context)
+        return {
+            "success": True,
+            "results": results
+        }
+    
     async def _handle_register_tool(self, parameters: Dict) -> Dict:
         """處理工具註冊請求"""
         tool_info = parameters.get("tool_info", {})
@@ -874,6 +1058,8 @@ class SmartToolEngineMCP:
 __all__ = [
     'SmartToolEngineMCP',
     'UnifiedToolRegistry', 
+    'ToolFeatureMatrix',
+    'VocabularyBitset',
     'IntelligentRoutingEngine',
     'CloudPlatformIntegration',
     'CostTracker',
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Human-in-the-Loop 集成工具測試
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+import uuid
+from datetime import datetime
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from human_loop_integration_tool import DecisionLearningModel, DecisionType, HumanLoopIntegrationTool, WorkflowContext
+
+
+class ModuleImportTest(unittest.TestCase):
+    """模組導入冒煙測試"""
+
+    def test_module_imports(self):
+        """工具模組可直接導入，不依賴 PowerAutomation.components 包初始化"""
+        import human_loop_integration_tool as tool
+
+        self.assertTrue(hasattr(tool, "HumanLoopIntegrationTool"))
+        self.assertEqual(tool.SessionEventSubscriber.__module__, "session_subscription")
+
+
+
+def make_context(workflow_type: str = "deployment", environment: str = "production") -> WorkflowContext:
+    return WorkflowContext(
+        workflow_id=str(uuid.uuid4()),
+        title="test",
+        description="",
+        parameters={},
+        metadata={"workflow_type": workflow_type, "environment": environment},
+        created_at=datetime.now()
+    )
+
+
+class DecisionLearningModelTest(unittest.IsolatedAsyncioTestCase):
+    """決策學習模型的內存預測和批量歷史寫入"""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "human_loop.db")
+
+    async def asyncTearDown(self):
+        await self.tool.decision_model.close()
+        await self.tool.response_subscriber.close()
+        self.tmpdir.cleanup()
+
+    def make_tool(self, **config: Any) -> HumanLoopIntegrationTool:
+        config["database_path"] = self.db_path
+        config_path = os.path.join(self.tmpdir.name, "config.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        self.tool = HumanLoopIntegrationTool(config_path)
+        return self.tool
+
+    async def record(self, context: WorkflowContext, success: bool,
+                     complexity: float = 0.2, risk: float = 0.1):
+        decision = {"type": DecisionType.AUTOMATIC, "complexity_score": complexity,
+                    "risk_score": risk, "confidence_score": 0.5}
+        await self.tool._record_and_learn(context, decision, {"success": success, "execution_time": 0.1})
+
+    def count_rows(self, table: str) -> int:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    async def test_prediction_served_from_memory(self):
+        """預測只讀內存統計，記錄尚未寫入數據庫時已反映最新結果"""
+        tool = self.make_tool(history_flush_interval=3600, history_flush_batch_size=100,
+                              learning_min_samples=3)
+        model = tool.decision_model
+        context = make_context()
+
+        self.assertEqual(await model.predict_confidence(context), 0.5)
+
+        for success in (True, True, False, True):
+            await self.record(context, success, complexity=0.5, risk=0.2)
+
+        expected = 0.75 * (1 - 0.5 * 0.3) * (1 - 0.2 * 0.3)
+        self.assertAlmostEqual(await model.predict_confidence(context), expected)
+        self.assertEqual(self.count_rows("decision_history"), 0)
+
+        # 特徵組合記錄不足時回退到同一決策類型的整體統計
+        self.assertAlmostEqual(await model.predict_confidence(make_context("api_integration", "staging")), expected)
+
+    async def test_prediction_restored_after_restart(self):
+        """寫入的歷史在重啟後恢復為相同的內存統計"""
+        tool = self.make_tool(history_flush_interval=3600, history_flush_batch_size=100)
+        context = make_context()
+        for success in (True, False, True):
+            await self.record(context, success)
+        expected = await tool.decision_model.predict_confidence(context)
+        await tool.decision_model.close()
+
+        restored = DecisionLearningModel(self.db_path, min_samples=3)
+        self.assertAlmostEqual(await restored.predict_confidence(context), expected)
+
+    async def test_history_flushed_in_batches(self):
+        """待寫入記錄達到批量大小時一次寫入"""
+        self.make_tool(history_flush_interval=3600, history_flush_batch_size=3)
+        contexts = [make_context() for _ in range(4)]
+
+        for context in contexts[:2]:
+            await self.record(context, True)
+        self.assertEqual(self.count_rows("decision_history"), 0)
+
+        await self.record(contexts[2], True)
+        self.assertEqual(self.count_rows("decision_history"), 3)
+        self.assertEqual(self.count_rows("workflows"), 3)
+
+        # 關閉時寫入不足一批的剩餘記錄
+        await self.record(contexts[3], False)
+        self.assertEqual(self.count_rows("decision_history"), 3)
+        await self.tool.decision_model.close()
+        self.assertEqual(self.count_rows("decision_history"), 4)
+
+    async def test_pending_history_flushed_after_interval(self):
+        """流量停止後由定時任務在寫入間隔內寫入剩餘記錄"""
+        self.make_tool(history_flush_interval=0.1, history_flush_batch_size=100)
+        model = self.tool.decision_model
+
+        await self.record(make_context(), True)
+        self.assertEqual(self.count_rows("decision_history"), 0)
+
+        for _ in range(50):
+            if self.count_rows("decision_history"):
+                break
+            await asyncio.sleep(0.02)
+        self.assertEqual(self.count_rows("decision_history"), 1)
+        self.assertEqual(model._pending_decisions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,316 @@
+"""
+PowerAutomation Local MCP Artifact Pipeline
+
+測試產物管道，截圖在測試流程中只做捕獲，編碼、縮放、WebP轉換、
+內容哈希去重和寫盤交給後台寫入線程完成；測試結果以JSON Lines流式寫入磁盤。
+寫入任務提交到線程池而非綁定某個事件循環的隊列，Flask每請求新建事件循環時同樣可用
+
+Author: Manus AI
+Version: 1.0.0
+Date: 2025-06-23
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Set
+
+from shared.utils import ensure_directory
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+
+def content_hash(data: bytes, image: Any = None) -> str:
+    """計算截圖的精確內容哈希；已解碼時按像素計算，忽略PNG編碼元數據差異"""
+    digest = hashlib.sha256()
+    if image is not None:
+        digest.update(f"{image.mode}:{image.width}x{image.height}:".encode())
+        digest.update(image.tobytes())
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ArtifactPipeline:
+    """異步測試產物管道"""
+
+    def __init__(self, config: Dict[str, Any], logger: logging.Logger):
+        """
+        初始化產物管道
+
+        Args:
+            config: 自動化配置
+            logger: 日誌器
+        """
+        self.logger = logger
+        self.output_dir = config.get("screenshot_dir", "screenshots")
+        self.result_log_path = config.get("result_log_path", "test_results/results.jsonl")
+        self.image_format = config.get("screenshot_format", "png").lower()
+        self.max_width = config.get("screenshot_max_width")
+        self.quality = config.get("screenshot_quality", 90)
+        self.dedup_enabled = config.get("screenshot_dedup", True)
+        self.queue_size = config.get("artifact_queue_size", 64)
+
+        if self.image_format not in ("png", "webp"):
+            self.image_format = "png"
+        if not PIL_AVAILABLE and (self.image_format != "png" or self.max_width):
+            self.logger.warning("未安裝Pillow，截圖將以原始PNG寫入")
+            self.image_format = "png"
+            self.max_width = None
+
+        self._started = False
+        # 編碼和寫盤在單獨線程中按提交順序串行執行，不阻塞事件循環
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 線程安全的在途任務集合和容量信號量，與調用方所在的事件循環無關
+        self._pending: Set[Future] = set()
+        self._pending_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._recent_hashes: deque = deque(maxlen=config.get("screenshot_dedup_window", 256))
+
+        # 統計由事件循環所在線程、寫入線程和完成回調共同更新，經 _record 加鎖累加
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "screenshots_submitted": 0,
+            "screenshots_written": 0,
+            "screenshots_deduplicated": 0,
+            "results_written": 0,
+            "bytes_in": 0,
+            "bytes_written": 0,
+            "errors": 0,
+            "encode_time": 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._started
+
+    async def start(self):
+        """啟動後台寫入線程"""
+        if self._started:
+            return
+
+        ensure_directory(self.output_dir)
+        result_dir = os.path.dirname(self.result_log_path)
+        if result_dir:
+            ensure_directory(result_dir)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-writer")
+        self._started = True
+
+    async def stop(self):
+        """等待已提交的產物寫入完成後停止接收"""
+        if not self._started:
+            return
+
+        await self.flush()
+        self._started = False
+
+    def close(self):
+        """關閉寫入線程池，剩餘任務寫完後返回"""
+        self._started = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def flush(self):
+        """等待所有已提交的產物寫入完成，可在任意事件循環中調用"""
+        with self._pending_lock:
+            pending = list(self._pending)
+        if pending:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True)
+
+    async def submit_screenshot(self, name: str, data: bytes, tag: str = "") -> str:
+        """
+        提交截圖，立即返回最終文件路徑，寫盤在後台完成
+
+        Args:
+            name: 截圖名稱
+            data: 瀏覽器返回的PNG數據
+            tag: 文件名附加標識（例如上下文槽位）
+
+        Returns:
+            str: 截圖文件路徑
+        """
+        filename = f"{name}_{int(time.time() * 1000)}{tag}.{self.image_format}"
+        path = os.path.join(self.output_dir, filename)
+
+        self._record(screenshots_submitted=1, bytes_in=len(data))
+
+        await self._submit(self._write_screenshot, path, data)
+        return path
+
+    async def submit_result(self, result: Dict[str, Any]):
+        """提交測試結果，追加到磁盤結果日誌"""
+        await self._submit(self._append_result, self.result_log_path, result)
+
+    async def read_results(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """讀取結果日誌，limit指定時只返回最近的記錄"""
+        await self.flush()
+        return await self._run(self._read_results_sync, limit)
+
+    async def clear_results(self):
+        """清空結果日誌"""
+        await self.flush()
+        await self._run(self._clear_results_sync)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取管道統計信息"""
+        with self._stats_lock:
+            stats = self.stats.copy()
+        stats.update({
+            "queue_depth": len(self._pending),
+            "image_format": self.image_format,
+            "pillow_available": PIL_AVAILABLE,
+            "result_log_path": self.result_log_path
+        })
+        return stats
+
+    async def _submit(self, func, path: str, payload: Any):
+        """提交寫入任務；在途任務達到上限時等待，形成背壓"""
+        if not self._started:
+            raise RuntimeError("產物管道未啟動")
+
+        if not self._slots.acquire(blocking=False):
+            await asyncio.get_running_loop().run_in_executor(None, self._slots.acquire)
+
+        try:
+            future = self._executor.submit(self._guarded, func, path, payload)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: Future):
+        with self._pending_lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def _guarded(self, func, path: str, payload: Any):
+        try:
+            func(path, payload)
+        except Exception as e:
+            self._record(errors=1)
+            self.logger.error(f"寫入測試產物失敗 {path}: {e}")
+
+    async def _run(self, func, *args):
+        """在寫入線程中執行，保證與已提交的寫入任務順序一致"""
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.wrap_future(self._executor.submit(func, *args))
+
+    def _write_screenshot(self, path: str, data: bytes):
+        start = time.time()
+
+        if not PIL_AVAILABLE:
+            # 無法解碼圖像時按原始字節去重
+            if self.dedup_enabled:
+                digest = content_hash(data)
+                duplicate = self._find_duplicate(digest)
+                if duplicate:
+                    self._link(duplicate, path)
+                    self._record(screenshots_deduplicated=1)
+                    return
+                self._recent_hashes.append((digest, path))
+            self._write_bytes(path, data)
+            self._record(encode_time=time.time() - start)
+            return
+
+        image = Image.open(io.BytesIO(data))
+        image.load()
+
+        if self.dedup_enabled:
+            # 只鏈接像素完全相同的畫面，相似但不同的幀照常寫入
+            image_hash = content_hash(data, image)
+            duplicate = self._find_duplicate(image_hash)
+            if duplicate:
+                self._link(duplicate, path)
+                self._record(screenshots_deduplicated=1, encode_time=time.time() - start)
+                return
+            self._recent_hashes.append((image_hash, path))
+
+        resized = False
+        if self.max_width and image.width > self.max_width:
+            height = max(1, round(image.height * self.max_width / image.width))
+            image = image.resize((self.max_width, height))
+            resized = True
+
+        if self.image_format == "webp":
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=self.quality)
+            self._write_bytes(path, buffer.getvalue())
+        elif resized:
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            self._write_bytes(path, buffer.getvalue())
+        else:
+            # 未做任何轉換時直接寫入原始PNG，避免重複編碼
+            self._write_bytes(path, data)
+
+        self._record(encode_time=time.time() - start)
+
+    def _record(self, **deltas):
+        """線程安全地累加統計"""
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _find_duplicate(self, digest: str) -> Optional[str]:
+        for known_hash, known_path in reversed(self._recent_hashes):
+            if known_hash == digest and os.path.exists(known_path):
+                return known_path
+        return None
+
+    def _link(self, source: str, path: str):
+        """重複畫面以硬鏈接指向已有文件，不支持時退回複製"""
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+
+    def _write_bytes(self, path: str, data: bytes):
+        with open(path, "wb") as f:
+            f.write(data)
+        self._record(screenshots_written=1, bytes_written=len(data))
+
+    def _append_result(self, path: str, result: Dict[str, Any]):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+        self._record(results_written=1)
+
+    def _read_results_sync(self, limit: Optional[int]) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.result_log_path):
+            return []
+
+        with open(self.result_log_path, "r", encoding="utf-8") as f:
+            lines = deque(f, maxlen=limit) if limit else f.readlines()
+
+        results = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return results
+
+    def _clear_results_sync(self):
+        if os.path.exists(self.result_log_path):
+            open(self.result_log_path, "w").close()
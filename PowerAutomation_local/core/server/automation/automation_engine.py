@@ -10,11 +10,12 @@ Date: 2025-06-23
 """
 
 import asyncio
+import contextvars
 import json
 import logging
-import os
 import sys
 import time
+from collections import deque
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 from playwright.async_api import async_playwright, Browser, Page
@@ -24,24 +25,47 @@ project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from shared.exceptions import AutomationError, async_handle_exceptions
-from shared.utils import ensure_directory, format_duration
+from shared.utils import format_duration
+from .browser_pool import BrowserContextPool, ContextLease, PageDriver, PlaywrightPageDriver
+from .artifact_pipeline import ArtifactPipeline
+
+# 當前測試任務持有的上下文租約，隨asyncio任務上下文傳遞
+_current_lease: contextvars.ContextVar[Optional[ContextLease]] = contextvars.ContextVar(
+    "automation_current_lease", default=None
+)
 
 
 class AutomationEngine:
     """自動化測試引擎"""
     
-    def __init__(self, config: Dict[str, Any], logger: logging.Logger):
+    APP_URL = "https://manus.im/app/uuX3KzwzsthCSgqmbQbgOz"
+    
+    # 測試案例到執行方法的映射
+    TEST_CASES = {
+        "TC001": "_run_tc001_login_test",
+        "TC002": "_run_tc002_message_test",
+        "TC003": "_run_tc003_conversation_test",
+        "TC004": "_run_tc004_task_test",
+        "TC005": "_run_tc005_file_test",
+        "TC006": "_run_tc006_integration_test"
+    }
+    
+    def __init__(self, config: Dict[str, Any], logger: logging.Logger,
+                 driver: Optional[PageDriver] = None):
         """
         初始化Automation Engine
         
         Args:
             config: 自動化配置
             logger: 日誌器
+            driver: 頁面驅動，默認使用Playwright
         """
         self.config = config
         self.logger = logger
         self.playwright = None
         self.browser = None
+        self.driver = driver
+        self.context_pool: Optional[BrowserContextPool] = None
         
         # 配置參數
         self.browser_type = config.get("browser", "chromium")
@@ -49,6 +73,9 @@ class AutomationEngine:
         self.screenshot_enabled = config.get("screenshot_enabled", True)
         self.video_recording = config.get("video_recording", True)
         self.test_timeout = config.get("test_timeout", 300)
+        self.pool_size = config.get("pool_size", 2)
+        self.max_concurrency = config.get("max_concurrency", self.pool_size)
+        self.storage_state_path = config.get("storage_state_path", "auth_state/manus_storage_state.json")
         
         # 狀態信息
         self.status = {
@@ -60,8 +87,9 @@ class AutomationEngine:
             "last_test_time": None
         }
         
-        # 測試結果存儲
-        self.test_results = []
+        # 測試結果流式寫入磁盤結果日誌，內存中只保留最近的結果
+        self.test_results = deque(maxlen=config.get("recent_results_size", 20))
+        self.artifact_pipeline = ArtifactPipeline(config, logger)
     
     async def initialize(self) -> bool:
         """
@@ -73,8 +101,9 @@ class AutomationEngine:
         try:
             self.logger.info("正在初始化Automation Engine...")
             
-            # 初始化Playwright
-            self.playwright = await async_playwright().start()
+            # 初始化Playwright（注入自定義驅動時無需）
+            if self.driver is None:
+                self.playwright = await async_playwright().start()
             
             self.status["initialized"] = True
             self.logger.info("Automation Engine初始化完成")
@@ -97,7 +126,8 @@ class AutomationEngine:
             
             self.logger.info("正在啟動Automation Engine...")
             
-            # 啟動瀏覽器
+            # 啟動產物寫入器和瀏覽器
+            await self.artifact_pipeline.start()
             await self._start_browser()
             
             self.status["running"] = True
@@ -118,8 +148,10 @@ class AutomationEngine:
         try:
             self.logger.info("正在停止Automation Engine...")
             
-            # 關閉瀏覽器
+            # 關閉瀏覽器，並等待剩餘產物寫入完成
             await self._stop_browser()
+            await self.artifact_pipeline.stop()
+            self.artifact_pipeline.close()
             
             # 關閉Playwright
             if self.playwright:
@@ -153,14 +185,22 @@ class AutomationEngine:
             # 添加配置信息
             status["config"] = {
                 "browser": self.browser_type,
+                "pool_size": self.pool_size,
+                "max_concurrency": self.max_concurrency,
                 "headless": self.headless,
                 "screenshot_enabled": self.screenshot_enabled,
                 "video_recording": self.video_recording,
                 "test_timeout": self.test_timeout
             }
             
+            # 添加上下文池信息
+            if self.context_pool:
+                status["context_pool"] = self.context_pool.get_stats()
+            
+            status["artifacts"] = self.artifact_pipeline.get_stats()
+            
             # 添加最近的測試結果
-            status["recent_results"] = self.test_results[-5:] if self.test_results else []
+            status["recent_results"] = list(self.test_results)[-5:]
             
             return status
             
@@ -188,11 +228,17 @@ class AutomationEngine:
                 result = await self.run_test(test_case)
                 return result
                 
+            elif method == "run_suite":
+                test_cases = params.get("test_cases") or list(self.TEST_CASES.keys())
+                return await self.run_suite(test_cases, params.get("concurrency"))
+                
             elif method == "get_test_results":
-                return {"results": self.test_results}
+                results = await self.artifact_pipeline.read_results(params.get("limit"))
+                return {"results": results}
                 
             elif method == "clear_results":
                 self.test_results.clear()
+                await self.artifact_pipeline.clear_results()
                 return {"success": True, "message": "測試結果已清空"}
                 
             else:
@@ -220,63 +266,129 @@ class AutomationEngine:
             self.status["test_count"] += 1
             self.status["last_test_time"] = start_time
             
-            # 創建新的頁面
-            page = await self.browser.new_page()
-            
-            try:
-                # 根據測試案例執行相應的測試
-                if test_case.upper() == "TC001":
-                    result = await self._run_tc001_login_test(page)
-                elif test_case.upper() == "TC002":
-                    result = await self._run_tc002_message_test(page)
-                elif test_case.upper() == "TC003":
-                    result = await self._run_tc003_conversation_test(page)
-                elif test_case.upper() == "TC004":
-                    result = await self._run_tc004_task_test(page)
-                elif test_case.upper() == "TC005":
-                    result = await self._run_tc005_file_test(page)
-                elif test_case.upper() == "TC006":
-                    result = await self._run_tc006_integration_test(page)
-                else:
-                    raise AutomationError(f"未知的測試案例: {test_case}")
-                
-                # 計算執行時間
-                end_time = time.time()
-                duration = end_time - start_time
-                
-                # 更新狀態
-                if result.get("success", False):
-                    self.status["success_count"] += 1
-                else:
-                    self.status["failure_count"] += 1
-                
-                # 構建測試結果
-                test_result = {
-                    "test_case": test_case,
-                    "success": result.get("success", False),
-                    "message": result.get("message", ""),
-                    "details": result.get("details", {}),
-                    "duration": duration,
-                    "duration_formatted": format_duration(duration),
-                    "timestamp": start_time,
-                    "screenshots": result.get("screenshots", []),
-                    "video_path": result.get("video_path", "")
-                }
-                
-                # 保存測試結果
-                self.test_results.append(test_result)
-                
-                self.logger.info(f"✅ 測試案例 {test_case} 執行完成 - 成功: {result.get('success', False)}")
-                return test_result
-                
-            finally:
-                await page.close()
+            method_name = self.TEST_CASES.get(test_case.upper())
+            if not method_name:
+                raise AutomationError(f"未知的測試案例: {test_case}")
+            
+            if not self.context_pool:
+                raise AutomationError("瀏覽器上下文池未啟動")
+            
+            # 登錄測試本身需要未認證的上下文，其餘案例復用已保存的登錄狀態
+            use_storage_state = test_case.upper() != "TC001"
+            
+            async with self.context_pool.acquire(use_storage_state=use_storage_state) as lease:
+                token = _current_lease.set(lease)
+                try:
+                    result = await getattr(self, method_name)(lease.page)
+                finally:
+                    _current_lease.reset(token)
+            
+            # 計算執行時間
+            end_time = time.time()
+            duration = end_time - start_time
+            
+            # 更新狀態
+            if result.get("success", False):
+                self.status["success_count"] += 1
+            else:
+                self.status["failure_count"] += 1
+            
+            # 構建測試結果
+            test_result = {
+                "test_case": test_case,
+                "success": result.get("success", False),
+                "message": result.get("message", ""),
+                "details": result.get("details", {}),
+                "duration": duration,
+                "duration_formatted": format_duration(duration),
+                "timestamp": start_time,
+                "screenshots": result.get("screenshots", []),
+                "video_path": result.get("video_path", ""),
+                "context_slot": lease.slot_id
+            }
+            
+            # 保存測試結果
+            self.test_results.append(test_result)
+            await self.artifact_pipeline.submit_result(test_result)
+            
+            self.logger.info(f"✅ 測試案例 {test_case} 執行完成 - 成功: {result.get('success', False)}")
+            return test_result
             
         except Exception as e:
             self.status["failure_count"] += 1
             self.logger.error(f"運行測試案例失敗: {e}")
             raise AutomationError(f"運行測試案例失敗: {e}", test_case=test_case)
     
+    async def run_suite(self, test_cases: List[str], concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """
+        在上下文池上並行運行測試套件
+        
+        Args:
+            test_cases: 測試案例列表
+            concurrency: 最大並發數，默認為配置值且不超過池大小
+            
+        Returns:
+            Dict[str, Any]: 套件結果，包含各案例結果和產物
+        """
+        if not self.context_pool:
+            raise AutomationError("瀏覽器上下文池未啟動")
+        
+        limit = max(1, min(concurrency or self.max_concurrency, self.context_pool.size))
+        semaphore = asyncio.Semaphore(limit)
+        suite_start = time.time()
+        
+        async def run_one(test_case: str) -> Dict[str, Any]:
+            async with semaphore:
+                result = await self.run_test(test_case)
+            if not result:
+                # run_test出錯時返回空字典
+                return {"test_case": test_case, "success": False, "message": "測試執行異常", "duration": 0.0}
+            return result
+        
+        # 沒有可復用的登錄狀態時先單獨運行一個案例完成首次登錄（優先TC001），
+        # 其餘案例共享其認證狀態，避免並發案例各自登錄並反覆觸發上下文重建
+        ordered = list(test_cases)
+        results: List[Dict[str, Any]] = []
+        if self.context_pool.state_version == 0 and ordered:
+            first = next((tc for tc in ordered if tc.upper() == "TC001"), ordered[0])
+            ordered.remove(first)
+            results.append(await run_one(first))
+        
+        results.extend(await asyncio.gather(*(run_one(tc) for tc in ordered)))
+        
+        wall_time = time.time() - suite_start
+        total_test_time = sum(r.get("duration", 0.0) for r in results)
+        passed = sum(1 for r in results if r.get("success", False))
+        
+        return {
+            "success": passed == len(results),
+            "total": len(results),
+            "passed": passed,
+            "failed": len(results) - passed,
+            "concurrency": limit,
+            "wall_time": wall_time,
+            "wall_time_formatted": format_duration(wall_time),
+            "total_test_time": total_test_time,
+            "speedup": (total_test_time / wall_time) if wall_time > 0 else 0.0,
+            "artifacts": {
+                "screenshots": [path for r in results for path in r.get("screenshots", []) if path],
+                "videos": [r["video_path"] for r in results if r.get("video_path")]
+            },
+            "results": results
+        }
+    
+    async def _ensure_logged_in(self, page: Page) -> Dict[str, Any]:
+        """確保頁面處於登錄狀態，優先復用上下文中已保存的認證狀態"""
+        lease = _current_lease.get()
+        
+        if lease and lease.logged_in:
+            await page.goto(self.APP_URL, timeout=30000)
+            if "login" not in page.url.lower():
+                return {"success": True, "message": "復用已保存的登錄狀態", "details": {"session_reused": True}}
+            self.logger.info("已保存的登錄狀態失效，重新登錄")
+        
+        return await self._run_tc001_login_test(page)
+    
     async def _run_tc001_login_test(self, page: Page) -> Dict[str, Any]:
         """運行TC001登錄測試"""
         try:
@@ -286,8 +398,7 @@ class AutomationEngine:
             details = {}
             
             # 導航到Manus應用
-            app_url = "https://manus.im/app/uuX3KzwzsthCSgqmbQbgOz"
-            await page.goto(app_url, timeout=30000)
+            await page.goto(self.APP_URL, timeout=30000)
             
             # 截圖1: 初始頁面
             if self.screenshot_enabled:
@@ -349,6 +460,12 @@ class AutomationEngine:
             current_url = page.url
             if "login" not in current_url.lower():
                 details["login_success"] = True
+                
+                # 共享認證狀態，後續案例無需重複登錄
+                lease = _current_lease.get()
+                if lease:
+                    await lease.save_authenticated_state()
+                
                 return {
                     "success": True,
                     "message": "登錄測試成功",
@@ -381,7 +498,7 @@ class AutomationEngine:
             details = {}
             
             # 先執行登錄
-            login_result = await self._run_tc001_login_test(page)
+            login_result = await self._ensure_logged_in(page)
             if not login_result.get("success", False):
                 return {"success": False, "message": "登錄失敗，無法執行消息測試", "details": details}
             
@@ -442,7 +559,7 @@ class AutomationEngine:
             details = {}
             
             # 先執行登錄
-            login_result = await self._run_tc001_login_test(page)
+            login_result = await self._ensure_logged_in(page)
             if not login_result.get("success", False):
                 return {"success": False, "message": "登錄失敗，無法執行對話測試", "details": details}
             
@@ -492,7 +609,7 @@ class AutomationEngine:
             details = {}
             
             # 先執行登錄
-            login_result = await self._run_tc001_login_test(page)
+            login_result = await self._ensure_logged_in(page)
             if not login_result.get("success", False):
                 return {"success": False, "message": "登錄失敗，無法執行任務測試", "details": details}
             
@@ -542,7 +659,7 @@ class AutomationEngine:
             details = {}
             
             # 先執行登錄
-            login_result = await self._run_tc001_login_test(page)
+            login_result = await self._ensure_logged_in(page)
             if not login_result.get("success", False):
                 return {"success": False, "message": "登錄失敗，無法執行文件測試", "details": details}
             
@@ -596,7 +713,7 @@ class AutomationEngine:
             test_results = []
             
             # TC001 - 登錄測試
-            tc001_result = await self._run_tc001_login_test(page)
+            tc001_result = await self._ensure_logged_in(page)
             test_results.append({"test": "TC001", "success": tc001_result.get("success", False)})
             
             if tc001_result.get("success", False):
@@ -647,48 +764,54 @@ class AutomationEngine:
             }
     
     async def _start_browser(self):
-        """啟動瀏覽器"""
+        """啟動瀏覽器並預熱上下文池"""
         try:
-            browser_type = getattr(self.playwright, self.browser_type)
-            self.browser = await browser_type.launch(
-                headless=self.headless,
-                args=['--no-sandbox', '--disable-dev-shm-usage']
+            if self.driver is None:
+                self.driver = PlaywrightPageDriver(
+                    self.playwright,
+                    browser_type=self.browser_type,
+                    headless=self.headless
+                )
+            
+            self.context_pool = BrowserContextPool(
+                self.driver,
+                size=self.pool_size,
+                storage_state_path=self.storage_state_path,
+                logger=self.logger
             )
+            await self.context_pool.start()
+            self.browser = getattr(self.driver, "browser", None)
             
+        except AutomationError:
+            raise
         except Exception as e:
             raise AutomationError(f"啟動瀏覽器失敗: {e}")
     
     async def _stop_browser(self):
-        """停止瀏覽器"""
+        """停止上下文池和瀏覽器"""
         try:
-            if self.browser:
-                await self.browser.close()
-                self.browser = None
+            if self.context_pool:
+                await self.context_pool.stop()
+                self.context_pool = None
+            self.browser = None
                 
         except Exception as e:
             self.logger.error(f"停止瀏覽器失敗: {e}")
     
     async def _take_screenshot(self, page: Page, name: str) -> str:
-        """截圖"""
+        """截圖，只在測試流程中捕獲，編碼和寫盤由產物管道在後台完成"""
         try:
             if not self.screenshot_enabled:
                 return ""
             
-            # 創建截圖目錄
-            screenshot_dir = "screenshots"
-            ensure_directory(screenshot_dir)
+            data = await page.screenshot(full_page=True)
             
-            # 生成截圖文件名
-            timestamp = int(time.time())
-            filename = f"{name}_{timestamp}.png"
-            filepath = os.path.join(screenshot_dir, filename)
+            # 並行上下文下以槽位區分文件名
+            lease = _current_lease.get()
+            tag = f"_ctx{lease.slot_id}" if lease else ""
             
-            # 截圖
-            await page.screenshot(path=filepath, full_page=True)
-            
-            return filepath
+            return await self.artifact_pipeline.submit_screenshot(name, data, tag=tag)
             
         except Exception as e:
             self.logger.error(f"截圖失敗: {e}")
             return ""
-
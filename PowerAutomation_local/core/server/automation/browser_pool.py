@@ -0,0 +1,292 @@
+"""
+PowerAutomation Local MCP Browser Context Pool
+
+瀏覽器上下文池，提供預熱的隔離上下文和已認證存儲狀態的復用
+頁面驅動可插拔，便於用假驅動測試調度邏輯
+
+Author: Manus AI
+Version: 1.0.0
+Date: 2025-06-23
+"""
+
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, List
+
+from shared.exceptions import AutomationError
+from shared.utils import ensure_directory
+
+
+class PageDriver(ABC):
+    """頁面驅動接口，隔離上下文池與具體瀏覽器實現"""
+
+    @abstractmethod
+    async def start(self):
+        """啟動驅動（例如啟動瀏覽器）"""
+
+    @abstractmethod
+    async def stop(self):
+        """停止驅動"""
+
+    @abstractmethod
+    async def new_context(self, storage_state: Optional[str] = None) -> Any:
+        """創建隔離的瀏覽器上下文，可選載入存儲狀態"""
+
+    @abstractmethod
+    async def close_context(self, context: Any):
+        """關閉瀏覽器上下文"""
+
+    @abstractmethod
+    async def new_page(self, context: Any) -> Any:
+        """在上下文中創建頁面"""
+
+    @abstractmethod
+    async def close_page(self, page: Any):
+        """關閉頁面"""
+
+    @abstractmethod
+    async def save_storage_state(self, context: Any, path: str):
+        """保存上下文的存儲狀態（cookies、localStorage）"""
+
+
+class PlaywrightPageDriver(PageDriver):
+    """基於Playwright的頁面驅動"""
+
+    def __init__(self, playwright: Any, browser_type: str = "chromium", headless: bool = False,
+                 launch_args: Optional[List[str]] = None):
+        self.playwright = playwright
+        self.browser_type = browser_type
+        self.headless = headless
+        self.launch_args = launch_args or ['--no-sandbox', '--disable-dev-shm-usage']
+        self.browser = None
+
+    async def start(self):
+        try:
+            launcher = getattr(self.playwright, self.browser_type)
+            self.browser = await launcher.launch(headless=self.headless, args=self.launch_args)
+        except Exception as e:
+            raise AutomationError(f"啟動瀏覽器失敗: {e}")
+
+    async def stop(self):
+        if self.browser:
+            await self.browser.close()
+            self.browser = None
+
+    async def new_context(self, storage_state: Optional[str] = None) -> Any:
+        if not self.browser:
+            raise AutomationError("瀏覽器未啟動")
+        if storage_state and os.path.exists(storage_state):
+            return await self.browser.new_context(storage_state=storage_state)
+        return await self.browser.new_context()
+
+    async def close_context(self, context: Any):
+        await context.close()
+
+    async def new_page(self, context: Any) -> Any:
+        return await context.new_page()
+
+    async def close_page(self, page: Any):
+        await page.close()
+
+    async def save_storage_state(self, context: Any, path: str):
+        await context.storage_state(path=path)
+
+
+class _PooledContext:
+    """池中的上下文槽位"""
+
+    __slots__ = ("slot_id", "context", "state_version", "leases")
+
+    def __init__(self, slot_id: int, context: Any, state_version: int):
+        self.slot_id = slot_id
+        self.context = context
+        self.state_version = state_version
+        self.leases = 0
+
+
+class ContextLease:
+    """上下文租約，測試期間獨佔一個上下文和頁面"""
+
+    def __init__(self, pool: "BrowserContextPool", slot: _PooledContext, context: Any, page: Any,
+                 logged_in: bool):
+        self.pool = pool
+        self.slot = slot
+        self.context = context
+        self.page = page
+        # 上下文已載入認證存儲狀態，或租約期間已完成登錄
+        self.logged_in = logged_in
+
+    @property
+    def slot_id(self) -> int:
+        return self.slot.slot_id
+
+    async def save_authenticated_state(self):
+        """將當前上下文的認證狀態共享給池中其他上下文"""
+        self.logged_in = True
+        await self.pool.save_storage_state(self.context)
+
+
+class BrowserContextPool:
+    """預熱的瀏覽器上下文池"""
+
+    def __init__(self, driver: PageDriver, size: int = 2, storage_state_path: Optional[str] = None,
+                 logger: Optional[logging.Logger] = None):
+        """
+        初始化上下文池
+
+        Args:
+            driver: 頁面驅動
+            size: 上下文數量
+            storage_state_path: 認證存儲狀態文件路徑，存在時新上下文將自動載入
+            logger: 日誌器
+        """
+        if size < 1:
+            raise AutomationError("上下文池大小必須大於0")
+
+        self.driver = driver
+        self.size = size
+        self.storage_state_path = storage_state_path
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._idle: Optional[asyncio.Queue] = None
+        self._slots: List[_PooledContext] = []
+        self._state_lock = asyncio.Lock()
+        # 存儲狀態版本，每次保存認證狀態遞增，舊上下文在下次租用時重建
+        self.state_version = 1 if storage_state_path and os.path.exists(storage_state_path) else 0
+        self.started = False
+
+        self.stats = {
+            "leases": 0,
+            "context_rebuilds": 0,
+            "state_saves": 0,
+            "total_wait_time": 0.0
+        }
+
+    async def start(self):
+        """啟動驅動並預熱所有上下文"""
+        if self.started:
+            return
+
+        await self.driver.start()
+        self._idle = asyncio.Queue()
+
+        contexts = await asyncio.gather(*(
+            self.driver.new_context(self._current_state()) for _ in range(self.size)
+        ))
+        for slot_id, context in enumerate(contexts):
+            slot = _PooledContext(slot_id, context, self.state_version)
+            self._slots.append(slot)
+            self._idle.put_nowait(slot)
+
+        self.started = True
+        self.logger.info(f"瀏覽器上下文池已預熱: {self.size}個上下文")
+
+    async def stop(self):
+        """關閉所有上下文並停止驅動"""
+        if not self.started:
+            return
+
+        for slot in self._slots:
+            try:
+                await self.driver.close_context(slot.context)
+            except Exception as e:
+                self.logger.warning(f"關閉上下文 {slot.slot_id} 失敗: {e}")
+
+        self._slots.clear()
+        self._idle = None
+        self.started = False
+        await self.driver.stop()
+
+    @asynccontextmanager
+    async def acquire(self, use_storage_state: bool = True):
+        """
+        租用一個上下文，返回帶新頁面的租約，退出時歸還
+
+        Args:
+            use_storage_state: 為False時總是使用全新的未認證臨時上下文（例如登錄測試本身）
+        """
+        if not self.started:
+            raise AutomationError("瀏覽器上下文池未啟動")
+
+        wait_start = time.time()
+        slot = await self._idle.get()
+        self.stats["total_wait_time"] += time.time() - wait_start
+
+        context = None
+        page = None
+        try:
+            if use_storage_state:
+                if slot.state_version < self.state_version:
+                    await self._rebuild(slot)
+                context = slot.context
+                logged_in = slot.state_version > 0
+            else:
+                # 未認證租約總是使用全新的臨時上下文，不載入也不繼承任何存儲狀態
+                context = await self.driver.new_context(None)
+                logged_in = False
+
+            page = await self.driver.new_page(context)
+            slot.leases += 1
+            self.stats["leases"] += 1
+
+            yield ContextLease(self, slot, context, page, logged_in)
+
+        finally:
+            if page is not None:
+                try:
+                    await self.driver.close_page(page)
+                except Exception as e:
+                    self.logger.warning(f"關閉頁面失敗: {e}")
+            if context is not None and context is not slot.context:
+                try:
+                    await self.driver.close_context(context)
+                except Exception as e:
+                    self.logger.warning(f"關閉臨時上下文失敗: {e}")
+            self._idle.put_nowait(slot)
+
+    async def save_storage_state(self, context: Any):
+        """保存認證存儲狀態，供其他上下文復用"""
+        if not self.storage_state_path:
+            return
+
+        async with self._state_lock:
+            directory = os.path.dirname(self.storage_state_path)
+            if directory:
+                ensure_directory(directory)
+            await self.driver.save_storage_state(context, self.storage_state_path)
+            self.state_version += 1
+            self.stats["state_saves"] += 1
+
+        # 保存者自身已處於最新狀態，無需重建
+        for slot in self._slots:
+            if slot.context is context:
+                slot.state_version = self.state_version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取池統計信息"""
+        stats = self.stats.copy()
+        stats.update({
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "state_version": self.state_version,
+            "storage_state_path": self.storage_state_path
+        })
+        return stats
+
+    def _current_state(self) -> Optional[str]:
+        return self.storage_state_path if self.state_version > 0 else None
+
+    async def _rebuild(self, slot: _PooledContext):
+        """用最新存儲狀態重建上下文"""
+        try:
+            await self.driver.close_context(slot.context)
+        except Exception as e:
+            self.logger.warning(f"關閉過期上下文 {slot.slot_id} 失敗: {e}")
+
+        slot.context = await self.driver.new_context(self._current_state())
+        slot.state_version = self.state_version
+        self.stats["context_rebuilds"] += 1
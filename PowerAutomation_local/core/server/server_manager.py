@@ -380,6 +380,26 @@ class ServerManager:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
+        @self.app.route('/api/automation/run_suite', methods=['POST'])
+        def run_suite():
+            """並行運行自動化測試套件"""
+            try:
+                data = request.get_json() or {}
+                
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                result = loop.run_until_complete(
+                    self.automation_engine.handle_request("run_suite", {
+                        "test_cases": data.get("test_cases"),
+                        "concurrency": data.get("concurrency")
+                    })
+                )
+                loop.close()
+                
+                return jsonify(result)
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
         @self.app.route('/api/storage/search', methods=['POST'])
         def search_data():
             """搜索數據"""
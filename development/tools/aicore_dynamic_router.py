@@ -8,11 +8,13 @@ AICore Dynamic Routing System with Human-in-the-Loop Integration
 import asyncio
 import json
 import logging
+import os
+import threading
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, asdict
 from enum import Enum
-from typing import Dict, List, Optional, Any, Callable, Union
+from typing import Dict, List, Optional, Any, Callable, Union, Tuple, FrozenSet
 from datetime import datetime, timedelta
 import uuid
 import aiohttp
@@ -76,9 +78,48 @@ class RoutingDecision:
     confidence_score: float = 0.0
     reasoning: str = ""
 
+def _metadata_flags(context: RoutingContext) -> FrozenSet[str]:
+    return frozenset(key for key, value in context.metadata.items() if value) if context.metadata else frozenset()
+
+# 特徵提取器：每個請求的每個特徵最多計算一次，由所有規則共享
+FEATURE_EXTRACTORS: Dict[str, Callable[[RoutingContext], Any]] = {
+    "operation_type": lambda context: context.operation_type,
+    "is_delete_operation": lambda context: "delete" in context.operation_type.lower(),
+    "metadata_flags": _metadata_flags,
+    "mentions_production": lambda context: "production" in str(context.metadata),
+    "user_id": lambda context: context.user_id,
+}
+
+def register_feature(name: str, extractor: Callable[[RoutingContext], Any]):
+    """註冊自定義特徵提取器"""
+    FEATURE_EXTRACTORS[name] = extractor
+
+class FeatureVector:
+    """路由上下文的共享特徵向量，按需提取並緩存"""
+    
+    __slots__ = ("context", "_values")
+    
+    def __init__(self, context: RoutingContext):
+        self.context = context
+        self._values: Dict[str, Any] = {}
+    
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._values[name]
+        except KeyError:
+            value = self._values[name] = FEATURE_EXTRACTORS[name](self.context)
+            return value
+
 class RoutingRule(ABC):
     """路由規則抽象基類"""
     
+    # 規則讀取的特徵，其中任一為假值時規則不適用，編譯時據此建立索引
+    gate_features: Tuple[str, ...] = ()
+    # 規則可能產生的最高最終置信度（已乘以 get_confidence），用於提前終止
+    max_confidence: float = 1.0
+    # 規則是否實現了 evaluate_features，為 False 時編譯規則集回退到異步的 evaluate
+    supports_features: bool = False
+    
     def __init__(self, name: str, priority: int = 0):
         self.name = name
         self.priority = priority
@@ -92,20 +133,46 @@ class RoutingRule(ABC):
     def get_confidence(self, context: RoutingContext) -> float:
         """獲取規則置信度"""
         pass
+    
+    def evaluate_features(self, features: FeatureVector) -> Optional[RoutingDecision]:
+        """基於共享特徵向量同步評估，supports_features 為 True 的規則必須覆寫"""
+        raise NotImplementedError(f"{type(self).__name__} does not support feature evaluation")
 
 class ComplexityBasedRule(RoutingRule):
     """基於複雜度的路由規則"""
     
-    def __init__(self):
+    max_confidence = 0.9 * 0.8
+    supports_features = True
+    
+    OPERATION_COMPLEXITY = {
+        "deployment": 0.7,
+        "configuration_change": 0.5,
+        "data_migration": 0.8,
+        "security_update": 0.9,
+        "routine_maintenance": 0.2
+    }
+    
+    METADATA_COMPLEXITY = {
+        "production_environment": 0.2,
+        "critical_system": 0.3,
+        "multiple_dependencies": 0.1
+    }
+    
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None):
         super().__init__("complexity_based", priority=10)
         self.complexity_thresholds = {
             "low": 0.3,
             "medium": 0.6,
             "high": 0.8
         }
+        if thresholds:
+            self.complexity_thresholds.update(thresholds)
     
     async def evaluate(self, context: RoutingContext) -> Optional[RoutingDecision]:
-        complexity_score = self._calculate_complexity(context)
+        return self.evaluate_features(FeatureVector(context))
+    
+    def evaluate_features(self, features: FeatureVector) -> Optional[RoutingDecision]:
+        complexity_score = self._calculate_complexity(features)
         
         if complexity_score < self.complexity_thresholds["low"]:
             return RoutingDecision(
@@ -138,29 +205,19 @@ class ComplexityBasedRule(RoutingRule):
                 reasoning=f"High complexity score: {complexity_score}"
             )
     
-    def _calculate_complexity(self, context: RoutingContext) -> float:
+    def _calculate_complexity(self, features: Union[FeatureVector, RoutingContext]) -> float:
         """計算操作複雜度"""
-        complexity = 0.0
+        if isinstance(features, RoutingContext):
+            features = FeatureVector(features)
         
         # 基於操作類型的複雜度
-        operation_complexity = {
-            "deployment": 0.7,
-            "configuration_change": 0.5,
-            "data_migration": 0.8,
-            "security_update": 0.9,
-            "routine_maintenance": 0.2
-        }
-        
-        complexity += operation_complexity.get(context.operation_type, 0.5)
+        complexity = self.OPERATION_COMPLEXITY.get(features["operation_type"], 0.5)
         
         # 基於元數據的複雜度調整
-        if context.metadata:
-            if context.metadata.get("production_environment"):
-                complexity += 0.2
-            if context.metadata.get("critical_system"):
-                complexity += 0.3
-            if context.metadata.get("multiple_dependencies"):
-                complexity += 0.1
+        flags = features["metadata_flags"]
+        for flag, weight in self.METADATA_COMPLEXITY.items():
+            if flag in flags:
+                complexity += weight
         
         return min(complexity, 1.0)
     
@@ -170,7 +227,10 @@ class ComplexityBasedRule(RoutingRule):
 class RiskBasedRule(RoutingRule):
     """基於風險的路由規則"""
     
-    def __init__(self):
+    max_confidence = 0.9 * 0.9
+    supports_features = True
+    
+    def __init__(self, risk_factors: Optional[Dict[str, float]] = None, risk_threshold: float = 0.7):
         super().__init__("risk_based", priority=20)
         self.risk_factors = {
             "production_deployment": 0.8,
@@ -179,11 +239,17 @@ class RiskBasedRule(RoutingRule):
             "user_data_access": 0.6,
             "system_configuration": 0.5
         }
+        if risk_factors:
+            self.risk_factors.update(risk_factors)
+        self.risk_threshold = risk_threshold
     
     async def evaluate(self, context: RoutingContext) -> Optional[RoutingDecision]:
-        risk_score = self._calculate_risk(context)
+        return self.evaluate_features(FeatureVector(context))
+    
+    def evaluate_features(self, features: FeatureVector) -> Optional[RoutingDecision]:
+        risk_score = self._calculate_risk(features)
         
-        if risk_score > 0.7:
+        if risk_score > self.risk_threshold:
             return RoutingDecision(
                 decision_type=DecisionType.HUMAN_REQUIRED,
                 target_component="human_loop_mcp",
@@ -205,19 +271,22 @@ class RiskBasedRule(RoutingRule):
         
         return None
     
-    def _calculate_risk(self, context: RoutingContext) -> float:
+    def _calculate_risk(self, features: Union[FeatureVector, RoutingContext]) -> float:
         """計算操作風險"""
+        if isinstance(features, RoutingContext):
+            features = FeatureVector(features)
         risk = 0.0
         
         # 檢查各種風險因素
+        flags = features["metadata_flags"]
         for factor, weight in self.risk_factors.items():
-            if context.metadata and context.metadata.get(factor):
+            if factor in flags:
                 risk += weight
         
         # 基於操作類型的風險
-        if "delete" in context.operation_type.lower():
+        if features["is_delete_operation"]:
             risk += 0.5
-        if "production" in str(context.metadata):
+        if features["mentions_production"]:
             risk += 0.3
         
         return min(risk, 1.0)
@@ -228,15 +297,23 @@ class RiskBasedRule(RoutingRule):
 class UserExperienceRule(RoutingRule):
     """基於用戶體驗的路由規則"""
     
-    def __init__(self):
+    gate_features = ("user_id",)
+    max_confidence = 0.7 * 0.6
+    supports_features = True
+    
+    def __init__(self, user_preferences: Optional[Dict[str, Dict[str, Any]]] = None):
         super().__init__("user_experience", priority=5)
-        self.user_preferences = {}  # 可以從數據庫加載用戶偏好
+        self.user_preferences = user_preferences or {}  # 可以從數據庫加載用戶偏好
     
     async def evaluate(self, context: RoutingContext) -> Optional[RoutingDecision]:
-        if not context.user_id:
+        return self.evaluate_features(FeatureVector(context))
+    
+    def evaluate_features(self, features: FeatureVector) -> Optional[RoutingDecision]:
+        user_id = features["user_id"]
+        if not user_id:
             return None
         
-        user_pref = self.user_preferences.get(context.user_id, {})
+        user_pref = self.user_preferences.get(user_id, {})
         
         # 如果用戶偏好自動化
         if user_pref.get("automation_preference") == "high":
@@ -269,6 +346,77 @@ class UserExperienceRule(RoutingRule):
     def get_confidence(self, context: RoutingContext) -> float:
         return 0.6 if context.user_id else 0.0
 
+class CompiledRuleSet:
+    """
+    編譯後的規則集
+    
+    規則按優先級排序，按門控特徵建立索引；評估時共享一個特徵向量，
+    當已有決策的置信度不低於剩餘規則的置信度上界時提前終止
+    """
+    
+    def __init__(self, rules: List[RoutingRule], version: int):
+        self.version = version
+        self.rules = sorted(rules, key=lambda r: r.priority, reverse=True)
+        self._sync = [rule.supports_features for rule in self.rules]
+        
+        # 剩餘規則的最高可能置信度：suffix_bounds[i] = max(rules[i:].max_confidence)
+        self.suffix_bounds = [0.0] * (len(self.rules) + 1)
+        for i in range(len(self.rules) - 1, -1, -1):
+            self.suffix_bounds[i] = max(self.rules[i].max_confidence, self.suffix_bounds[i + 1])
+        
+        # 特徵 -> 以該特徵為門控的規則下標
+        self.gate_index: Dict[str, List[int]] = {}
+        for i, rule in enumerate(self.rules):
+            for feature in rule.gate_features:
+                self.gate_index.setdefault(feature, []).append(i)
+    
+    async def evaluate(self, context: RoutingContext,
+                       early_exit_confidence: Optional[float] = None
+                       ) -> Tuple[Optional[RoutingRule], Optional[RoutingDecision], int, bool]:
+        """
+        評估規則集
+        
+        Returns:
+            (最佳規則, 最佳決策, 實際評估的規則數, 是否提前終止)
+        """
+        features = FeatureVector(context)
+        
+        skipped = set()
+        for feature, indexes in self.gate_index.items():
+            if not features[feature]:
+                skipped.update(indexes)
+        
+        best_rule = None
+        best_decision = None
+        best_confidence = -1.0
+        evaluated = 0
+        
+        for i, rule in enumerate(self.rules):
+            if best_decision is not None and (
+                best_confidence >= self.suffix_bounds[i]
+                or (early_exit_confidence is not None and best_confidence >= early_exit_confidence)
+            ):
+                return best_rule, best_decision, evaluated, True
+            if i in skipped:
+                continue
+            
+            evaluated += 1
+            try:
+                if self._sync[i]:
+                    decision = rule.evaluate_features(features)
+                else:
+                    decision = await rule.evaluate(context)
+                if decision:
+                    decision.confidence_score *= rule.get_confidence(context)
+                    # 置信度相同時保留優先級更高（先評估）的規則
+                    if decision.confidence_score > best_confidence:
+                        best_rule, best_decision = rule, decision
+                        best_confidence = decision.confidence_score
+            except Exception as e:
+                logger.error(f"Error evaluating rule {rule.name}: {e}")
+        
+        return best_rule, best_decision, evaluated, False
+
 class AICoreDynamicRouter:
     """AICore動態路由器"""
     
@@ -276,7 +424,29 @@ class AICoreDynamicRouter:
         self.rules: List[RoutingRule] = []
         self.human_loop_client = None
         self.expert_system = None
+        self.config_path = config_path
         self.config = self._load_config(config_path)
+        
+        # 配置生成的規則可熱重載，add_rule 添加的自定義規則保持不變
+        self._config_rules: List[RoutingRule] = []
+        self._custom_rules: List[RoutingRule] = []
+        self._rules_version = 0
+        self._compiled: Optional[CompiledRuleSet] = None
+        self._compile_lock = threading.Lock()
+        self._config_mtime = self._get_config_mtime()
+        self._next_reload_check = time.monotonic()
+        
+        self.stats = {
+            "total_requests": 0,
+            "decisions": {decision_type.value: 0 for decision_type in DecisionType},
+            "rules_evaluated": 0,
+            "early_exits": 0,
+            "compilations": 0,
+            "reloads": 0,
+            "reload_errors": 0,
+            "total_routing_time": 0.0
+        }
+        
         self._initialize_components()
     
     def _load_config(self, config_path: Optional[str]) -> Dict[str, Any]:
@@ -289,7 +459,14 @@ class AICoreDynamicRouter:
             "routing": {
                 "default_timeout": 300,
                 "max_retries": 3,
-                "fallback_to_human": True
+                "fallback_to_human": True,
+                "early_exit_confidence": None,  # 達到此置信度即停止評估，None 表示只按置信度上界終止
+                "hot_reload_interval": 5.0  # 檢查配置文件變化的間隔（秒），0 表示關閉
+            },
+            "rules": {
+                "risk_based": {"enabled": True},
+                "complexity_based": {"enabled": True},
+                "user_experience": {"enabled": True}
             },
             "logging": {
                 "level": "INFO",
@@ -299,20 +476,26 @@ class AICoreDynamicRouter:
         
         if config_path:
             try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    user_config = yaml.safe_load(f)
-                    default_config.update(user_config)
+                default_config.update(self._read_config_file(config_path))
             except Exception as e:
                 logger.warning(f"Failed to load config from {config_path}: {e}")
         
         return default_config
     
+    @staticmethod
+    def _read_config_file(config_path: str) -> Dict[str, Any]:
+        """讀取配置文件，內容為空或不是映射時拋出異常"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            user_config = yaml.safe_load(f)
+        if not isinstance(user_config, dict):
+            raise ValueError(f"config must be a mapping, got {type(user_config).__name__}")
+        return user_config
+    
     def _initialize_components(self):
         """初始化組件"""
         # 添加默認路由規則
-        self.add_rule(RiskBasedRule())
-        self.add_rule(ComplexityBasedRule())
-        self.add_rule(UserExperienceRule())
+        self._config_rules = self._build_config_rules(self.config.get("rules", {}))
+        self._rebuild_rules()
         
         # 初始化Human Loop MCP客戶端
         self.human_loop_client = HumanLoopMCPClient(
@@ -320,36 +503,153 @@ class AICoreDynamicRouter:
             timeout=self.config["human_loop_mcp"]["timeout"]
         )
     
+    def _build_config_rules(self, rules_config: Dict[str, Any]) -> List[RoutingRule]:
+        """根據配置創建內置規則"""
+        rules: List[RoutingRule] = []
+        
+        risk_config = rules_config.get("risk_based", {})
+        if risk_config.get("enabled", True):
+            rules.append(RiskBasedRule(
+                risk_factors=risk_config.get("risk_factors"),
+                risk_threshold=risk_config.get("risk_threshold", 0.7)
+            ))
+        
+        complexity_config = rules_config.get("complexity_based", {})
+        if complexity_config.get("enabled", True):
+            rules.append(ComplexityBasedRule(thresholds=complexity_config.get("thresholds")))
+        
+        experience_config = rules_config.get("user_experience", {})
+        if experience_config.get("enabled", True):
+            rules.append(UserExperienceRule(user_preferences=experience_config.get("user_preferences")))
+        
+        for rule in rules:
+            rule_config = rules_config.get(rule.name, {})
+            if "priority" in rule_config:
+                rule.priority = rule_config["priority"]
+        
+        return rules
+    
+    def _rebuild_rules(self):
+        rules = self._config_rules + self._custom_rules
+        # 按優先級排序
+        rules.sort(key=lambda r: r.priority, reverse=True)
+        self.rules = rules
+        self.invalidate_rules()
+    
     def add_rule(self, rule: RoutingRule):
         """添加路由規則"""
-        self.rules.append(rule)
-        # 按優先級排序
-        self.rules.sort(key=lambda r: r.priority, reverse=True)
+        self._custom_rules.append(rule)
+        self._rebuild_rules()
+    
+    def remove_rule(self, name: str) -> bool:
+        """移除路由規則"""
+        before = len(self._config_rules) + len(self._custom_rules)
+        self._config_rules = [rule for rule in self._config_rules if rule.name != name]
+        self._custom_rules = [rule for rule in self._custom_rules if rule.name != name]
+        if len(self._config_rules) + len(self._custom_rules) == before:
+            return False
+        self._rebuild_rules()
+        return True
+    
+    def invalidate_rules(self):
+        """規則或規則參數變化後調用，下一個請求使用重新編譯的規則集"""
+        self._rules_version += 1
+    
+    def get_compiled_rules(self) -> CompiledRuleSet:
+        """獲取緩存的編譯規則集，規則變化時重新編譯"""
+        compiled = self._compiled
+        if compiled is not None and compiled.version == self._rules_version:
+            return compiled
+        
+        with self._compile_lock:
+            if self._compiled is None or self._compiled.version != self._rules_version:
+                self._compiled = CompiledRuleSet(self.rules, self._rules_version)
+                self.stats["compilations"] += 1
+            return self._compiled
+    
+    def reload_rules(self) -> bool:
+        """重新讀取配置文件並重建內置規則，讀取失敗時保留當前規則"""
+        if not self.config_path:
+            return False
+        
+        mtime = self._get_config_mtime()
+        try:
+            user_config = self._read_config_file(self.config_path)
+            config = self._load_config(None)
+            config.update(user_config)
+            rules_config = config.get("rules", {})
+            config_rules = self._build_config_rules(rules_config)
+        except Exception as e:
+            # 文件正在寫入或格式錯誤，不回退到默認規則，等待下次檢查重試
+            self.stats["reload_errors"] += 1
+            logger.warning(f"Failed to reload config from {self.config_path}, keeping current rules: {e}")
+            return False
+        
+        self._config_mtime = mtime
+        self.config["routing"] = config["routing"]
+        if rules_config == self.config.get("rules"):
+            return False
+        
+        self.config["rules"] = rules_config
+        self._config_rules = config_rules
+        self._rebuild_rules()
+        self.stats["reloads"] += 1
+        logger.info(f"Routing rules reloaded from {self.config_path}")
+        return True
+    
+    def _get_config_mtime(self) -> Optional[int]:
+        if not self.config_path:
+            return None
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _maybe_hot_reload(self):
+        """按間隔檢查配置文件，變化時熱重載規則"""
+        interval = self.config["routing"].get("hot_reload_interval", 0)
+        if not self.config_path or not interval:
+            return
+        
+        now = time.monotonic()
+        if now < self._next_reload_check:
+            return
+        self._next_reload_check = now + interval
+        
+        mtime = self._get_config_mtime()
+        if mtime is not None and mtime != self._config_mtime:
+            # 只有成功讀取後才記錄 mtime，失敗時下次檢查繼續重試
+            self.reload_rules()
     
     async def route_request(self, context: RoutingContext) -> RoutingDecision:
         """路由請求"""
-        logger.info(f"Routing request {context.request_id} for operation {context.operation_type}")
+        start = time.perf_counter()
+        # 熱路徑上避免格式化未輸出的日誌
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(f"Routing request {context.request_id} for operation {context.operation_type}")
         
-        # 評估所有規則
-        decisions = []
-        for rule in self.rules:
-            try:
-                decision = await rule.evaluate(context)
-                if decision:
-                    decision.confidence_score *= rule.get_confidence(context)
-                    decisions.append((rule, decision))
-            except Exception as e:
-                logger.error(f"Error evaluating rule {rule.name}: {e}")
+        self._maybe_hot_reload()
+        compiled = self.get_compiled_rules()
         
-        # 選擇最佳決策
-        if not decisions:
-            return self._get_default_decision(context)
+        # 按優先級評估規則，已有決策足夠可信時提前終止
+        best_rule, best_decision, evaluated, early_exit = await compiled.evaluate(
+            context, self.config["routing"].get("early_exit_confidence")
+        )
+        
+        self.stats["total_requests"] += 1
+        self.stats["rules_evaluated"] += evaluated
+        if early_exit:
+            self.stats["early_exits"] += 1
         
-        # 按置信度和優先級排序
-        decisions.sort(key=lambda x: (x[1].confidence_score, x[0].priority), reverse=True)
-        best_rule, best_decision = decisions[0]
+        # 選擇最佳決策
+        if best_decision is None:
+            best_decision = self._get_default_decision(context)
+        elif debug:
+            logger.debug(f"Selected decision from rule {best_rule.name}: {best_decision.decision_type}")
         
-        logger.info(f"Selected decision from rule {best_rule.name}: {best_decision.decision_type}")
+        self.stats["decisions"][best_decision.decision_type.value] += 1
+        self.stats["total_routing_time"] += time.perf_counter() - start
         
         # 如果需要人工介入，創建會話
         if best_decision.decision_type == DecisionType.HUMAN_REQUIRED:
@@ -394,13 +694,21 @@ class AICoreDynamicRouter:
     
     async def get_routing_statistics(self) -> Dict[str, Any]:
         """獲取路由統計信息"""
-        # 這裡可以實現統計邏輯
+        total = self.stats["total_requests"]
+        decisions = self.stats["decisions"]
         return {
-            "total_requests": 0,
-            "automatic_decisions": 0,
-            "human_interventions": 0,
-            "expert_consultations": 0,
-            "average_response_time": 0.0
+            "total_requests": total,
+            "automatic_decisions": decisions[DecisionType.AUTOMATIC.value],
+            "human_interventions": decisions[DecisionType.HUMAN_REQUIRED.value],
+            "expert_consultations": decisions[DecisionType.EXPERT_CONSULTATION.value],
+            "conditional_decisions": decisions[DecisionType.CONDITIONAL.value],
+            "average_response_time": self.stats["total_routing_time"] / total if total else 0.0,
+            "average_rules_evaluated": self.stats["rules_evaluated"] / total if total else 0.0,
+            "early_exits": self.stats["early_exits"],
+            "rule_set_version": self._rules_version,
+            "compilations": self.stats["compilations"],
+            "reloads": self.stats["reloads"],
+            "reload_errors": self.stats["reload_errors"]
         }
 
 class HumanLoopMCPClient:
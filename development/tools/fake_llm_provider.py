@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Fake LLM Provider Server
+
+離線測試 LLM 提供商客戶端用的本地假服務：
+- OpenAI /v1/chat/completions（stream 時為 SSE）和 Ollama /api/generate（stream 時為 NDJSON）
+- 可配置首 token 延遲、token 間隔和回答內容
+- 可注入限流（429 + Retry-After）和臨時錯誤（503）
+- 記錄請求數、最大並發和 TCP 連接數，用於驗證並發限制和連接復用
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+from typing import Dict, List, Optional, Any
+
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE = "這是來自本地假LLM服務的回答，用於離線測試流式輸出、並發限制和重試行為。"
+
+class FakeLLMProvider:
+    """本地假 LLM 提供商"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 response_text: str = DEFAULT_RESPONSE,
+                 chunk_size: int = 4,
+                 first_token_delay: float = 0.05,
+                 token_delay: float = 0.01,
+                 rate_limit_first: int = 0,
+                 retry_after: Optional[float] = 0.1,
+                 error_rate: float = 0.0,
+                 seed: int = 42):
+        """
+        初始化假服務
+
+        Args:
+            response_text: 回答內容
+            chunk_size: 每個流式片段的字符數
+            first_token_delay: 首個片段前的延遲（秒）
+            token_delay: 片段之間的延遲（秒）
+            rate_limit_first: 前 N 個請求返回 429
+            retry_after: 429 響應的 Retry-After（秒），None 表示不攜帶
+            error_rate: 隨機返回 503 的比例
+        """
+        self.host = host
+        self.port = port
+        self.response_text = response_text
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.rate_limit_first = rate_limit_first
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+        self._in_flight = 0
+        self._connections = set()
+        self.stats = {
+            "requests": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "streamed": 0,
+            "max_concurrency": 0
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._openai)
+        app.router.add_post("/api/generate", self._ollama)
+        app.router.add_get("/stats", self._stats)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "connections": len(self._connections)}
+
+    def _chunks(self) -> List[str]:
+        text = self.response_text
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def _admit(self, request: web.Request) -> Optional[web.Response]:
+        """記錄請求並按配置注入錯誤"""
+        self.stats["requests"] += 1
+        self._connections.add(id(request.transport))
+        if self.stats["requests"] <= self.rate_limit_first:
+            self.stats["rate_limited"] += 1
+            headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            return web.json_response({"error": {"message": "rate limited"}}, status=429, headers=headers)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"error": {"message": "service unavailable"}}, status=503)
+        return None
+
+    async def _stream(self, request: web.Request, content_type: str, encode) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        await response.prepare(request)
+        await asyncio.sleep(self.first_token_delay)
+        chunks = self._chunks()
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            await response.write(encode(chunk, False))
+        await response.write(encode(None, True))
+        await response.write_eof()
+        self.stats["streamed"] += 1
+        return response
+
+    async def _handle(self, request: web.Request, streaming, complete):
+        rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+
+        self._in_flight += 1
+        self.stats["max_concurrency"] = max(self.stats["max_concurrency"], self._in_flight)
+        try:
+            payload = await request.json()
+            if payload.get("stream"):
+                return await streaming(request)
+            await asyncio.sleep(self.first_token_delay + self.token_delay * (len(self._chunks()) - 1))
+            return web.json_response(complete(payload))
+        finally:
+            self._in_flight -= 1
+
+    async def _openai(self, request: web.Request) -> web.StreamResponse:
+        def encode(chunk, done):
+            if done:
+                return b"data: [DONE]\n\n"
+            event = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": chunk}}]}
+            return f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        return await self._handle(
+            request,
+            lambda req: self._stream(req, "text/event-stream", encode),
+            lambda payload: {
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.response_text}}]
+            }
+        )
+
+    async def _ollama(self, request: web.Request) -> web.StreamResponse:
+        def encode(chunk, done):
+            event = {"response": "", "done": True} if done else {"response": chunk, "done": False}
+            return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+        return await self._handle(
+            request,
+            lambda req: self._stream(req, "application/x-ndjson", encode),
+            lambda payload: {"model": payload.get("model"), "response": self.response_text, "done": True}
+        )
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口：在前台運行假服務"""
+    parser = argparse.ArgumentParser(description="Local fake LLM provider (OpenAI / Ollama)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--rate-limit-first", type=int, default=0, help="前 N 個請求返回 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="隨機返回 503 的比例")
+    args = parser.parse_args(argv)
+
+    provider = FakeLLMProvider(host=args.host, port=args.port,
+                               first_token_delay=args.first_token_delay, token_delay=args.token_delay,
+                               rate_limit_first=args.rate_limit_first, error_rate=args.error_rate)
+    await provider.start()
+    logger.info(f"Fake LLM provider listening on {provider.base_url}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await provider.stop()
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        pass
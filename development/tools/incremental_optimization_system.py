@@ -7,8 +7,11 @@ Incremental Optimization System for AICore Human-in-the-Loop Integration
 """
 
 import asyncio
+import copy
 import json
 import logging
+import math
+import os
 import time
 import numpy as np
 import pandas as pd
@@ -22,9 +25,8 @@ import pickle
 import sqlite3
 import aiofiles
 import aiohttp
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, mean_squared_error, classification_report
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.metrics import mean_squared_error
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 import joblib
 import threading
@@ -104,19 +106,565 @@ class OptimizationResult:
     parameters_changed: Dict[str, Any]
     validation_score: Optional[float] = None
 
+class QuantileSketch:
+    """可合併的相對誤差分位數草圖（對數分桶）"""
+    
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = defaultdict(int)
+        self.negative: Dict[int, int] = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+    
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+    
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+    
+    def add(self, value: float):
+        if value > 1e-12:
+            self.positive[self._index(value)] += 1
+        elif value < -1e-12:
+            self.negative[self._index(-value)] += 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+    
+    def merge(self, other: "QuantileSketch"):
+        for index, count in other.positive.items():
+            self.positive[index] += count
+        for index, count in other.negative.items():
+            self.negative[index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.positive)) if self.positive else 0.0
+    
+    def to_json(self) -> str:
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "p": self.positive,
+            "n": self.negative,
+            "z": self.zero_count
+        }, separators=(",", ":"))
+    
+    @classmethod
+    def from_json(cls, data: str) -> "QuantileSketch":
+        raw = json.loads(data)
+        sketch = cls(raw.get("a", 0.01))
+        for index, count in raw.get("p", {}).items():
+            sketch.positive[int(index)] = count
+        for index, count in raw.get("n", {}).items():
+            sketch.negative[int(index)] = count
+        sketch.zero_count = raw.get("z", 0)
+        sketch.count = sketch.zero_count + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+class _RollupBucket:
+    """單個聚合桶：count/sum/min/max 和分位數草圖"""
+    
+    __slots__ = ("count", "sum", "min", "max", "sketch")
+    
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+    
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+    
+    def merge(self, count: int, total: float, minimum: float, maximum: float, sketch: QuantileSketch):
+        self.count += count
+        self.sum += total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+        self.sketch.merge(sketch)
+
+class RetentionManager:
+    """時序數據降採樣與保留策略
+    
+    後台將原始樣本逐級聚合為 1 分鐘、1 小時、1 天三個層級，
+    並按配置的保留窗口刪除已聚合的過期數據。
+    晚到的樣本（時間戳落在已聚合範圍內）按原始表 id 水位線識別，
+    在下一輪合併到已有的聚合桶中。
+    """
+    
+    # 層級名稱、桶長度（秒）和時間戳截取長度（"YYYY-MM-DD HH:MM" 等）
+    TIERS = [("1m", 60, 16), ("1h", 3600, 13), ("1d", 86400, 10)]
+    BUCKET_SUFFIX = {16: ":00", 13: ":00:00", 10: " 00:00:00"}
+    
+    # 原始數據源：表名、分組鍵、數值列
+    SOURCES = {
+        "metrics": ("metrics", "metric_type", "metric_id", "value"),
+        "decisions": ("decisions", "decision_type", "outcome", "confidence")
+    }
+    
+    # rollup_state 中記錄已處理原始行 id 的偽層級
+    RAW_ID_STATE = "raw_id"
+    
+    DEFAULT_RETENTION_HOURS = {
+        "metrics": {"raw": 48, "1m": 24 * 7, "1h": 24 * 90, "1d": None},
+        "decisions": {"raw": 24 * 7, "1m": 24 * 7, "1h": 24 * 90, "1d": None}
+    }
+    
+    def __init__(self, db_path: str, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.db_path = db_path
+        self.rollup_interval = config.get("rollup_interval", 60)
+        # 桶結束後等待寫入線程落盤的時間
+        self.grace_seconds = config.get("rollup_grace_seconds", 10)
+        self.chunk_hours = config.get("rollup_chunk_hours", 1)
+        self.min_points = config.get("min_points", 60)
+        self.retention_hours = {
+            source: {**defaults, **config.get("retention_hours", {}).get(source, {})}
+            for source, defaults in self.DEFAULT_RETENTION_HOURS.items()
+        }
+        
+        self.running = False
+        self.rollup_thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"rollup_runs": 0, "rows_rolled": 0, "rows_expired": 0, "late_rows": 0,
+                      "errors": 0}
+        
+        self._init_tables()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def _init_tables(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    source TEXT NOT NULL,
+                    tier TEXT NOT NULL,
+                    bucket_start TEXT NOT NULL,
+                    key1 TEXT,
+                    key2 TEXT,
+                    count INTEGER,
+                    sum REAL,
+                    min REAL,
+                    max REAL,
+                    sketch TEXT,
+                    PRIMARY KEY (source, tier, bucket_start, key1, key2)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    source TEXT NOT NULL,
+                    tier TEXT NOT NULL,
+                    watermark TEXT,
+                    PRIMARY KEY (source, tier)
+                )
+            """)
+        conn.close()
+    
+    def start(self):
+        """啟動後台聚合線程"""
+        if not self.running:
+            self.running = True
+            self._stop_event.clear()
+            self.rollup_thread = threading.Thread(target=self._rollup_worker,
+                                                  name="optimization-rollup", daemon=True)
+            self.rollup_thread.start()
+    
+    def stop(self):
+        """停止後台聚合線程"""
+        self.running = False
+        self._stop_event.set()
+        if self.rollup_thread:
+            self.rollup_thread.join()
+            self.rollup_thread = None
+    
+    def _rollup_worker(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Rollup error: {e}")
+            self._stop_event.wait(self.rollup_interval)
+    
+    def run_once(self, now: Optional[datetime] = None):
+        """執行一輪聚合和過期清理"""
+        now = now or datetime.now()
+        with self._lock:
+            conn = self._connect()
+            try:
+                for source in self.SOURCES:
+                    max_id = self._catch_up_late(conn, source)
+                    self._rollup_raw(conn, source, now, max_id)
+                    for finer, coarser in zip(self.TIERS, self.TIERS[1:]):
+                        self._rollup_tier(conn, source, finer, coarser)
+                    self._expire(conn, source, now)
+                self.stats["rollup_runs"] += 1
+            finally:
+                conn.close()
+    
+    # ---- 聚合 ----
+    
+    @classmethod
+    def _bucket(cls, timestamp: str, width: int) -> str:
+        return timestamp[:width] + cls.BUCKET_SUFFIX[width]
+    
+    def _get_watermark(self, conn: sqlite3.Connection, source: str, tier: str) -> Optional[str]:
+        row = conn.execute("SELECT watermark FROM rollup_state WHERE source = ? AND tier = ?",
+                           (source, tier)).fetchone()
+        return row[0] if row else None
+    
+    def _set_watermark(self, conn: sqlite3.Connection, source: str, tier: str, watermark: str):
+        conn.execute("INSERT OR REPLACE INTO rollup_state (source, tier, watermark) VALUES (?, ?, ?)",
+                     (source, tier, watermark))
+    
+    def _write_buckets(self, conn: sqlite3.Connection, source: str, tier: str,
+                       buckets: Dict[Tuple[str, str, str], _RollupBucket]):
+        conn.executemany("""
+            INSERT OR REPLACE INTO rollups (source, tier, bucket_start, key1, key2, count, sum, min, max, sketch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (source, tier, bucket_start, key1, key2, b.count, b.sum, b.min, b.max, b.sketch.to_json())
+            for (bucket_start, key1, key2), b in buckets.items()
+        ])
+    
+    def _catch_up_late(self, conn: sqlite3.Connection, source: str) -> int:
+        """
+        將上一輪之後寫入、但時間戳早於 1 分鐘層級水位線的晚到樣本合併到已聚合的桶中
+        
+        Returns:
+            本輪處理的原始行 id 上限，_rollup_raw 只聚合不超過該 id 的行，
+            之後寫入的行留給下一輪，避免同一行被正常聚合和補聚合各計一次
+        """
+        table, key1, key2, value = self.SOURCES[source]
+        row = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()
+        max_id = row[0] if row and row[0] is not None else 0
+        
+        last_id = self._get_watermark(conn, source, self.RAW_ID_STATE)
+        watermark = self._get_watermark(conn, source, self.TIERS[0][0])
+        if last_id is None or watermark is None:
+            # 首次運行：尚無已聚合的範圍，所有行都由 _rollup_raw 處理
+            with conn:
+                self._set_watermark(conn, source, self.RAW_ID_STATE, str(max_id))
+            return max_id
+        
+        _, _, width = self.TIERS[0]
+        late: Dict[Tuple[str, str, str], _RollupBucket] = defaultdict(_RollupBucket)
+        rows = conn.execute(
+            f"SELECT {key1}, {key2}, {value}, timestamp FROM {table} "
+            f"WHERE id > ? AND id <= ? AND timestamp < ?",
+            (int(last_id), max_id, watermark)
+        )
+        rolled = 0
+        for k1, k2, v, ts in rows:
+            if v is None:
+                continue
+            late[(self._bucket(ts, width), k1, k2)].add(float(v))
+            rolled += 1
+        
+        with conn:
+            if late:
+                # 逐級合併：只更新已被該層級聚合過的桶，其餘的由正常聚合流程處理
+                for tier, _, tier_width in self.TIERS:
+                    tier_watermark = self._get_watermark(conn, source, tier)
+                    if tier_watermark is None:
+                        break
+                    dirty: Dict[Tuple[str, str, str], _RollupBucket] = defaultdict(_RollupBucket)
+                    for (bucket_start, k1, k2), b in late.items():
+                        coarse = self._bucket(bucket_start, tier_width)
+                        if coarse < tier_watermark:
+                            dirty[(coarse, k1, k2)].merge(b.count, b.sum, b.min, b.max, b.sketch)
+                    if not dirty:
+                        break
+                    self._merge_into(conn, source, tier, dirty)
+            self._set_watermark(conn, source, self.RAW_ID_STATE, str(max_id))
+        
+        if rolled:
+            self.stats["late_rows"] += rolled
+            logger.info(f"Merged {rolled} late {source} rows into existing rollups")
+        return max_id
+    
+    def _merge_into(self, conn: sqlite3.Connection, source: str, tier: str,
+                    buckets: Dict[Tuple[str, str, str], _RollupBucket]):
+        """將增量合併到已有的聚合行後寫回"""
+        for (bucket_start, k1, k2), b in buckets.items():
+            existing = conn.execute("""
+                SELECT count, sum, min, max, sketch FROM rollups
+                WHERE source = ? AND tier = ? AND bucket_start = ? AND key1 IS ? AND key2 IS ?
+            """, (source, tier, bucket_start, k1, k2)).fetchone()
+            if existing:
+                count, total, minimum, maximum, sketch = existing
+                b.merge(count, total, minimum, maximum, QuantileSketch.from_json(sketch))
+        self._write_buckets(conn, source, tier, buckets)
+    
+    def _rollup_raw(self, conn: sqlite3.Connection, source: str, now: datetime,
+                    max_id: Optional[int] = None):
+        """原始樣本 -> 1 分鐘層級，只處理已結束的分鐘"""
+        table, key1, key2, value = self.SOURCES[source]
+        tier, _, width = self.TIERS[0]
+        end = self._bucket(str(now - timedelta(seconds=self.grace_seconds)), width)
+        
+        start = self._get_watermark(conn, source, tier)
+        if start is None:
+            row = conn.execute(f"SELECT MIN(timestamp) FROM {table}").fetchone()
+            if not row or row[0] is None:
+                return
+            start = self._bucket(row[0], width)
+        
+        # 分塊處理，避免積壓時一次讀入過多行
+        while start < end:
+            chunk_end = min(end, str(datetime.fromisoformat(start) + timedelta(hours=self.chunk_hours)))
+            buckets: Dict[Tuple[str, str, str], _RollupBucket] = defaultdict(_RollupBucket)
+            query = (f"SELECT {key1}, {key2}, {value}, timestamp FROM {table} "
+                     f"WHERE timestamp >= ? AND timestamp < ?")
+            params: List[Any] = [start, chunk_end]
+            if max_id is not None:
+                query += " AND id <= ?"
+                params.append(max_id)
+            rows = conn.execute(query, params)
+            rolled = 0
+            for k1, k2, v, ts in rows:
+                if v is None:
+                    continue
+                buckets[(self._bucket(ts, width), k1, k2)].add(float(v))
+                rolled += 1
+            
+            with conn:
+                self._write_buckets(conn, source, tier, buckets)
+                self._set_watermark(conn, source, tier, chunk_end)
+            self.stats["rows_rolled"] += rolled
+            start = chunk_end
+    
+    def _rollup_tier(self, conn: sqlite3.Connection, source: str,
+                     finer: Tuple[str, int, int], coarser: Tuple[str, int, int]):
+        """細粒度層級 -> 粗粒度層級，只處理已被細粒度完整覆蓋的桶"""
+        finer_tier = finer[0]
+        tier, _, width = coarser
+        finer_watermark = self._get_watermark(conn, source, finer_tier)
+        if finer_watermark is None:
+            return
+        end = self._bucket(finer_watermark, width)
+        
+        start = self._get_watermark(conn, source, tier)
+        if start is None:
+            row = conn.execute("SELECT MIN(bucket_start) FROM rollups WHERE source = ? AND tier = ?",
+                               (source, finer_tier)).fetchone()
+            if not row or row[0] is None:
+                return
+            start = self._bucket(row[0], width)
+        if start >= end:
+            return
+        
+        buckets = self._merge_rows(conn.execute("""
+            SELECT bucket_start, key1, key2, count, sum, min, max, sketch FROM rollups
+            WHERE source = ? AND tier = ? AND bucket_start >= ? AND bucket_start < ?
+        """, (source, finer_tier, start, end)), width)
+        
+        with conn:
+            self._write_buckets(conn, source, tier, buckets)
+            self._set_watermark(conn, source, tier, end)
+    
+    def _merge_rows(self, rows, width: int) -> Dict[Tuple[str, str, str], _RollupBucket]:
+        buckets: Dict[Tuple[str, str, str], _RollupBucket] = defaultdict(_RollupBucket)
+        for bucket_start, k1, k2, count, total, minimum, maximum, sketch in rows:
+            buckets[(self._bucket(bucket_start, width), k1, k2)].merge(
+                count, total, minimum, maximum, QuantileSketch.from_json(sketch)
+            )
+        return buckets
+    
+    def _expire(self, conn: sqlite3.Connection, source: str, now: datetime):
+        """刪除超出保留窗口且已被上一層級聚合的數據"""
+        table = self.SOURCES[source][0]
+        retention = self.retention_hours[source]
+        levels = ["raw"] + [tier for tier, _, _ in self.TIERS]
+        
+        with conn:
+            for level, next_level in zip(levels, levels[1:] + [None]):
+                hours = retention.get(level)
+                if hours is None:
+                    continue
+                cutoff = str(now - timedelta(hours=hours))
+                if next_level is not None:
+                    # 只刪除已聚合到下一層級的數據
+                    watermark = self._get_watermark(conn, source, next_level)
+                    if watermark is None:
+                        continue
+                    cutoff = min(cutoff, watermark)
+                
+                if level == "raw":
+                    cursor = conn.execute(f"DELETE FROM {table} WHERE timestamp < ?", (cutoff,))
+                else:
+                    cursor = conn.execute(
+                        "DELETE FROM rollups WHERE source = ? AND tier = ? AND bucket_start < ?",
+                        (source, level, cutoff)
+                    )
+                self.stats["rows_expired"] += cursor.rowcount
+    
+    # ---- 查詢 ----
+    
+    def select_tier(self, source: str, hours: float, min_points: Optional[int] = None) -> str:
+        """選擇能覆蓋查詢範圍、且點數不少於 min_points 的最粗層級"""
+        min_points = min_points or self.min_points
+        retention = self.retention_hours[source]
+        for tier, seconds, _ in reversed(self.TIERS):
+            kept = retention.get(tier)
+            if kept is not None and kept < hours:
+                continue
+            if hours * 3600 / seconds >= min_points:
+                return tier
+        return self.TIERS[0][0]
+    
+    def query(self, source: str, hours: float, key1: Optional[str] = None,
+              tier: Optional[str] = None, min_points: Optional[int] = None,
+              quantiles: Tuple[float, ...] = (0.5, 0.95, 0.99)) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        查詢聚合序列，尚未聚合的最新數據從更細的層級或原始數據即時補齊
+        
+        Returns:
+            (使用的層級, 按 bucket_start 排序的聚合行)
+        """
+        tier = tier or self.select_tier(source, hours, min_points)
+        start = str(datetime.now() - timedelta(hours=hours))
+        
+        conn = self._connect()
+        try:
+            buckets = self._read_tier(conn, source, tier, start, key1)
+        finally:
+            conn.close()
+        
+        rows = []
+        for (bucket_start, k1, k2), b in sorted(buckets.items()):
+            row = {
+                "bucket_start": bucket_start,
+                "key1": k1,
+                "key2": k2,
+                "count": b.count,
+                "sum": b.sum,
+                "mean": b.sum / b.count if b.count else None,
+                "min": b.min,
+                "max": b.max
+            }
+            for q in quantiles:
+                row[f"p{int(q * 100)}"] = b.sketch.quantile(q)
+            rows.append(row)
+        return tier, rows
+    
+    def _read_tier(self, conn: sqlite3.Connection, source: str, tier: str, start: str,
+                   key1: Optional[str]) -> Dict[Tuple[str, str, str], _RollupBucket]:
+        index = [name for name, _, _ in self.TIERS].index(tier)
+        width = self.TIERS[index][2]
+        watermark = self._get_watermark(conn, source, tier)
+        
+        buckets: Dict[Tuple[str, str, str], _RollupBucket] = defaultdict(_RollupBucket)
+        if watermark is not None:
+            query = ("SELECT bucket_start, key1, key2, count, sum, min, max, sketch FROM rollups "
+                     "WHERE source = ? AND tier = ? AND bucket_start >= ? AND bucket_start < ?")
+            params: List[Any] = [source, tier, self._bucket(start, width), watermark]
+            if key1 is not None:
+                query += " AND key1 = ?"
+                params.append(key1)
+            buckets = self._merge_rows(conn.execute(query, params), width)
+        
+        # 水位線之後的數據從更細的層級補齊
+        tail_start = max(start, watermark) if watermark else start
+        if index == 0:
+            table, k1_col, k2_col, value_col = self.SOURCES[source]
+            query = f"SELECT {k1_col}, {k2_col}, {value_col}, timestamp FROM {table} WHERE timestamp >= ?"
+            params = [tail_start]
+            if key1 is not None:
+                query += f" AND {k1_col} = ?"
+                params.append(key1)
+            for k1, k2, v, ts in conn.execute(query, params):
+                if v is not None:
+                    buckets[(self._bucket(ts, width), k1, k2)].add(float(v))
+        else:
+            finer = self._read_tier(conn, source, self.TIERS[index - 1][0], tail_start, key1)
+            for (bucket_start, k1, k2), b in finer.items():
+                buckets[(self._bucket(bucket_start, width), k1, k2)].merge(
+                    b.count, b.sum, b.min, b.max, b.sketch
+                )
+        return buckets
+
 class DataCollector:
     """數據收集器"""
     
-    def __init__(self, db_path: str = "optimization_data.db"):
+    # 各類數據的預編譯插入語句
+    INSERT_STATEMENTS = {
+        "metric": """
+            INSERT INTO metrics (metric_id, metric_type, value, timestamp, context)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+        "decision": """
+            INSERT INTO decisions (decision_id, input_features, decision_type, confidence, outcome, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        "optimization": """
+            INSERT INTO optimizations (optimization_id, strategy, parameters, results, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        """
+    }
+    
+    _STOP = object()
+    
+    def __init__(self, db_path: str = "optimization_data.db", max_queue_size: int = 100000,
+                 batch_size: int = 5000, flush_interval: float = 0.5, put_timeout: float = 5.0,
+                 retention_config: Optional[Dict[str, Any]] = None):
         self.db_path = db_path
-        self.data_queue = queue.Queue()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        # 有界隊列：寫入跟不上時收集方阻塞等待，形成背壓
+        self.data_queue = queue.Queue(maxsize=max_queue_size)
         self.collection_thread = None
         self.running = False
+        # 停止收集後沒有寫入線程消費隊列，之後的數據同步寫入
+        self._stopped = False
+        self._sync_lock = threading.Lock()
+        self.stats = {
+            "stored": 0,
+            "batches": 0,
+            "dropped": 0,
+            "errors": 0
+        }
         self._init_database()
+        self.retention = RetentionManager(db_path, retention_config)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
     
     def _init_database(self):
         """初始化數據庫"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # 創建表
@@ -154,6 +702,13 @@ class DataCollector:
             )
         """)
         
+        # 時間範圍和類型查詢的索引
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_type_timestamp ON metrics (metric_type, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_decisions_timestamp ON decisions (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_decisions_type_timestamp ON decisions (decision_type, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_optimizations_timestamp ON optimizations (timestamp)")
+        
         conn.commit()
         conn.close()
     
@@ -161,317 +716,560 @@ class DataCollector:
         """開始數據收集"""
         if not self.running:
             self.running = True
-            self.collection_thread = threading.Thread(target=self._collection_worker)
+            self._stopped = False
+            self.collection_thread = threading.Thread(target=self._collection_worker,
+                                                      name="optimization-data-writer", daemon=True)
             self.collection_thread.start()
+            self.retention.start()
             logger.info("Data collection started")
     
     def stop_collection(self):
-        """停止數據收集"""
-        self.running = False
+        """停止數據收集，寫入隊列中剩餘的數據"""
+        if self.running:
+            self._stopped = True
+            self.running = False
+            self.data_queue.put(self._STOP)
         if self.collection_thread:
             self.collection_thread.join()
+            self.collection_thread = None
+        
+        # 寫入線程退出前後入隊的數據
+        leftover = []
+        while True:
+            try:
+                item = self.data_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.data_queue.task_done()
+            if item is not self._STOP:
+                leftover.append(item)
+        if leftover:
+            self._store_now(leftover)
+        self.retention.stop()
         logger.info("Data collection stopped")
     
+    def flush(self):
+        """等待隊列中已有數據全部寫入"""
+        if self.running:
+            self.data_queue.join()
+    
     def _collection_worker(self):
-        """數據收集工作線程"""
-        while self.running:
-            try:
-                # 處理隊列中的數據
-                while not self.data_queue.empty():
-                    data = self.data_queue.get_nowait()
-                    self._store_data(data)
+        """數據收集工作線程：批量取出隊列數據，每批一個事務寫入"""
+        conn = self._connect()
+        try:
+            while True:
+                try:
+                    item = self.data_queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.data_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                stop = any(data is self._STOP for data in batch)
+                try:
+                    self._store_batch(conn, [data for data in batch if data is not self._STOP])
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"Data collection error: {e}")
+                finally:
+                    for _ in batch:
+                        self.data_queue.task_done()
                 
-                time.sleep(1)  # 避免過度消耗CPU
+                if stop:
+                    break
+        finally:
+            conn.close()
+    
+    def _store_batch(self, conn: sqlite3.Connection, batch: List[Tuple[str, Tuple]]):
+        """批量存儲數據到數據庫，整批失敗時逐行重試，只丟棄寫不進去的記錄"""
+        rows: Dict[str, List[Tuple]] = defaultdict(list)
+        for data_type, row in batch:
+            rows[data_type].append(row)
+        
+        if not rows:
+            return
+        
+        try:
+            with conn:
+                for data_type, values in rows.items():
+                    conn.executemany(self.INSERT_STATEMENTS[data_type], values)
+            self.stats["stored"] += len(batch)
+            self.stats["batches"] += 1
+            return
+        except sqlite3.Error as e:
+            logger.warning(f"Batch insert failed, retrying row by row: {e}")
+        
+        for data_type, row in batch:
+            try:
+                with conn:
+                    conn.execute(self.INSERT_STATEMENTS[data_type], row)
+                self.stats["stored"] += 1
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                logger.error(f"Failed to store {data_type} record: {e}")
+        self.stats["batches"] += 1
+    
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, default=str)
+    
+    def _store_now(self, batch: List[Tuple[str, Tuple]]):
+        """不經隊列直接寫入（停止收集之後使用）"""
+        with self._sync_lock:
+            conn = self._connect()
+            try:
+                self._store_batch(conn, batch)
             except Exception as e:
+                self.stats["errors"] += 1
                 logger.error(f"Data collection error: {e}")
+            finally:
+                conn.close()
     
-    def _store_data(self, data: Dict[str, Any]):
-        """存儲數據到數據庫"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def _enqueue(self, data_type: str, row: Tuple):
+        """入隊前已序列化為數據庫行，單條異常數據不會影響整批寫入"""
+        if self._stopped:
+            self._store_now([(data_type, row)])
+            return
         try:
-            if data["type"] == "metric":
-                cursor.execute("""
-                    INSERT INTO metrics (metric_id, metric_type, value, timestamp, context)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    data["metric_id"],
-                    data["metric_type"],
-                    data["value"],
-                    data["timestamp"],
-                    json.dumps(data.get("context", {}))
-                ))
-            
-            elif data["type"] == "decision":
-                cursor.execute("""
-                    INSERT INTO decisions (decision_id, input_features, decision_type, confidence, outcome, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    data["decision_id"],
-                    json.dumps(data["input_features"]),
-                    data["decision_type"],
-                    data["confidence"],
-                    data["outcome"],
-                    data["timestamp"]
-                ))
-            
-            elif data["type"] == "optimization":
-                cursor.execute("""
-                    INSERT INTO optimizations (optimization_id, strategy, parameters, results, timestamp)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    data["optimization_id"],
-                    data["strategy"],
-                    json.dumps(data["parameters"]),
-                    json.dumps(data["results"]),
-                    data["timestamp"]
-                ))
-            
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Failed to store data: {e}")
-        finally:
-            conn.close()
+            self.data_queue.put((data_type, row), timeout=self.put_timeout)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            logger.warning(f"Data queue full, dropped {data_type} record")
     
     def collect_metric(self, metric_id: str, metric_type: str, value: float, context: Dict[str, Any] = None):
         """收集指標數據"""
-        data = {
-            "type": "metric",
-            "metric_id": metric_id,
-            "metric_type": metric_type,
-            "value": value,
-            "timestamp": datetime.now(),
-            "context": context or {}
-        }
-        self.data_queue.put(data)
+        self._enqueue("metric", (
+            metric_id,
+            metric_type,
+            value,
+            str(datetime.now()),
+            self._dumps(context) if context else "{}"
+        ))
     
     def collect_decision(self, decision_id: str, input_features: Dict[str, Any], 
                         decision_type: str, confidence: float, outcome: str):
         """收集決策數據"""
-        data = {
-            "type": "decision",
-            "decision_id": decision_id,
-            "input_features": input_features,
-            "decision_type": decision_type,
-            "confidence": confidence,
-            "outcome": outcome,
-            "timestamp": datetime.now()
-        }
-        self.data_queue.put(data)
+        self._enqueue("decision", (
+            decision_id,
+            self._dumps(input_features),
+            decision_type,
+            confidence,
+            outcome,
+            str(datetime.now())
+        ))
+    
+    def collect_optimization(self, optimization_id: str, strategy: str, parameters: Dict[str, Any],
+                             results: Dict[str, Any], timestamp: Optional[datetime] = None):
+        """收集優化結果"""
+        self._enqueue("optimization", (
+            optimization_id,
+            strategy,
+            self._dumps(parameters),
+            self._dumps(results),
+            str(timestamp or datetime.now())
+        ))
     
     def get_metrics_data(self, metric_type: str = None, hours: int = 24) -> pd.DataFrame:
         """獲取指標數據"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         
-        query = """
-            SELECT * FROM metrics 
-            WHERE timestamp > datetime('now', '-{} hours')
-        """.format(hours)
+        query = "SELECT * FROM metrics WHERE timestamp > ?"
+        params: List[Any] = [str(datetime.now() - timedelta(hours=hours))]
         
         if metric_type:
-            query += f" AND metric_type = '{metric_type}'"
+            query += " AND metric_type = ?"
+            params.append(metric_type)
         
         query += " ORDER BY timestamp"
         
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(query, conn, params=params)
         conn.close()
         
         return df
     
     def get_decisions_data(self, hours: int = 24) -> pd.DataFrame:
         """獲取決策數據"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         
         query = """
             SELECT * FROM decisions 
-            WHERE timestamp > datetime('now', '-{} hours')
+            WHERE timestamp > ?
             ORDER BY timestamp
-        """.format(hours)
+        """
         
-        df = pd.read_sql_query(query, conn)
+        df = pd.read_sql_query(query, conn, params=[str(datetime.now() - timedelta(hours=hours))])
         conn.close()
         
         return df
 
+    def get_decision_types(self) -> List[str]:
+        """獲取已出現過的全部決策類型"""
+        conn = self._connect()
+        rows = conn.execute("SELECT DISTINCT decision_type FROM decisions").fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+    
+    def get_decisions_since(self, last_id: int = 0, limit: int = 50000,
+                            decision_types: List[str] = None, until_id: Optional[int] = None) -> pd.DataFrame:
+        """獲取檢查點之後的新決策數據（按 id 升序）"""
+        conn = self._connect()
+        query = "SELECT * FROM decisions WHERE id > ?"
+        params: List[Any] = [last_id]
+        if decision_types:
+            query += f" AND decision_type IN ({','.join('?' * len(decision_types))})"
+            params.extend(decision_types)
+        if until_id is not None:
+            query += " AND id <= ?"
+            params.append(until_id)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+        return df
+    
+    def get_metrics_since(self, last_id: int = 0, metric_types: List[str] = None,
+                          limit: int = 200000) -> pd.DataFrame:
+        """獲取檢查點之後的新指標數據（按 id 升序）"""
+        conn = self._connect()
+        query = "SELECT * FROM metrics WHERE id > ?"
+        params: List[Any] = [last_id]
+        if metric_types:
+            query += f" AND metric_type IN ({','.join('?' * len(metric_types))})"
+            params.extend(metric_types)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+        return df
+    
+    def get_metrics_aggregates(self, metric_type: str = None, hours: float = 24,
+                               tier: str = None, min_points: int = None) -> pd.DataFrame:
+        """獲取指標聚合序列，自動選擇能覆蓋時間範圍的最粗層級"""
+        tier, rows = self.retention.query("metrics", hours, key1=metric_type, tier=tier, min_points=min_points)
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        
+        df = df.rename(columns={"bucket_start": "timestamp", "key1": "metric_type", "key2": "metric_id"})
+        df["value"] = df["mean"]
+        df["tier"] = tier
+        return df
+    
+    def get_decisions_aggregates(self, decision_type: str = None, hours: float = 24,
+                                 tier: str = None, min_points: int = None) -> pd.DataFrame:
+        """獲取決策聚合序列（數值為置信度），自動選擇能覆蓋時間範圍的最粗層級"""
+        tier, rows = self.retention.query("decisions", hours, key1=decision_type, tier=tier, min_points=min_points)
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        
+        df = df.rename(columns={"bucket_start": "timestamp", "key1": "decision_type", "key2": "outcome"})
+        df["tier"] = tier
+        return df
+
+@dataclass
+class OnlineModelState:
+    """在線模型狀態：模型、流式縮放統計和數據檢查點"""
+    name: str
+    model: Any
+    scaler: StandardScaler
+    version: int = 0
+    checkpoint: int = 0  # 已消費數據的最大行 id
+    samples_seen: int = 0
+    classes: List[str] = field(default_factory=list)
+    # 性能模型的滑動窗口尾部，跨批次延續窗口特徵
+    tails: Dict[str, List[float]] = field(default_factory=dict)
+    last_score: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
 class ModelTrainer:
     """模型訓練器"""
     
-    def __init__(self, model_dir: str = "./models"):
+    PERFORMANCE_METRIC_TYPES = ['latency', 'throughput', 'memory_usage', 'cpu_usage']
+    PERFORMANCE_WINDOW_SIZE = 5
+    
+    def __init__(self, model_dir: str = "./models", routing_classes: List[str] = None,
+                 keep_versions: int = 5):
         self.model_dir = model_dir
+        self.online_dir = os.path.join(model_dir, "online")
         self.models = {}
         self.scalers = {}
         self.encoders = {}
         
+        # 在線學習狀態，更新在副本上進行，完成後整體替換
+        self.routing_classes = routing_classes or [
+            "automatic", "human_required", "expert_consultation", "conditional"
+        ]
+        self.keep_versions = keep_versions
+        self.online_state: Dict[str, OnlineModelState] = {}
+        self._swap_lock = threading.Lock()
+        
         # 確保模型目錄存在
-        import os
         os.makedirs(model_dir, exist_ok=True)
+        os.makedirs(self.online_dir, exist_ok=True)
+    
+    @staticmethod
+    def _routing_features(input_features: Dict[str, Any]) -> List[float]:
+        """路由決策特徵向量"""
+        return [
+            input_features.get('complexity', 0),
+            input_features.get('risk_level', 0),
+            input_features.get('urgency', 0),
+            input_features.get('resource_availability', 1),
+            1 if input_features.get('production_environment') else 0,
+            1 if input_features.get('critical_system') else 0
+        ]
+    
+    @staticmethod
+    def _window_features(feature_window) -> List[float]:
+        """性能預測的滑動窗口特徵"""
+        return [
+            np.mean(feature_window),
+            np.std(feature_window),
+            np.min(feature_window),
+            np.max(feature_window),
+            feature_window[-1]  # 最近值
+        ]
     
-    def train_routing_model(self, training_data: pd.DataFrame) -> Dict[str, Any]:
-        """訓練路由決策模型"""
+    def update_routing_model_online(self, new_rows: pd.DataFrame) -> Dict[str, Any]:
+        """
+        用檢查點之後的新決策增量更新路由模型
+        
+        Args:
+            new_rows: 新決策數據（需包含 id、input_features、decision_type，按 id 升序）
+        """
         try:
-            # 準備特徵和標籤
-            features = []
-            labels = []
-            
-            for _, row in training_data.iterrows():
-                input_features = json.loads(row['input_features'])
-                features.append([
-                    input_features.get('complexity', 0),
-                    input_features.get('risk_level', 0),
-                    input_features.get('urgency', 0),
-                    input_features.get('resource_availability', 1),
-                    1 if input_features.get('production_environment') else 0,
-                    1 if input_features.get('critical_system') else 0
-                ])
-                labels.append(row['decision_type'])
-            
-            if len(features) < 10:  # 需要足夠的訓練數據
-                logger.warning("Insufficient training data for routing model")
-                return {"success": False, "reason": "insufficient_data"}
-            
-            X = np.array(features)
-            y = np.array(labels)
-            
-            # 編碼標籤
-            label_encoder = LabelEncoder()
-            y_encoded = label_encoder.fit_transform(y)
-            
-            # 特徵縮放
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X)
-            
-            # 分割數據
-            X_train, X_test, y_train, y_test = train_test_split(
-                X_scaled, y_encoded, test_size=0.2, random_state=42
-            )
-            
-            # 訓練模型
-            model = RandomForestClassifier(n_estimators=100, random_state=42)
-            model.fit(X_train, y_train)
-            
-            # 評估模型
-            y_pred = model.predict(X_test)
-            accuracy = accuracy_score(y_test, y_pred)
+            if new_rows.empty:
+                return {"success": True, "updated": False, "reason": "no_new_data"}
+            
+            state = self.online_state.get('routing')
+            if state is None:
+                state = OnlineModelState(
+                    name='routing',
+                    model=SGDClassifier(loss="log_loss", random_state=42),
+                    scaler=StandardScaler(),
+                    classes=list(self.routing_classes)
+                )
+            
+            features, labels, unseen = [], [], set()
+            for input_features, decision_type in zip(new_rows['input_features'], new_rows['decision_type']):
+                if decision_type not in state.classes:
+                    # 新類別無法增量加入，需要 run_full_retrain 擴展類別
+                    unseen.add(decision_type)
+                    continue
+                features.append(self._routing_features(json.loads(input_features)))
+                labels.append(state.classes.index(decision_type))
             
-            # 保存模型
-            model_path = f"{self.model_dir}/routing_model.joblib"
-            scaler_path = f"{self.model_dir}/routing_scaler.joblib"
-            encoder_path = f"{self.model_dir}/routing_encoder.joblib"
+            new_state = copy.deepcopy(state)
+            # 補學跳過的舊行時檢查點不回退
+            new_state.checkpoint = max(state.checkpoint, int(new_rows['id'].max()))
             
-            joblib.dump(model, model_path)
-            joblib.dump(scaler, scaler_path)
-            joblib.dump(label_encoder, encoder_path)
+            if features:
+                X = np.array(features, dtype=float)
+                y = np.array(labels)
+                
+                # 先評估再學習（前序驗證）
+                if new_state.samples_seen > 0:
+                    new_state.last_score = float(new_state.model.score(new_state.scaler.transform(X), y))
+                
+                new_state.scaler.partial_fit(X)
+                new_state.model.partial_fit(new_state.scaler.transform(X), y,
+                                            classes=np.arange(len(new_state.classes)))
+                new_state.samples_seen += len(X)
             
-            self.models['routing'] = model
-            self.scalers['routing'] = scaler
-            self.encoders['routing'] = label_encoder
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(new_state.classes)
+            self._publish(new_state, encoder)
             
-            logger.info(f"Routing model trained with accuracy: {accuracy:.3f}")
+            if unseen:
+                logger.warning(f"Unseen routing classes {sorted(unseen)}, full retrain required")
             
             return {
                 "success": True,
-                "accuracy": accuracy,
-                "model_path": model_path,
-                "training_samples": len(X_train),
-                "test_samples": len(X_test)
+                "updated": bool(features),
+                "version": new_state.version,
+                "checkpoint": new_state.checkpoint,
+                "new_samples": len(features),
+                "samples_seen": new_state.samples_seen,
+                "prequential_accuracy": new_state.last_score,
+                "unseen_classes": sorted(unseen),
+                "requires_full_retrain": bool(unseen)
             }
             
         except Exception as e:
-            logger.error(f"Failed to train routing model: {e}")
+            logger.error(f"Failed to update routing model online: {e}")
             return {"success": False, "reason": str(e)}
     
-    def train_performance_model(self, metrics_data: pd.DataFrame) -> Dict[str, Any]:
-        """訓練性能預測模型"""
+    def update_performance_model_online(self, new_rows: pd.DataFrame) -> Dict[str, Any]:
+        """
+        用檢查點之後的新指標增量更新性能預測模型
+        
+        Args:
+            new_rows: 新指標數據（需包含 id、metric_type、value，按 id 升序）
+        """
         try:
-            # 準備時間序列特徵
-            metrics_data['timestamp'] = pd.to_datetime(metrics_data['timestamp'])
-            metrics_data = metrics_data.sort_values('timestamp')
-            
-            # 按指標類型分組
-            performance_metrics = metrics_data[metrics_data['metric_type'].isin([
-                'latency', 'throughput', 'memory_usage', 'cpu_usage'
-            ])]
-            
-            if len(performance_metrics) < 50:
-                logger.warning("Insufficient performance data for model training")
-                return {"success": False, "reason": "insufficient_data"}
-            
-            # 創建特徵
-            features = []
-            targets = []
-            
-            for metric_type in ['latency', 'throughput', 'memory_usage', 'cpu_usage']:
-                metric_data = performance_metrics[performance_metrics['metric_type'] == metric_type]
-                if len(metric_data) < 10:
+            if new_rows.empty:
+                return {"success": True, "updated": False, "reason": "no_new_data"}
+            
+            state = self.online_state.get('performance')
+            if state is None:
+                state = OnlineModelState(
+                    name='performance',
+                    model=SGDRegressor(random_state=42),
+                    scaler=StandardScaler()
+                )
+            
+            new_state = copy.deepcopy(state)
+            new_state.checkpoint = int(new_rows['id'].max())
+            window_size = self.PERFORMANCE_WINDOW_SIZE
+            
+            features, targets = [], []
+            for metric_type, value in zip(new_rows['metric_type'], new_rows['value']):
+                if metric_type not in self.PERFORMANCE_METRIC_TYPES:
                     continue
+                tail = new_state.tails.setdefault(metric_type, [])
+                if len(tail) == window_size:
+                    features.append(self._window_features(np.array(tail)))
+                    targets.append(value)
+                tail.append(value)
+                if len(tail) > window_size:
+                    tail.pop(0)
+            
+            if features:
+                X = np.array(features, dtype=float)
+                y = np.array(targets, dtype=float)
                 
-                values = metric_data['value'].values
+                if new_state.samples_seen > 0:
+                    y_pred = new_state.model.predict(new_state.scaler.transform(X))
+                    new_state.last_score = float(np.sqrt(mean_squared_error(y, y_pred)))
                 
-                # 創建滑動窗口特徵
-                window_size = 5
-                for i in range(window_size, len(values)):
-                    feature_window = values[i-window_size:i]
-                    target_value = values[i]
-                    
-                    features.append([
-                        np.mean(feature_window),
-                        np.std(feature_window),
-                        np.min(feature_window),
-                        np.max(feature_window),
-                        feature_window[-1]  # 最近值
-                    ])
-                    targets.append(target_value)
-            
-            if len(features) < 20:
-                logger.warning("Insufficient feature data for performance model")
-                return {"success": False, "reason": "insufficient_features"}
-            
-            X = np.array(features)
-            y = np.array(targets)
-            
-            # 特徵縮放
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X)
-            
-            # 分割數據
-            X_train, X_test, y_train, y_test = train_test_split(
-                X_scaled, y, test_size=0.2, random_state=42
-            )
-            
-            # 訓練模型
-            model = GradientBoostingRegressor(n_estimators=100, random_state=42)
-            model.fit(X_train, y_train)
+                new_state.scaler.partial_fit(X)
+                new_state.model.partial_fit(new_state.scaler.transform(X), y)
+                new_state.samples_seen += len(X)
             
-            # 評估模型
-            y_pred = model.predict(X_test)
-            mse = mean_squared_error(y_test, y_pred)
-            rmse = np.sqrt(mse)
-            
-            # 保存模型
-            model_path = f"{self.model_dir}/performance_model.joblib"
-            scaler_path = f"{self.model_dir}/performance_scaler.joblib"
-            
-            joblib.dump(model, model_path)
-            joblib.dump(scaler, scaler_path)
-            
-            self.models['performance'] = model
-            self.scalers['performance'] = scaler
-            
-            logger.info(f"Performance model trained with RMSE: {rmse:.3f}")
+            self._publish(new_state)
             
             return {
                 "success": True,
-                "rmse": rmse,
-                "model_path": model_path,
-                "training_samples": len(X_train),
-                "test_samples": len(X_test)
+                "updated": bool(features),
+                "version": new_state.version,
+                "checkpoint": new_state.checkpoint,
+                "new_samples": len(features),
+                "samples_seen": new_state.samples_seen,
+                "prequential_rmse": new_state.last_score
             }
             
         except Exception as e:
-            logger.error(f"Failed to train performance model: {e}")
+            logger.error(f"Failed to update performance model online: {e}")
             return {"success": False, "reason": str(e)}
     
+    def get_checkpoint(self, name: str) -> int:
+        """在線模型已消費數據的檢查點"""
+        state = self.online_state.get(name)
+        return state.checkpoint if state else 0
+    
+    def extend_routing_classes(self, classes: List[str]) -> List[str]:
+        """
+        為路由模型加入增量更新無法處理的新類別，保留已學到的權重
+        
+        新類別的權重從零開始，由後續的增量更新學習；二分類模型先展開為等價的一對多形式
+        
+        Returns:
+            實際新增的類別
+        """
+        added = [c for c in classes if c not in self.routing_classes]
+        if not added:
+            return []
+        self.routing_classes = self.routing_classes + added
+        
+        state = self.online_state.get('routing')
+        if state is None:
+            return added
+        
+        new_state = copy.deepcopy(state)
+        model = new_state.model
+        if getattr(model, 'coef_', None) is not None:
+            coef, intercept = model.coef_, model.intercept_
+            if len(new_state.classes) == 2:
+                coef = np.vstack([-coef[0], coef[0]])
+                intercept = np.array([-intercept[0], intercept[0]])
+            model.coef_ = np.vstack([coef, np.zeros((len(added), coef.shape[1]))])
+            model.intercept_ = np.concatenate([intercept, np.full(len(added), intercept.min())])
+            model.classes_ = np.arange(len(new_state.classes) + len(added))
+        new_state.classes = new_state.classes + added
+        
+        encoder = LabelEncoder()
+        encoder.classes_ = np.array(new_state.classes)
+        self._publish(new_state, encoder)
+        logger.info(f"Routing model extended with classes {added}")
+        return added
+    
+    def _publish(self, state: OnlineModelState, encoder: Optional[LabelEncoder] = None):
+        """保存版本化快照後原子替換當前模型"""
+        state.version += 1
+        state.updated_at = datetime.now()
+        
+        snapshot_path = os.path.join(self.online_dir, f"{state.name}_v{state.version:06d}.joblib")
+        tmp_path = snapshot_path + ".tmp"
+        joblib.dump({"state": state, "encoder": encoder}, tmp_path)
+        os.replace(tmp_path, snapshot_path)
+        
+        pointer_path = os.path.join(self.online_dir, f"{state.name}_current.json")
+        with open(pointer_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": state.version,
+                "path": snapshot_path,
+                "checkpoint": state.checkpoint,
+                "updated_at": state.updated_at.isoformat()
+            }, f)
+        os.replace(pointer_path + ".tmp", pointer_path)
+        
+        with self._swap_lock:
+            self.online_state[state.name] = state
+            self.models[state.name] = state.model
+            self.scalers[state.name] = state.scaler
+            if encoder is not None:
+                self.encoders[state.name] = encoder
+        
+        self._prune_snapshots(state.name, state.version)
+    
+    def _prune_snapshots(self, name: str, current_version: int):
+        oldest_kept = current_version - self.keep_versions + 1
+        prefix = f"{name}_v"
+        for filename in os.listdir(self.online_dir):
+            if filename.startswith(prefix) and filename.endswith(".joblib"):
+                try:
+                    version = int(filename[len(prefix):-len(".joblib")])
+                except ValueError:
+                    continue
+                if version < oldest_kept:
+                    os.remove(os.path.join(self.online_dir, filename))
+    
+    def _load_online_models(self):
+        """加載當前在線模型快照"""
+        for name in ('routing', 'performance'):
+            pointer_path = os.path.join(self.online_dir, f"{name}_current.json")
+            if not os.path.exists(pointer_path):
+                continue
+            with open(pointer_path, "r", encoding="utf-8") as f:
+                pointer = json.load(f)
+            snapshot = joblib.load(pointer["path"])
+            state: OnlineModelState = snapshot["state"]
+            with self._swap_lock:
+                self.online_state[name] = state
+                self.models[name] = state.model
+                self.scalers[name] = state.scaler
+                if snapshot.get("encoder") is not None:
+                    self.encoders[name] = snapshot["encoder"]
+            logger.info(f"Online {name} model v{state.version} loaded (checkpoint={state.checkpoint})")
+    
     def load_models(self):
         """加載已保存的模型"""
         try:
@@ -494,6 +1292,9 @@ class ModelTrainer:
                 self.models['performance'] = joblib.load(performance_model_path)
                 self.scalers['performance'] = joblib.load(performance_scaler_path)
                 logger.info("Performance model loaded successfully")
+            
+            # 在線模型快照比離線模型更新，加載後覆蓋
+            self._load_online_models()
                 
         except Exception as e:
             logger.error(f"Failed to load models: {e}")
@@ -525,6 +1326,7 @@ class OptimizationEngine:
             "optimization_interval": 300,  # 5分鐘
             "model_retrain_interval": 3600,  # 1小時
             "min_data_points": 100,
+            "online_batch_limit": 50000,  # 單次增量更新讀取的最大行數
             "confidence_threshold": 0.8,
             "max_parameter_change": 0.2,  # 最大參數變化20%
             "rollback_threshold": 0.1  # 性能下降10%則回滾
@@ -634,8 +1436,8 @@ class OptimizationEngine:
     def _update_metrics(self):
         """更新指標值"""
         try:
-            # 獲取最近的指標數據
-            metrics_data = self.data_collector.get_metrics_data(hours=1)
+            # 獲取最近的指標聚合數據
+            metrics_data = self.data_collector.get_metrics_aggregates(hours=1)
             
             if metrics_data.empty:
                 return
@@ -646,7 +1448,7 @@ class OptimizationEngine:
                 
                 if not metric_data.empty:
                     # 計算最近的平均值
-                    recent_value = metric_data['value'].mean()
+                    recent_value = metric_data['sum'].sum() / metric_data['count'].sum()
                     
                     # 更新指標
                     metric.current_value = recent_value
@@ -728,14 +1530,13 @@ class OptimizationEngine:
             self.optimization_history.append(optimization_result)
             
             # 記錄優化結果
-            self.data_collector.data_queue.put({
-                "type": "optimization",
-                "optimization_id": optimization_result.optimization_id,
-                "strategy": optimization_result.strategy.value,
-                "parameters": optimization_result.parameters_changed,
-                "results": asdict(optimization_result),
-                "timestamp": optimization_result.timestamp
-            })
+            self.data_collector.collect_optimization(
+                optimization_result.optimization_id,
+                optimization_result.strategy.value,
+                optimization_result.parameters_changed,
+                asdict(optimization_result),
+                optimization_result.timestamp
+            )
             
             logger.info("Routing parameters optimized")
             return True
@@ -745,29 +1546,59 @@ class OptimizationEngine:
             return False
     
     def _retrain_routing_model(self) -> bool:
-        """重新訓練路由模型"""
+        """用檢查點之後的新決策增量更新路由模型"""
         try:
-            # 獲取最近的決策數據
-            decisions_data = self.data_collector.get_decisions_data(hours=24)
-            
-            if len(decisions_data) < self.config["min_data_points"]:
-                logger.warning("Insufficient data for model retraining")
-                return False
-            
-            # 重新訓練模型
-            result = self.model_trainer.train_routing_model(decisions_data)
+            result = self._update_routing_online()
             
             if result["success"]:
-                logger.info(f"Routing model retrained with accuracy: {result['accuracy']:.3f}")
+                if result.get("updated"):
+                    logger.info(f"Routing model updated online: v{result['version']}, "
+                                f"{result['new_samples']} new samples")
                 return True
             else:
-                logger.error(f"Failed to retrain routing model: {result['reason']}")
+                logger.error(f"Failed to update routing model: {result['reason']}")
                 return False
                 
         except Exception as e:
             logger.error(f"Failed to retrain routing model: {e}")
             return False
     
+    def _update_routing_online(self) -> Dict[str, Any]:
+        """消費路由模型檢查點之後的全部新決策"""
+        result = {"success": True, "updated": False}
+        limit = self.config["online_batch_limit"]
+        while True:
+            checkpoint = self.model_trainer.get_checkpoint('routing')
+            new_rows = self.data_collector.get_decisions_since(checkpoint, limit=limit)
+            if new_rows.empty:
+                return result
+            batch_result = self.model_trainer.update_routing_model_online(new_rows)
+            if not batch_result["success"]:
+                return batch_result
+            batch_result["updated"] = batch_result["updated"] or result["updated"]
+            result = batch_result
+            if len(new_rows) < limit:
+                return result
+    
+    def _update_performance_online(self) -> Dict[str, Any]:
+        """消費性能模型檢查點之後的全部新指標"""
+        result = {"success": True, "updated": False}
+        limit = self.config["online_batch_limit"]
+        while True:
+            checkpoint = self.model_trainer.get_checkpoint('performance')
+            new_rows = self.data_collector.get_metrics_since(
+                checkpoint, ModelTrainer.PERFORMANCE_METRIC_TYPES, limit=limit
+            )
+            if new_rows.empty:
+                return result
+            batch_result = self.model_trainer.update_performance_model_online(new_rows)
+            if not batch_result["success"]:
+                return batch_result
+            batch_result["updated"] = batch_result["updated"] or result["updated"]
+            result = batch_result
+            if len(new_rows) < limit:
+                return result
+    
     def _optimize_memory_usage(self, context: Dict[str, float]) -> bool:
         """優化記憶體使用"""
         try:
@@ -795,28 +1626,79 @@ class OptimizationEngine:
             return False
     
     def _retrain_models(self):
-        """重新訓練所有模型"""
+        """增量更新所有模型，只消費上次檢查點之後的新數據"""
+        try:
+            routing_result = self._update_routing_online()
+            if routing_result.get("updated"):
+                logger.info(f"Routing model updated online: v{routing_result['version']}, "
+                            f"prequential accuracy={routing_result['prequential_accuracy']}")
+            if routing_result.get("requires_full_retrain"):
+                logger.warning("Routing model has unseen classes, run run_full_retrain() offline")
+            
+            performance_result = self._update_performance_online()
+            if performance_result.get("updated"):
+                logger.info(f"Performance model updated online: v{performance_result['version']}, "
+                            f"prequential RMSE={performance_result['prequential_rmse']}")
+            
+        except Exception as e:
+            logger.error(f"Failed to update models online: {e}")
+    
+    def run_full_retrain(self) -> Dict[str, Any]:
+        """
+        全量重訓任務（需顯式調用，不在優化循環中執行）
+        
+        原始數據按保留策略過期，無法從頭重放全部歷史，因此不丟棄已學到的模型：
+        為路由模型擴展新類別，補學保留窗口內此前因類別未知而跳過的決策，
+        再讓兩個模型消費檢查點之後的全部新數據
+        """
+        results: Dict[str, Any] = {}
         try:
-            logger.info("Starting model retraining...")
+            logger.info("Starting full model retraining...")
             
-            # 獲取訓練數據
-            decisions_data = self.data_collector.get_decisions_data(hours=168)  # 一週數據
-            metrics_data = self.data_collector.get_metrics_data(hours=168)
+            checkpoint = self.model_trainer.get_checkpoint('routing')
+            added = self.model_trainer.extend_routing_classes(self.data_collector.get_decision_types())
+            results["absorbed_classes"] = added
+            if added and checkpoint:
+                results["replayed"] = self._replay_skipped_decisions(added, checkpoint)
             
-            # 重新訓練路由模型
-            if len(decisions_data) >= self.config["min_data_points"]:
-                routing_result = self.model_trainer.train_routing_model(decisions_data)
-                if routing_result["success"]:
-                    logger.info(f"Routing model retrained: accuracy={routing_result['accuracy']:.3f}")
+            results["routing"] = self._update_routing_online()
+            if results["routing"].get("updated"):
+                logger.info(f"Routing model updated: v{results['routing']['version']}, "
+                            f"{results['routing']['samples_seen']} samples")
             
-            # 重新訓練性能模型
-            if len(metrics_data) >= self.config["min_data_points"]:
-                performance_result = self.model_trainer.train_performance_model(metrics_data)
-                if performance_result["success"]:
-                    logger.info(f"Performance model retrained: RMSE={performance_result['rmse']:.3f}")
+            results["performance"] = self._update_performance_online()
+            if results["performance"].get("updated"):
+                logger.info(f"Performance model updated: v{results['performance']['version']}, "
+                            f"{results['performance']['samples_seen']} samples")
+            
+            results["success"] = (results.get("replayed", {}).get("success", True)
+                                  and results["routing"]["success"] and results["performance"]["success"])
             
         except Exception as e:
             logger.error(f"Failed to retrain models: {e}")
+            results.update({"success": False, "reason": str(e)})
+        
+        return results
+    
+    def _replay_skipped_decisions(self, classes: List[str], checkpoint: int) -> Dict[str, Any]:
+        """補學檢查點之前、因類別未知而被跳過的決策"""
+        result = {"success": True, "updated": False}
+        limit = self.config["online_batch_limit"]
+        last_id = 0
+        while True:
+            rows = self.data_collector.get_decisions_since(
+                last_id, limit=limit, decision_types=classes, until_id=checkpoint
+            )
+            if rows.empty:
+                return result
+            batch_result = self.model_trainer.update_routing_model_online(rows)
+            if not batch_result["success"]:
+                return batch_result
+            batch_result["updated"] = batch_result["updated"] or result["updated"]
+            result = batch_result
+            if len(rows) < limit:
+                return result
+            last_id = int(rows['id'].max())
     
     def get_optimization_status(self) -> Dict[str, Any]:
         """獲取優化狀態"""
@@ -846,8 +1728,17 @@ class IncrementalOptimizationSystem:
         self.config = self._load_config(config_path)
         
         # 初始化組件
-        self.data_collector = DataCollector(self.config.get("db_path", "optimization_data.db"))
-        self.model_trainer = ModelTrainer(self.config.get("model_dir", "./models"))
+        self.data_collector = DataCollector(
+            self.config.get("db_path", "optimization_data.db"),
+            max_queue_size=self.config.get("collector_queue_size", 100000),
+            batch_size=self.config.get("collector_batch_size", 5000),
+            retention_config=self.config.get("retention", {})
+        )
+        self.model_trainer = ModelTrainer(
+            self.config.get("model_dir", "./models"),
+            routing_classes=self.config.get("routing_classes"),
+            keep_versions=self.config.get("model_keep_versions", 5)
+        )
         self.optimization_engine = OptimizationEngine(self.data_collector, self.model_trainer)
         
         # 加載已有模型
@@ -904,6 +1795,11 @@ class IncrementalOptimizationSystem:
         except Exception as e:
             logger.error(f"Failed to stop optimization system: {e}")
     
+    def run_full_retrain(self) -> Dict[str, Any]:
+        """擴展路由類別並讓在線模型追上全部新數據，不丟棄已學到的模型"""
+        self.data_collector.flush()
+        return self.optimization_engine.run_full_retrain()
+    
     def collect_routing_decision(self, decision_id: str, input_features: Dict[str, Any], 
                                decision_type: str, confidence: float, outcome: str):
         """收集路由決策數據"""
@@ -918,12 +1814,22 @@ class IncrementalOptimizationSystem:
         return {
             "data_collector": {
                 "running": self.data_collector.running,
-                "queue_size": self.data_collector.data_queue.qsize()
+                "queue_size": self.data_collector.data_queue.qsize(),
+                **self.data_collector.stats
             },
             "optimization_engine": self.optimization_engine.get_optimization_status(),
             "models": {
                 "loaded_models": list(self.model_trainer.models.keys()),
-                "model_dir": self.model_trainer.model_dir
+                "model_dir": self.model_trainer.model_dir,
+                "online": {
+                    name: {
+                        "version": state.version,
+                        "checkpoint": state.checkpoint,
+                        "samples_seen": state.samples_seen,
+                        "last_score": state.last_score
+                    }
+                    for name, state in self.model_trainer.online_state.items()
+                }
             }
         }
     
@@ -931,15 +1837,15 @@ class IncrementalOptimizationSystem:
         """生成優化報告"""
         try:
             # 獲取最近的數據
-            metrics_data = self.data_collector.get_metrics_data(hours=24)
-            decisions_data = self.data_collector.get_decisions_data(hours=24)
+            metrics_data = self.data_collector.get_metrics_aggregates(hours=24)
+            decisions_data = self.data_collector.get_decisions_aggregates(hours=24)
             
             # 計算統計信息
             report = {
                 "generated_at": datetime.now().isoformat(),
                 "data_summary": {
-                    "metrics_count": len(metrics_data),
-                    "decisions_count": len(decisions_data),
+                    "metrics_count": int(metrics_data['count'].sum()) if not metrics_data.empty else 0,
+                    "decisions_count": int(decisions_data['count'].sum()) if not decisions_data.empty else 0,
                     "time_range": "24 hours"
                 },
                 "optimization_summary": {
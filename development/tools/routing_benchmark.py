@@ -0,0 +1,787 @@
+#!/usr/bin/env python3
+"""
+Routing Stack Benchmark Harness
+
+動態路由棧的負載生成與延遲基準測試：
+- 目標：AICoreDynamicRouter、SmartRoutingEngine、SmartToolEngine，進程內調用或經 HTTP 調用本地樁服務
+- 負載模型：閉環（固定並發，完成後立即發下一個請求）和開環（固定到達率，按計劃發送時間計算延遲）
+- HDR 延遲直方圖，結果輸出為 JSON
+- 與存儲的基線比較，超過閾值的指標標記為回歸
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+import aiohttp
+from aiohttp import web
+
+# 配置日誌
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_ROOT = os.path.abspath(os.path.join(_TOOLS_DIR, "..", ".."))
+
+for _path in (
+    _TOOLS_DIR,
+    os.path.join(_REPO_ROOT, "PowerAutomation", "core"),
+    os.path.join(_REPO_ROOT, "PowerAutomation", "components", "mcp", "core", "routing"),
+):
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+class LatencyHistogram:
+    """
+    HDR 延遲直方圖（微秒）
+
+    對數分桶、桶內線性細分，在整個量程內保持固定的有效數字精度；
+    桶計數稀疏存儲，可合併、可序列化
+    """
+
+    def __init__(self, significant_digits: int = 3):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.significant_digits = significant_digits
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.half_bits = self.sub_bucket_bits - 1
+        self.counts: Dict[int, int] = {}
+        self.total_count = 0
+        self.min_value: Optional[int] = None
+        self.max_value = 0
+        self.sum_value = 0
+
+    def _index(self, value: int) -> int:
+        bucket = max(0, value.bit_length() - self.sub_bucket_bits)
+        return (bucket << self.half_bits) + (value >> bucket)
+
+    def _bucket_range(self, index: int) -> Tuple[int, int]:
+        bucket = max(0, (index >> self.half_bits) - 1)
+        low = (index - (bucket << self.half_bits)) << bucket
+        return low, low + (1 << bucket) - 1
+
+    def record(self, value_us: float, count: int = 1):
+        """記錄一個延遲值（微秒）"""
+        value = max(0, int(value_us))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.sum_value += value * count
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if value > self.max_value:
+            self.max_value = value
+
+    def merge(self, other: "LatencyHistogram"):
+        """合併另一個直方圖"""
+        if other.significant_digits != self.significant_digits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.sum_value += other.sum_value
+        if other.min_value is not None and (self.min_value is None or other.min_value < self.min_value):
+            self.min_value = other.min_value
+        self.max_value = max(self.max_value, other.max_value)
+
+    def percentile(self, percent: float) -> int:
+        """百分位延遲（返回所在桶的最大等價值，與 HdrHistogram 一致）"""
+        if self.total_count == 0:
+            return 0
+        target = max(1, math.ceil(self.total_count * percent / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._bucket_range(index)[1], self.max_value)
+        return self.max_value
+
+    def mean(self) -> float:
+        return self.sum_value / self.total_count if self.total_count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """常用百分位摘要（毫秒）"""
+        return {
+            "count": self.total_count,
+            "min_ms": (self.min_value or 0) / 1000,
+            "mean_ms": self.mean() / 1000,
+            "p50_ms": self.percentile(50) / 1000,
+            "p90_ms": self.percentile(90) / 1000,
+            "p95_ms": self.percentile(95) / 1000,
+            "p99_ms": self.percentile(99) / 1000,
+            "p999_ms": self.percentile(99.9) / 1000,
+            "max_ms": self.max_value / 1000
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "significant_digits": self.significant_digits,
+            "unit": "us",
+            "total_count": self.total_count,
+            "min": self.min_value or 0,
+            "max": self.max_value,
+            "sum": self.sum_value,
+            "counts": [[index, self.counts[index]] for index in sorted(self.counts)]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls(data.get("significant_digits", 3))
+        histogram.counts = {int(index): int(count) for index, count in data.get("counts", [])}
+        histogram.total_count = data.get("total_count", sum(histogram.counts.values()))
+        histogram.min_value = data.get("min") if histogram.total_count else None
+        histogram.max_value = data.get("max", 0)
+        histogram.sum_value = data.get("sum", 0)
+        return histogram
+
+# ==================== 請求組合 ====================
+
+# 各目標的默認請求組合：名稱 -> (權重, 請求參數)
+DEFAULT_MIXES: Dict[str, Dict[str, Tuple[float, Dict[str, Any]]]] = {
+    "dynamic_router": {
+        "routine_maintenance": (0.5, {"operation_type": "routine_maintenance", "metadata": {}}),
+        "configuration_change": (0.2, {"operation_type": "configuration_change",
+                                       "metadata": {"multiple_dependencies": True}}),
+        "user_preference": (0.15, {"operation_type": "data_migration", "user_id": "bench-user-auto",
+                                   "metadata": {}}),
+        "high_risk_deployment": (0.15, {"operation_type": "deployment",
+                                        "metadata": {"production_environment": True,
+                                                     "critical_system": True,
+                                                     "database_changes": True}})
+    },
+    "smart_routing": {
+        "text_processing": (0.5, {"capability_required": "text_processing"}),
+        "code_analysis": (0.3, {"capability_required": "code_analysis"}),
+        "preferred_tool": (0.2, {"capability_required": "data_analysis", "preferred_tools": ["bench_tool_1"]})
+    },
+    "smart_tool": {
+        "data_analysis": (0.5, {"task_description": "analyze sales data and generate report"}),
+        "automation": (0.3, {"task_description": "automate workflow notification", "requirements": {"budget": "low"}}),
+        "code": (0.2, {"task_description": "review code quality for api service"})
+    }
+}
+
+class RequestMix:
+    """按權重抽取請求模板（固定隨機種子，結果可複現）"""
+
+    def __init__(self, entries: Dict[str, Tuple[float, Dict[str, Any]]], seed: int = 42):
+        if not entries:
+            raise ValueError("Request mix must not be empty")
+        self.names = list(entries)
+        self.templates = [entries[name][1] for name in self.names]
+        total = sum(entries[name][0] for name in self.names)
+        cumulative = 0.0
+        self.cumulative_weights = []
+        for name in self.names:
+            cumulative += entries[name][0] / total
+            self.cumulative_weights.append(cumulative)
+        self._random = random.Random(seed)
+
+    def next(self) -> Tuple[str, Dict[str, Any]]:
+        point = self._random.random()
+        for name, template, threshold in zip(self.names, self.templates, self.cumulative_weights):
+            if point <= threshold:
+                return name, template
+        return self.names[-1], self.templates[-1]
+
+# ==================== 被測目標 ====================
+
+class BenchmarkTarget(ABC):
+    """基準測試目標"""
+
+    name: str = "target"
+
+    async def setup(self):
+        """準備被測組件"""
+
+    async def teardown(self):
+        """釋放資源"""
+
+    @abstractmethod
+    async def call(self, request: Dict[str, Any]) -> Any:
+        """發送一個請求"""
+
+class DynamicRouterTarget(BenchmarkTarget):
+    """進程內調用 AICoreDynamicRouter"""
+
+    name = "dynamic_router"
+
+    def __init__(self, human_loop_url: str):
+        self.human_loop_url = human_loop_url
+        self.router = None
+
+    async def setup(self):
+        from aicore_dynamic_router import AICoreDynamicRouter, HumanLoopMCPClient, UserExperienceRule
+
+        self.router = AICoreDynamicRouter()
+        # 人工會話發往本地樁服務
+        self.router.human_loop_client = HumanLoopMCPClient(self.human_loop_url, timeout=10)
+        for rule in self.router.rules:
+            if isinstance(rule, UserExperienceRule):
+                rule.user_preferences["bench-user-auto"] = {"automation_preference": "high"}
+
+    async def teardown(self):
+        if self.router and self.router.human_loop_client.session:
+            await self.router.human_loop_client.session.close()
+
+    async def call(self, request: Dict[str, Any]) -> Any:
+        from aicore_dynamic_router import RoutingContext
+
+        context = RoutingContext(
+            request_id=str(uuid.uuid4()),
+            workflow_id="benchmark",
+            operation_type=request["operation_type"],
+            user_id=request.get("user_id"),
+            metadata=dict(request.get("metadata", {}))
+        )
+        decision = await self.router.route_request(context)
+        return {"decision_type": decision.decision_type.value, "confidence": decision.confidence_score}
+
+class SmartRoutingTarget(BenchmarkTarget):
+    """進程內調用 SmartRoutingEngine（註冊合成端點）"""
+
+    name = "smart_routing"
+
+    def __init__(self, tool_count: int = 20, endpoints_per_tool: int = 2):
+        self.tool_count = tool_count
+        self.endpoints_per_tool = endpoints_per_tool
+        self.engine = None
+
+    async def setup(self):
+        from smart_engine import SmartRoutingEngine, ToolEndpoint, LoadMetrics
+
+        logging.getLogger("smart_engine").setLevel(logging.WARNING)
+        self.engine = SmartRoutingEngine({"default_strategy": "intelligent"})
+        capabilities = ["text_processing", "code_analysis", "data_analysis"]
+        rng = random.Random(7)
+        for i in range(self.tool_count):
+            tool_id = f"bench_tool_{i}"
+            for j in range(self.endpoints_per_tool):
+                self.engine.register_tool_endpoint(tool_id, ToolEndpoint(
+                    tool_id=tool_id,
+                    endpoint_url=f"http://127.0.0.1:9/{tool_id}/{j}",
+                    capabilities=[capabilities[i % 3], capabilities[(i + j) % 3]],
+                    load_metrics=LoadMetrics(
+                        cpu_usage=rng.uniform(5, 80),
+                        memory_usage=rng.uniform(10, 70),
+                        response_time_avg=rng.uniform(20, 400),
+                        error_rate=rng.uniform(0, 0.05)
+                    )
+                ))
+
+    async def call(self, request: Dict[str, Any]) -> Any:
+        from smart_engine import RoutingRequest
+
+        routing_request = RoutingRequest(
+            request_id=str(uuid.uuid4()),
+            capability_required=request["capability_required"],
+            preferred_tools=list(request.get("preferred_tools", []))
+        )
+        decision = await self.engine.route_request(routing_request)
+        return {"target_tool": decision.target_tool, "confidence": decision.confidence}
+
+class SmartToolTarget(BenchmarkTarget):
+    """進程內調用 SmartToolEngine.select_optimal_tool"""
+
+    name = "smart_tool"
+
+    def __init__(self):
+        self.engine = None
+
+    async def setup(self):
+        from smart_tool_engine import SmartToolEngine
+
+        logging.getLogger("smart_tool_engine").setLevel(logging.WARNING)
+        self.engine = SmartToolEngine()
+        await self.engine.initialize()
+
+    async def call(self, request: Dict[str, Any]) -> Any:
+        result = await self.engine.select_optimal_tool(
+            request["task_description"], dict(request.get("requirements", {}))
+        )
+        selected = result.get("selected_tool") or {}
+        return {"selected_tool": selected.get("name") if isinstance(selected, dict) else selected}
+
+class HttpTarget(BenchmarkTarget):
+    """經 HTTP 調用本地樁服務上的組件"""
+
+    def __init__(self, name: str, url: str, connection_limit: int = 100):
+        self.name = f"{name}_http"
+        self.url = url
+        self.connection_limit = connection_limit
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def setup(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+
+    async def teardown(self):
+        if self.session:
+            await self.session.close()
+
+    async def call(self, request: Dict[str, Any]) -> Any:
+        async with self.session.post(self.url, json=request) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            return await response.json()
+
+class LocalStubServer:
+    """
+    本地樁服務
+
+    提供 Human Loop MCP 會話接口，並把各進程內目標掛在 /bench/{target} 上，
+    供 HTTP 模式測量序列化和網絡棧的開銷
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.targets: Dict[str, BenchmarkTarget] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.sessions_created = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self, targets: Dict[str, BenchmarkTarget]):
+        self.targets = targets
+        app = web.Application()
+        app.router.add_post("/api/sessions", self._create_session)
+        app.router.add_post("/bench/{target}", self._handle_target)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _create_session(self, request: web.Request) -> web.Response:
+        await request.read()
+        self.sessions_created += 1
+        return web.json_response({"session_id": f"bench-session-{self.sessions_created}"})
+
+    async def _handle_target(self, request: web.Request) -> web.Response:
+        target = self.targets.get(request.match_info["target"])
+        if target is None:
+            return web.json_response({"error": "unknown target"}, status=404)
+        try:
+            result = await target.call(await request.json())
+            return web.json_response(result)
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=500)
+
+# ==================== 負載生成 ====================
+
+@dataclass
+class BenchmarkScenario:
+    """基準測試場景"""
+    name: str
+    target: str  # dynamic_router / smart_routing / smart_tool
+    transport: str = "in_process"  # in_process / http
+    load_model: str = "closed"  # closed / open
+    concurrency: int = 10  # 閉環並發數
+    rate: float = 100.0  # 開環到達率（請求/秒）
+    arrival: str = "poisson"  # 開環到達分佈：poisson / constant
+    max_in_flight: int = 1000  # 開環最大在途請求數，超出時計為丟棄
+    duration: float = 10.0  # 測量時長（秒）
+    warmup: float = 1.0  # 預熱時長（秒），不計入結果
+    max_requests: Optional[int] = None  # 閉環最大請求數，達到後提前結束
+    mix: Optional[Dict[str, Any]] = None  # 請求組合 {名稱: [權重, 請求參數]}
+    seed: int = 42
+
+    def __post_init__(self):
+        if self.target not in DEFAULT_MIXES:
+            raise ValueError(f"Unknown benchmark target: {self.target}")
+        if self.transport not in ("in_process", "http"):
+            raise ValueError(f"Unknown transport: {self.transport}")
+        if self.load_model not in ("closed", "open"):
+            raise ValueError(f"Unknown load model: {self.load_model}")
+
+class _Recorder:
+    """單個場景的測量狀態"""
+
+    def __init__(self, mix_names: List[str]):
+        # 發送時間早於此值的請求屬於預熱，不計入結果
+        self.measure_from = float("inf")
+        self.histogram = LatencyHistogram()
+        self.per_mix = {name: LatencyHistogram() for name in mix_names}
+        self.errors: Dict[str, int] = {}
+        self.completed = 0
+        self.dropped = 0
+
+    def record(self, mix_name: str, sent_at: float, latency_us: float, error: Optional[Exception]):
+        if sent_at < self.measure_from:
+            return
+        if error is not None:
+            key = type(error).__name__
+            self.errors[key] = self.errors.get(key, 0) + 1
+            return
+        self.completed += 1
+        self.histogram.record(latency_us)
+        self.per_mix[mix_name].record(latency_us)
+
+class BenchmarkRunner:
+    """基準測試運行器"""
+
+    def __init__(self, smart_routing_tools: int = 20):
+        self.smart_routing_tools = smart_routing_tools
+        self.stub = LocalStubServer()
+        self._in_process: Dict[str, BenchmarkTarget] = {}
+        self._http: Dict[str, HttpTarget] = {}
+
+    async def start(self):
+        """啟動本地樁服務並準備所有目標"""
+        await self.stub.start(self._in_process)
+        self._in_process.update({
+            "dynamic_router": DynamicRouterTarget(self.stub.base_url),
+            "smart_routing": SmartRoutingTarget(tool_count=self.smart_routing_tools),
+            "smart_tool": SmartToolTarget()
+        })
+        for name, target in self._in_process.items():
+            await target.setup()
+            http_target = HttpTarget(name, f"{self.stub.base_url}/bench/{name}")
+            await http_target.setup()
+            self._http[name] = http_target
+
+    async def stop(self):
+        for target in list(self._http.values()) + list(self._in_process.values()):
+            try:
+                await target.teardown()
+            except Exception as e:
+                logger.warning(f"Failed to teardown benchmark target {target.name}: {e}")
+        await self.stub.stop()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def _get_target(self, scenario: BenchmarkScenario) -> BenchmarkTarget:
+        targets = self._in_process if scenario.transport == "in_process" else self._http
+        return targets[scenario.target]
+
+    async def run(self, scenario: BenchmarkScenario) -> Dict[str, Any]:
+        """運行一個場景，返回可序列化的結果"""
+        target = self._get_target(scenario)
+        mix_entries = scenario.mix or DEFAULT_MIXES[scenario.target]
+        mix = RequestMix({name: tuple(entry) for name, entry in mix_entries.items()}, seed=scenario.seed)
+        recorder = _Recorder(mix.names)
+
+        logger.info(f"Running benchmark {scenario.name}: {target.name}, {scenario.load_model}-loop")
+
+        started_at = datetime.now().isoformat()
+        if scenario.load_model == "closed":
+            elapsed = await self._run_closed(scenario, target, mix, recorder)
+        else:
+            elapsed = await self._run_open(scenario, target, mix, recorder)
+
+        errors = sum(recorder.errors.values())
+        total = recorder.completed + errors
+        return {
+            "name": scenario.name,
+            "scenario": asdict(scenario),
+            "target": target.name,
+            "started_at": started_at,
+            "elapsed": elapsed,
+            "completed": recorder.completed,
+            "errors": recorder.errors,
+            "error_rate": errors / total if total else 0.0,
+            "dropped": recorder.dropped,
+            "throughput": recorder.completed / elapsed if elapsed > 0 else 0.0,
+            "latency": recorder.histogram.summary(),
+            "latency_by_mix": {name: histogram.summary() for name, histogram in recorder.per_mix.items()
+                               if histogram.total_count},
+            "histogram": recorder.histogram.to_dict()
+        }
+
+    async def _timed_call(self, target: BenchmarkTarget, mix_name: str, request: Dict[str, Any],
+                          recorder: _Recorder, intended_start: Optional[float] = None):
+        start = time.perf_counter()
+        error = None
+        try:
+            await target.call(request)
+        except Exception as e:
+            error = e
+        # 開環按計劃發送時間計算延遲，避免協調遺漏
+        origin = intended_start if intended_start is not None else start
+        recorder.record(mix_name, origin, (time.perf_counter() - origin) * 1e6, error)
+
+    async def _run_closed(self, scenario: BenchmarkScenario, target: BenchmarkTarget,
+                          mix: RequestMix, recorder: _Recorder) -> float:
+        """閉環：固定並發，每個工作者完成一個請求後立即發送下一個"""
+        warmup_end = time.perf_counter() + scenario.warmup
+        deadline = warmup_end + scenario.duration
+        recorder.measure_from = warmup_end
+        issued = 0
+
+        async def worker():
+            nonlocal issued
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    return
+                if now >= warmup_end and scenario.max_requests is not None:
+                    if issued >= scenario.max_requests:
+                        return
+                    issued += 1
+                mix_name, request = mix.next()
+                await self._timed_call(target, mix_name, request, recorder)
+                # 目標內部沒有掛起點時，讓出事件循環使各工作者交替執行
+                await asyncio.sleep(0)
+
+        workers = [asyncio.create_task(worker()) for _ in range(scenario.concurrency)]
+        await asyncio.gather(*workers)
+        return time.perf_counter() - warmup_end
+
+    async def _run_open(self, scenario: BenchmarkScenario, target: BenchmarkTarget,
+                        mix: RequestMix, recorder: _Recorder) -> float:
+        """開環：按到達率發送請求，不等待前一個請求完成"""
+        rng = random.Random(scenario.seed)
+        interval = 1.0 / scenario.rate
+        in_flight = set()
+
+        start = time.perf_counter()
+        warmup_end = start + scenario.warmup
+        deadline = warmup_end + scenario.duration
+        recorder.measure_from = warmup_end
+        next_arrival = start
+
+        while next_arrival < deadline:
+            now = time.perf_counter()
+            if next_arrival > now:
+                await asyncio.sleep(next_arrival - now)
+
+            if len(in_flight) >= scenario.max_in_flight:
+                if next_arrival >= warmup_end:
+                    recorder.dropped += 1
+            else:
+                mix_name, request = mix.next()
+                task = asyncio.create_task(self._timed_call(target, mix_name, request, recorder, next_arrival))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            if scenario.arrival == "constant":
+                next_arrival += interval
+            else:
+                next_arrival += rng.expovariate(scenario.rate)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        return time.perf_counter() - warmup_end
+
+# ==================== 結果與回歸比較 ====================
+
+# 默認回歸閾值：延遲允許上升、吞吐量允許下降的相對比例
+DEFAULT_THRESHOLDS = {
+    "p50_ms": 0.10,
+    "p95_ms": 0.15,
+    "p99_ms": 0.20,
+    "throughput": 0.10,
+    "error_rate": 0.01  # 絕對值
+}
+
+def build_report(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """組裝帶運行環境信息的結果報告"""
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": results
+    }
+
+def write_results(report: Dict[str, Any], path: str):
+    """寫入 JSON 結果文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compare_to_baseline(current: Dict[str, Any], baseline: Dict[str, Any],
+                        thresholds: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    將當前結果與基線逐場景比較
+
+    Args:
+        current: 當前報告
+        baseline: 基線報告
+        thresholds: 各指標的回歸閾值，默認為 DEFAULT_THRESHOLDS
+
+    Returns:
+        Dict[str, Any]: {"regressions": [...], "improvements": [...], "scenarios": {...}, "passed": bool}
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    baseline_by_name = {result["name"]: result for result in baseline.get("results", [])}
+
+    comparison = {"regressions": [], "improvements": [], "missing_in_baseline": [], "scenarios": {}}
+
+    for result in current.get("results", []):
+        name = result["name"]
+        base = baseline_by_name.get(name)
+        if base is None:
+            comparison["missing_in_baseline"].append(name)
+            continue
+
+        scenario_diff = {}
+        for metric, threshold in thresholds.items():
+            if metric == "throughput":
+                current_value, base_value = result["throughput"], base["throughput"]
+            elif metric == "error_rate":
+                current_value, base_value = result["error_rate"], base["error_rate"]
+            else:
+                current_value = result["latency"].get(metric)
+                base_value = base["latency"].get(metric)
+            if current_value is None or base_value is None:
+                continue
+
+            if metric == "error_rate":
+                change = current_value - base_value
+                regressed = change > threshold
+                improved = change < -threshold
+            else:
+                change = (current_value - base_value) / base_value if base_value else 0.0
+                if metric == "throughput":
+                    # 吞吐量下降為回歸
+                    regressed = change < -threshold
+                    improved = change > threshold
+                else:
+                    regressed = change > threshold
+                    improved = change < -threshold
+
+            entry = {
+                "scenario": name,
+                "metric": metric,
+                "baseline": base_value,
+                "current": current_value,
+                "change": change,
+                "threshold": threshold
+            }
+            scenario_diff[metric] = entry
+            if regressed:
+                comparison["regressions"].append(entry)
+            elif improved:
+                comparison["improvements"].append(entry)
+
+        comparison["scenarios"][name] = scenario_diff
+
+    comparison["passed"] = not comparison["regressions"]
+    return comparison
+
+def default_scenarios(duration: float = 5.0, warmup: float = 1.0) -> List[BenchmarkScenario]:
+    """默認場景：三個目標各自的閉環進程內、閉環 HTTP 和開環進程內測試"""
+    scenarios = []
+    for target, concurrency, rate in (
+        ("dynamic_router", 16, 2000.0),
+        ("smart_routing", 16, 2000.0),
+        ("smart_tool", 32, 200.0)
+    ):
+        scenarios.extend([
+            BenchmarkScenario(name=f"{target}_closed_in_process", target=target, load_model="closed",
+                              concurrency=concurrency, duration=duration, warmup=warmup),
+            BenchmarkScenario(name=f"{target}_closed_http", target=target, transport="http",
+                              load_model="closed", concurrency=concurrency, duration=duration, warmup=warmup),
+            BenchmarkScenario(name=f"{target}_open_in_process", target=target, load_model="open",
+                              rate=rate, duration=duration, warmup=warmup)
+        ])
+    return scenarios
+
+def load_scenarios(path: str) -> List[BenchmarkScenario]:
+    """從 JSON/YAML 文件加載場景列表"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    entries = data.get("scenarios", data) if isinstance(data, dict) else data
+    return [BenchmarkScenario(**entry) for entry in entries]
+
+async def run_benchmarks(scenarios: List[BenchmarkScenario], smart_routing_tools: int = 20) -> Dict[str, Any]:
+    """運行場景列表並返回報告"""
+    results = []
+    async with BenchmarkRunner(smart_routing_tools=smart_routing_tools) as runner:
+        for scenario in scenarios:
+            result = await runner.run(scenario)
+            latency = result["latency"]
+            logger.info(
+                f"{scenario.name}: {result['throughput']:.1f} req/s, "
+                f"p50={latency['p50_ms']:.3f}ms p99={latency['p99_ms']:.3f}ms, "
+                f"errors={sum(result['errors'].values())}"
+            )
+            results.append(result)
+    return build_report(results)
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口：運行基準測試，寫入結果並與基線比較"""
+    parser = argparse.ArgumentParser(description="Routing stack benchmark harness")
+    parser.add_argument("--scenarios", help="場景定義文件（JSON/YAML），默認使用內置場景")
+    parser.add_argument("--only", nargs="*", help="只運行指定名稱的場景")
+    parser.add_argument("--duration", type=float, default=5.0, help="內置場景的測量時長（秒）")
+    parser.add_argument("--warmup", type=float, default=1.0, help="內置場景的預熱時長（秒）")
+    parser.add_argument("--output", default="benchmark_results.json", help="結果輸出路徑")
+    parser.add_argument("--baseline", help="基線結果文件")
+    parser.add_argument("--update-baseline", action="store_true", help="將本次結果寫為基線")
+    parser.add_argument("--thresholds", help="回歸閾值 JSON，例如 '{\"p99_ms\": 0.3}'")
+    args = parser.parse_args(argv)
+
+    scenarios = load_scenarios(args.scenarios) if args.scenarios else default_scenarios(args.duration, args.warmup)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+
+    report = await run_benchmarks(scenarios)
+    write_results(report, args.output)
+    logger.info(f"Benchmark results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        write_results(report, args.baseline)
+        logger.info(f"Baseline written to {args.baseline}")
+        return 0
+
+    thresholds = json.loads(args.thresholds) if args.thresholds else None
+    comparison = compare_to_baseline(report, load_results(args.baseline), thresholds)
+    for entry in comparison["regressions"]:
+        logger.error(
+            f"Regression in {entry['scenario']} {entry['metric']}: "
+            f"{entry['baseline']:.4f} -> {entry['current']:.4f} ({entry['change']:+.1%})"
+        )
+    print(json.dumps({"passed": comparison["passed"], "regressions": comparison["regressions"]},
+                     indent=2, ensure_ascii=False))
+    return 0 if comparison["passed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+MCP Server Serving-Mode Benchmark
+
+對比 MCP 服務器在 Flask 模式（每個請求新建事件循環）和 ASGI 模式（每個工作進程一個長期事件循環）下的吞吐量：
+- 通過 asgi_launcher 在子進程中啟動服務器，等待健康檢查通過後施加閉環負載
+- 各端點分別測量，延遲使用 routing_benchmark 的 HDR 直方圖
+- 輸出結果與 routing_benchmark 格式一致，可複用基線比較；報告中附帶 ASGI 相對 Flask 的提升倍數
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Tuple
+
+import aiohttp
+
+from routing_benchmark import (
+    LatencyHistogram, build_report, write_results, load_results, compare_to_baseline
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_ROOT = os.path.abspath(os.path.join(_TOOLS_DIR, "..", ".."))
+LAUNCHER_PATH = os.path.join(_REPO_ROOT, "PowerAutomation", "servers", "asgi_launcher.py")
+
+# 基準測試使用的固定 API Key（fully_integrated_system 從環境變量讀取）
+BENCH_API_KEY = "user_serving-benchmark"
+
+@dataclass
+class Endpoint:
+    """被測端點"""
+    name: str
+    method: str
+    path: str
+    body: Optional[Dict[str, Any]] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+# 各服務器的默認被測端點
+DEFAULT_ENDPOINTS: Dict[str, List[Endpoint]] = {
+    "dynamic": [
+        Endpoint("status", "GET", "/status"),
+        Endpoint("process", "POST", "/process", {"input": "請分析臺銀人壽核保流程的自動化方案"})
+    ],
+    "domain": [
+        Endpoint("health", "GET", "/health"),
+        Endpoint("classify", "POST", "/api/classify", {"request": "請幫我設計一個微服務架構"}),
+        Endpoint("process", "POST", "/api/process", {"request": "請幫我設計一個微服務架構"})
+    ],
+    "integrated": [
+        Endpoint("health", "GET", "/health"),
+        Endpoint("status", "GET", "/api/status"),
+        Endpoint("process", "POST", "/api/process", {"request": "分析保險核保流程並給出自動化建議"},
+                 {"X-API-Key": BENCH_API_KEY})
+    ]
+}
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class ServerProcess:
+    """在子進程中通過 asgi_launcher 啟動服務器"""
+
+    def __init__(self, app: str, mode: str, workers: int = 1, port: Optional[int] = None,
+                 startup_timeout: float = 60.0, log_path: Optional[str] = None):
+        self.app = app
+        self.mode = mode
+        self.workers = workers
+        self.port = port or _free_port()
+        self.startup_timeout = startup_timeout
+        self.log_path = log_path
+        self._process: Optional[subprocess.Popen] = None
+        self._log_file = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, health_path: str = "/health"):
+        command = [
+            sys.executable, LAUNCHER_PATH, self.app,
+            "--mode", self.mode, "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning"
+        ]
+        env = {**os.environ, "POWERAUTOMATION_USER_API_KEY": BENCH_API_KEY}
+        self._log_file = open(self.log_path, "w") if self.log_path else subprocess.DEVNULL
+        self._process = subprocess.Popen(command, env=env, stdout=self._log_file, stderr=subprocess.STDOUT,
+                                         start_new_session=True)
+
+        deadline = time.monotonic() + self.startup_timeout
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+            while time.monotonic() < deadline:
+                if self._process.poll() is not None:
+                    raise RuntimeError(f"{self.app} ({self.mode}) exited with code {self._process.returncode}")
+                try:
+                    async with session.get(self.base_url + health_path) as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.2)
+        await self.stop()
+        raise TimeoutError(f"{self.app} ({self.mode}) did not become healthy in {self.startup_timeout}s")
+
+    async def stop(self):
+        if self._process and self._process.poll() is None:
+            # 終止整個進程組，包括 uvicorn 的工作進程
+            os.killpg(self._process.pid, 15)
+            try:
+                await asyncio.to_thread(self._process.wait, 10)
+            except subprocess.TimeoutExpired:
+                os.killpg(self._process.pid, 9)
+        if self._log_file not in (None, subprocess.DEVNULL):
+            self._log_file.close()
+        self._process = None
+
+async def run_endpoint(session: aiohttp.ClientSession, base_url: str, endpoint: Endpoint,
+                       concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    """對單個端點施加閉環負載"""
+    histogram = LatencyHistogram()
+    errors: Dict[str, int] = {}
+    completed = 0
+    url = base_url + endpoint.path
+
+    warmup_end = time.perf_counter() + warmup
+    deadline = warmup_end + duration
+
+    async def worker():
+        nonlocal completed
+        while True:
+            start = time.perf_counter()
+            if start >= deadline:
+                return
+            error = None
+            try:
+                async with session.request(endpoint.method, url, json=endpoint.body,
+                                           headers=endpoint.headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        error = f"HTTP {response.status}"
+            except Exception as e:
+                error = type(e).__name__
+            if start < warmup_end:
+                continue
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                completed += 1
+                histogram.record((time.perf_counter() - start) * 1e6)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - warmup_end
+    total_errors = sum(errors.values())
+    total = completed + total_errors
+    return {
+        "elapsed": elapsed,
+        "completed": completed,
+        "errors": errors,
+        "error_rate": total_errors / total if total else 0.0,
+        "throughput": completed / elapsed if elapsed > 0 else 0.0,
+        "latency": histogram.summary(),
+        "histogram": histogram.to_dict()
+    }
+
+async def benchmark_server(app: str, mode: str, workers: int, concurrency: int, duration: float,
+                           warmup: float, endpoints: List[Endpoint],
+                           log_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """啟動一個服務器，依次測量各端點"""
+    log_path = os.path.join(log_dir, f"{app}_{mode}.log") if log_dir else None
+    server = ServerProcess(app, mode, workers=workers if mode == "asgi" else 1, log_path=log_path)
+    await server.start()
+    results = []
+    try:
+        connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=30)) as session:
+            for endpoint in endpoints:
+                result = await run_endpoint(session, server.base_url, endpoint, concurrency, duration, warmup)
+                result.update({
+                    "name": f"{app}_{endpoint.name}_{mode}",
+                    "app": app,
+                    "endpoint": endpoint.name,
+                    "mode": mode,
+                    "workers": server.workers,
+                    "concurrency": concurrency
+                })
+                latency = result["latency"]
+                logger.info(
+                    f"{result['name']}: {result['throughput']:.1f} req/s, "
+                    f"p50={latency['p50_ms']:.3f}ms p99={latency['p99_ms']:.3f}ms, "
+                    f"errors={sum(result['errors'].values())}"
+                )
+                results.append(result)
+    finally:
+        await server.stop()
+    return results
+
+def summarize_speedup(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按服務器和端點對比 ASGI 相對 Flask 的吞吐量和延遲"""
+    by_key: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+    for result in results:
+        by_key.setdefault((result["app"], result["endpoint"]), {})[result["mode"]] = result
+
+    summary = []
+    for (app, endpoint), modes in by_key.items():
+        flask, asgi = modes.get("flask"), modes.get("asgi")
+        if not flask or not asgi:
+            continue
+        summary.append({
+            "app": app,
+            "endpoint": endpoint,
+            "flask_throughput": flask["throughput"],
+            "asgi_throughput": asgi["throughput"],
+            "throughput_speedup": asgi["throughput"] / flask["throughput"] if flask["throughput"] else None,
+            "flask_p99_ms": flask["latency"].get("p99_ms"),
+            "asgi_p99_ms": asgi["latency"].get("p99_ms")
+        })
+    return summary
+
+async def run_serving_benchmarks(apps: List[str], modes: List[str], workers: int = 1, concurrency: int = 16,
+                                 duration: float = 5.0, warmup: float = 1.0,
+                                 log_dir: Optional[str] = None) -> Dict[str, Any]:
+    """運行所有服務器和模式的組合並返回報告"""
+    results = []
+    for app in apps:
+        for mode in modes:
+            try:
+                results.extend(await benchmark_server(app, mode, workers, concurrency, duration, warmup,
+                                                      DEFAULT_ENDPOINTS[app], log_dir))
+            except Exception as e:
+                logger.error(f"Failed to benchmark {app} ({mode}): {e}")
+
+    report = build_report(results)
+    report["speedup"] = summarize_speedup(results)
+    return report
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Flask vs ASGI serving benchmark for the MCP servers")
+    parser.add_argument("--apps", nargs="*", default=sorted(DEFAULT_ENDPOINTS), choices=sorted(DEFAULT_ENDPOINTS))
+    parser.add_argument("--modes", nargs="*", default=["flask", "asgi"], choices=["flask", "asgi"])
+    parser.add_argument("--workers", type=int, default=1, help="ASGI 工作進程數")
+    parser.add_argument("--concurrency", type=int, default=16, help="閉環並發數")
+    parser.add_argument("--duration", type=float, default=5.0, help="每個端點的測量時長（秒）")
+    parser.add_argument("--warmup", type=float, default=1.0, help="每個端點的預熱時長（秒）")
+    parser.add_argument("--log-dir", help="服務器輸出日誌目錄")
+    parser.add_argument("--output", default="serving_benchmark_results.json", help="結果輸出路徑")
+    parser.add_argument("--baseline", help="基線結果文件，存在時比較並在回歸時返回非零")
+    args = parser.parse_args(argv)
+
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+
+    report = await run_serving_benchmarks(args.apps, args.modes, args.workers, args.concurrency,
+                                          args.duration, args.warmup, args.log_dir)
+    write_results(report, args.output)
+    logger.info(f"Serving benchmark results written to {args.output}")
+    print(json.dumps(report["speedup"], indent=2, ensure_ascii=False))
+
+    if args.baseline and os.path.exists(args.baseline):
+        comparison = compare_to_baseline(report, load_results(args.baseline))
+        for entry in comparison["regressions"]:
+            logger.error(
+                f"Regression in {entry['scenario']} {entry['metric']}: "
+                f"{entry['baseline']:.4f} -> {entry['current']:.4f} ({entry['change']:+.1%})"
+            )
+        return 0 if comparison["passed"] else 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+AICore 動態路由測試
+編譯規則集與逐條評估的等價性，以及配置文件熱重載
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+import unittest
+from typing import List, Optional, Tuple
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aicore_dynamic_router import (
+    AICoreDynamicRouter, CompiledRuleSet, ComplexityBasedRule, DecisionType, Priority,
+    RiskBasedRule, RoutingContext, RoutingDecision, RoutingRule, UserExperienceRule
+)
+
+
+class AsyncOnlyRule(RoutingRule):
+    """只實現異步 evaluate 的自定義規則，編譯規則集應回退到 evaluate"""
+
+    def __init__(self):
+        super().__init__("async_only", priority=15)
+
+    async def evaluate(self, context: RoutingContext) -> Optional[RoutingDecision]:
+        if context.operation_type != "data_migration":
+            return None
+        return RoutingDecision(
+            decision_type=DecisionType.EXPERT_CONSULTATION,
+            target_component="expert_system",
+            priority=Priority.HIGH,
+            confidence_score=0.95,
+            reasoning="Data migration needs an expert"
+        )
+
+    def get_confidence(self, context: RoutingContext) -> float:
+        return 0.9
+
+
+class FakeHumanLoopClient:
+    """不發出網絡請求的 Human Loop 客戶端"""
+
+    def __init__(self):
+        self.sessions = []
+
+    async def create_session(self, session_data):
+        self.sessions.append(session_data)
+        return f"session-{len(self.sessions)}"
+
+
+async def evaluate_legacy(rules: List[RoutingRule], context: RoutingContext
+                          ) -> Tuple[Optional[RoutingRule], Optional[RoutingDecision]]:
+    """編譯前的評估方式：按優先級逐條 await evaluate，保留置信度最高的決策"""
+    best_rule, best_decision = None, None
+    for rule in sorted(rules, key=lambda r: r.priority, reverse=True):
+        decision = await rule.evaluate(context)
+        if decision:
+            decision.confidence_score *= rule.get_confidence(context)
+            if best_decision is None or decision.confidence_score > best_decision.confidence_score:
+                best_rule, best_decision = rule, decision
+    return best_rule, best_decision
+
+
+def make_contexts() -> List[RoutingContext]:
+    operation_types = ["deployment", "data_migration", "security_update", "routine_maintenance",
+                       "delete_records", "unknown"]
+    metadata_sets = [
+        {},
+        {"production_environment": True},
+        {"critical_system": True, "database_changes": True},
+        {"security_modifications": True, "user_data_access": True, "multiple_dependencies": True},
+        {"target": "production", "system_configuration": False},
+    ]
+    user_ids = [None, "auto_user", "manual_user", "other_user"]
+    return [
+        RoutingContext(request_id=f"r{i}", workflow_id="w", operation_type=operation_type,
+                       user_id=user_id, metadata=dict(metadata))
+        for i, (operation_type, metadata, user_id)
+        in enumerate(itertools.product(operation_types, metadata_sets, user_ids))
+    ]
+
+
+class CompiledRuleSetEquivalenceTest(unittest.IsolatedAsyncioTestCase):
+    """編譯規則集（特徵共享、門控索引、提前終止）與逐條評估選出相同決策"""
+
+    def make_rules(self) -> List[RoutingRule]:
+        return [
+            RiskBasedRule(risk_threshold=0.6),
+            ComplexityBasedRule(),
+            UserExperienceRule(user_preferences={
+                "auto_user": {"automation_preference": "high"},
+                "manual_user": {"automation_preference": "low"},
+            }),
+            AsyncOnlyRule(),
+        ]
+
+    async def test_same_decision_as_legacy_evaluation(self):
+        rules = self.make_rules()
+        compiled = CompiledRuleSet(rules, version=1)
+        early_exits = 0
+
+        for context in make_contexts():
+            legacy_rule, legacy = await evaluate_legacy(rules, context)
+            rule, decision, evaluated, early_exit = await compiled.evaluate(context)
+            early_exits += early_exit
+
+            with self.subTest(operation=context.operation_type, metadata=context.metadata,
+                              user=context.user_id):
+                self.assertIs(rule, legacy_rule)
+                self.assertEqual(decision.decision_type, legacy.decision_type)
+                self.assertEqual(decision.target_component, legacy.target_component)
+                self.assertAlmostEqual(decision.confidence_score, legacy.confidence_score)
+                self.assertEqual(decision.reasoning, legacy.reasoning)
+                self.assertLessEqual(evaluated, len(rules))
+
+        # 高風險請求在置信度上界處提前終止
+        self.assertGreater(early_exits, 0)
+
+    async def test_rule_capabilities(self):
+        """內置規則走同步特徵評估，只實現 evaluate 的規則回退到異步評估"""
+        for rule in self.make_rules():
+            self.assertEqual(rule.supports_features, not isinstance(rule, AsyncOnlyRule))
+
+        context = RoutingContext(request_id="r", workflow_id="w", operation_type="data_migration")
+        rule, decision, _, _ = await CompiledRuleSet(self.make_rules(), version=1).evaluate(context)
+        self.assertEqual(rule.name, "async_only")
+        self.assertEqual(decision.decision_type, DecisionType.EXPERT_CONSULTATION)
+
+
+class HotReloadTest(unittest.IsolatedAsyncioTestCase):
+    """配置文件變化後下一個請求使用重新編譯的規則"""
+
+    def setUp(self):
+        handle, self.config_path = tempfile.mkstemp(suffix=".yaml")
+        os.close(handle)
+        self.addCleanup(os.remove, self.config_path)
+        self.mtime = 1_000_000_000_000_000_000
+
+    def write_config(self, text: str):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        # 保證 mtime 變化，不依賴文件系統的時間戳精度
+        self.mtime += 1_000_000_000
+        os.utime(self.config_path, ns=(self.mtime, self.mtime))
+
+    def write_rules(self, rules: dict):
+        self.write_config(yaml.safe_dump({
+            "routing": {
+                "default_timeout": 300,
+                "fallback_to_human": False,
+                "early_exit_confidence": None,
+                "hot_reload_interval": 0.001,
+            },
+            "rules": rules,
+        }))
+
+    def make_router(self) -> AICoreDynamicRouter:
+        router = AICoreDynamicRouter(self.config_path)
+        router.human_loop_client = FakeHumanLoopClient()
+        return router
+
+    async def route(self, router: AICoreDynamicRouter) -> RoutingDecision:
+        router._next_reload_check = 0
+        return await router.route_request(RoutingContext(
+            request_id="r", workflow_id="w", operation_type="delete_records",
+            metadata={"database_changes": True}
+        ))
+
+    async def test_rule_change_is_picked_up(self):
+        self.write_rules({"risk_based": {"enabled": True}})
+        router = self.make_router()
+
+        decision = await self.route(router)
+        self.assertEqual(decision.decision_type, DecisionType.HUMAN_REQUIRED)
+        self.assertEqual(decision.metadata, {"session_id": "session-1"})
+        version = router.get_compiled_rules().version
+
+        self.write_rules({"risk_based": {"enabled": True, "risk_threshold": 1.0}})
+        decision = await self.route(router)
+
+        # 風險規則不再觸發，複雜度規則按未知操作給出中等複雜度
+        self.assertEqual(decision.decision_type, DecisionType.CONDITIONAL)
+        self.assertEqual(router.stats["reloads"], 1)
+        self.assertGreater(router.get_compiled_rules().version, version)
+        self.assertEqual([rule.risk_threshold for rule in router.rules if rule.name == "risk_based"], [1.0])
+
+    async def test_custom_rules_survive_reload(self):
+        self.write_rules({"risk_based": {"enabled": True}})
+        router = self.make_router()
+        router.add_rule(AsyncOnlyRule())
+
+        self.write_rules({"risk_based": {"enabled": False}})
+        await self.route(router)
+
+        names = {rule.name for rule in router.get_compiled_rules().rules}
+        self.assertNotIn("risk_based", names)
+        self.assertIn("async_only", names)
+
+    async def test_unchanged_rules_do_not_recompile(self):
+        self.write_rules({"risk_based": {"enabled": True}})
+        router = self.make_router()
+        await self.route(router)
+        compilations = router.stats["compilations"]
+
+        self.write_rules({"risk_based": {"enabled": True}})
+        await self.route(router)
+
+        self.assertEqual(router.stats["reloads"], 0)
+        self.assertEqual(router.stats["compilations"], compilations)
+
+    async def test_invalid_config_keeps_current_rules(self):
+        self.write_rules({"risk_based": {"enabled": True}})
+        router = self.make_router()
+        await self.route(router)
+        rules = router.get_compiled_rules()
+
+        self.write_config("")
+        decision = await self.route(router)
+
+        self.assertEqual(decision.decision_type, DecisionType.HUMAN_REQUIRED)
+        self.assertIs(router.get_compiled_rules(), rules)
+        self.assertEqual(router.stats["reload_errors"], 1)
+
+        # 修復後的配置在下一次檢查時生效
+        self.write_rules({"risk_based": {"enabled": False}})
+        await self.route(router)
+        self.assertEqual(router.stats["reloads"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()